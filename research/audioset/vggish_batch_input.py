@@ -0,0 +1,345 @@
+# Copyright 2017 The TensorFlow Authors All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Compute input examples for VGGish from many audio files in batches.
+
+This computes the same examples as vggish_input.wavfile_to_examples(), but is
+meant for large collections of audio files:
+- The STFT window and the mel filterbank are computed once per configuration
+  instead of once per waveform (see LogMelFrontend and get_frontend()).
+- WAV files are memory mapped and processed in chunks of examples, so that long
+  files are never loaded whole. Consecutive chunks overlap by the samples that
+  their edge examples share, so chunked examples are the same as those of the
+  whole file (up to floating point rounding when resampling).
+- Chunks of many files are processed in a pool of worker processes (see
+  wavfiles_to_examples()).
+- Examples of successive files are packed into fixed-size batches for VGGish
+  inference (see batch_examples()).
+"""
+
+import collections
+import fractions
+import logging
+import multiprocessing
+
+import numpy as np
+import resampy
+from scipy.io import wavfile
+
+import mel_features
+import vggish_params
+
+# Default number of examples (of 0.96 seconds each) computed at once per file.
+DEFAULT_CHUNK_EXAMPLES = 64
+
+# Margin of audio, in seconds, resampled beyond each side of a chunk so that
+# the edges of the resampling filter do not affect the chunk.
+_RESAMPLING_MARGIN_SECONDS = 1.0
+
+
+class LogMelFrontend(object):
+  """Computes log mel spectrogram examples for one feature configuration.
+
+  The STFT window and the mel filterbank matrix only depend on the
+  configuration, so they are computed once in the constructor.
+  """
+
+  def __init__(self,
+               sample_rate=vggish_params.SAMPLE_RATE,
+               log_offset=vggish_params.LOG_OFFSET,
+               window_length_secs=vggish_params.STFT_WINDOW_LENGTH_SECONDS,
+               hop_length_secs=vggish_params.STFT_HOP_LENGTH_SECONDS,
+               num_mel_bins=vggish_params.NUM_MEL_BINS,
+               lower_edge_hertz=vggish_params.MEL_MIN_HZ,
+               upper_edge_hertz=vggish_params.MEL_MAX_HZ,
+               example_window_secs=vggish_params.EXAMPLE_WINDOW_SECONDS,
+               example_hop_secs=vggish_params.EXAMPLE_HOP_SECONDS):
+    """Precomputes the window and mel filterbank of a configuration.
+
+    Args:
+      sample_rate: Sample rate of the waveforms the features are computed on.
+      log_offset: Add this to values when taking log to avoid -Infs.
+      window_length_secs: Duration of each STFT window.
+      hop_length_secs: Advance between successive STFT windows.
+      num_mel_bins: How many bands in the resulting mel spectrum.
+      lower_edge_hertz: Lower bound on the frequencies of the mel spectrum.
+      upper_edge_hertz: Upper bound on the frequencies of the mel spectrum.
+      example_window_secs: Duration of each example.
+      example_hop_secs: Advance between successive examples.
+    """
+    self.sample_rate = sample_rate
+    self.log_offset = log_offset
+    self.window_length_samples = int(round(sample_rate * window_length_secs))
+    self.hop_length_samples = int(round(sample_rate * hop_length_secs))
+    self.fft_length = 2 ** int(
+        np.ceil(np.log(self.window_length_samples) / np.log(2.0)))
+    self._window = mel_features.periodic_hann(self.window_length_samples)
+    self._mel_matrix = mel_features.spectrogram_to_mel_matrix(
+        num_mel_bins=num_mel_bins,
+        num_spectrogram_bins=self.fft_length // 2 + 1,
+        audio_sample_rate=sample_rate,
+        lower_edge_hertz=lower_edge_hertz,
+        upper_edge_hertz=upper_edge_hertz)
+
+    features_sample_rate = 1.0 / hop_length_secs
+    self.example_window_length = int(round(
+        example_window_secs * features_sample_rate))
+    self.example_hop_length = int(round(
+        example_hop_secs * features_sample_rate))
+    # Number of samples covered by an example, and between the first samples
+    # of successive examples.
+    self.example_window_samples = (
+        (self.example_window_length - 1) * self.hop_length_samples +
+        self.window_length_samples)
+    self.example_hop_samples = (
+        self.example_hop_length * self.hop_length_samples)
+
+  def log_mel_spectrogram(self, data):
+    """Same as mel_features.log_mel_spectrogram() for this configuration."""
+    frames = mel_features.frame(
+        data, self.window_length_samples, self.hop_length_samples)
+    spectrogram = np.abs(np.fft.rfft(frames * self._window, self.fft_length))
+    return np.log(np.dot(spectrogram, self._mel_matrix) + self.log_offset)
+
+  def num_examples(self, num_samples):
+    """Returns the number of examples of a waveform of num_samples samples."""
+    if num_samples < self.example_window_samples:
+      return 0
+    return 1 + ((num_samples - self.example_window_samples) //
+                self.example_hop_samples)
+
+  def examples(self, data):
+    """Converts a mono waveform at the frontend sample rate into examples.
+
+    Args:
+      data: 1-D np.array of samples.
+
+    Returns:
+      3-D np.array of shape [num_examples, num_frames, num_bands], see
+      vggish_input.waveform_to_examples().
+    """
+    num_examples = self.num_examples(len(data))
+    if not num_examples:
+      return np.zeros(
+          [0, self.example_window_length, self._mel_matrix.shape[1]])
+    # Only compute the frames covered by examples.
+    data = data[:(num_examples - 1) * self.example_hop_samples +
+                self.example_window_samples]
+    return mel_features.frame(self.log_mel_spectrogram(data),
+                              window_length=self.example_window_length,
+                              hop_length=self.example_hop_length)
+
+  def waveform_to_examples(self, data, sample_rate):
+    """Same as vggish_input.waveform_to_examples() for this configuration."""
+    if len(data.shape) > 1:
+      data = np.mean(data, axis=1)
+    if sample_rate != self.sample_rate:
+      data = resampy.resample(data, sample_rate, self.sample_rate)
+    return self.examples(data)
+
+  def resampled_length(self, num_samples, sample_rate):
+    """Returns the number of samples of a waveform after resampling."""
+    if sample_rate == self.sample_rate:
+      return num_samples
+    return int(num_samples * self.sample_rate / float(sample_rate))
+
+  def wav_chunk_examples(self, wav_data, sample_rate, start, end):
+    """Computes a range of the examples of a WAV waveform.
+
+    Args:
+      wav_data: np.array of signed 16-bit PCM samples, of either one dimension
+        (mono) or two dimensions (multi-channel), e.g. memory mapped by
+        scipy.io.wavfile.read(..., mmap=True).
+      sample_rate: Sample rate of wav_data.
+      start: Index of the first example to compute.
+      end: Index after the last example to compute.
+
+    Returns:
+      3-D np.array with examples start to end - 1 of
+      vggish_input.waveform_to_examples(wav_data / 32768.0, sample_rate).
+    """
+    # Range of samples of the examples, at the frontend sample rate.
+    first_sample = start * self.example_hop_samples
+    last_sample = ((end - 1) * self.example_hop_samples +
+                   self.example_window_samples)
+    if sample_rate == self.sample_rate:
+      data = wav_data[first_sample:last_sample] / 32768.0
+      if len(data.shape) > 1:
+        data = np.mean(data, axis=1)
+      return self.examples(data)
+
+    # Resample a margin around the range. The margin is aligned on the periods
+    # shared by both sample rates, so that the resampled samples fall on the
+    # same times as when resampling the whole waveform.
+    ratio = fractions.Fraction(self.sample_rate, sample_rate)
+    input_period = ratio.denominator
+    output_period = ratio.numerator
+    margin = int(_RESAMPLING_MARGIN_SECONDS * self.sample_rate)
+    first_period = max(0, first_sample - margin) // output_period
+    last_period = -(-(last_sample + margin) // output_period)
+    data = wav_data[first_period * input_period:
+                    last_period * input_period] / 32768.0
+    if len(data.shape) > 1:
+      data = np.mean(data, axis=1)
+    data = resampy.resample(data, sample_rate, self.sample_rate)
+    offset = first_sample - first_period * output_period
+    return self.examples(data[offset:offset + last_sample - first_sample])
+
+
+_frontends = {}
+
+
+def get_frontend(**config):
+  """Returns the LogMelFrontend of a configuration, creating it once.
+
+  Args:
+    **config: Arguments of LogMelFrontend. Defaults to the VGGish parameters.
+
+  Returns:
+    A LogMelFrontend shared by all callers with the same configuration.
+  """
+  key = tuple(sorted(config.items()))
+  if key not in _frontends:
+    _frontends[key] = LogMelFrontend(**config)
+  return _frontends[key]
+
+
+def _read_wavfile(wav_file):
+  """Memory maps a WAV file of signed 16-bit PCM samples.
+
+  Raises:
+    ValueError: If the samples are not signed 16-bit PCM.
+  """
+  sr, wav_data = wavfile.read(wav_file, mmap=True)
+  if wav_data.dtype != np.int16:
+    raise ValueError('Bad sample type: %r' % wav_data.dtype)
+  return sr, wav_data
+
+
+def _wavfile_chunk_examples(task):
+  """Computes the examples of a chunk of a WAV file in a worker process."""
+  wav_file, start, end = task
+  sr, wav_data = _read_wavfile(wav_file)
+  return wav_file, start, get_frontend().wav_chunk_examples(
+      wav_data, sr, start, end).astype(np.float32)
+
+
+def wavfile_chunks(wav_file, chunk_examples=DEFAULT_CHUNK_EXAMPLES):
+  """Splits the examples of a WAV file into chunks.
+
+  Args:
+    wav_file: String path to a WAV file of signed 16-bit PCM samples.
+    chunk_examples: Maximum number of examples per chunk.
+
+  Returns:
+    List of (wav_file, start, end) tuples, each of which stands for the
+    examples start to end - 1 of the file. Files that cannot be read are logged
+    and have no chunk, like files too short for a single example.
+  """
+  try:
+    sr, wav_data = _read_wavfile(wav_file)
+  except (IOError, OSError, ValueError) as e:
+    logging.warning('Skipping unreadable WAV file %s: %s', wav_file, e)
+    return []
+  frontend = get_frontend()
+  num_examples = frontend.num_examples(
+      frontend.resampled_length(len(wav_data), sr))
+  return [(wav_file, start, min(start + chunk_examples, num_examples))
+          for start in range(0, num_examples, chunk_examples)]
+
+
+def wavfiles_to_examples(wav_files, num_processes=None,
+                         chunk_examples=DEFAULT_CHUNK_EXAMPLES,
+                         max_pending_chunks=None):
+  """Computes the examples of many WAV files in a pool of processes.
+
+  Args:
+    wav_files: Iterable of string paths to WAV files of signed 16-bit PCM
+      samples.
+    num_processes: Number of worker processes. Defaults to the number of CPUs.
+      If 1, examples are computed in the calling process.
+    chunk_examples: Maximum number of examples computed at once per file.
+    max_pending_chunks: Maximum number of chunks being computed or waiting to
+      be consumed, which bounds the memory used. Defaults to four chunks per
+      process.
+
+  Yields:
+    (wav_file, start, examples) tuples, where examples is a float32 np.array
+    with the examples start to start + len(examples) - 1 of wav_file, as
+    computed by vggish_input.wavfile_to_examples(). Chunks are yielded in the
+    order of wav_files, and each file is covered by consecutive chunks. Files
+    too short for a single example, or that cannot be read, yield no chunk.
+  """
+  tasks = (task for wav_file in wav_files
+           for task in wavfile_chunks(wav_file, chunk_examples))
+  num_processes = num_processes or multiprocessing.cpu_count()
+  if num_processes <= 1:
+    for task in tasks:
+      yield _wavfile_chunk_examples(task)
+    return
+
+  max_pending_chunks = max_pending_chunks or 4 * num_processes
+  pool = multiprocessing.Pool(num_processes)
+  try:
+    pending = collections.deque()
+    for task in tasks:
+      if len(pending) >= max_pending_chunks:
+        yield pending.popleft().get()
+      pending.append(pool.apply_async(_wavfile_chunk_examples, (task,)))
+    while pending:
+      yield pending.popleft().get()
+  finally:
+    pool.terminate()
+    pool.join()
+
+
+def batch_examples(chunks, batch_size):
+  """Packs chunks of examples of successive files into fixed-size batches.
+
+  Every batch has the same shape, so that it can be fed to VGGish without
+  retracing differently shaped computations; the last batch is padded with
+  zero examples.
+
+  Args:
+    chunks: Iterable of (wav_file, start, examples) tuples, as yielded by
+      wavfiles_to_examples().
+    batch_size: Number of examples per batch.
+
+  Yields:
+    (batch, sources) tuples, where batch is a float32 np.array of shape
+    [batch_size, num_frames, num_bands] and sources is a list of
+    (wav_file, example_index) tuples for the first len(sources) rows of the
+    batch; the remaining rows are padding.
+  """
+  batch = None
+  sources = []
+  for wav_file, start, examples in chunks:
+    if batch is None:
+      batch = np.zeros((batch_size,) + examples.shape[1:], dtype=np.float32)
+    position = 0
+    while position < len(examples):
+      num_copied = min(batch_size - len(sources), len(examples) - position)
+      batch[len(sources):len(sources) + num_copied] = (
+          examples[position:position + num_copied])
+      sources.extend((wav_file, start + position + i)
+                     for i in range(num_copied))
+      position += num_copied
+      if len(sources) == batch_size:
+        # The caller may hold on to the batch, so a new one is filled next.
+        yield batch, sources
+        batch = np.zeros_like(batch)
+        sources = []
+  if sources:
+    yield batch, sources
@@ -0,0 +1,353 @@
+# Copyright 2017 The TensorFlow Authors All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+r"""Extracts postprocessed VGGish embeddings of many WAV files.
+
+Where vggish_inference_demo.py runs a single WAV file through VGGish, this
+extracts the embeddings of a whole collection of WAV files (assumed to contain
+signed 16-bit PCM samples):
+- Examples are computed by a pool of processes (see vggish_batch_input.py), and
+  the examples of successive files are packed into batches of --batch_size
+  examples, so that every run of the model is full.
+- The embeddings of each batch are whitened and quantized to 8 bits as soon as
+  they are computed, using the same postprocessing as vggish_postprocess.py.
+- The embeddings of each file are written as a SequenceExample, in the same
+  format as the embedding features released in AudioSet, with the path of the
+  file as the 'video_id' context feature. Files too short to contain a single
+  example, or that cannot be read as 16-bit PCM, get a SequenceExample without
+  embeddings.
+- SequenceExamples are written to TFRecord shards of --files_per_shard files,
+  by a pool of --num_writer_threads threads.
+
+Each shard is written to a temporary file, which is renamed once complete, next
+to a small text file listing the paths of its files. An interrupted extraction
+can then be resumed by running the same command again: the files listed for
+complete shards are skipped, and temporary files are discarded.
+
+Usage:
+  # Extract the embeddings of all WAV files under a directory.
+  $ python vggish_extract_embeddings.py --input_dir /path/to/wav/files \
+                                        --output_dir /path/to/embeddings
+
+  # Extract the embeddings of the WAV files listed in a text file, one path per
+  # line, with explicit model files.
+  $ python vggish_extract_embeddings.py --input_list /path/to/list \
+                                        --output_dir /path/to/embeddings \
+                                        --checkpoint /path/to/model/checkpoint \
+                                        --pca_params /path/to/pca/params
+"""
+
+from __future__ import print_function
+
+import collections
+import multiprocessing.pool
+import os
+import re
+import time
+
+import numpy as np
+import tensorflow as tf
+
+import vggish_batch_input
+import vggish_params
+import vggish_postprocess
+import vggish_slim
+
+flags = tf.app.flags
+
+flags.DEFINE_string(
+    'input_dir', None,
+    'Directory searched recursively for .wav files.')
+
+flags.DEFINE_string(
+    'input_list', None,
+    'Text file listing the paths of WAV files, one per line. If set, '
+    '--input_dir is ignored.')
+
+flags.DEFINE_string(
+    'output_dir', None,
+    'Directory where the TFRecord shards are written.')
+
+flags.DEFINE_string(
+    'checkpoint', 'vggish_model.ckpt',
+    'Path to the VGGish checkpoint file.')
+
+flags.DEFINE_string(
+    'pca_params', 'vggish_pca_params.npz',
+    'Path to the VGGish PCA parameters file.')
+
+flags.DEFINE_integer(
+    'batch_size', 256,
+    'Number of examples per run of the model.')
+
+flags.DEFINE_integer(
+    'num_processes', 0,
+    'Number of processes computing examples. Defaults to the number of CPUs.')
+
+flags.DEFINE_integer(
+    'chunk_examples', vggish_batch_input.DEFAULT_CHUNK_EXAMPLES,
+    'Maximum number of examples computed at once per file.')
+
+flags.DEFINE_integer(
+    'files_per_shard', 1000,
+    'Number of files per TFRecord shard. Files of an incomplete shard are '
+    'extracted again when resuming.')
+
+flags.DEFINE_integer(
+    'num_writer_threads', 4,
+    'Number of threads writing shards.')
+
+FLAGS = flags.FLAGS
+
+# Name of the shards in the output directory.
+_SHARD_PATTERN = 'embeddings-%05d.tfrecord'
+_SHARD_RE = re.compile(r'embeddings-(\d+)\.tfrecord$')
+
+# Suffix of the list of the paths of the files of a shard.
+_IDS_SUFFIX = '.ids'
+
+# Suffix of the shards being written.
+_TMP_SUFFIX = '.tmp'
+
+# Pace to report extraction log.
+_STATUS_CHECK_ITERATIONS = 100
+
+
+def make_sequence_example(path, embeddings):
+  """Builds the SequenceExample of the postprocessed embeddings of a file.
+
+  Args:
+    path: Path of the file, stored as the 'video_id' context feature.
+    embeddings: uint8 np.array of shape [num_examples, embedding_size].
+
+  Returns:
+    A tf.train.SequenceExample where each embedding is a bytes-valued feature,
+    as in the embedding features released in AudioSet.
+  """
+  return tf.train.SequenceExample(
+      context=tf.train.Features(feature={
+          'video_id': tf.train.Feature(
+              bytes_list=tf.train.BytesList(value=[path.encode('utf-8')]))
+      }),
+      feature_lists=tf.train.FeatureLists(
+          feature_list={
+              vggish_params.AUDIO_EMBEDDING_FEATURE_NAME:
+                  tf.train.FeatureList(
+                      feature=[
+                          tf.train.Feature(
+                              bytes_list=tf.train.BytesList(
+                                  value=[embedding.tobytes()]))
+                          for embedding in embeddings
+                      ]
+                  )
+          }
+      )
+  )
+
+
+def read_extracted_files(output_dir):
+  """Lists the files in the complete shards of an interrupted extraction.
+
+  Only the lists of paths written next to the shards are read. Temporary files
+  of incomplete shards, and lists of shards that were not renamed, are removed.
+
+  Args:
+    output_dir: Directory of the shards.
+
+  Returns:
+    extracted_files: Set of the paths of the files in complete shards.
+    next_shard: Index of the next shard to write.
+  """
+  extracted_files = set()
+  next_shard = 0
+  filenames = set(tf.gfile.ListDirectory(output_dir))
+  for filename in filenames:
+    if (filename.endswith(_TMP_SUFFIX) or
+        filename.endswith(_IDS_SUFFIX) and
+        filename[:-len(_IDS_SUFFIX)] not in filenames):
+      tf.gfile.Remove(os.path.join(output_dir, filename))
+      continue
+    match = _SHARD_RE.match(filename)
+    if not match:
+      continue
+    next_shard = max(next_shard, int(match.group(1)) + 1)
+    with tf.gfile.GFile(
+        os.path.join(output_dir, filename + _IDS_SUFFIX), 'r') as f:
+      extracted_files.update(line.rstrip('\n') for line in f)
+  return extracted_files, next_shard
+
+
+def write_shard(shard_path, video_ids, seq_examples):
+  """Writes SequenceExamples to a shard, which only appears once complete.
+
+  The list of video_ids is renamed into place before the shard, so that every
+  complete shard has one.
+  """
+  writer = tf.python_io.TFRecordWriter(shard_path + _TMP_SUFFIX)
+  for seq_example in seq_examples:
+    writer.write(seq_example.SerializeToString())
+  writer.close()
+  ids_path = shard_path + _IDS_SUFFIX
+  with tf.gfile.GFile(ids_path + _TMP_SUFFIX, 'w') as f:
+    f.write(''.join(video_id + '\n' for video_id in video_ids))
+  tf.gfile.Rename(ids_path + _TMP_SUFFIX, ids_path, overwrite=True)
+  tf.gfile.Rename(shard_path + _TMP_SUFFIX, shard_path)
+
+
+class ShardedWriter(object):
+  """Groups SequenceExamples into shards written by a pool of threads."""
+
+  def __init__(self, output_dir, first_shard, files_per_shard, num_threads):
+    """Starts the writing threads.
+
+    Args:
+      output_dir: Directory of the shards.
+      first_shard: Index of the first shard to write.
+      files_per_shard: Number of SequenceExamples per shard.
+      num_threads: Number of shards written concurrently.
+    """
+    self._output_dir = output_dir
+    self._next_shard = first_shard
+    self._files_per_shard = files_per_shard
+    self._num_threads = num_threads
+    self._video_ids = []
+    self._seq_examples = []
+    self._pool = multiprocessing.pool.ThreadPool(num_threads)
+    self._pending = collections.deque()
+
+  def _write_shard(self):
+    # Bound the number of shards held in memory, and raise write errors.
+    while len(self._pending) >= 2 * self._num_threads:
+      self._pending.popleft().get()
+    shard_path = os.path.join(self._output_dir,
+                              _SHARD_PATTERN % self._next_shard)
+    self._pending.append(self._pool.apply_async(
+        write_shard, (shard_path, self._video_ids, self._seq_examples)))
+    self._next_shard += 1
+    self._video_ids = []
+    self._seq_examples = []
+
+  def add(self, video_id, seq_example):
+    """Adds the SequenceExample of a file to the current shard."""
+    self._video_ids.append(video_id)
+    self._seq_examples.append(seq_example)
+    if len(self._seq_examples) >= self._files_per_shard:
+      self._write_shard()
+
+  def close(self):
+    """Writes the last shard and waits until all shards are written."""
+    if self._seq_examples:
+      self._write_shard()
+    try:
+      while self._pending:
+        self._pending.popleft().get()
+    finally:
+      self._pool.terminate()
+      self._pool.join()
+
+
+def list_wav_files():
+  """Returns the paths of the WAV files to extract, without duplicates."""
+  if FLAGS.input_list:
+    with open(FLAGS.input_list, 'r') as f:
+      wav_files = [line.strip() for line in f if line.strip()]
+  else:
+    wav_files = []
+    for dirpath, _, filenames in os.walk(FLAGS.input_dir):
+      wav_files.extend(os.path.join(dirpath, filename)
+                       for filename in filenames
+                       if filename.lower().endswith('.wav'))
+    wav_files.sort()
+  return list(collections.OrderedDict.fromkeys(wav_files))
+
+
+def main(_):
+  if not FLAGS.output_dir:
+    raise ValueError('--output_dir is required.')
+  if not FLAGS.input_dir and not FLAGS.input_list:
+    raise ValueError('Either --input_dir or --input_list is required.')
+  tf.logging.set_verbosity(tf.logging.INFO)
+  tf.gfile.MakeDirs(FLAGS.output_dir)
+  extracted_files, next_shard = read_extracted_files(FLAGS.output_dir)
+  wav_files = [path for path in list_wav_files()
+               if path not in extracted_files]
+  tf.logging.info('Extracting %d files, %d already extracted',
+                  len(wav_files), len(extracted_files))
+
+  pproc = vggish_postprocess.Postprocessor(FLAGS.pca_params)
+  writer = ShardedWriter(FLAGS.output_dir, next_shard, FLAGS.files_per_shard,
+                         FLAGS.num_writer_threads)
+
+  with tf.Graph().as_default(), tf.Session() as sess:
+    vggish_slim.define_vggish_slim(training=False)
+    vggish_slim.load_vggish_slim_checkpoint(sess, FLAGS.checkpoint)
+    features_tensor = sess.graph.get_tensor_by_name(
+        vggish_params.INPUT_TENSOR_NAME)
+    embedding_tensor = sess.graph.get_tensor_by_name(
+        vggish_params.OUTPUT_TENSOR_NAME)
+
+    start_time = time.time()
+    num_examples = 0
+    # Files are extracted in order. The file at num_files is being extracted,
+    # and its examples may span several batches. It is complete once a batch
+    # moves on to a later file; files in between had no examples.
+    num_files = 0
+    current_embeddings = []
+
+    def finish_file():
+      embeddings = (np.concatenate(current_embeddings) if current_embeddings
+                    else np.zeros([0, vggish_params.EMBEDDING_SIZE],
+                                  dtype=np.uint8))
+      path = wav_files[num_files]
+      writer.add(path, make_sequence_example(path, embeddings))
+      del current_embeddings[:]
+
+    batches = vggish_batch_input.batch_examples(
+        vggish_batch_input.wavfiles_to_examples(
+            wav_files, FLAGS.num_processes, FLAGS.chunk_examples),
+        FLAGS.batch_size)
+    for i, (batch, sources) in enumerate(batches):
+      if i % _STATUS_CHECK_ITERATIONS == 0:
+        elapsed = time.time() - start_time
+        tf.logging.info('Batch %d: %d files, %d examples, %.1f examples/sec',
+                        i, num_files, num_examples,
+                        num_examples / elapsed if elapsed else 0.0)
+      [embedding_batch] = sess.run([embedding_tensor],
+                                   feed_dict={features_tensor: batch})
+      postprocessed_batch = pproc.postprocess(embedding_batch[:len(sources)])
+      start = 0
+      while start < len(sources):
+        path = sources[start][0]
+        end = start + 1
+        while end < len(sources) and sources[end][0] == path:
+          end += 1
+        while wav_files[num_files] != path:
+          finish_file()
+          num_files += 1
+        current_embeddings.append(postprocessed_batch[start:end])
+        start = end
+      num_examples += len(sources)
+    while num_files < len(wav_files):
+      finish_file()
+      num_files += 1
+
+  writer.close()
+  elapsed = time.time() - start_time
+  tf.logging.info('Extracted %d files, %d examples in %.1f s',
+                  num_files, num_examples, elapsed)
+
+
+if __name__ == '__main__':
+  tf.app.run()
@@ -0,0 +1,162 @@
+# Copyright 2017 The TensorFlow Authors All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+r"""Benchmark of the batched VGGish input frontend, in clips/sec.
+
+Synthetic WAV clips (of noise, at various sample rates) are written to a
+temporary directory, and converted into examples both by
+vggish_input.wavfile_to_examples(), one clip at a time, and by
+vggish_batch_input.wavfiles_to_examples(), in a pool of processes. Both
+throughputs are printed, and the examples are checked to be the same.
+
+If a checkpoint is given, the examples are also run through VGGish in
+fixed-size batches, and the end-to-end throughput is printed.
+
+Usage:
+  # Benchmark the frontends on 200 clips of 10 seconds.
+  $ python vggish_frontend_benchmark.py
+
+  # Also benchmark inference on 1000 clips, with batches of 256 examples.
+  $ python vggish_frontend_benchmark.py --num_clips 1000 \
+                                        --checkpoint vggish_model.ckpt \
+                                        --batch_size 256
+"""
+
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from scipy.io import wavfile
+import tensorflow as tf
+
+import vggish_batch_input
+import vggish_input
+import vggish_params
+import vggish_slim
+
+flags = tf.app.flags
+
+flags.DEFINE_integer(
+    'num_clips', 200,
+    'Number of synthetic clips.')
+
+flags.DEFINE_float(
+    'clip_secs', 10.0,
+    'Duration of each clip, in seconds.')
+
+flags.DEFINE_string(
+    'sample_rates', '16000,44100',
+    'Comma-separated sample rates of the clips, used in turn.')
+
+flags.DEFINE_integer(
+    'num_processes', 0,
+    'Number of processes of the batched frontend. Defaults to the number of '
+    'CPUs.')
+
+flags.DEFINE_integer(
+    'chunk_examples', vggish_batch_input.DEFAULT_CHUNK_EXAMPLES,
+    'Maximum number of examples computed at once per clip.')
+
+flags.DEFINE_string(
+    'checkpoint', None,
+    'Path to the VGGish checkpoint file. If set, inference is benchmarked.')
+
+flags.DEFINE_integer(
+    'batch_size', 128,
+    'Number of examples per inference batch.')
+
+FLAGS = flags.FLAGS
+
+
+def write_clips(clip_dir):
+  """Writes the synthetic clips and returns their paths."""
+  rng = np.random.RandomState(0)
+  sample_rates = [int(sr) for sr in FLAGS.sample_rates.split(',')]
+  wav_files = []
+  for i in range(FLAGS.num_clips):
+    sr = sample_rates[i % len(sample_rates)]
+    samples = rng.randint(-8192, 8192, size=int(FLAGS.clip_secs * sr))
+    wav_file = os.path.join(clip_dir, 'clip_%05d.wav' % i)
+    wavfile.write(wav_file, sr, samples.astype(np.int16))
+    wav_files.append(wav_file)
+  return wav_files
+
+
+def benchmark_inference(wav_files):
+  """Runs the clips through VGGish in fixed-size batches."""
+  with tf.Graph().as_default(), tf.Session() as sess:
+    vggish_slim.define_vggish_slim(training=False)
+    vggish_slim.load_vggish_slim_checkpoint(sess, FLAGS.checkpoint)
+    features_tensor = sess.graph.get_tensor_by_name(
+        vggish_params.INPUT_TENSOR_NAME)
+    embedding_tensor = sess.graph.get_tensor_by_name(
+        vggish_params.OUTPUT_TENSOR_NAME)
+
+    start_time = time.time()
+    num_examples = 0
+    for batch, sources in vggish_batch_input.batch_examples(
+        vggish_batch_input.wavfiles_to_examples(
+            wav_files, FLAGS.num_processes, FLAGS.chunk_examples),
+        FLAGS.batch_size):
+      sess.run(embedding_tensor, feed_dict={features_tensor: batch})
+      num_examples += len(sources)
+    elapsed = time.time() - start_time
+  print('Inference: %d examples in %.1f s, %.1f clips/sec' %
+        (num_examples, elapsed, len(wav_files) / elapsed))
+
+
+def main(_):
+  clip_dir = tempfile.mkdtemp()
+  try:
+    wav_files = write_clips(clip_dir)
+
+    start_time = time.time()
+    expected = {wav_file: vggish_input.wavfile_to_examples(wav_file)
+                for wav_file in wav_files}
+    elapsed = time.time() - start_time
+    print('vggish_input: %d clips in %.1f s, %.1f clips/sec' %
+          (len(wav_files), elapsed, len(wav_files) / elapsed))
+
+    start_time = time.time()
+    chunks = list(vggish_batch_input.wavfiles_to_examples(
+        wav_files, FLAGS.num_processes, FLAGS.chunk_examples))
+    elapsed = time.time() - start_time
+    print('vggish_batch_input: %d clips in %.1f s, %.1f clips/sec' %
+          (len(wav_files), elapsed, len(wav_files) / elapsed))
+
+    max_error = 0.0
+    for wav_file, start, examples in chunks:
+      examples_error = np.abs(
+          expected[wav_file][start:start + len(examples)] - examples)
+      max_error = max(max_error, examples_error.max())
+    num_examples = sum(len(examples) for _, _, examples in chunks)
+    num_expected = sum(len(examples) for examples in expected.values())
+    assert num_examples == num_expected, (
+        'Mismatched number of examples: %d != %d' %
+        (num_examples, num_expected))
+    print('Maximum difference of the examples: %g' % max_error)
+
+    if FLAGS.checkpoint:
+      benchmark_inference(wav_files)
+  finally:
+    shutil.rmtree(clip_dir)
+
+
+if __name__ == '__main__':
+  tf.app.run()
@@ -11,6 +11,7 @@ https://github.com/pocmo/Python-Brainfuck/blob/master/brainfuck.py
 """
 
 from collections import namedtuple
+from collections import OrderedDict
 import time
 
 
@@ -232,3 +233,275 @@ def evaluate(code, input_buffer=None, init_memory=None, base=256, timeout=1.0,
       program_trace=program_trace)
 
 
+# Opcodes of compiled programs. Runs of the same "+", "-", ">", "<" or "."
+# character, and runs of ignored characters, are collapsed into one
+# instruction whose argument is the length of the run.
+_RIGHT, _LEFT, _INC, _DEC, _OPEN, _CLOSE, _OUT, _IN, _NOP = range(9)
+_CHAR_TO_OPCODE = {'>': _RIGHT, '<': _LEFT, '+': _INC, '-': _DEC, '[': _OPEN,
+                   ']': _CLOSE, '.': _OUT, ',': _IN}
+_COLLAPSIBLE_OPCODES = frozenset([_RIGHT, _LEFT, _INC, _DEC, _OUT, _NOP])
+
+# Number of instructions executed between wall clock checks.
+_TIMEOUT_CHECK_INTERVAL = 1024
+
+
+CompiledProgram = namedtuple(
+    'CompiledProgram', ['opcodes', 'args', 'steps', 'correct_syntax'])
+
+
+def compile_program(code):
+  """Compiles BF code into a list of run-length collapsed instructions.
+
+  Args:
+    code: String or list of BF characters. Any character not in CHARS compiles
+        to a no-op, which still counts as an execution step.
+
+  Returns:
+    CompiledProgram namedtuple containing
+      opcodes: List of instruction opcodes.
+      args: List of instruction arguments. For "[" and "]" this is the index of
+          the matching brace instruction (or of the instruction itself if the
+          brace is unmatched), otherwise it is the run length.
+      steps: List with the number of code characters of each instruction.
+      correct_syntax: True if all braces match.
+  """
+  opcodes, args = [], []
+  for char in code:
+    opcode = _CHAR_TO_OPCODE.get(char, _NOP)
+    if opcodes and opcode in _COLLAPSIBLE_OPCODES and opcodes[-1] == opcode:
+      args[-1] += 1
+    else:
+      opcodes.append(opcode)
+      args.append(1)
+  steps = list(args)
+
+  bracestack = []
+  correct_syntax = True
+  for position, opcode in enumerate(opcodes):
+    if opcode == _OPEN:
+      bracestack.append(position)
+      args[position] = position
+    elif opcode == _CLOSE:
+      if not bracestack:  # Unmatched closing brace.
+        args[position] = position
+        correct_syntax = False
+        continue
+      start = bracestack.pop()
+      args[start] = position
+      args[position] = start
+  if bracestack:  # Unmatched opening braces.
+    correct_syntax = False
+
+  return CompiledProgram(opcodes, args, steps, correct_syntax)
+
+
+def evaluate_compiled(program, input_buffer=None, init_memory=None, base=256,
+                      timeout=1.0, max_steps=None, require_correct_syntax=True,
+                      output_memory=False):
+  """Execute a compiled BF program.
+
+  Gives the same results as `evaluate` on the code the program was compiled
+  from, except that the timeout is only checked every
+  _TIMEOUT_CHECK_INTERVAL instructions. Program traces are not supported.
+
+  Args:
+    program: A CompiledProgram returned by `compile_program`.
+    input_buffer: See `evaluate`.
+    init_memory: See `evaluate`.
+    base: See `evaluate`.
+    timeout: See `evaluate`.
+    max_steps: See `evaluate`.
+    require_correct_syntax: See `evaluate`.
+    output_memory: See `evaluate`.
+
+  Returns:
+    EvalResult namedtuple, see `evaluate`. program_trace is always None.
+  """
+  if require_correct_syntax and not program.correct_syntax:
+    return EvalResult([], False, Status.SYNTAX_ERROR, 0, 0.0,
+                      [] if output_memory else None, None)
+
+  opcodes, args, op_steps = program.opcodes, program.args, program.steps
+  num_ops = len(opcodes)
+  inputs = list(input_buffer) if input_buffer is not None else []
+  num_inputs = len(inputs)
+  input_pos = 0
+  output_buffer = []
+  cells = list(init_memory) if init_memory else [0]
+  codeptr, cellptr = 0, 0
+
+  step_limit = max_steps if max_steps is not None else float('inf')
+  success = True
+  reason = Status.SUCCESS
+  start_time = time.time()
+  steps = 0
+  timeout_check_countdown = _TIMEOUT_CHECK_INTERVAL
+  while codeptr < num_ops:
+    opcode = opcodes[codeptr]
+    count = op_steps[codeptr]
+    step_limit_reached = steps + count >= step_limit
+    if step_limit_reached:
+      # Only execute the part of the run up to the step limit.
+      count = max(step_limit - steps, 1)
+
+    if opcode == _OPEN:
+      if cells[cellptr] == 0:
+        codeptr = args[codeptr]
+    elif opcode == _CLOSE:
+      if cells[cellptr] != 0:
+        codeptr = args[codeptr]
+    elif opcode == _INC:
+      value = cells[cellptr]
+      if 0 <= value < base:
+        cells[cellptr] = (value + count) % base
+      else:
+        for _ in range(count):
+          value = value + 1 if value < (base - 1) else 0
+        cells[cellptr] = value
+    elif opcode == _DEC:
+      value = cells[cellptr]
+      if 0 <= value < base:
+        cells[cellptr] = (value - count) % base
+      else:
+        for _ in range(count):
+          value = value - 1 if value > 0 else (base - 1)
+        cells[cellptr] = value
+    elif opcode == _RIGHT:
+      cellptr += count
+      if cellptr >= len(cells):
+        cells.extend([0] * (cellptr + 1 - len(cells)))
+    elif opcode == _LEFT:
+      cellptr = cellptr - count if cellptr > count else 0
+    elif opcode == _OUT:
+      output_buffer.extend([cells[cellptr]] * count)
+    elif opcode == _IN:
+      if input_pos < num_inputs:
+        cells[cellptr] = inputs[input_pos]
+        input_pos += 1
+      else:
+        cells[cellptr] = 0
+
+    codeptr += 1
+    steps += count
+
+    timeout_check_countdown -= 1
+    if timeout is not None and (step_limit_reached or
+                                not timeout_check_countdown):
+      timeout_check_countdown = _TIMEOUT_CHECK_INTERVAL
+      if time.time() - start_time > timeout:
+        success = False
+        reason = Status.TIMEOUT
+        break
+    if step_limit_reached:
+      success = False
+      reason = Status.STEP_LIMIT
+      break
+
+  return EvalResult(
+      output=output_buffer,
+      success=success,
+      failure_reason=reason,
+      steps=steps,
+      time=time.time() - start_time,
+      memory=cells if output_memory else None,
+      program_trace=None)
+
+
+class _LRUCache(object):
+  """Dict with a maximum size which evicts the least recently used entries."""
+
+  def __init__(self, max_size):
+    self.max_size = max_size
+    self._entries = OrderedDict()
+
+  def __len__(self):
+    return len(self._entries)
+
+  def get(self, key):
+    value = self._entries.pop(key, None)
+    if value is not None:
+      # Reinserting marks the entry as most recently used.
+      self._entries[key] = value
+    return value
+
+  def put(self, key, value):
+    if self.max_size <= 0:
+      return
+    self._entries.pop(key, None)
+    self._entries[key] = value
+    while len(self._entries) > self.max_size:
+      self._entries.popitem(last=False)
+
+
+class Evaluator(object):
+  """Executes BF code with caches of compiled programs and of their results.
+
+  Programs repeat heavily during search, and so do their inputs, e.g. the test
+  cases of a task. Code is compiled once with `compile_program`, and the
+  results of executions which did not time out are cached per program, input
+  and execution options. Executions which timed out are not cached because
+  whether they time out depends on the machine load.
+
+  Results are the same as those of `evaluate`, except that the `time` of a
+  cached result is the time of the execution that produced it.
+  """
+
+  def __init__(self, max_programs=10000, max_results=100000):
+    """Constructor.
+
+    Args:
+      max_programs: Maximum number of compiled programs to cache.
+      max_results: Maximum number of execution results to cache.
+    """
+    self._programs = _LRUCache(max_programs)
+    self._results = _LRUCache(max_results)
+
+  def compile(self, code):
+    """Returns the CompiledProgram for `code`, compiling it if not cached."""
+    code = code if isinstance(code, str) else ''.join(code)
+    program = self._programs.get(code)
+    if program is None:
+      program = compile_program(code)
+      self._programs.put(code, program)
+    return program
+
+  def evaluate(self, code, input_buffer=None, init_memory=None, base=256,
+               timeout=1.0, max_steps=None, require_correct_syntax=True,
+               output_memory=False, debug=False):
+    """Execute BF code. Same arguments and return value as `evaluate`."""
+    if debug:
+      return evaluate(
+          code, input_buffer=input_buffer, init_memory=init_memory, base=base,
+          timeout=timeout, max_steps=max_steps,
+          require_correct_syntax=require_correct_syntax,
+          output_memory=output_memory, debug=True)
+
+    code = code if isinstance(code, str) else ''.join(code)
+    key = (code, tuple(input_buffer or ()), tuple(init_memory or ()), base,
+           timeout, max_steps, require_correct_syntax, output_memory)
+    result = self._results.get(key)
+    if result is None:
+      result = evaluate_compiled(
+          self.compile(code), input_buffer=input_buffer,
+          init_memory=init_memory, base=base, timeout=timeout,
+          max_steps=max_steps, require_correct_syntax=require_correct_syntax,
+          output_memory=output_memory)
+      if result.failure_reason != Status.TIMEOUT:
+        self._results.put(key, result)
+    # Callers own the returned lists.
+    return result._replace(
+        output=list(result.output),
+        memory=list(result.memory) if output_memory else None)
+
+  def evaluate_batch(self, code_input_pairs, **kwargs):
+    """Execute a batch of BF programs on their inputs.
+
+    Args:
+      code_input_pairs: Iterable of (code, input_buffer) tuples.
+      **kwargs: Other arguments of `evaluate`, shared by all executions.
+
+    Returns:
+      List of EvalResult namedtuples, one for each (code, input_buffer) pair.
+    """
+    return [self.evaluate(code, input_buffer=input_buffer, **kwargs)
+            for code, input_buffer in code_input_pairs]
@@ -132,6 +132,75 @@ class BfTest(tf.test.TestCase):
             next_input=0, output_buffer=[2, 1, 0])],
         er.program_trace)
 
+  def testCompileProgram(self):
+    program = bf.compile_program('+++[->>a<<]..,')
+    self.assertEqual(
+        ['+', '[', '-', '>', 'a', '<', ']', '.', ','],
+        [bf.CHARS[op] if op < len(bf.CHARS) else 'a'
+         for op in program.opcodes])
+    self.assertEqual([3, 1, 1, 2, 1, 2, 1, 2, 1], program.steps)
+    self.assertEqual(6, program.args[1])
+    self.assertEqual(1, program.args[6])
+    self.assertTrue(program.correct_syntax)
+    self.assertFalse(bf.compile_program('+]').correct_syntax)
+    self.assertFalse(bf.compile_program('[+').correct_syntax)
+
+  def testEvaluateCompiledMatchesEvaluate(self):
+    codes = ['+++.--.+.', '+.<.>++.', '+,.', '>,[>,]<[.<]',
+             '>,[>,]hello<world[.<]comments', '+++.]]]]>----.[[[[[>+.',
+             '+.[-].', '+++++[->+++<]>.<<<---.', '+>++>+++>++++.']
+    for code in codes:
+      for kwargs in [dict(base=256),
+                     dict(base=5, require_correct_syntax=False),
+                     dict(base=7, max_steps=10, require_correct_syntax=False),
+                     dict(base=256, init_memory=[3, 300], output_memory=True,
+                          require_correct_syntax=False)]:
+        kwargs.setdefault('max_steps', 1000)
+        expected = bf.evaluate(code, input_buffer=[4, 3, 2], timeout=None,
+                               **kwargs)
+        result = bf.evaluate_compiled(
+            bf.compile_program(code), input_buffer=[4, 3, 2], timeout=None,
+            **kwargs)
+        self.assertEqual(
+            (expected.output, expected.success, expected.failure_reason,
+             expected.steps, expected.memory),
+            (result.output, result.success, result.failure_reason,
+             result.steps, result.memory))
+
+  def testEvaluateCompiledMaxStepsWithinRun(self):
+    er = bf.evaluate_compiled(bf.compile_program('++++++.'), timeout=None,
+                              max_steps=4, output_memory=True)
+    self.assertEqual(
+        ([], False, bf.Status.STEP_LIMIT, 4, [4]),
+        (er.output, er.success, er.failure_reason, er.steps, er.memory))
+
+  def testEvaluateCompiledTimeout(self):
+    er = bf.evaluate_compiled(bf.compile_program('+.[].'), base=5,
+                              timeout=0.1)
+    self.assertEqual(
+        ([1], False, bf.Status.TIMEOUT),
+        (er.output, er.success, er.failure_reason))
+
+  def testEvaluator(self):
+    evaluator = bf.Evaluator(max_programs=2, max_results=2)
+    er = evaluator.evaluate('>,[>,]<[.<]', input_buffer=[4, 3, 2])
+    self.assertCorrectOutput([2, 3, 4], er)
+
+    # Cached results are copied, so that callers can modify them.
+    er.output.append(1)
+    self.assertCorrectOutput(
+        [2, 3, 4], evaluator.evaluate('>,[>,]<[.<]', input_buffer=[4, 3, 2]))
+    self.assertCorrectOutput(
+        [3, 4], evaluator.evaluate(list('>,[>,]<[.<]'), input_buffer=[4, 3]))
+    self.assertEqual(
+        bf.Status.SYNTAX_ERROR, evaluator.evaluate('[').failure_reason)
+
+    ers = evaluator.evaluate_batch(
+        [('+.[].', []), ('+.[-].', [])], base=5, timeout=0.1)
+    self.assertEqual(
+        [([1], False, bf.Status.TIMEOUT), ([1, 0], True, bf.Status.SUCCESS)],
+        [(er.output, er.success, er.failure_reason) for er in ers])
+
 
 if __name__ == '__main__':
   tf.test.main()
@@ -7,6 +7,8 @@ from __future__ import print_function
 import abc
 import copy
 import itertools
+import math
+import multiprocessing
 import random
 
 from absl import logging
@@ -25,7 +27,7 @@ MAX_EXECUTION_STEPS = 5000
 def make_task(task_name, override_kwargs=None, max_code_length=100,
               require_correct_syntax=False,
               do_code_simplification=False,
-              correct_bonus=2.0, code_length_bonus=1.0):
+              correct_bonus=2.0, code_length_bonus=1.0, num_reward_workers=0):
   """Make tasks with setting from paper."""
   logging.info('Making paper-config task.')
   n = 16  # Number of test cases.
@@ -108,7 +110,8 @@ def make_task(task_name, override_kwargs=None, max_code_length=100,
       task=task, correct_bonus=correct_bonus,
       code_length_bonus=code_length_bonus,
       max_code_length=max_code_length, min_code_length=min_code_length,
-      reward_fn=reward_fn, require_correct_syntax=require_correct_syntax)
+      reward_fn=reward_fn, require_correct_syntax=require_correct_syntax,
+      num_workers=num_reward_workers)
 
 
 def concat(lists):
@@ -134,13 +137,35 @@ def clipped_linear(x, x0, y0, slope, y_range):
   return min(max(slope * (x - x0) + y0, min_y), max_y)
 
 
+# Task manager of a reward worker process.
+_worker_task_manager = None
+
+
+def _init_reward_worker(task_manager):
+  global _worker_task_manager
+  _worker_task_manager = task_manager
+  # Forked workers inherit the random state of the parent, which would make
+  # the test cases of stochastic tasks identical across workers.
+  random.seed()
+  np.random.seed()
+
+
+def _score_code_chunk(code_strings):
+  return [_worker_task_manager._score_code(code) for code in code_strings]
+
+
 class MultiIOTaskManager(object):
-  """Supports tasks which test the code with multiple I/O examples."""
+  """Supports tasks which test the code with multiple I/O examples.
+
+  If num_workers is positive, batches of programs are scored in a pool of
+  num_workers processes, which is started on first use and kept until `close`
+  is called.
+  """
 
   def __init__(self, task, max_code_length=32, min_code_length=0,
                max_execution_steps=MAX_EXECUTION_STEPS, correct_bonus=1.0,
                code_length_bonus=1.0, failure_reward=-2.0, reward_fn=None,
-               require_correct_syntax=False):
+               require_correct_syntax=False, num_workers=0):
     assert isinstance(task, BaseTask)
     self.task = task
     self.max_code_length = max_code_length
@@ -162,8 +187,26 @@ class MultiIOTaskManager(object):
     self.output_type = (
         task.output_type if hasattr(task, 'output_type')
         else misc.IOType.integer)
+    # Sampled programs repeat heavily, so programs and their results on the
+    # test cases are cached.
+    self._evaluator = bf.Evaluator()
+    self.num_workers = num_workers
+    self._pool = None
     self._compute_best_reward()
 
+  def __getstate__(self):
+    # The worker pool stays with the process which started it.
+    state = self.__dict__.copy()
+    state['_pool'] = None
+    return state
+
+  def close(self):
+    """Stops the reward workers, if any."""
+    if self._pool is not None:
+      self._pool.terminate()
+      self._pool.join()
+      self._pool = None
+
   def _compute_best_reward(self):
     io_seqs = self.task.make_io_set()
     reward = 0.0
@@ -176,7 +219,28 @@ class MultiIOTaskManager(object):
     logging.info('Known best reward: %.4f', self.best_reward)
 
   def _score_batch(self, code_strings):
-    return [self._score_code(code) for code in code_strings]
+    """Scores a batch of code strings, in the worker pool if there is one.
+
+    Args:
+      code_strings: A list of BF code strings.
+
+    Returns:
+      A list of misc.RewardInfo namedtuples, in the order of code_strings.
+    """
+    if self.num_workers <= 0 or len(code_strings) <= 1:
+      return [self._score_code(code) for code in code_strings]
+
+    if self._pool is None:
+      self._pool = multiprocessing.Pool(
+          self.num_workers, initializer=_init_reward_worker,
+          initargs=(self,))
+    # A few chunks per worker balance the load without sending every program
+    # separately.
+    chunk_size = int(
+        math.ceil(len(code_strings) / float(4 * self.num_workers)))
+    chunks = [code_strings[i:i + chunk_size]
+              for i in xrange(0, len(code_strings), chunk_size)]
+    return concat(self._pool.map(_score_code_chunk, chunks))
 
   def _score_code(self, code):
     """Run test cases on code and compute reward.
@@ -196,7 +260,7 @@ class MultiIOTaskManager(object):
     results = []
     reason = 'correct'
     for input_seq, output_seq in io_seqs:
-      eval_result = bf.evaluate(
+      eval_result = self._evaluator.evaluate(
           code, input_buffer=input_seq, timeout=0.1,
           max_steps=self.max_execution_steps,
           base=self.task.base,
@@ -241,7 +305,13 @@ class MultiIOTaskManager(object):
         reason=reason)
 
   def rl_batch(self, batch_size):
-    """Produces list of reward functions. One for each program in the batch."""
+    """Produces list of reward functions. One for each program in the batch.
+
+    With reward workers, a single function which scores the whole batch is
+    returned instead.
+    """
+    if self.num_workers > 0:
+      return self._score_batch
     return [self._score_code] * batch_size
 
 
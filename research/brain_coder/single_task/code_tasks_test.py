@@ -73,6 +73,19 @@ class CodeTasksTest(tf.test.TestCase):
         r(pad(',[>,]+[,<.]', maxlen, padchr)).episode_rewards[-1],
         0.75)
 
+  def testParallelScoring(self):
+    code_strings = ['>,>,>,.<.<.<.', ',[>,]+[,<.]', '+[]', ',.', ',[.,]'] * 3
+    task = code_tasks.make_task('reverse', max_code_length=100)
+    parallel_task = code_tasks.make_task(
+        'reverse', max_code_length=100, num_reward_workers=2)
+    try:
+      batch_reward_fn = parallel_task.rl_batch(len(code_strings))
+      self.assertEqual(
+          [task._score_code(code) for code in code_strings],
+          batch_reward_fn(code_strings))
+    finally:
+      parallel_task.close()
+
   def testMakeTask(self):
     maxlen = 100
     padchr = '['
@@ -67,7 +67,8 @@ class DataManager(object):
         require_correct_syntax=env_config.correct_syntax,
         do_code_simplification=do_code_simplification,
         correct_bonus=env_config.task_manager_config.correct_bonus,
-        code_length_bonus=env_config.task_manager_config.code_length_bonus)
+        code_length_bonus=env_config.task_manager_config.code_length_bonus,
+        num_reward_workers=env_config.num_reward_workers)
 
   def sample_rl_batch(self):
     """Create reward functions from the current task.
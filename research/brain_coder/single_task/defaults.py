@@ -67,6 +67,9 @@ def default_config():
               correct_bonus=2.0,  # Bonus for code getting correct answer.
               code_length_bonus=1.0),  # Maximum bonus for short code.
           correct_syntax=False,
+          # Number of processes which score programs. If 0, programs are
+          # scored one at a time in the training process.
+          num_reward_workers=0,
       ),
       batch_size=64,
       timestep_limit=32)
@@ -10,6 +10,7 @@ GA function code borrowed from https://github.com/DEAP/deap.
 
 from collections import namedtuple
 import random
+import time
 
 from absl import flags
 from absl import logging
@@ -83,17 +84,8 @@ def io_repr(result):
   return inputs, target_outputs, code_outputs
 
 
-def make_task_eval_fn(task_manager):
-  """Returns a wrapper that converts an RL task into a GA task.
-
-  Args:
-    task_manager: Is a task manager object from code_tasks.py
-
-  Returns:
-    A function that takes as input a single list of a code chars, and outputs
-    a Result namedtuple instance containing the reward and information about
-    code execution.
-  """
+def _make_result_fn(task_manager):
+  """Returns a function that converts a misc.RewardInfo into a Result."""
   def to_data_list(single_or_tuple):
     if isinstance(single_or_tuple, misc.IOTuple):
       return list(single_or_tuple)
@@ -104,9 +96,7 @@ def make_task_eval_fn(task_manager):
       return IOType.string
     return IOType.integer
 
-  # Wrapper function.
-  def evalbf(bf_chars):
-    result = task_manager._score_code(''.join(bf_chars))
+  def to_result(result):
     reward = sum(result.episode_rewards)
     correct = result.reason == 'correct'
     return Result(
@@ -119,9 +109,51 @@ def make_task_eval_fn(task_manager):
         correct=correct,
         base=task_manager.task.base)
 
+  return to_result
+
+
+def make_task_eval_fn(task_manager):
+  """Returns a wrapper that converts an RL task into a GA task.
+
+  Args:
+    task_manager: Is a task manager object from code_tasks.py
+
+  Returns:
+    A function that takes as input a single list of a code chars, and outputs
+    a Result namedtuple instance containing the reward and information about
+    code execution.
+  """
+  to_result = _make_result_fn(task_manager)
+
+  # Wrapper function.
+  def evalbf(bf_chars):
+    return to_result(task_manager._score_code(''.join(bf_chars)))
+
   return evalbf
 
 
+def make_task_batch_eval_fn(task_manager):
+  """Returns a wrapper that scores a batch of GA individuals with an RL task.
+
+  The batch is scored with the task manager's `_score_batch`, which can use a
+  pool of worker processes.
+
+  Args:
+    task_manager: Is a task manager object from code_tasks.py
+
+  Returns:
+    A function that takes as input a list of lists of code chars, and outputs
+    a list of Result namedtuple instances in the same order.
+  """
+  to_result = _make_result_fn(task_manager)
+
+  def evalbf_batch(bf_chars_list):
+    return [to_result(result) for result in task_manager._score_batch(
+        [''.join(bf_chars) for bf_chars in bf_chars_list])]
+
+  return evalbf_batch
+
+
 def debug_str(individual, task_eval_fn):
   res = task_eval_fn(individual)
   input_str, target_output_str, code_output_str = io_repr(res)
@@ -258,7 +290,7 @@ def mutate_and_crossover(population, mutation_rate, crossover_rate):
 
 
 def ga_loop(population, cxpb, mutpb, ngen, task_eval_fn, halloffame=None,
-            checkpoint_writer=None):
+            checkpoint_writer=None, task_batch_eval_fn=None):
   """A bare bones genetic algorithm.
 
   Similar to chapter 7 of Back, Fogel and Michalewicz, "Evolutionary
@@ -277,12 +309,29 @@ def ga_loop(population, cxpb, mutpb, ngen, task_eval_fn, halloffame=None,
         Needs to have `write`, `load`, and `has_checkpoint` methods. Used to
         periodically save progress. In event of a restart, the population will
         be loaded from disk.
+    task_batch_eval_fn: (optional) a python function which maps a list of
+        Individuals to a list of Result namedtuples. If given, the new
+        individuals of each generation are evaluated with it in one batch.
 
   Returns:
     GaResult namedtuple instance. This contains information about the GA run,
     including the resulting population, best reward (fitness) obtained, and
     the best code string found.
   """
+  start_time = time.time()
+  reward_secs = [0.0]  # Time spent evaluating individuals.
+
+  def evaluate(individuals):
+    """Sets the fitness of the individuals and returns their rewards."""
+    start_time = time.time()
+    if task_batch_eval_fn is None:
+      results = [task_eval_fn(ind) for ind in individuals]
+    else:
+      results = task_batch_eval_fn(individuals) if individuals else []
+    for ind, res in zip(individuals, results):
+      ind.fitness.values = res.reward,
+    reward_secs[0] += time.time() - start_time
+    return [res.reward for res in results]
 
   has_checkpoint = False
   if checkpoint_writer and checkpoint_writer.has_checkpoint():
@@ -296,17 +345,12 @@ def ga_loop(population, cxpb, mutpb, ngen, task_eval_fn, halloffame=None,
           'Loaded population from checkpoint. Starting at generation %d', gen)
 
       # Evaluate the individuals with an invalid fitness
-      invalid_ind = [ind for ind in population if not ind.fitness.valid]
-      for ind in invalid_ind:
-        ind.fitness.values = task_eval_fn(ind).reward,
-      for _, ind in halloffame.iter_in_order():
-        ind.fitness.values = task_eval_fn(ind).reward,
+      evaluate([ind for ind in population if not ind.fitness.valid])
+      evaluate([ind for _, ind in halloffame.iter_in_order()])
 
   if not has_checkpoint:
     # Evaluate the individuals with an invalid fitness
-    invalid_ind = [ind for ind in population if not ind.fitness.valid]
-    for ind in invalid_ind:
-      ind.fitness.values = task_eval_fn(ind).reward,
+    evaluate([ind for ind in population if not ind.fitness.valid])
 
     if halloffame is not None:
       for ind in population:
@@ -331,15 +375,22 @@ def ga_loop(population, cxpb, mutpb, ngen, task_eval_fn, halloffame=None,
 
     # Evaluate the individuals with an invalid fitness
     invalid_ind = [ind for ind in offspring if not ind.fitness.valid]
-    for ind in invalid_ind:
-      str_repr = ''.join(ind)
-      if program_reward_cache is not None and str_repr in program_reward_cache:
-        ind.fitness.values = (program_reward_cache[str_repr],)
-      else:
-        eval_result = task_eval_fn(ind)
-        ind.fitness.values = (eval_result.reward,)
-        if program_reward_cache is not None:
-          program_reward_cache[str_repr] = eval_result.reward
+    if program_reward_cache is None:
+      evaluate(invalid_ind)
+    else:
+      uncached_ind = {}
+      for ind in invalid_ind:
+        str_repr = ''.join(ind)
+        if str_repr in program_reward_cache:
+          ind.fitness.values = (program_reward_cache[str_repr],)
+        else:
+          uncached_ind.setdefault(str_repr, []).append(ind)
+      str_reprs = list(uncached_ind)
+      rewards = evaluate([uncached_ind[k][0] for k in str_reprs])
+      for str_repr, reward in zip(str_reprs, rewards):
+        program_reward_cache[str_repr] = reward
+        for ind in uncached_ind[str_repr][1:]:
+          ind.fitness.values = (reward,)
 
     # Replace the current population by the offspring
     population = list(offspring)
@@ -356,6 +407,8 @@ def ga_loop(population, cxpb, mutpb, ngen, task_eval_fn, halloffame=None,
       top_code = '\n'.join([debug_str(ind, task_eval_fn)
                             for ind in topk(population, k=4)])
       logging.info('gen: %d\nNPE: %d\n%s\n\n', gen, gen * pop_size, top_code)
+      logging.info('Spent %.1f of %.1f seconds evaluating individuals.',
+                   reward_secs[0], time.time() - start_time)
 
       best_code = ''.join(halloffame.get_max()[1])
       res = task_eval_fn(best_code)
@@ -190,6 +190,9 @@ def run_training(config=None, tuner=None, logdir=None, trial_name=None,  # pylin
 
     data_manager = data.DataManager(config, run_number=global_rep)
     task_eval_fn = ga_lib.make_task_eval_fn(data_manager.rl_task)
+    task_batch_eval_fn = (
+        ga_lib.make_task_batch_eval_fn(data_manager.rl_task)
+        if config.env.num_reward_workers > 0 else None)
 
     if config.agent.algorithm == 'rand':
       logging.info('Running random search.')
@@ -208,7 +211,9 @@ def run_training(config=None, tuner=None, logdir=None, trial_name=None,  # pylin
           cxpb=config.agent.crossover_rate, mutpb=config.agent.mutation_rate,
           task_eval_fn=task_eval_fn,
           ngen=max_generations, halloffame=hof,
-          checkpoint_writer=checkpoint_writer)
+          checkpoint_writer=checkpoint_writer,
+          task_batch_eval_fn=task_batch_eval_fn)
+    data_manager.rl_task.close()
 
     logging.info('Finished rep. Num gens: %d', result.generations)
 
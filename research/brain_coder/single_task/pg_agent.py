@@ -670,6 +670,29 @@ class LMAgent(object):
             simple_value=np.min(tr))])
     return reward_summary
 
+  def _timing_summary(self, model_secs, reward_secs):
+    """Create summaries that report where the time of an update step went.
+
+    Args:
+      model_secs: Time in seconds spent running the model, i.e. sampling
+          programs and training on them.
+      reward_secs: Time in seconds spent computing the rewards of the sampled
+          programs.
+
+    Returns:
+      tf.Summary op.
+    """
+    return tf.Summary(value=[
+        tf.Summary.Value(
+            tag='timing/model_secs',
+            simple_value=model_secs),
+        tf.Summary.Value(
+            tag='timing/reward_secs',
+            simple_value=reward_secs),
+        tf.Summary.Value(
+            tag='timing/reward_fraction',
+            simple_value=reward_secs / max(model_secs + reward_secs, 1e-9))])
+
   def _iw_summary(self, session, replay_iw, replay_log_probs,
                   norm_replay_weights, on_policy_iw,
                   on_policy_log_probs):
@@ -762,11 +785,13 @@ class LMAgent(object):
 
       # Sample new programs from the policy.
       num_programs_from_policy = rl_batch.batch_size
+      start_time = time.time()
       (batch_actions,
        batch_values,
        episode_lengths) = session.run(
            [self.sampled_batch.tokens, self.sampled_batch.value,
             self.sampled_batch.episode_lengths])
+      model_secs = time.time() - start_time
       if episode_lengths.size == 0:
         # This should not happen.
         logging.warn(
@@ -777,8 +802,10 @@ class LMAgent(object):
             batch_actions.shape, batch_values.shape, episode_lengths.shape)
 
       # Compute rewards.
+      start_time = time.time()
       code_scores = compute_rewards(
           rl_batch, batch_actions, episode_lengths)
+      reward_secs = time.time() - start_time
       code_strings = code_scores.code_strings
       batch_tot_r = code_scores.total_rewards
       test_cases = code_scores.test_cases
@@ -814,6 +841,7 @@ class LMAgent(object):
           'summaries': self.rl_summary_op,
           'train_op': train_op,
           'gradients': self.gradients_dict if return_gradients else self.no_op}
+      start_time = time.time()
       fetched = session.run(
           fetches,
           {self.actions: batch_actions,
@@ -823,6 +851,7 @@ class LMAgent(object):
            self.off_policy_targets: off_policy_targets,
            self.off_policy_target_lengths: off_policy_target_lengths,
            self.offp_switch: offp_switch})
+      model_secs += time.time() - start_time
 
       combined_adjusted_lengths = adjusted_lengths
       combined_returns = batch_returns
@@ -834,9 +863,11 @@ class LMAgent(object):
       # Note: batch size is constant. A full batch will be sampled, but not all
       # programs will be executed and added to the replay buffer. Those which
       # are not executed will be discarded and not counted.
+      start_time = time.time()
       batch_actions, batch_values, episode_lengths, log_probs = session.run(
           [self.sampled_batch.tokens, self.sampled_batch.value,
            self.sampled_batch.episode_lengths, self.sampled_batch.log_probs])
+      model_secs = time.time() - start_time
       if episode_lengths.size == 0:
         # This should not happen.
         logging.warn(
@@ -867,10 +898,12 @@ class LMAgent(object):
                                                dtype=np.int32)
 
         # compute log probs for replay samples under current policy
+        start_time = time.time()
         all_replay_log_probs, = session.run(
             [self.given_batch.log_probs],
             {self.actions: replay_batch_actions,
              self.adjusted_lengths: replay_adjusted_lengths})
+        model_secs += time.time() - start_time
         replay_log_probs = [
             np.choose(replay_actions[i], all_replay_log_probs[i, :l].T).sum()
             for i, l in enumerate(replay_adjusted_lengths)]
@@ -887,9 +920,11 @@ class LMAgent(object):
       assert not self.a2c  # TODO(danabo): Support A2C with importance sampling.
 
       # Compute rewards.
+      start_time = time.time()
       code_scores = compute_rewards(
           rl_batch, batch_actions, episode_lengths,
           batch_size=num_programs_from_policy)
+      reward_secs = time.time() - start_time
       code_strings = code_scores.code_strings
       batch_tot_r = code_scores.total_rewards
       test_cases = code_scores.test_cases
@@ -1029,6 +1064,7 @@ class LMAgent(object):
           'summaries': self.rl_summary_op,
           'train_op': train_op,
           'gradients': self.gradients_dict if return_gradients else self.no_op}
+      start_time = time.time()
       fetched = session.run(
           fetches,
           {self.actions: combined_actions,
@@ -1038,6 +1074,7 @@ class LMAgent(object):
            self.off_policy_targets: off_policy_targets,
            self.off_policy_target_lengths: off_policy_target_lengths,
            self.offp_switch: offp_switch})
+      model_secs += time.time() - start_time
 
       # Add to experience replay buffer.
       self.experience_replay.add_many(
@@ -1064,7 +1101,8 @@ class LMAgent(object):
     global_step = fetched['global_step']
     global_npe = fetched['program_count']
     core_summaries = fetched['summaries']
-    summaries_list = [core_summaries]
+    summaries_list = [core_summaries,
+                      self._timing_summary(model_secs, reward_secs)]
 
     if num_programs_from_policy:
       s_i = 0
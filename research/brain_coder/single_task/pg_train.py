@@ -658,6 +658,9 @@ def train(config, is_chief, tuner=None, run_dir=None, run_number=0,
       supervisor_deadline_exceeded = True
       should_retry = False
 
+  # Stop the reward workers, if any.
+  trainer.data_manager.rl_task.close()
+
   if is_chief:
     logging.info('This is chief worker. Stopping all workers.')
     sv.stop()
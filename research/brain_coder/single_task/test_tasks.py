@@ -32,6 +32,9 @@ class BasicTaskManager(object):
     reward_fns = [self._score_string] * batch_size
     return reward_fns
 
+  def close(self):
+    pass
+
 
 class Trie(object):
   """Trie for sequences."""
@@ -24,6 +24,9 @@ from delf.protos import delf_config_pb2
 from delf.protos import feature_pb2
 from delf.python import datum_io
 from delf.python import delf_v1
+from delf.python import extraction_pipeline
 from delf.python import feature_extractor
 from delf.python import feature_io
+from delf.python import packed_feature_io
+from delf.python import retrieval_index
 # pylint: enable=unused-import
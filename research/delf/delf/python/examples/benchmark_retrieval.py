@@ -0,0 +1,228 @@
+# Copyright 2017 The TensorFlow Authors All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Benchmarks query latency and recall of the retrieval index on synthetic data.
+
+Each synthetic scene is a set of keypoints with random locations and
+descriptors. An image of a scene shows a random subset of its keypoints under a
+random affine transformation, with noisy descriptors and additional clutter
+features. The database holds several images of each scene plus distractor
+images of clutter only, and each query is a new image of a scene whose database
+images are the relevant ones.
+
+The program reports the recall at several ranks of the visual word shortlist
+and of the geometrically re-ranked results, as well as the query latencies.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import numpy as np
+import sys
+import tensorflow as tf
+from tensorflow.python.platform import app
+import time
+
+from delf import retrieval_index
+
+cmd_args = None
+
+# Side of the square in which keypoints are located.
+_IMAGE_SIZE = 500.0
+
+# Ranks at which recall is reported.
+_RECALL_RANKS = (1, 5, 10)
+
+
+def _RandomDescriptors(rng, num_descriptors):
+  """Returns random L2-normalized descriptors, as output by DELF."""
+  descriptors = rng.randn(num_descriptors, cmd_args.depth)
+  return descriptors / np.linalg.norm(descriptors, axis=1, keepdims=True)
+
+
+def _RandomImage(rng, scene_locations, scene_descriptors):
+  """Returns the locations and descriptors of a random image of a scene."""
+  visible = rng.rand(len(scene_locations)) < cmd_args.visible_fraction
+  angle = rng.uniform(-np.pi / 8, np.pi / 8)
+  scale = rng.uniform(0.8, 1.2)
+  rotation = scale * np.array([[np.cos(angle), -np.sin(angle)],
+                               [np.sin(angle), np.cos(angle)]])
+  translation = rng.uniform(-50, 50, size=2)
+  locations = np.dot(scene_locations[visible], rotation.T) + translation
+  descriptors = scene_descriptors[visible] + (
+      cmd_args.descriptor_noise * rng.randn(np.sum(visible), cmd_args.depth))
+  descriptors /= np.linalg.norm(descriptors, axis=1, keepdims=True)
+
+  num_clutter = int(cmd_args.clutter_fraction * cmd_args.num_features)
+  locations = np.concatenate(
+      [locations, rng.uniform(0, _IMAGE_SIZE, size=[num_clutter, 2])])
+  descriptors = np.concatenate(
+      [descriptors, _RandomDescriptors(rng, num_clutter)])
+  return locations.astype(np.float32), descriptors.astype(np.float32)
+
+
+def _Recall(image_indices, relevant):
+  """Returns the fraction of relevant images at each rank of _RECALL_RANKS."""
+  return [
+      len(relevant.intersection(image_indices[:rank])) / len(relevant)
+      for rank in _RECALL_RANKS
+  ]
+
+
+def main(unused_argv):
+  tf.logging.set_verbosity(tf.logging.INFO)
+  rng = np.random.RandomState(cmd_args.seed)
+
+  tf.logging.info('Generating %d scenes...', cmd_args.num_scenes)
+  scenes = [(rng.uniform(0, _IMAGE_SIZE, size=[cmd_args.num_features, 2]),
+             _RandomDescriptors(rng, cmd_args.num_features))
+            for _ in range(cmd_args.num_scenes)]
+  database = []
+  image_scenes = []
+  for scene_index, scene in enumerate(scenes):
+    for _ in range(cmd_args.images_per_scene):
+      database.append(_RandomImage(rng, *scene))
+      image_scenes.append(scene_index)
+  for _ in range(cmd_args.num_distractors):
+    database.append((rng.uniform(
+        0, _IMAGE_SIZE, size=[cmd_args.num_features, 2]).astype(np.float32),
+                     _RandomDescriptors(rng, cmd_args.num_features)))
+    image_scenes.append(-1)
+  image_scenes = np.array(image_scenes)
+
+  tf.logging.info('Training codebook on %d descriptors...',
+                  cmd_args.codebook_sample_size)
+  all_descriptors = np.concatenate([descriptors for _, descriptors in database])
+  start = time.time()
+  codebook = retrieval_index.TrainCodebook(
+      all_descriptors[rng.choice(
+          len(all_descriptors),
+          min(cmd_args.codebook_sample_size, len(all_descriptors)),
+          replace=False)],
+      cmd_args.num_words,
+      num_iterations=cmd_args.num_iterations,
+      seed=cmd_args.seed)
+  tf.logging.info('Codebook trained in %f seconds', time.time() - start)
+
+  start = time.time()
+  builder = retrieval_index.RetrievalIndexBuilder(codebook)
+  for i, (locations, descriptors) in enumerate(database):
+    builder.AddImage(str(i), locations, descriptors)
+  index = builder.Build()
+  tf.logging.info('Indexed %d images with %d features in %f seconds',
+                  index.num_images, len(all_descriptors), time.time() - start)
+
+  shortlist_recalls = []
+  reranked_recalls = []
+  shortlist_latencies = []
+  query_latencies = []
+  for _ in range(cmd_args.num_queries):
+    scene_index = rng.randint(cmd_args.num_scenes)
+    locations, descriptors = _RandomImage(rng, *scenes[scene_index])
+    relevant = set(np.flatnonzero(image_scenes == scene_index))
+
+    start = time.time()
+    image_indices, _ = index.Shortlist(descriptors, cmd_args.shortlist_size)
+    shortlist_latencies.append(time.time() - start)
+    shortlist_recalls.append(_Recall(image_indices, relevant))
+
+    start = time.time()
+    image_indices, _, _ = index.Query(
+        locations,
+        descriptors,
+        shortlist_size=cmd_args.shortlist_size,
+        num_to_rerank=cmd_args.num_to_rerank)
+    query_latencies.append(time.time() - start)
+    reranked_recalls.append(_Recall(image_indices, relevant))
+
+  for name, recalls in [('shortlist', shortlist_recalls),
+                        ('reranked', reranked_recalls)]:
+    print('%s recall: %s' % (name, ', '.join(
+        '@%d=%.3f' % (rank, recall)
+        for rank, recall in zip(_RECALL_RANKS, np.mean(recalls, axis=0)))))
+  for name, latencies in [('shortlist', shortlist_latencies),
+                          ('query', query_latencies)]:
+    print('%s latency: mean=%.2fms, p50=%.2fms, p99=%.2fms' %
+          (name, 1000 * np.mean(latencies), 1000 * np.percentile(latencies, 50),
+           1000 * np.percentile(latencies, 99)))
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.register('type', 'bool', lambda v: v.lower() == 'true')
+  parser.add_argument(
+      '--num_scenes', type=int, default=200, help="""
+      Number of synthetic scenes.
+      """)
+  parser.add_argument(
+      '--images_per_scene', type=int, default=5, help="""
+      Number of database images of each scene.
+      """)
+  parser.add_argument(
+      '--num_distractors', type=int, default=2000, help="""
+      Number of database images of clutter only.
+      """)
+  parser.add_argument(
+      '--num_features', type=int, default=300, help="""
+      Number of keypoints of each scene.
+      """)
+  parser.add_argument(
+      '--depth', type=int, default=40, help="""
+      Dimensionality of the descriptors.
+      """)
+  parser.add_argument(
+      '--visible_fraction', type=float, default=0.5, help="""
+      Probability that a keypoint of a scene is visible in an image.
+      """)
+  parser.add_argument(
+      '--clutter_fraction', type=float, default=0.5, help="""
+      Number of clutter features of an image, relative to num_features.
+      """)
+  parser.add_argument(
+      '--descriptor_noise', type=float, default=0.05, help="""
+      Standard deviation of the noise added to descriptors.
+      """)
+  parser.add_argument(
+      '--num_words', type=int, default=4096, help="""
+      Number of visual words of the codebook.
+      """)
+  parser.add_argument(
+      '--codebook_sample_size', type=int, default=100000, help="""
+      Number of descriptors the codebook is trained on.
+      """)
+  parser.add_argument(
+      '--num_iterations', type=int, default=10, help="""
+      Number of k-means iterations to train the codebook.
+      """)
+  parser.add_argument(
+      '--num_queries', type=int, default=100, help="""
+      Number of queries.
+      """)
+  parser.add_argument(
+      '--shortlist_size', type=int, default=100, help="""
+      Number of images shortlisted by visual word similarity.
+      """)
+  parser.add_argument(
+      '--num_to_rerank', type=int, default=20, help="""
+      Number of shortlisted images re-ranked by geometric verification.
+      """)
+  parser.add_argument(
+      '--seed', type=int, default=0, help="""
+      Seed of the synthetic data.
+      """)
+  cmd_args, unparsed = parser.parse_known_args()
+  app.run(main=main, argv=[sys.argv[0]] + unparsed)
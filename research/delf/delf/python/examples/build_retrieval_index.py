@@ -0,0 +1,182 @@
+# Copyright 2017 The TensorFlow Authors All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Builds a retrieval index over DELF features of database images.
+
+The program reads all DELF feature files of a directory, as written by
+extract_features.py, or all images of a packed container written by
+convert_features_to_packed.py. It trains a codebook of visual words on a random
+sample of their descriptors, and saves an inverted file of the database images to the
+output directory. The index can then be queried with query_retrieval_index.py.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import numpy as np
+import os
+import sys
+import tensorflow as tf
+from tensorflow.python.platform import app
+
+from delf import feature_io
+from delf import packed_feature_io
+from delf import retrieval_index
+
+cmd_args = None
+
+# Extension of feature files.
+_DELF_EXT = '.delf'
+
+# Pace to report indexing log.
+_STATUS_CHECK_ITERATIONS = 1000
+
+
+def _ListImages():
+  """Lists the database images.
+
+  Returns:
+    image_names: List of the names of the database images.
+    read_fn: Function returning the DELF features of an image given its name,
+      as returned by feature_io.ReadFromFile.
+  """
+  if cmd_args.packed_features_dir:
+    reader = packed_feature_io.PackedFeatureReader(
+        cmd_args.packed_features_dir)
+    return reader.image_names, reader.Read
+
+  features_paths = {
+      os.path.splitext(filename)[0]:
+      os.path.join(cmd_args.features_dir, filename)
+      for filename in tf.gfile.ListDirectory(cmd_args.features_dir)
+      if filename.endswith(_DELF_EXT)
+  }
+  def _ReadFromFile(image_name):
+    return feature_io.ReadFromFile(features_paths[image_name])
+
+  return sorted(features_paths), _ReadFromFile
+
+
+def _SampleDescriptors(image_names, read_fn, sample_size, seed):
+  """Samples descriptors from images visited in random order.
+
+  Args:
+    image_names: List of the names of the database images.
+    read_fn: Function returning the DELF features of an image given its name.
+    sample_size: Number of descriptors to sample.
+    seed: Seed of the sampling.
+
+  Returns:
+    descriptors: [M, depth] float array with at most sample_size descriptors.
+  """
+  rng = np.random.RandomState(seed)
+  samples = []
+  num_sampled = 0
+  for i in rng.permutation(len(image_names)):
+    if num_sampled >= sample_size:
+      break
+    _, _, descriptors, _, _ = read_fn(image_names[i])
+    if not len(descriptors):
+      continue
+    samples.append(descriptors[:sample_size - num_sampled])
+    num_sampled += len(samples[-1])
+  return np.concatenate(samples).astype(np.float32)
+
+
+def main(unused_argv):
+  tf.logging.set_verbosity(tf.logging.INFO)
+
+  image_names, read_fn = _ListImages()
+  num_images = len(image_names)
+  tf.logging.info('Found %d images', num_images)
+
+  tf.logging.info('Training codebook of %d visual words...',
+                  cmd_args.num_words)
+  codebook = retrieval_index.TrainCodebook(
+      _SampleDescriptors(image_names, read_fn, cmd_args.codebook_sample_size,
+                         cmd_args.seed),
+      cmd_args.num_words,
+      num_iterations=cmd_args.num_iterations,
+      seed=cmd_args.seed)
+
+  builder = retrieval_index.RetrievalIndexBuilder(codebook)
+  for i, image_name in enumerate(image_names):
+    if i % _STATUS_CHECK_ITERATIONS == 0:
+      tf.logging.info('Indexing image %d out of %d', i, num_images)
+    locations, _, descriptors, _, _ = read_fn(image_name)
+    builder.AddImage(image_name, locations, descriptors)
+
+  tf.logging.info('Building inverted file...')
+  builder.Build().Save(cmd_args.output_dir)
+  tf.logging.info('Index saved to %s', cmd_args.output_dir)
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.register('type', 'bool', lambda v: v.lower() == 'true')
+  parser.add_argument(
+      '--features_dir',
+      type=str,
+      default='test_features',
+      help="""
+      Directory holding the DELF features of the database images.
+      """)
+  parser.add_argument(
+      '--packed_features_dir',
+      type=str,
+      default='',
+      help="""
+      Directory of a packed container holding the DELF features of the
+      database images. If set, --features_dir is ignored.
+      """)
+  parser.add_argument(
+      '--output_dir',
+      type=str,
+      default='test_index',
+      help="""
+      Directory where the index will be written to.
+      """)
+  parser.add_argument(
+      '--num_words',
+      type=int,
+      default=65536,
+      help="""
+      Number of visual words of the codebook.
+      """)
+  parser.add_argument(
+      '--codebook_sample_size',
+      type=int,
+      default=1000000,
+      help="""
+      Number of descriptors the codebook is trained on.
+      """)
+  parser.add_argument(
+      '--num_iterations',
+      type=int,
+      default=20,
+      help="""
+      Number of k-means iterations to train the codebook.
+      """)
+  parser.add_argument(
+      '--seed',
+      type=int,
+      default=0,
+      help="""
+      Seed of the descriptor sampling and of the codebook initialization.
+      """)
+  cmd_args, unparsed = parser.parse_known_args()
+  app.run(main=main, argv=[sys.argv[0]] + unparsed)
@@ -0,0 +1,133 @@
+# Copyright 2017 The TensorFlow Authors All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Converts a directory of DELF feature files into a packed container.
+
+The feature files, as written by extract_features.py, are assigned to the
+shards of the container by a hash of their image name, and the shards are
+converted in parallel. Images already stored in any shard of the container are
+skipped, so that an interrupted conversion can be resumed by running the
+program again, even with new feature files or another number of shards.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tensorflow as tf
+from tensorflow.python.platform import app
+
+from delf import feature_io
+from delf import packed_feature_io
+
+cmd_args = None
+
+# Extension of feature files.
+_DELF_EXT = '.delf'
+
+# Pace to report conversion log.
+_STATUS_CHECK_ITERATIONS = 1000
+
+
+def _ConvertShard(shard_task):
+  """Appends the features of a list of feature files to a shard.
+
+  Args:
+    shard_task: A tuple (output_dir, shard_index, features_paths).
+
+  Returns:
+    Number of converted images.
+  """
+  output_dir, shard_index, features_paths = shard_task
+  num_converted = 0
+  with packed_feature_io.PackedFeatureWriter(output_dir, shard_index) as writer:
+    for features_path in features_paths:
+      image_name = os.path.splitext(os.path.basename(features_path))[0]
+      writer.Append(image_name, *feature_io.ReadFromFile(features_path))
+      num_converted += 1
+      if num_converted % _STATUS_CHECK_ITERATIONS == 0:
+        tf.logging.info('Shard %d: converted %d images', shard_index,
+                        num_converted)
+  return num_converted
+
+
+def main(unused_argv):
+  tf.logging.set_verbosity(tf.logging.INFO)
+
+  image_names = sorted(
+      filename[:-len(_DELF_EXT)]
+      for filename in tf.gfile.ListDirectory(cmd_args.features_dir)
+      if filename.endswith(_DELF_EXT))
+  tf.logging.info('Found %d feature files', len(image_names))
+
+  shard_tasks = []
+  for shard_index, shard_names in enumerate(packed_feature_io.AssignShards(
+      cmd_args.output_dir, image_names, cmd_args.num_shards)):
+    if shard_names:
+      shard_tasks.append((cmd_args.output_dir, shard_index, [
+          os.path.join(cmd_args.features_dir, image_name + _DELF_EXT)
+          for image_name in shard_names
+      ]))
+  tf.logging.info('Converting %d images',
+                  sum(len(task[2]) for task in shard_tasks))
+  if cmd_args.num_workers > 1:
+    pool = multiprocessing.Pool(
+        max(1, min(cmd_args.num_workers, len(shard_tasks))))
+    num_converted = sum(pool.map(_ConvertShard, shard_tasks))
+    pool.close()
+    pool.join()
+  else:
+    num_converted = sum(map(_ConvertShard, shard_tasks))
+  tf.logging.info('Converted %d images into %s', num_converted,
+                  cmd_args.output_dir)
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.register('type', 'bool', lambda v: v.lower() == 'true')
+  parser.add_argument(
+      '--features_dir',
+      type=str,
+      default='test_features',
+      help="""
+      Directory holding the DELF feature files to convert.
+      """)
+  parser.add_argument(
+      '--output_dir',
+      type=str,
+      default='test_packed_features',
+      help="""
+      Directory where the packed container will be written to.
+      """)
+  parser.add_argument(
+      '--num_shards',
+      type=int,
+      default=16,
+      help="""
+      Number of shards of the container.
+      """)
+  parser.add_argument(
+      '--num_workers',
+      type=int,
+      default=4,
+      help="""
+      Number of processes converting shards in parallel.
+      """)
+  cmd_args, unparsed = parser.parse_known_args()
+  app.run(main=main, argv=[sys.argv[0]] + unparsed)
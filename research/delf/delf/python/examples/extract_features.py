@@ -15,8 +15,10 @@
 
 """Extracts DELF features from a list of images, saving them to file.
 
-The images must be in JPG format. The program checks if descriptors already
-exist, and skips computation for those.
+The images must be in JPG format. Images are decoded by a pool of threads,
+features are extracted by concurrent session runs, and written by a background
+thread. Written images are recorded in a manifest, or in the index of the shard
+written with --packed_output, and skipped when the program is run again.
 """
 
 from __future__ import absolute_import
@@ -33,9 +35,10 @@ from tensorflow.python.platform import app
 import time
 
 from delf import delf_config_pb2
+from delf import extraction_pipeline
 from delf import feature_extractor
 from delf import feature_io
-from delf import feature_pb2
+from delf import packed_feature_io
 
 cmd_args = None
 
@@ -45,6 +48,9 @@ _DELF_EXT = '.delf'
 # Pace to report extraction log.
 _STATUS_CHECK_ITERATIONS = 100
 
+# Default name of the manifest of written images in the output directory.
+_MANIFEST_FILENAME = 'manifest.txt'
+
 
 def _ReadImageList(list_path):
   """Helper function to read image paths.
@@ -79,14 +85,49 @@ def main(unused_argv):
   if not os.path.exists(cmd_args.output_dir):
     os.makedirs(cmd_args.output_dir)
 
+  # Skip the images written by previous runs.
+  if cmd_args.packed_output:
+    # Concurrent runs write different shards, so the index of its own shard
+    # records the images of a run, and no manifest is shared between runs.
+    packed_writer = packed_feature_io.PackedFeatureWriter(
+        cmd_args.output_dir, cmd_args.packed_output_shard)
+    manifest = None
+    written_images = packed_writer
+
+    def _WriteFeatures(image_name, features):
+      if image_name not in packed_writer:
+        packed_writer.Append(image_name, *features)
+  else:
+    # Without a manifest, as written by older versions of this program, the
+    # output directory is listed once.
+    manifest_path = cmd_args.manifest_path or os.path.join(
+        cmd_args.output_dir, _MANIFEST_FILENAME)
+    written_images = set()
+    if not os.path.exists(manifest_path):
+      written_images = set(
+          os.path.splitext(filename)[0]
+          for filename in tf.gfile.ListDirectory(cmd_args.output_dir)
+          if filename.endswith(_DELF_EXT))
+    manifest = extraction_pipeline.ExtractionManifest(manifest_path)
+
+    def _WriteFeatures(image_name, features):
+      feature_io.WriteToFile(
+          os.path.join(cmd_args.output_dir, image_name + _DELF_EXT), *features)
+
+  image_paths = [
+      image_path for image_path in image_paths
+      if extraction_pipeline.ImageName(image_path) not in written_images and
+      (manifest is None or
+       extraction_pipeline.ImageName(image_path) not in manifest)
+  ]
+  tf.logging.info('Skipping %d images extracted before',
+                  num_images - len(image_paths))
+  num_images = len(image_paths)
+
+  decoder = extraction_pipeline.ImageDecoder(cmd_args.max_image_size)
+
   # Tell TensorFlow that the model will be built into the default Graph.
   with tf.Graph().as_default():
-    # Reading list of images.
-    filename_queue = tf.train.string_input_producer(image_paths, shuffle=False)
-    reader = tf.WholeFileReader()
-    _, value = reader.read(filename_queue)
-    image_tf = tf.image.decode_jpeg(value, channels=3)
-
     with tf.Session() as sess:
       # Initialize variables.
       init_op = tf.global_variables_initializer()
@@ -111,33 +152,11 @@ def main(unused_argv):
       locations, descriptors = feature_extractor.DelfFeaturePostProcessing(
           boxes, raw_descriptors, config)
 
-      # Start input enqueue threads.
-      coord = tf.train.Coordinator()
-      threads = tf.train.start_queue_runners(sess=sess, coord=coord)
-      start = time.clock()
-      for i in range(num_images):
-        # Write to log-info once in a while.
-        if i == 0:
-          tf.logging.info('Starting to extract DELF features from images...')
-        elif i % _STATUS_CHECK_ITERATIONS == 0:
-          elapsed = (time.clock() - start)
-          tf.logging.info('Processing image %d out of %d, last %d '
-                          'images took %f seconds', i, num_images,
-                          _STATUS_CHECK_ITERATIONS, elapsed)
-          start = time.clock()
-
-        # # Get next image.
-        im = sess.run(image_tf)
-
-        # If descriptor already exists, skip its computation.
-        out_desc_filename = os.path.splitext(os.path.basename(
-            image_paths[i]))[0] + _DELF_EXT
-        out_desc_fullpath = os.path.join(cmd_args.output_dir, out_desc_filename)
-        if tf.gfile.Exists(out_desc_fullpath):
-          tf.logging.info('Skipping %s', image_paths[i])
-          continue
-
-        # Extract and save features.
+      def _Decode(image_path):
+        return image_path, decoder.Decode(image_path)
+
+      def _Extract(decoded_image):
+        image_path, (im, scale_factor) = decoded_image
         (locations_out, descriptors_out, feature_scales_out,
          attention_out) = sess.run(
              [locations, descriptors, feature_scales, attention],
@@ -151,14 +170,46 @@ def main(unused_argv):
                  input_max_feature_num:
                      config.delf_local_config.max_feature_num
              })
+        # Map features of a downscaled image back to the original image.
+        locations_out /= scale_factor
+        feature_scales_out /= scale_factor
+        return image_path, (locations_out, feature_scales_out, descriptors_out,
+                            attention_out)
+
+      # Images of the same size have the same scale pyramid, so they are
+      # extracted back to back.
+      decoded_images = extraction_pipeline.GroupByShape(
+          extraction_pipeline.ParallelMap(_Decode, image_paths,
+                                          cmd_args.num_decode_threads),
+          lambda decoded_image: decoded_image[1][0].shape,
+          cmd_args.shape_window_size)
+      writer = extraction_pipeline.AsyncWriter(_WriteFeatures, manifest)
 
-        serialized_desc = feature_io.WriteToFile(
-            out_desc_fullpath, locations_out, feature_scales_out,
-            descriptors_out, attention_out)
+      tf.logging.info('Starting to extract DELF features from images...')
+      start = time.time()
+      last_status_time = start
+      for i, (image_path, features) in enumerate(
+          extraction_pipeline.ParallelMap(_Extract, decoded_images,
+                                          cmd_args.num_extract_threads)):
+        writer.Write(extraction_pipeline.ImageName(image_path), features)
+        # Write to log-info once in a while.
+        if (i + 1) % _STATUS_CHECK_ITERATIONS == 0:
+          now = time.time()
+          tf.logging.info('Processed image %d out of %d, %f images/sec', i + 1,
+                          num_images,
+                          _STATUS_CHECK_ITERATIONS / (now - last_status_time))
+          last_status_time = now
 
-      # Finalize enqueue threads.
-      coord.request_stop()
-      coord.join(threads)
+      writer.Close()
+      elapsed = time.time() - start
+      tf.logging.info('Extracted %d images in %f seconds, %f images/sec',
+                      num_images, elapsed, num_images / max(elapsed, 1e-6))
+
+  decoder.Close()
+  if cmd_args.packed_output:
+    packed_writer.Close()
+  else:
+    manifest.Close()
 
 
 if __name__ == '__main__':
@@ -187,5 +238,61 @@ if __name__ == '__main__':
       Directory where DELF features will be written to. Each image's features
       will be written to a file with same name, and extension replaced by .delf.
       """)
+  parser.add_argument(
+      '--manifest_path',
+      type=str,
+      default='',
+      help="""
+      Local path to the manifest of the images whose features were written.
+      Defaults to manifest.txt in the output directory. Unused with
+      --packed_output, where the shard records its images.
+      """)
+  parser.add_argument(
+      '--packed_output',
+      type='bool',
+      default=False,
+      help="""
+      If True, features are written to a shard of a packed container in the
+      output directory, see packed_feature_io, instead of one file per image.
+      """)
+  parser.add_argument(
+      '--packed_output_shard',
+      type=int,
+      default=0,
+      help="""
+      Index of the shard written with --packed_output. Concurrent runs must
+      write different shards.
+      """)
+  parser.add_argument(
+      '--num_decode_threads',
+      type=int,
+      default=4,
+      help="""
+      Number of threads reading and decoding images.
+      """)
+  parser.add_argument(
+      '--num_extract_threads',
+      type=int,
+      default=2,
+      help="""
+      Number of concurrent feature extraction runs.
+      """)
+  parser.add_argument(
+      '--shape_window_size',
+      type=int,
+      default=16,
+      help="""
+      Number of decoded images within which images of the same size are
+      grouped.
+      """)
+  parser.add_argument(
+      '--max_image_size',
+      type=int,
+      default=0,
+      help="""
+      If positive, images whose height or width exceeds this size are
+      downscaled before extraction. Feature locations and scales are still
+      given in the original image.
+      """)
   cmd_args, unparsed = parser.parse_known_args()
   app.run(main=main, argv=[sys.argv[0]] + unparsed)
@@ -0,0 +1,101 @@
+# Copyright 2017 The TensorFlow Authors All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Retrieves the database images most similar to a query image.
+
+The query is given by its DELF features, as written by extract_features.py, and
+the database by an index written by build_retrieval_index.py.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import sys
+import tensorflow as tf
+from tensorflow.python.platform import app
+import time
+
+from delf import feature_io
+from delf import retrieval_index
+
+cmd_args = None
+
+
+def main(unused_argv):
+  tf.logging.set_verbosity(tf.logging.INFO)
+
+  index = retrieval_index.RetrievalIndex.Load(cmd_args.index_dir)
+  tf.logging.info('Loaded index of %d images', index.num_images)
+
+  locations, _, descriptors, _, _ = feature_io.ReadFromFile(
+      cmd_args.features_path)
+  tf.logging.info('Loaded query with %d features', len(locations))
+
+  start = time.time()
+  image_indices, similarities, num_inliers = index.Query(
+      locations,
+      descriptors,
+      shortlist_size=cmd_args.shortlist_size,
+      num_to_rerank=cmd_args.num_to_rerank)
+  tf.logging.info('Query took %f seconds', time.time() - start)
+
+  for rank in range(min(cmd_args.num_results, len(image_indices))):
+    print('%d\t%s\tsimilarity=%f\tinliers=%d' %
+          (rank + 1, index.image_names[image_indices[rank]],
+           similarities[rank], num_inliers[rank]))
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.register('type', 'bool', lambda v: v.lower() == 'true')
+  parser.add_argument(
+      '--index_dir',
+      type=str,
+      default='test_index',
+      help="""
+      Directory holding an index written by build_retrieval_index.py.
+      """)
+  parser.add_argument(
+      '--features_path',
+      type=str,
+      default='test_features/image_1.delf',
+      help="""
+      Path to DELF features of the query image.
+      """)
+  parser.add_argument(
+      '--shortlist_size',
+      type=int,
+      default=100,
+      help="""
+      Number of images shortlisted by visual word similarity.
+      """)
+  parser.add_argument(
+      '--num_to_rerank',
+      type=int,
+      default=20,
+      help="""
+      Number of shortlisted images re-ranked by geometric verification.
+      """)
+  parser.add_argument(
+      '--num_results',
+      type=int,
+      default=10,
+      help="""
+      Number of retrieved images to print.
+      """)
+  cmd_args, unparsed = parser.parse_known_args()
+  app.run(main=main, argv=[sys.argv[0]] + unparsed)
@@ -0,0 +1,273 @@
+# Copyright 2017 The TensorFlow Authors All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Building blocks of a pipelined DELF feature extraction.
+
+The extraction of a list of images is split into stages which overlap:
+  1. Images are read and decoded (and optionally downscaled) by a pool of
+     threads, see ImageDecoder and ParallelMap.
+  2. Decoded images are reordered within a small window so that images of the
+     same size, whose scale pyramids are identical, are extracted back to back,
+     see GroupByShape.
+  3. Features are extracted by concurrent session runs, see ParallelMap.
+  4. Features are written by a background thread, which records each written
+     image in a manifest, see AsyncWriter and ExtractionManifest.
+
+Each stage only holds a bounded number of images, so that memory does not grow
+with the number of images.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import collections
+import multiprocessing.pool
+import os
+import threading
+
+from six.moves import queue
+import tensorflow as tf
+
+
+class ExtractionManifest(object):
+  """Append-only list of the images whose features have been written.
+
+  The manifest is a text file with one image name per line. It is read once
+  when it is opened, so that resuming an extraction does not check the
+  existence of the output of each image.
+  """
+
+  def __init__(self, manifest_path):
+    """Opens the manifest for appending, creating it if necessary.
+
+    Args:
+      manifest_path: Local path to the manifest file.
+    """
+    self._image_names = set()
+    size = 0
+    if os.path.exists(manifest_path):
+      with open(manifest_path, 'r') as f:
+        for line in f:
+          # Ignore a line left incomplete by an interrupted extraction.
+          if not line.endswith('\n'):
+            break
+          self._image_names.add(line[:-1])
+          size += len(line)
+    self._file = open(manifest_path, 'a')
+    self._file.truncate(size)
+    self._lock = threading.Lock()
+
+  def __contains__(self, image_name):
+    return image_name in self._image_names
+
+  def __len__(self):
+    return len(self._image_names)
+
+  def Add(self, image_name):
+    """Records that the features of an image have been written."""
+    with self._lock:
+      self._file.write(image_name + '\n')
+      self._file.flush()
+      self._image_names.add(image_name)
+
+  def Close(self):
+    self._file.close()
+
+
+class ImageDecoder(object):
+  """Decodes JPEG images, as done by tf.image.decode_jpeg.
+
+  Decode may be called concurrently from several threads, which then decode
+  images in parallel.
+  """
+
+  def __init__(self, max_image_size=0):
+    """Builds the decoding graph.
+
+    Args:
+      max_image_size: If positive, images whose height or width exceeds it are
+        downscaled so that it does not.
+    """
+    graph = tf.Graph()
+    with graph.as_default():
+      self._encoded_image = tf.placeholder(tf.string, shape=[])
+      image = tf.image.decode_jpeg(self._encoded_image, channels=3)
+      self._scale_factor = tf.constant(1.0)
+      if max_image_size > 0:
+        image_size = tf.to_float(tf.shape(image)[:2])
+        self._scale_factor = tf.minimum(
+            1.0, max_image_size / tf.reduce_max(image_size))
+        image = tf.cond(
+            self._scale_factor < 1.0,
+            lambda: tf.cast(tf.round(tf.image.resize_bilinear(
+                tf.expand_dims(image, 0),
+                tf.to_int32(tf.round(image_size * self._scale_factor)))[0]),
+                            tf.uint8),
+            lambda: image)
+      self._image = image
+    self._sess = tf.Session(graph=graph)
+
+  def Decode(self, image_path):
+    """Reads and decodes an image.
+
+    Args:
+      image_path: Path to a JPEG image.
+
+    Returns:
+      image: [height, width, 3] uint8 array.
+      scale_factor: Factor by which the image was downscaled, or 1.0.
+    """
+    with tf.gfile.GFile(image_path, 'rb') as f:
+      encoded_image = f.read()
+    return self._sess.run([self._image, self._scale_factor],
+                          feed_dict={self._encoded_image: encoded_image})
+
+  def Close(self):
+    self._sess.close()
+
+
+def ParallelMap(fn, items, num_threads, max_pending=None):
+  """Applies a function to items in a pool of threads.
+
+  Unlike multiprocessing.pool.ThreadPool.imap, items are only consumed from
+  |items| as results are consumed, so that at most |max_pending| results are
+  held at once.
+
+  Args:
+    fn: Function applied to each item.
+    items: Iterable of items.
+    num_threads: Number of threads. If 1, fn is applied in the calling thread.
+    max_pending: Maximum number of items being processed or whose result waits
+      to be consumed. Defaults to twice num_threads.
+
+  Yields:
+    fn(item) for each item, in the order of |items|.
+  """
+  if num_threads <= 1:
+    for item in items:
+      yield fn(item)
+    return
+
+  max_pending = max(max_pending or 2 * num_threads, num_threads)
+  pool = multiprocessing.pool.ThreadPool(num_threads)
+  try:
+    pending = collections.deque()
+    for item in items:
+      if len(pending) >= max_pending:
+        yield pending.popleft().get()
+      pending.append(pool.apply_async(fn, (item,)))
+    while pending:
+      yield pending.popleft().get()
+  finally:
+    pool.terminate()
+    pool.join()
+
+
+def GroupByShape(items, shape_fn, window_size):
+  """Reorders items so that items of the same shape are consecutive.
+
+  Items are buffered until |window_size| items are held, at which point all
+  buffered items of the most common shape are emitted.
+
+  Args:
+    items: Iterable of items.
+    shape_fn: Function returning the shape of an item, e.g. the shape of a
+      decoded image.
+    window_size: Maximum number of buffered items.
+
+  Yields:
+    The items, grouped by shape.
+  """
+  groups = collections.OrderedDict()
+  num_buffered = 0
+  for item in items:
+    groups.setdefault(shape_fn(item), []).append(item)
+    num_buffered += 1
+    if num_buffered >= window_size:
+      shape = max(groups, key=lambda shape: len(groups[shape]))
+      group = groups.pop(shape)
+      num_buffered -= len(group)
+      for grouped_item in group:
+        yield grouped_item
+  for group in groups.values():
+    for grouped_item in group:
+      yield grouped_item
+
+
+class AsyncWriter(object):
+  """Writes extracted features in a background thread.
+
+  Errors raised by the writing function are raised by the next call to Write
+  or Close.
+  """
+
+  def __init__(self, write_fn, manifest=None, max_pending=16):
+    """Starts the writing thread.
+
+    Args:
+      write_fn: Function taking an image name and its features, which writes
+        them.
+      manifest: Optional ExtractionManifest, to which images are added once
+        their features are written.
+      max_pending: Maximum number of images waiting to be written.
+    """
+    self._write_fn = write_fn
+    self._manifest = manifest
+    self._queue = queue.Queue(maxsize=max_pending)
+    self._error = None
+    self._thread = threading.Thread(target=self._Run)
+    self._thread.daemon = True
+    self._thread.start()
+
+  def _Run(self):
+    while True:
+      item = self._queue.get()
+      if item is None:
+        return
+      if self._error is not None:
+        continue
+      image_name, features = item
+      try:
+        self._write_fn(image_name, features)
+        if self._manifest is not None:
+          self._manifest.Add(image_name)
+      except Exception as e:  # pylint: disable=broad-except
+        self._error = e
+
+  def _RaiseError(self):
+    if self._error is not None:
+      raise self._error
+
+  def Write(self, image_name, features):
+    """Queues the features of an image for writing.
+
+    Args:
+      image_name: Name of the image.
+      features: Features passed to write_fn.
+    """
+    self._RaiseError()
+    self._queue.put((image_name, features))
+
+  def Close(self):
+    """Waits until all queued features are written."""
+    self._queue.put(None)
+    self._thread.join()
+    self._RaiseError()
+
+
+def ImageName(image_path):
+  """Returns the name under which the features of an image are written."""
+  return os.path.splitext(os.path.basename(image_path))[0]
@@ -0,0 +1,107 @@
+# Copyright 2017 The TensorFlow Authors All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for extraction_pipeline."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from delf import extraction_pipeline
+import numpy as np
+import os
+import tempfile
+import tensorflow as tf
+
+
+class ExtractionPipelineTest(tf.test.TestCase):
+
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp(dir=tf.test.get_temp_dir())
+
+  def testManifestIsResumed(self):
+    manifest_path = os.path.join(self.tmpdir, 'manifest.txt')
+    manifest = extraction_pipeline.ExtractionManifest(manifest_path)
+    manifest.Add('image_1')
+    manifest.Add('image_2')
+    manifest.Close()
+    # Simulate an interrupted write.
+    with open(manifest_path, 'a') as f:
+      f.write('imag')
+
+    manifest = extraction_pipeline.ExtractionManifest(manifest_path)
+    self.assertEqual(2, len(manifest))
+    self.assertIn('image_2', manifest)
+    self.assertNotIn('imag', manifest)
+    manifest.Add('image_3')
+    manifest.Close()
+    with open(manifest_path, 'r') as f:
+      self.assertEqual('image_1\nimage_2\nimage_3\n', f.read())
+
+  def testParallelMapKeepsOrder(self):
+    for num_threads in [1, 4]:
+      self.assertEqual([x * x for x in range(100)],
+                       list(extraction_pipeline.ParallelMap(
+                           lambda x: x * x, range(100), num_threads)))
+
+  def testParallelMapConsumesItemsLazily(self):
+    consumed = []
+
+    def Items():
+      for i in range(100):
+        consumed.append(i)
+        yield i
+
+    results = extraction_pipeline.ParallelMap(
+        lambda x: x, Items(), num_threads=2, max_pending=4)
+    self.assertEqual(0, next(results))
+    self.assertLessEqual(len(consumed), 5)
+
+  def testGroupByShape(self):
+    shapes = [(1,), (2,), (1,), (3,), (2,), (1,), (3,)]
+    items = list(enumerate(shapes))
+    grouped = list(extraction_pipeline.GroupByShape(
+        items, lambda item: item[1], window_size=4))
+    self.assertEqual(sorted(items), sorted(grouped))
+    self.assertEqual([0, 2, 1, 4, 3, 6, 5], [i for i, _ in grouped])
+
+  def testAsyncWriter(self):
+    manifest = extraction_pipeline.ExtractionManifest(
+        os.path.join(self.tmpdir, 'manifest.txt'))
+    written = {}
+
+    def WriteFn(image_name, features):
+      written[image_name] = features
+
+    writer = extraction_pipeline.AsyncWriter(WriteFn, manifest)
+    for i in range(10):
+      writer.Write('image_%d' % i, np.full([2], i))
+    writer.Close()
+    self.assertEqual(10, len(manifest))
+    self.assertAllEqual([3, 3], written['image_3'])
+
+  def testAsyncWriterRaisesErrors(self):
+
+    def WriteFn(image_name, features):
+      raise IOError('Cannot write %s' % image_name)
+
+    writer = extraction_pipeline.AsyncWriter(WriteFn)
+    writer.Write('image_1', None)
+    with self.assertRaises(IOError):
+      writer.Close()
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -0,0 +1,345 @@
+# Copyright 2017 The TensorFlow Authors All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Packed container of the DELF features of many images.
+
+Instead of one DelfFeatures file per image (see feature_io), a container stores
+the features of all images in a few shards. Each shard is a directory holding:
+  - One raw float32 file per feature field (locations, scales, descriptors,
+    attention and orientations), in which the features of all images of the
+    shard are concatenated.
+  - An index file, with one line "<end>\t<image_name>" per image, where <end>
+    is the number of features of the shard up to and including this image.
+  - A metadata file with the descriptor depth.
+
+Shards are append-only: a writer appends the features of an image before its
+index line, so that an interrupted writer leaves a valid shard, whose trailing
+incomplete data is dropped when it is opened again. Readers memory map the
+feature files and return numpy views into them, without parsing or copying.
+
+Example usage:
+  with packed_feature_io.PackedFeatureWriter(container_dir, 0) as writer:
+    writer.Append(image_name, locations, scales, descriptors, attention)
+
+  reader = packed_feature_io.PackedFeatureReader(container_dir)
+  locations, scales, descriptors, attention, orientations = reader.Read(
+      image_name)
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import os
+import zlib
+
+import numpy as np
+
+# Feature fields, in the order returned by readers, and the number of values
+# per feature of each; None stands for the descriptor depth.
+_FIELDS = (('locations', 2), ('scales', 1), ('descriptors', None),
+           ('attention', 1), ('orientations', 1))
+
+_INDEX_FILENAME = 'index.txt'
+_METADATA_FILENAME = 'metadata.json'
+_SHARD_PREFIX = 'shard-'
+
+
+def ShardDir(container_dir, shard_index):
+  """Returns the directory of a shard of a container."""
+  return os.path.join(container_dir, '%s%05d' % (_SHARD_PREFIX, shard_index))
+
+
+def ShardIndex(image_name, num_shards):
+  """Returns the shard of an image, from a stable hash of its name.
+
+  The shard only depends on the image name, so that adding images to the input
+  of a conversion does not move the other images to different shards.
+  """
+  return (zlib.crc32(image_name.encode('utf8')) & 0xffffffff) % num_shards
+
+
+def AssignShards(container_dir, image_names, num_shards):
+  """Assigns the images not stored in any shard of a container to shards.
+
+  Args:
+    container_dir: Directory of the container, which may not exist yet.
+    image_names: Names of the images to store.
+    num_shards: Number of shards to assign images to.
+
+  Returns:
+    A list of |num_shards| lists, with the names of the images to append to
+    each shard. Images already stored in any shard of the container, e.g. by an
+    interrupted conversion with another number of shards, are left out.
+  """
+  stored_names = set()
+  if os.path.isdir(container_dir):
+    stored_names = set(PackedFeatureReader(container_dir).image_names)
+  shard_names = [[] for _ in range(num_shards)]
+  for image_name in image_names:
+    if image_name not in stored_names:
+      shard_names[ShardIndex(image_name, num_shards)].append(image_name)
+  return shard_names
+
+
+def _FieldPath(shard_dir, field):
+  return os.path.join(shard_dir, field + '.f32')
+
+
+def _FieldShape(field_size, depth, num_features):
+  if field_size == 1:
+    return (num_features,)
+  return (num_features, depth if field_size is None else field_size)
+
+
+def _ReadIndex(shard_dir):
+  """Reads the complete lines of the index of a shard.
+
+  Args:
+    shard_dir: Directory of the shard.
+
+  Returns:
+    image_names: List of the names of the images of the shard.
+    offsets: [num_images + 1] int64 array; the features of image i are at
+      positions [offsets[i], offsets[i + 1]).
+    index_size: Size in bytes of the complete lines of the index file.
+  """
+  image_names = []
+  ends = [0]
+  index_size = 0
+  index_path = os.path.join(shard_dir, _INDEX_FILENAME)
+  if os.path.exists(index_path):
+    with open(index_path, 'rb') as f:
+      for line in f:
+        if not line.endswith(b'\n'):
+          break
+        end, image_name = line[:-1].decode('utf8').split('\t', 1)
+        ends.append(int(end))
+        image_names.append(image_name)
+        index_size += len(line)
+  return image_names, np.array(ends, dtype=np.int64), index_size
+
+
+def _ReadDepth(shard_dir):
+  """Returns the descriptor depth of a shard, or None if it is unknown."""
+  metadata_path = os.path.join(shard_dir, _METADATA_FILENAME)
+  if not os.path.exists(metadata_path):
+    return None
+  with open(metadata_path, 'r') as f:
+    return json.load(f)['depth']
+
+
+class PackedFeatureWriter(object):
+  """Appends the DELF features of images to a shard of a container.
+
+  A shard must only be written by a single writer at a time. If the shard
+  already exists, the features are appended to it.
+  """
+
+  def __init__(self, container_dir, shard_index):
+    """Opens the shard for appending.
+
+    Args:
+      container_dir: Directory of the container, created if necessary.
+      shard_index: Index of the shard to write.
+    """
+    self._shard_dir = ShardDir(container_dir, shard_index)
+    if not os.path.exists(self._shard_dir):
+      os.makedirs(self._shard_dir)
+    self._depth = _ReadDepth(self._shard_dir)
+    image_names, offsets, index_size = _ReadIndex(self._shard_dir)
+    self._image_names = set(image_names)
+    self._num_features = int(offsets[-1])
+
+    # Drop the data of an interrupted append.
+    self._index_file = open(os.path.join(self._shard_dir, _INDEX_FILENAME),
+                            'ab')
+    self._index_file.truncate(index_size)
+    self._field_files = []
+    for field, field_size in _FIELDS:
+      field_file = open(_FieldPath(self._shard_dir, field), 'ab')
+      field_size = self._depth if field_size is None else field_size
+      field_file.truncate(4 * self._num_features * (field_size or 0))
+      self._field_files.append(field_file)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.Close()
+
+  def __contains__(self, image_name):
+    return image_name in self._image_names
+
+  def _SetDepth(self, depth):
+    """Records the descriptor depth of the shard."""
+    with open(os.path.join(self._shard_dir, _METADATA_FILENAME), 'w') as f:
+      json.dump({'depth': depth}, f)
+    self._depth = depth
+
+  def Append(self,
+             image_name,
+             locations,
+             scales,
+             descriptors,
+             attention,
+             orientations=None):
+    """Appends the features of an image.
+
+    Args:
+      image_name: Name of the image, which must not contain tabs or newlines.
+      locations: [N, 2] float array which denotes the selected keypoint
+        locations. N is the number of features.
+      scales: [N] float array with feature scales.
+      descriptors: [N, depth] float array with DELF descriptors.
+      attention: [N] float array with attention scores.
+      orientations: [N] float array with orientations. If None, all orientations
+        are set to zero.
+
+    Raises:
+      ValueError: If the image is already in the shard, or if the depth of the
+        descriptors differs from the one of the shard.
+    """
+    if image_name in self._image_names:
+      raise ValueError('Image %s is already in shard %s' %
+                       (image_name, self._shard_dir))
+    num_features = len(attention)
+    if orientations is None:
+      orientations = np.zeros([num_features], dtype=np.float32)
+    if num_features:
+      depth = np.shape(descriptors)[1]
+      if self._depth is None:
+        self._SetDepth(depth)
+      elif depth != self._depth:
+        raise ValueError('Descriptor depth %d differs from depth %d of shard %s'
+                         % (depth, self._depth, self._shard_dir))
+      for field_file, values in zip(
+          self._field_files,
+          (locations, scales, descriptors, attention, orientations)):
+        field_file.write(np.ascontiguousarray(values, dtype=np.float32)
+                         .tobytes())
+        field_file.flush()
+
+    self._num_features += num_features
+    self._index_file.write(
+        ('%d\t%s\n' % (self._num_features, image_name)).encode('utf8'))
+    self._index_file.flush()
+    self._image_names.add(image_name)
+
+  def Close(self):
+    for field_file in self._field_files:
+      field_file.close()
+    self._index_file.close()
+
+
+class PackedFeatureShardReader(object):
+  """Memory maps a shard of a container.
+
+  Attributes:
+    image_names: List of the names of the images of the shard.
+    offsets: [num_images + 1] int64 array; the features of image i are at
+      positions [offsets[i], offsets[i + 1]) of the feature arrays.
+    locations, scales, descriptors, attention, orientations: Memory mapped
+      float32 arrays with the features of all images of the shard.
+  """
+
+  def __init__(self, shard_dir):
+    """Opens a shard, ignoring images appended after this call.
+
+    Args:
+      shard_dir: Directory of the shard.
+    """
+    self.image_names, self.offsets, _ = _ReadIndex(shard_dir)
+    depth = _ReadDepth(shard_dir) or 0
+    num_features = int(self.offsets[-1])
+    for field, field_size in _FIELDS:
+      shape = _FieldShape(field_size, depth, num_features)
+      if num_features:
+        values = np.memmap(
+            _FieldPath(shard_dir, field), dtype=np.float32, mode='r',
+            shape=shape)
+      else:
+        values = np.zeros(shape, dtype=np.float32)
+      setattr(self, field, values)
+
+  def __len__(self):
+    return len(self.image_names)
+
+  def Read(self, image_index):
+    """Returns the features of an image of the shard.
+
+    Args:
+      image_index: Index of the image in the shard.
+
+    Returns:
+      locations: [N, 2] float32 array which denotes the selected keypoint
+        locations. N is the number of features.
+      scales: [N] float32 array with feature scales.
+      descriptors: [N, depth] float32 array with DELF descriptors.
+      attention: [N] float32 array with attention scores.
+      orientations: [N] float32 array with orientations.
+      All arrays are read-only views into the memory mapped shard.
+    """
+    start, end = self.offsets[image_index:image_index + 2]
+    return tuple(getattr(self, field)[start:end] for field, _ in _FIELDS)
+
+
+class PackedFeatureReader(object):
+  """Reads the features of images from all shards of a container."""
+
+  def __init__(self, container_dir):
+    """Opens all shards of a container.
+
+    Args:
+      container_dir: Directory of the container.
+
+    Raises:
+      ValueError: If an image is stored in more than one shard.
+    """
+    self.shards = [
+        PackedFeatureShardReader(os.path.join(container_dir, name))
+        for name in sorted(os.listdir(container_dir))
+        if name.startswith(_SHARD_PREFIX)
+    ]
+    self._locations = {}
+    for shard_index, shard in enumerate(self.shards):
+      for image_index, image_name in enumerate(shard.image_names):
+        if image_name in self._locations:
+          raise ValueError('Image %s is stored in more than one shard' %
+                           image_name)
+        self._locations[image_name] = (shard_index, image_index)
+
+  def __len__(self):
+    return len(self._locations)
+
+  def __contains__(self, image_name):
+    return image_name in self._locations
+
+  @property
+  def image_names(self):
+    """Returns the names of all images, in shard order."""
+    return [name for shard in self.shards for name in shard.image_names]
+
+  def Read(self, image_name):
+    """Returns the features of an image, see PackedFeatureShardReader.Read."""
+    shard_index, image_index = self._locations[image_name]
+    return self.shards[shard_index].Read(image_index)
+
+  def __iter__(self):
+    """Yields the name and features of all images, in shard order."""
+    for shard in self.shards:
+      for image_index, image_name in enumerate(shard.image_names):
+        yield (image_name,) + shard.Read(image_index)
@@ -0,0 +1,162 @@
+# Copyright 2017 The TensorFlow Authors All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for packed_feature_io."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from delf import packed_feature_io
+import numpy as np
+import os
+import tempfile
+import tensorflow as tf
+
+
+def create_data(num_features, offset=0):
+  """Creates features to be used in tests.
+
+  Args:
+    num_features: Number of features.
+    offset: Value added to all features, to tell images apart.
+
+  Returns:
+    locations: [N, 2] float array which denotes the selected keypoint
+      locations. N is the number of features.
+    scales: [N] float array with feature scales.
+    descriptors: [N, depth] float array with DELF descriptors.
+    attention: [N] float array with attention scores.
+    orientations: [N] float array with orientations.
+  """
+  locations = np.arange(2 * num_features, dtype=np.float32).reshape(-1, 2)
+  scales = np.arange(num_features, dtype=np.float32)
+  descriptors = np.arange(8 * num_features, dtype=np.float32).reshape(-1, 8)
+  attention = -np.arange(num_features, dtype=np.float32)
+  orientations = np.ones([num_features], dtype=np.float32)
+  return tuple(values + offset for values in (locations, scales, descriptors,
+                                              attention, orientations))
+
+
+class PackedFeatureIoTest(tf.test.TestCase):
+
+  def setUp(self):
+    self.container_dir = tempfile.mkdtemp(dir=tf.test.get_temp_dir())
+
+  def assertFeaturesEqual(self, expected, actual):
+    self.assertEqual(len(expected), len(actual))
+    for expected_values, actual_values in zip(expected, actual):
+      self.assertAllEqual(expected_values, actual_values)
+
+  def testWriteAndRead(self):
+    with packed_feature_io.PackedFeatureWriter(self.container_dir, 0) as writer:
+      writer.Append('image_1', *create_data(3))
+      writer.Append('image_2', *create_data(0))
+    with packed_feature_io.PackedFeatureWriter(self.container_dir, 1) as writer:
+      writer.Append('image_3', *create_data(5, offset=10)[:4])
+
+    reader = packed_feature_io.PackedFeatureReader(self.container_dir)
+    self.assertEqual(3, len(reader))
+    self.assertEqual(['image_1', 'image_2', 'image_3'], reader.image_names)
+    self.assertFeaturesEqual(create_data(3), reader.Read('image_1'))
+    self.assertEqual(0, len(reader.Read('image_2')[2]))
+    locations, _, descriptors, _, orientations = reader.Read('image_3')
+    self.assertAllEqual(create_data(5, offset=10)[0], locations)
+    self.assertAllEqual(create_data(5, offset=10)[2], descriptors)
+    self.assertAllEqual(np.zeros([5]), orientations)
+    self.assertIsInstance(descriptors, np.memmap)
+
+  def testAppendToExistingShard(self):
+    with packed_feature_io.PackedFeatureWriter(self.container_dir, 0) as writer:
+      writer.Append('image_1', *create_data(3))
+    with packed_feature_io.PackedFeatureWriter(self.container_dir, 0) as writer:
+      self.assertIn('image_1', writer)
+      with self.assertRaises(ValueError):
+        writer.Append('image_1', *create_data(3))
+      writer.Append('image_2', *create_data(4, offset=1))
+
+    reader = packed_feature_io.PackedFeatureReader(self.container_dir)
+    self.assertFeaturesEqual(create_data(3), reader.Read('image_1'))
+    self.assertFeaturesEqual(create_data(4, offset=1), reader.Read('image_2'))
+
+  def testInterruptedAppendIsDropped(self):
+    with packed_feature_io.PackedFeatureWriter(self.container_dir, 0) as writer:
+      writer.Append('image_1', *create_data(3))
+    # Simulate an append interrupted before its index line was complete.
+    shard_dir = packed_feature_io.ShardDir(self.container_dir, 0)
+    with open(os.path.join(shard_dir, 'descriptors.f32'), 'ab') as f:
+      f.write(np.zeros([2, 8], dtype=np.float32).tobytes())
+    with open(os.path.join(shard_dir, 'index.txt'), 'ab') as f:
+      f.write(b'5\timage_')
+
+    self.assertEqual(['image_1'],
+                     packed_feature_io.PackedFeatureShardReader(
+                         shard_dir).image_names)
+    with packed_feature_io.PackedFeatureWriter(self.container_dir, 0) as writer:
+      writer.Append('image_2', *create_data(4, offset=1))
+    reader = packed_feature_io.PackedFeatureReader(self.container_dir)
+    self.assertEqual(['image_1', 'image_2'], reader.image_names)
+    self.assertFeaturesEqual(create_data(4, offset=1), reader.Read('image_2'))
+
+  def testDepthMismatchRaises(self):
+    with packed_feature_io.PackedFeatureWriter(self.container_dir, 0) as writer:
+      writer.Append('image_1', *create_data(3))
+      locations, scales, _, attention, _ = create_data(3)
+      with self.assertRaises(ValueError):
+        writer.Append('image_2', locations, scales, np.zeros([3, 4]),
+                      attention)
+
+  def _Convert(self, image_names, num_shards):
+    """Appends the images missing from the container, as in a conversion."""
+    for shard_index, shard_names in enumerate(packed_feature_io.AssignShards(
+        self.container_dir, image_names, num_shards)):
+      with packed_feature_io.PackedFeatureWriter(self.container_dir,
+                                                 shard_index) as writer:
+        for image_name in shard_names:
+          writer.Append(image_name, *create_data(2, offset=len(image_name)))
+
+  def testAssignShardsIsStable(self):
+    image_names = ['image_%d' % i for i in range(20)]
+    shard_names = packed_feature_io.AssignShards(self.container_dir,
+                                                 image_names, 4)
+    self.assertEqual(sorted(image_names), sorted(sum(shard_names, [])))
+    for shard_index, names in enumerate(shard_names):
+      for image_name in names:
+        self.assertEqual(shard_index,
+                         packed_feature_io.ShardIndex(image_name, 4))
+    # Adding an image does not move the others.
+    self.assertEqual(
+        shard_names,
+        [[name for name in names if name != 'image_new'] for names in
+         packed_feature_io.AssignShards(self.container_dir,
+                                        image_names + ['image_new'], 4)])
+
+  def testResumeWithAddedImage(self):
+    image_names = ['image_%d' % i for i in range(10)]
+    self._Convert(image_names[:6], 3)
+    # Resume with an added image and another number of shards.
+    self._Convert(image_names + ['image_new'], 5)
+    self.assertEqual([[]] * 5, packed_feature_io.AssignShards(
+        self.container_dir, image_names + ['image_new'], 5))
+
+    reader = packed_feature_io.PackedFeatureReader(self.container_dir)
+    self.assertEqual(11, len(reader))
+    for image_name in image_names + ['image_new']:
+      self.assertFeaturesEqual(create_data(2, offset=len(image_name)),
+                               reader.Read(image_name))
+
+
+if __name__ == '__main__':
+  tf.test.main()
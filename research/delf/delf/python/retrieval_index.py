@@ -0,0 +1,400 @@
+# Copyright 2017 The TensorFlow Authors All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Image retrieval over DELF features using an inverted file of visual words.
+
+DELF descriptors are quantized to the visual words of a codebook trained with
+k-means. The database images are stored in an inverted file, which maps each
+visual word to the images containing it together with their tf-idf weights.
+
+A query proceeds in two stages:
+  1. All database images are ranked by the cosine similarity of their tf-idf
+     weighted bags of visual words to the one of the query, by accumulating the
+     votes of the posting lists of the query words only.
+  2. The top candidates are geometrically verified with RANSAC, using the
+     features assigned to the same visual word as putative correspondences, and
+     re-ranked by their number of inliers.
+
+Since the index only stores the visual words and locations of the features, it
+does not need the original descriptors to answer queries, and it can be memory
+mapped from disk.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+import numpy as np
+from skimage.measure import ransac
+from skimage.transform import AffineTransform
+import tensorflow as tf
+
+# Number of distances to the codebook computed at once, which bounds the memory
+# used to quantize descriptors (64 MiB of float32 per distance matrix).
+_QUANTIZATION_CHUNK_ELEMENTS = 1 << 24
+
+# Name of the file listing the database images in an index directory.
+_IMAGE_NAMES_FILENAME = 'image_names.txt'
+
+# Arrays stored in an index directory, one .npy file each.
+_INDEX_ARRAYS = ('codebook', 'idf', 'word_offsets', 'posting_images',
+                 'posting_weights', 'feature_offsets', 'feature_words',
+                 'feature_locations')
+
+# RANSAC parameters of geometric verification, as in match_images.py.
+_RANSAC_MIN_SAMPLES = 3
+_RANSAC_RESIDUAL_THRESHOLD = 20
+_RANSAC_MAX_TRIALS = 1000
+
+
+def QuantizeDescriptors(descriptors, codebook):
+  """Assigns descriptors to their nearest visual words.
+
+  Args:
+    descriptors: [N, depth] float array with DELF descriptors.
+    codebook: [num_words, depth] float array with visual words.
+
+  Returns:
+    words: [N] int32 array with the index of the nearest visual word of each
+      descriptor.
+  """
+  descriptors = np.asarray(descriptors, dtype=np.float32)
+  codebook = np.asarray(codebook, dtype=np.float32)
+  squared_norms = np.sum(codebook**2, axis=1)
+  words = np.zeros([len(descriptors)], dtype=np.int32)
+  chunk_size = max(1, _QUANTIZATION_CHUNK_ELEMENTS // len(codebook))
+  for start in range(0, len(descriptors), chunk_size):
+    chunk = descriptors[start:start + chunk_size]
+    # The squared norms of the descriptors do not change the nearest word.
+    distances = squared_norms - 2 * np.dot(chunk, codebook.T)
+    words[start:start + len(chunk)] = np.argmin(distances, axis=1)
+  return words
+
+
+def TrainCodebook(descriptors, num_words, num_iterations=20, seed=0):
+  """Trains a codebook of visual words with k-means.
+
+  Args:
+    descriptors: [N, depth] float array with DELF descriptors, e.g. a random
+      sample of the descriptors of the database images.
+    num_words: Number of visual words.
+    num_iterations: Number of k-means iterations.
+    seed: Seed of the initialization.
+
+  Returns:
+    codebook: [num_words, depth] float32 array with visual words.
+
+  Raises:
+    ValueError: If there are fewer descriptors than visual words.
+  """
+  descriptors = np.asarray(descriptors, dtype=np.float32)
+  num_descriptors = len(descriptors)
+  if num_descriptors < num_words:
+    raise ValueError('Cannot train %d visual words on %d descriptors' %
+                     (num_words, num_descriptors))
+
+  rng = np.random.RandomState(seed)
+  codebook = descriptors[rng.choice(num_descriptors, num_words, replace=False)]
+  for i in range(num_iterations):
+    words = QuantizeDescriptors(descriptors, codebook)
+    counts = np.bincount(words, minlength=num_words)
+    order = np.argsort(words, kind='mergesort')
+    nonempty = np.flatnonzero(counts)
+    starts = np.searchsorted(words[order], nonempty)
+    codebook[nonempty] = (np.add.reduceat(descriptors[order], starts, axis=0) /
+                          counts[nonempty, np.newaxis])
+    # Restart empty clusters from random descriptors.
+    empty = np.flatnonzero(counts == 0)
+    codebook[empty] = descriptors[rng.choice(num_descriptors, len(empty))]
+    tf.logging.info('k-means iteration %d: %d empty clusters', i, len(empty))
+
+  return codebook
+
+
+def _ConcatenatedRanges(starts, lengths):
+  """Returns the concatenation of the ranges [start, start + length)."""
+  offsets = np.cumsum(lengths) - lengths
+  return np.arange(np.sum(lengths)) + np.repeat(starts - offsets, lengths)
+
+
+class RetrievalIndexBuilder(object):
+  """Collects the features of database images into a RetrievalIndex.
+
+  The visual words and locations of all features are held in memory, and Build
+  sorts them all at once, peaking at about 80 bytes per database feature: e.g.
+  80 GB for 1M images of 1000 features each. Only the built index is memory
+  mapped when loaded, so larger databases must be split into several indexes.
+
+  Example usage:
+    builder = RetrievalIndexBuilder(codebook)
+    for image_name, features_path in database:
+      locations, _, descriptors, _, _ = feature_io.ReadFromFile(features_path)
+      builder.AddImage(image_name, locations, descriptors)
+    builder.Build().Save(index_dir)
+  """
+
+  def __init__(self, codebook):
+    """Constructor.
+
+    Args:
+      codebook: [num_words, depth] float array with visual words, see
+        TrainCodebook.
+    """
+    self._codebook = np.asarray(codebook, dtype=np.float32)
+    self._image_names = []
+    self._words = []
+    self._locations = []
+
+  def AddImage(self, image_name, locations, descriptors):
+    """Adds the features of a database image.
+
+    Args:
+      image_name: Name of the image, returned by queries.
+      locations: [N, 2] float array with feature locations.
+      descriptors: [N, depth] float array with DELF descriptors.
+    """
+    self._image_names.append(image_name)
+    if not len(descriptors):
+      self._words.append(np.zeros([0], dtype=np.int32))
+      self._locations.append(np.zeros([0, 2], dtype=np.float32))
+      return
+    self._words.append(QuantizeDescriptors(descriptors, self._codebook))
+    self._locations.append(np.asarray(locations, dtype=np.float32))
+
+  def Build(self):
+    """Builds the inverted file of the added images.
+
+    Returns:
+      A RetrievalIndex.
+    """
+    num_images = len(self._image_names)
+    num_words = len(self._codebook)
+    num_features = np.array([len(words) for words in self._words],
+                            dtype=np.int64)
+    feature_offsets = np.concatenate([[0], np.cumsum(num_features)])
+    feature_words = np.concatenate(self._words + [np.zeros([0], np.int32)])
+    feature_locations = np.concatenate(
+        self._locations + [np.zeros([0, 2], np.float32)])
+
+    # Count the occurrences of each (word, image) pair; the unique keys are
+    # sorted by word, then by image, which is the order of the inverted file.
+    image_ids = np.repeat(np.arange(num_images, dtype=np.int64), num_features)
+    keys, term_frequencies = np.unique(
+        feature_words.astype(np.int64) * num_images + image_ids,
+        return_counts=True)
+    posting_words = keys // num_images
+    posting_images = (keys % num_images).astype(np.int32)
+
+    document_frequencies = np.bincount(posting_words, minlength=num_words)
+    idf = np.zeros([num_words], dtype=np.float32)
+    present = document_frequencies > 0
+    idf[present] = np.log(num_images / document_frequencies[present])
+    word_offsets = np.concatenate([[0], np.cumsum(document_frequencies)])
+
+    # Normalize the tf-idf vector of each image, so that the votes of a query
+    # sum up to cosine similarities.
+    weights = term_frequencies * idf[posting_words]
+    norms = np.sqrt(
+        np.bincount(posting_images, weights=weights**2, minlength=num_images))
+    norms[norms == 0] = 1
+    posting_weights = (weights / norms[posting_images]).astype(np.float32)
+
+    return RetrievalIndex(
+        image_names=list(self._image_names),
+        codebook=self._codebook,
+        idf=idf,
+        word_offsets=word_offsets.astype(np.int64),
+        posting_images=posting_images,
+        posting_weights=posting_weights,
+        feature_offsets=feature_offsets.astype(np.int64),
+        feature_words=feature_words.astype(np.int32),
+        feature_locations=feature_locations.astype(np.float32))
+
+
+class RetrievalIndex(object):
+  """Inverted file of the visual words of database images.
+
+  Use RetrievalIndexBuilder to create an index, and Save and Load to store it.
+  The arrays of the index are:
+    codebook: [num_words, depth] float32 array with visual words.
+    idf: [num_words] float32 array with the inverse document frequency of each
+      visual word.
+    word_offsets: [num_words + 1] int64 array; the postings of word w are at
+      positions [word_offsets[w], word_offsets[w + 1]).
+    posting_images: [num_postings] int32 array with the image of each posting.
+    posting_weights: [num_postings] float32 array with the normalized tf-idf
+      weight of each posting.
+    feature_offsets: [num_images + 1] int64 array; the features of image i are
+      at positions [feature_offsets[i], feature_offsets[i + 1]).
+    feature_words: [num_features] int32 array with the visual word of each
+      feature.
+    feature_locations: [num_features, 2] float32 array with the location of
+      each feature.
+  """
+
+  def __init__(self, image_names, **arrays):
+    """Constructor.
+
+    Args:
+      image_names: List of the names of the database images.
+      **arrays: The arrays of the index, see the class docstring.
+    """
+    self.image_names = image_names
+    for name in _INDEX_ARRAYS:
+      setattr(self, name, arrays[name])
+
+  @property
+  def num_images(self):
+    return len(self.image_names)
+
+  def Save(self, index_dir):
+    """Saves the index to a directory.
+
+    Args:
+      index_dir: Local directory, created if necessary.
+    """
+    if not os.path.exists(index_dir):
+      os.makedirs(index_dir)
+    for name in _INDEX_ARRAYS:
+      np.save(os.path.join(index_dir, name + '.npy'), getattr(self, name))
+    with open(os.path.join(index_dir, _IMAGE_NAMES_FILENAME), 'w') as f:
+      for image_name in self.image_names:
+        f.write(image_name + '\n')
+
+  @classmethod
+  def Load(cls, index_dir, mmap=True):
+    """Loads an index saved by Save.
+
+    Args:
+      index_dir: Local directory holding the index.
+      mmap: If True, the arrays are memory mapped instead of read into memory.
+
+    Returns:
+      A RetrievalIndex.
+    """
+    with open(os.path.join(index_dir, _IMAGE_NAMES_FILENAME), 'r') as f:
+      image_names = [line.rstrip('\n') for line in f]
+    arrays = {
+        name: np.load(os.path.join(index_dir, name + '.npy'),
+                      mmap_mode='r' if mmap else None)
+        for name in _INDEX_ARRAYS
+    }
+    return cls(image_names, **arrays)
+
+  def Shortlist(self, descriptors, shortlist_size=100):
+    """Ranks the database images by visual word similarity to a query.
+
+    Args:
+      descriptors: [N, depth] float array with the DELF descriptors of the query.
+      shortlist_size: Maximum number of returned images.
+
+    Returns:
+      image_indices: [K] int array with the indices of the most similar images,
+        sorted by decreasing similarity. Images without any visual word in
+        common with the query are not returned.
+      similarities: [K] float array with their cosine similarities.
+    """
+    return self._Shortlist(
+        QuantizeDescriptors(descriptors, self.codebook), shortlist_size)
+
+  def _Shortlist(self, query_words, shortlist_size):
+    """Implements Shortlist given the visual words of the query features."""
+    query_words, term_frequencies = np.unique(query_words, return_counts=True)
+    query_weights = term_frequencies * self.idf[query_words]
+    norm = np.linalg.norm(query_weights)
+    if norm == 0:
+      return np.zeros([0], dtype=np.int64), np.zeros([0], dtype=np.float32)
+    query_weights /= norm
+
+    # Accumulate the votes of the posting lists of the query words.
+    starts = self.word_offsets[query_words]
+    lengths = self.word_offsets[query_words + 1] - starts
+    postings = _ConcatenatedRanges(starts, lengths)
+    similarities = np.bincount(
+        self.posting_images[postings],
+        weights=(self.posting_weights[postings] *
+                 np.repeat(query_weights, lengths)),
+        minlength=self.num_images)
+
+    candidates = np.flatnonzero(similarities > 0)
+    if len(candidates) > shortlist_size:
+      candidates = candidates[np.argpartition(
+          -similarities[candidates], shortlist_size - 1)[:shortlist_size]]
+    candidates = candidates[np.argsort(-similarities[candidates],
+                                       kind='mergesort')]
+    return candidates, similarities[candidates]
+
+  def _CountInliers(self, image_index, query_words, query_locations):
+    """Counts the RANSAC inliers between a query and a database image."""
+    start, end = self.feature_offsets[image_index:image_index + 2]
+    words = np.asarray(self.feature_words[start:end])
+    order = np.argsort(words, kind='mergesort')
+    sorted_words = words[order]
+
+    # Putative correspondences are all pairs of features with the same word.
+    lower = np.searchsorted(sorted_words, query_words, side='left')
+    counts = np.searchsorted(sorted_words, query_words, side='right') - lower
+    query_features = np.repeat(np.arange(len(query_words)), counts)
+    image_features = start + order[_ConcatenatedRanges(lower, counts)]
+    if len(query_features) <= _RANSAC_MIN_SAMPLES:
+      return 0
+
+    _, inliers = ransac(
+        (np.asarray(self.feature_locations[image_features]),
+         query_locations[query_features]),
+        AffineTransform,
+        min_samples=_RANSAC_MIN_SAMPLES,
+        residual_threshold=_RANSAC_RESIDUAL_THRESHOLD,
+        max_trials=_RANSAC_MAX_TRIALS)
+    return 0 if inliers is None else int(np.sum(inliers))
+
+  def Query(self, locations, descriptors, shortlist_size=100,
+            num_to_rerank=20):
+    """Retrieves the database images most similar to a query image.
+
+    Args:
+      locations: [N, 2] float array with the feature locations of the query.
+      descriptors: [N, depth] float array with the DELF descriptors of the query.
+      shortlist_size: Maximum number of returned images.
+      num_to_rerank: Number of top shortlisted images that are geometrically
+        verified.
+
+    Returns:
+      image_indices: [K] int array with the indices of the retrieved images.
+        The verified images come first, sorted by decreasing number of
+        inliers, followed by the rest of the shortlist.
+      similarities: [K] float array with their visual word similarities.
+      num_inliers: [K] int array with their numbers of RANSAC inliers, or -1
+        for the images that were not verified.
+    """
+    query_words = QuantizeDescriptors(descriptors, self.codebook)
+    image_indices, similarities = self._Shortlist(query_words, shortlist_size)
+    num_inliers = np.full([len(image_indices)], -1, dtype=np.int64)
+    num_to_rerank = min(num_to_rerank, len(image_indices))
+    if not num_to_rerank:
+      return image_indices, similarities, num_inliers
+
+    query_locations = np.asarray(locations, dtype=np.float32)
+    for i in range(num_to_rerank):
+      num_inliers[i] = self._CountInliers(image_indices[i], query_words,
+                                          query_locations)
+
+    # Stable sort, so that ties keep their order by similarity.
+    order = np.argsort(-num_inliers[:num_to_rerank], kind='mergesort')
+    order = np.concatenate([order, np.arange(num_to_rerank,
+                                             len(image_indices))])
+    return image_indices[order], similarities[order], num_inliers[order]
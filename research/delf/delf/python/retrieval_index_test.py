@@ -0,0 +1,131 @@
+# Copyright 2017 The TensorFlow Authors All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for retrieval_index."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from delf import retrieval_index
+import numpy as np
+import os
+import tensorflow as tf
+
+
+def create_database(rng):
+  """Creates database images, two of which show the same scene.
+
+  Args:
+    rng: np.random.RandomState used to create the images.
+
+  Returns:
+    images: List of (locations, descriptors) tuples. Images 0 and 1 show the
+      same scene, with image 1 being shifted by 10 pixels.
+  """
+  scene_locations = rng.uniform(0, 500, size=[100, 2]).astype(np.float32)
+  scene_descriptors = rng.randn(100, 8).astype(np.float32)
+  images = [(scene_locations, scene_descriptors),
+            (scene_locations + 10, scene_descriptors)]
+  for _ in range(8):
+    images.append((rng.uniform(0, 500, size=[100, 2]).astype(np.float32),
+                   rng.randn(100, 8).astype(np.float32)))
+  return images
+
+
+class RetrievalIndexTest(tf.test.TestCase):
+
+  def setUp(self):
+    rng = np.random.RandomState(0)
+    self.images = create_database(rng)
+    self.codebook = retrieval_index.TrainCodebook(
+        np.concatenate([descriptors for _, descriptors in self.images]),
+        num_words=64, num_iterations=5)
+    builder = retrieval_index.RetrievalIndexBuilder(self.codebook)
+    for i, (locations, descriptors) in enumerate(self.images):
+      builder.AddImage('image_%d' % i, locations, descriptors)
+    self.index = builder.Build()
+
+  def testQuantizeDescriptors(self):
+    codebook = np.array([[0, 0], [1, 1], [-1, 2]], dtype=np.float32)
+    descriptors = np.array([[0.9, 1.2], [-0.1, 0], [-2, 2]], dtype=np.float32)
+    self.assertAllEqual([1, 0, 2],
+                        retrieval_index.QuantizeDescriptors(descriptors,
+                                                            codebook))
+
+  def testQuantizeDescriptorsInChunks(self):
+    rng = np.random.RandomState(0)
+    codebook = rng.randn(16, 4).astype(np.float32)
+    descriptors = rng.randn(50, 4).astype(np.float32)
+    expected_words = np.argmin(
+        np.sum((descriptors[:, np.newaxis] - codebook)**2, axis=2), axis=1)
+    chunk_elements = retrieval_index._QUANTIZATION_CHUNK_ELEMENTS
+    try:
+      # Chunks of 3 descriptors, and of a single one.
+      for elements in [50, 1]:
+        retrieval_index._QUANTIZATION_CHUNK_ELEMENTS = elements
+        self.assertAllEqual(expected_words,
+                            retrieval_index.QuantizeDescriptors(descriptors,
+                                                                codebook))
+    finally:
+      retrieval_index._QUANTIZATION_CHUNK_ELEMENTS = chunk_elements
+
+  def testTrainCodebookRaisesWithTooFewDescriptors(self):
+    with self.assertRaises(ValueError):
+      retrieval_index.TrainCodebook(np.zeros([3, 8]), num_words=4)
+
+  def testShortlist(self):
+    image_indices, similarities = self.index.Shortlist(self.images[0][1],
+                                                       shortlist_size=3)
+    self.assertEqual(3, len(image_indices))
+    self.assertAllEqual([0, 1], sorted(image_indices[:2]))
+    self.assertAllClose([1, 1], similarities[:2])
+    self.assertLess(similarities[2], 1)
+
+  def testQueryVerifiesShortlist(self):
+    locations, descriptors = self.images[1]
+    image_indices, similarities, num_inliers = self.index.Query(
+        locations, descriptors, shortlist_size=5, num_to_rerank=3)
+    self.assertAllEqual([0, 1], sorted(image_indices[:2]))
+    self.assertEqual(5, len(similarities))
+    # Features with the same visual word may yield a few more inliers than the
+    # 100 true correspondences.
+    self.assertGreaterEqual(min(num_inliers[:2]), 100)
+    self.assertLess(num_inliers[2], 100)
+    self.assertAllEqual([-1, -1], num_inliers[3:])
+
+  def testQueryWithoutFeatures(self):
+    image_indices, similarities, num_inliers = self.index.Query(
+        np.zeros([0, 2]), np.zeros([0, 8]))
+    self.assertEqual(0, len(image_indices))
+    self.assertEqual(0, len(similarities))
+    self.assertEqual(0, len(num_inliers))
+
+  def testSaveAndLoad(self):
+    index_dir = os.path.join(tf.test.get_temp_dir(), 'index')
+    self.index.Save(index_dir)
+    loaded_index = retrieval_index.RetrievalIndex.Load(index_dir)
+
+    self.assertEqual(self.index.image_names, loaded_index.image_names)
+    self.assertAllEqual(self.index.posting_images, loaded_index.posting_images)
+    image_indices, similarities = self.index.Shortlist(self.images[2][1])
+    loaded_image_indices, loaded_similarities = loaded_index.Shortlist(
+        self.images[2][1])
+    self.assertAllEqual(image_indices, loaded_image_indices)
+    self.assertAllClose(similarities, loaded_similarities)
+
+
+if __name__ == '__main__':
+  tf.test.main()
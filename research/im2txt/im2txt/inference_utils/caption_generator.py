@@ -209,3 +209,170 @@ class CaptionGenerator(object):
       complete_captions = partial_captions
 
     return complete_captions.extract(sort=True)
+
+  def batch_beam_search(self, sess, encoded_images):
+    """Runs beam search caption generation on a batch of images.
+
+    This produces the same captions as beam_search() on each image, but decodes
+    all images together: each step runs a single inference_step() on the
+    partial captions of all images, and the partial and complete captions are
+    kept in preallocated arrays rather than in Caption objects. Metadata
+    returned by the model is ignored.
+
+    Args:
+      sess: TensorFlow Session object.
+      encoded_images: A list of encoded image strings.
+
+    Returns:
+      A list with a list of Caption sorted by descending score for each image.
+    """
+    if not encoded_images:
+      return []
+
+    # Feed in the images to get the initial states.
+    initial_states = np.concatenate(
+        [self.model.feed_image(sess, image) for image in encoded_images])
+
+    num_images = len(encoded_images)
+    beam_size = self.beam_size
+    max_length = self.max_caption_length
+    state_size = initial_states.shape[1]
+
+    # Partial captions of image i are at [i, :]. Captions that do not exist
+    # (yet) have logprob -inf.
+    sentences = np.zeros([num_images, beam_size, max_length], dtype=np.int64)
+    sentences[:, :, 0] = self.vocab.start_id
+    logprobs = np.full([num_images, beam_size], -np.inf)
+    logprobs[:, 0] = 0.0
+    states = np.zeros([num_images, beam_size, state_size],
+                      dtype=initial_states.dtype)
+    states[:, 0] = initial_states
+
+    # Complete captions, with the same layout.
+    complete_sentences = np.zeros_like(sentences)
+    complete_lengths = np.zeros([num_images, beam_size], dtype=np.int64)
+    complete_logprobs = np.full([num_images, beam_size], -np.inf)
+    complete_scores = np.full([num_images, beam_size], -np.inf)
+    complete_states = np.zeros_like(states)
+
+    # Candidate c of an image extends its partial caption c // beam_size.
+    parents = np.repeat(np.arange(beam_size), beam_size)
+    images = np.arange(num_images)[:, np.newaxis]
+
+    length = 1
+    while length < max_length:
+      # Only feed the partial captions that exist.
+      rows = np.flatnonzero(np.isfinite(logprobs))
+      if not rows.size:
+        # We have run out of partial candidates; happens when beam_size = 1.
+        break
+
+      softmax, new_states, _ = self.model.inference_step(
+          sess, sentences[:, :, length - 1].ravel()[rows],
+          states.reshape([-1, state_size])[rows])
+
+      # For each partial caption, get the beam_size most probable next words.
+      words, probs = _top_k(softmax, beam_size)
+      num_words = words.shape[1]
+      candidate_words = np.zeros([num_images * beam_size, beam_size],
+                                 dtype=np.int64)
+      candidate_words[rows, :num_words] = words
+      candidate_logprobs = np.full([num_images * beam_size, beam_size],
+                                   -np.inf)
+      # Avoid log(0).
+      candidate_logprobs[rows, :num_words] = np.where(
+          probs < 1e-12, -np.inf,
+          logprobs.ravel()[rows, np.newaxis] + np.log(np.maximum(probs,
+                                                                 1e-12)))
+      all_states = np.zeros([num_images * beam_size, state_size],
+                            dtype=states.dtype)
+      all_states[rows] = new_states
+
+      candidate_words = candidate_words.reshape([num_images, -1])
+      candidate_logprobs = candidate_logprobs.reshape([num_images, -1])
+      candidate_states = all_states.reshape([num_images, beam_size, -1])[
+          :, parents]
+      candidate_sentences = sentences[:, parents]
+      candidate_sentences[:, :, length] = candidate_words
+      length += 1
+
+      is_end = candidate_words == self.vocab.end_id
+
+      # Merge the candidates ending in end_id into the complete captions.
+      end_logprobs = np.where(is_end, candidate_logprobs, -np.inf)
+      end_scores = end_logprobs
+      if self.length_normalization_factor > 0:
+        end_scores = end_scores / length**self.length_normalization_factor
+      top = _top_sorted(np.hstack([complete_scores, end_scores]), beam_size)
+      complete_sentences = np.concatenate(
+          [complete_sentences, candidate_sentences], axis=1)[images, top]
+      complete_lengths = np.hstack([
+          complete_lengths, np.full(end_scores.shape, length, dtype=np.int64)
+      ])[images, top]
+      complete_logprobs = np.hstack([complete_logprobs, end_logprobs])[images,
+                                                                       top]
+      complete_scores = np.hstack([complete_scores, end_scores])[images, top]
+      complete_states = np.concatenate(
+          [complete_states, candidate_states], axis=1)[images, top]
+
+      # The other candidates compete for the partial captions.
+      top = _top_sorted(
+          np.where(is_end, -np.inf, candidate_logprobs), beam_size)
+      sentences = candidate_sentences[images, top]
+      logprobs = np.where(is_end, -np.inf, candidate_logprobs)[images, top]
+      states = candidate_states[images, top]
+
+    captions = []
+    for i in range(num_images):
+      # As in beam_search, fall back to the partial captions if there are no
+      # complete captions, but never output a mixture of both.
+      if np.isfinite(complete_scores[i, 0]):
+        captions.append([
+            Caption(
+                sentence=complete_sentences[i, j, :complete_lengths[i, j]]
+                .tolist(),
+                state=complete_states[i, j],
+                logprob=complete_logprobs[i, j],
+                score=complete_scores[i, j])
+            for j in range(beam_size) if np.isfinite(complete_scores[i, j])
+        ])
+      else:
+        captions.append([
+            Caption(
+                sentence=sentences[i, j, :length].tolist(),
+                state=states[i, j],
+                logprob=logprobs[i, j],
+                score=logprobs[i, j])
+            for j in range(beam_size) if np.isfinite(logprobs[i, j])
+        ])
+
+    return captions
+
+
+def _top_k(scores, k):
+  """Returns the indices and values of the k largest scores of each row.
+
+  Args:
+    scores: A numpy array of shape [num_rows, num_scores].
+    k: The number of scores to select per row.
+
+  Returns:
+    indices: A numpy array of shape [num_rows, min(k, num_scores)] holding the
+      indices of the largest scores of each row, in descending order of score.
+    values: The corresponding scores.
+  """
+  k = min(k, scores.shape[1])
+  rows = np.arange(scores.shape[0])[:, np.newaxis]
+  # Only the k largest scores are sorted.
+  indices = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+  indices = indices[rows, np.argsort(-scores[rows, indices], axis=1)]
+  return indices, scores[rows, indices]
+
+
+def _top_sorted(scores, k):
+  """Returns the indices of the k largest scores of each row.
+
+  Unlike _top_k, ties are broken in favor of the smaller index, so that earlier
+  captions win over later captions of equal score as in TopN.
+  """
+  return np.argsort(-scores, axis=1, kind="mergesort")[:, :k]
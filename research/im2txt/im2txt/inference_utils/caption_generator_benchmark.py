@@ -0,0 +1,101 @@
+# Copyright 2017 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Benchmarks single image and batched beam search of CaptionGenerator.
+
+Example usage:
+    python im2txt/inference_utils/caption_generator_benchmark.py \
+        --benchmarks=.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from im2txt.inference_utils import caption_generator
+
+
+class FakeVocab(object):
+  """Fake Vocabulary for benchmarking purposes."""
+
+  def __init__(self):
+    self.start_id = 0  # Word id denoting sentence start.
+    self.end_id = 1  # Word id denoting sentence end.
+
+
+class FakeModel(object):
+  """Fake recurrent model with the sizes of the default im2txt model."""
+
+  def __init__(self, vocab_size=12000, state_size=1024, seed=0):
+    random_state = np.random.RandomState(seed)
+    self._state_size = state_size
+    self._embeddings = random_state.normal(
+        size=[vocab_size, state_size]).astype(np.float32)
+    self._logits_weights = random_state.normal(
+        scale=0.1, size=[state_size, vocab_size]).astype(np.float32)
+
+  # pylint: disable=unused-argument
+
+  def feed_image(self, sess, encoded_image):
+    return np.random.RandomState(encoded_image).normal(
+        size=[1, self._state_size]).astype(np.float32)
+
+  def inference_step(self, sess, input_feed, state_feed):
+    new_state = np.tanh(state_feed + self._embeddings[input_feed])
+    logits = np.dot(new_state, self._logits_weights)
+    logits -= np.max(logits, axis=1, keepdims=True)
+    softmax_output = np.exp(logits)
+    softmax_output /= np.sum(softmax_output, axis=1, keepdims=True)
+    return softmax_output, new_state, None
+
+  # pylint: enable=unused-argument
+
+
+class CaptionGeneratorBenchmark(tf.test.Benchmark):
+  """Compares beam_search on each image with batch_beam_search."""
+
+  def _run(self, name, fn, num_images, num_iters=3):
+    start_time = time.time()
+    for _ in range(num_iters):
+      fn()
+    wall_time = (time.time() - start_time) / num_iters
+    self.report_benchmark(
+        name=name, iters=num_iters, wall_time=wall_time,
+        extras={"images_per_sec": num_images / wall_time})
+
+  def benchmark_beam_search(self):
+    num_images = 16
+    images = list(range(num_images))
+    generator = caption_generator.CaptionGenerator(FakeModel(), FakeVocab())
+
+    self._run(
+        "beam_search",
+        lambda: [generator.beam_search(None, image) for image in images],
+        num_images)
+    for batch_size in [4, 16]:
+      self._run(
+          "batch_beam_search_%d" % batch_size,
+          lambda: [
+              generator.batch_beam_search(None, images[i:i + batch_size])
+              for i in range(0, num_images, batch_size)
+          ], num_images)
+
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -123,6 +123,17 @@ class CaptionGeneratorTest(tf.test.TestCase):
     self.assertEqual(expected_sentences, actual_sentences)
     self.assertAllClose(expected_probabilities, actual_probabilities)
 
+    # Batched beam search generates the same captions for every image.
+    batch_captions = generator.batch_beam_search(
+        sess=None, encoded_images=[None, None])
+    self.assertEqual(2, len(batch_captions))
+    for actual_captions in batch_captions:
+      actual_sentences = [c.sentence for c in actual_captions]
+      actual_probabilities = [math.exp(c.logprob) for c in actual_captions]
+
+      self.assertEqual(expected_sentences, actual_sentences)
+      self.assertAllClose(expected_probabilities, actual_probabilities)
+
   def testBeamSize(self):
     # Beam size = 1.
     expected = [([0, 4, 10, 1], 0.16)]
@@ -173,6 +184,12 @@ class CaptionGeneratorTest(tf.test.TestCase):
     self._assertExpectedCaptions(
         expected, beam_size=4, length_normalization_factor=3)
 
+  def testBatchBeamSearchEmptyBatch(self):
+    generator = caption_generator.CaptionGenerator(
+        model=FakeModel(), vocab=FakeVocab())
+    self.assertEqual([], generator.batch_beam_search(sess=None,
+                                                     encoded_images=[]))
+
 
 if __name__ == '__main__':
   tf.test.main()
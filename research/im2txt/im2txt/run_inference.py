@@ -20,6 +20,7 @@ from __future__ import print_function
 
 import math
 import os
+import time
 
 
 import tensorflow as tf
@@ -38,6 +39,9 @@ tf.flags.DEFINE_string("vocab_file", "", "Text file containing the vocabulary.")
 tf.flags.DEFINE_string("input_files", "",
                        "File pattern or comma-separated list of file patterns "
                        "of image files.")
+tf.flags.DEFINE_integer("batch_size", 1,
+                        "Number of images captioned together by batched beam "
+                        "search. With 1, images are captioned one at a time.")
 
 tf.logging.set_verbosity(tf.logging.INFO)
 
@@ -69,16 +73,30 @@ def main(_):
     # available beam search parameters.
     generator = caption_generator.CaptionGenerator(model, vocab)
 
-    for filename in filenames:
-      with tf.gfile.GFile(filename, "rb") as f:
-        image = f.read()
-      captions = generator.beam_search(sess, image)
-      print("Captions for image %s:" % os.path.basename(filename))
-      for i, caption in enumerate(captions):
-        # Ignore begin and end words.
-        sentence = [vocab.id_to_word(w) for w in caption.sentence[1:-1]]
-        sentence = " ".join(sentence)
-        print("  %d) %s (p=%f)" % (i, sentence, math.exp(caption.logprob)))
+    start_time = time.time()
+    for start in range(0, len(filenames), FLAGS.batch_size):
+      batch_filenames = filenames[start:start + FLAGS.batch_size]
+      images = []
+      for filename in batch_filenames:
+        with tf.gfile.GFile(filename, "rb") as f:
+          images.append(f.read())
+      if FLAGS.batch_size > 1:
+        batch_captions = generator.batch_beam_search(sess, images)
+      else:
+        batch_captions = [generator.beam_search(sess, images[0])]
+
+      for filename, captions in zip(batch_filenames, batch_captions):
+        print("Captions for image %s:" % os.path.basename(filename))
+        for i, caption in enumerate(captions):
+          # Ignore begin and end words.
+          sentence = [vocab.id_to_word(w) for w in caption.sentence[1:-1]]
+          sentence = " ".join(sentence)
+          print("  %d) %s (p=%f)" % (i, sentence, math.exp(caption.logprob)))
+
+    elapsed = time.time() - start_time
+    tf.logging.info("Captioned %d images in %.1f seconds (%.2f images/sec)",
+                    len(filenames), elapsed,
+                    len(filenames) / max(elapsed, 1e-6))
 
 
 if __name__ == "__main__":
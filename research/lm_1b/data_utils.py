@@ -231,6 +231,11 @@ class LM1BDataset(object):
     self._all_shards = tf.gfile.Glob(filepattern)
     tf.logging.info('Found %d shards at %s', len(self._all_shards), filepattern)
 
+  @property
+  def shards(self):
+    """The files of the dataset."""
+    return self._all_shards
+
   def _load_random_shard(self):
     """Randomly select a file and read it."""
     return self._load_shard(random.choice(self._all_shards))
@@ -274,6 +279,11 @@ class LM1BDataset(object):
     return get_batch(self._get_sentence(forever), batch_size, num_steps,
                      self.vocab.max_word_length, pad=pad)
 
+  def get_shard_batch(self, shard_name, batch_size, num_steps, pad=False):
+    """Reads the batches of a single file once, in order."""
+    return get_batch(iter(self._load_shard(shard_name)), batch_size, num_steps,
+                     self.vocab.max_word_length, pad=pad)
+
   @property
   def vocab(self):
     return self._vocab
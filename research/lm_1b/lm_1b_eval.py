@@ -15,10 +15,16 @@
 
 """Eval pre-trained 1 billion word language model.
 """
+import itertools
+import json
+import multiprocessing
 import os
 import sys
+import threading
+import time
 
 import numpy as np
+from six.moves import queue as Queue
 from six.moves import xrange
 import tensorflow as tf
 
@@ -63,6 +69,22 @@ tf.flags.DEFINE_string('input_data', '',
                        'Input data files for eval model.')
 tf.flags.DEFINE_integer('max_eval_steps', 1000000,
                         'Maximum mumber of steps to run "eval" mode.')
+tf.flags.DEFINE_integer('num_eval_workers', 0,
+                        'If > 0, "eval" mode evaluates the files of '
+                        'FLAGS.input_data in this many worker processes, '
+                        'each loading its own copy of the model, and '
+                        'max_eval_steps applies to each file. Progress is '
+                        'checkpointed to FLAGS.eval_dir, so that an '
+                        'interrupted evaluation resumes where it stopped.')
+tf.flags.DEFINE_string('eval_dir', '',
+                       'Used by parallel "eval" mode to save the partial sums '
+                       'of each file and the final report.')
+tf.flags.DEFINE_integer('eval_checkpoint_steps', 1000,
+                        'Number of steps between checkpoints of the partial '
+                        'sums of a file in parallel "eval" mode.')
+tf.flags.DEFINE_integer('eval_prefetch_batches', 1000,
+                        'Number of batches prefetched by a background thread '
+                        'in parallel "eval" mode.')
 
 
 # For saving demo resources, use batch size 1 and step 1.
@@ -156,6 +178,224 @@ def _EvalModel(dataset):
       break
 
 
+def _PrefetchBatches(batches, capacity):
+  """Generates batches produced by a background thread.
+
+  Args:
+    batches: iterator over tuples of numpy arrays. get_batch reuses its arrays,
+      so they are copied.
+    capacity: maximum number of prefetched batches.
+
+  Yields:
+    The batches of batches.
+  """
+  batch_queue = Queue.Queue(capacity)
+  done = object()
+
+  def _Fill():
+    try:
+      for batch in batches:
+        batch_queue.put(tuple(np.copy(x) for x in batch))
+      batch_queue.put(done)
+    except Exception as e:  # pylint: disable=broad-except
+      batch_queue.put(e)
+
+  thread = threading.Thread(target=_Fill)
+  thread.daemon = True
+  thread.start()
+  while True:
+    batch = batch_queue.get()
+    if batch is done:
+      return
+    if isinstance(batch, Exception):
+      raise batch
+    yield batch
+
+
+def _ShardStatePath(shard):
+  return os.path.join(FLAGS.eval_dir, os.path.basename(shard) + '.eval.npz')
+
+
+def _LoadShardState(shard):
+  """Returns the checkpointed evaluation state of a file, or None."""
+  path = _ShardStatePath(shard)
+  if not tf.gfile.Exists(path):
+    return None
+  with tf.gfile.Open(path, 'rb') as f:
+    with np.load(f) as state:
+      return {key: state[key].item() if state[key].ndim == 0 else state[key]
+              for key in state.files}
+
+
+def _SaveShardState(shard, state):
+  """Atomically checkpoints the evaluation state of a file."""
+  path = _ShardStatePath(shard)
+  with tf.gfile.Open(path + '.tmp', 'wb') as f:
+    np.savez(f, **state)
+  tf.gfile.Rename(path + '.tmp', path, overwrite=True)
+
+
+# Model of a parallel eval worker process, set by _InitEvalWorker.
+_worker_model = None
+
+
+def _InitEvalWorker(vocab):
+  """Loads the model and prepares saving and restoring the LSTM states."""
+  global _worker_model
+  sess, t = _LoadModel(FLAGS.pbtxt, FLAGS.ckpt)
+  # The LSTM states are carried over between steps in variables, which are the
+  # targets of the assignments of states_init.
+  states_init = sess.graph.get_operation_by_name('states_init')
+  state_vars = [op.inputs[0] for op in states_init.control_inputs
+                if op.type == 'Assign']
+  with sess.graph.as_default():
+    state_feeds = [tf.placeholder(v.dtype.base_dtype, v.get_shape())
+                   for v in state_vars]
+    restore_states = tf.group(*[tf.assign(v, feed) for v, feed in
+                                zip(state_vars, state_feeds)])
+  _worker_model = (sess, t, state_vars, state_feeds, restore_states,
+                   data_utils.LM1BDataset(FLAGS.input_data, vocab))
+
+
+def _EvalShard(shard):
+  """Evaluates a file, resuming from and updating its checkpointed state.
+
+  Args:
+    shard: the file to evaluate.
+
+  Returns:
+    A tuple (shard, state) of the file and its final state: the sums of the
+    perplexity, the number of steps and target words, the evaluation time and
+    whether the file is done.
+  """
+  sess, t, state_vars, state_feeds, restore_states, dataset = _worker_model
+  state = _LoadShardState(shard)
+  if state is None:
+    state = {'sum_num': 0.0, 'sum_den': 0.0, 'num_steps': 0, 'num_words': 0,
+             'secs': 0.0, 'done': False}
+    sess.run(t['states_init'])
+  else:
+    tf.logging.info('Resuming %s at step %d.', shard, state['num_steps'])
+    sess.run(restore_states, dict(zip(
+        state_feeds, [state['lstm_state_%d' % i]
+                      for i in xrange(len(state_vars))])))
+  if state['done']:
+    return shard, state
+
+  state = {key: value for key, value in state.items()
+           if not key.startswith('lstm_state_')}
+  start_time = time.time() - state['secs']
+  batches = itertools.islice(
+      dataset.get_shard_batch(shard, BATCH_SIZE, NUM_TIMESTEPS),
+      int(state['num_steps']), FLAGS.max_eval_steps)
+
+  def _Checkpoint(done):
+    state['secs'] = time.time() - start_time
+    state['done'] = done
+    lstm_states = sess.run(state_vars)
+    _SaveShardState(shard, dict(
+        state, **{'lstm_state_%d' % i: lstm_state
+                  for i, lstm_state in enumerate(lstm_states)}))
+
+  for inputs, char_inputs, _, targets, weights in _PrefetchBatches(
+      batches, FLAGS.eval_prefetch_batches):
+    input_dict = {t['inputs_in']: inputs,
+                  t['targets_in']: targets,
+                  t['target_weights_in']: weights}
+    if 'char_inputs_in' in t:
+      input_dict[t['char_inputs_in']] = char_inputs
+    log_perp = sess.run(t['log_perplexity_out'], feed_dict=input_dict)
+
+    if np.isnan(log_perp):
+      tf.logging.error('log_perplexity is Nan in %s.', shard)
+    else:
+      state['sum_num'] += log_perp * weights.mean()
+      state['sum_den'] += weights.mean()
+    state['num_steps'] += 1
+    state['num_words'] += int(weights.sum())
+    if state['num_steps'] % FLAGS.eval_checkpoint_steps == 0:
+      _Checkpoint(done=False)
+
+  _Checkpoint(done=True)
+  return shard, state
+
+
+def _Perplexity(sum_num, sum_den):
+  return float(np.exp(sum_num / sum_den)) if sum_den > 0 else float('nan')
+
+
+def _ParallelEvalModel(vocab):
+  """Evaluates model perplexity on the files of FLAGS.input_data in parallel.
+
+  Each file is evaluated by one worker process, from the initial LSTM state.
+  The perplexity sums of the files are checkpointed to FLAGS.eval_dir, and
+  aggregated into a report written to FLAGS.eval_dir/report.json.
+
+  Args:
+    vocab: Vocabulary.
+  """
+  assert FLAGS.eval_dir, 'Must specify FLAGS.eval_dir for parallel eval.'
+  if not tf.gfile.IsDirectory(FLAGS.eval_dir):
+    tf.gfile.MakeDirs(FLAGS.eval_dir)
+  shards = sorted(data_utils.LM1BDataset(FLAGS.input_data, vocab).shards)
+
+  start_time = time.time()
+  results = {}
+  words_before_run = 0
+  todo = []
+  for shard in shards:
+    state = _LoadShardState(shard)
+    if state is not None and state['done']:
+      results[shard] = state
+    else:
+      todo.append(shard)
+    if state is not None:
+      words_before_run += int(state['num_words'])
+  tf.logging.info('Evaluating %d files, %d are already done.', len(shards),
+                  len(shards) - len(todo))
+
+  if todo:
+    pool = multiprocessing.Pool(min(FLAGS.num_eval_workers, len(todo)),
+                                initializer=_InitEvalWorker,
+                                initargs=(vocab,))
+    try:
+      for shard, state in pool.imap_unordered(_EvalShard, todo):
+        results[shard] = state
+        tf.logging.info('Finished %s (%d/%d): perplexity %f over %d words.',
+                        shard, len(results), len(shards),
+                        _Perplexity(state['sum_num'], state['sum_den']),
+                        state['num_words'])
+    finally:
+      pool.terminate()
+      pool.join()
+  wall_secs = time.time() - start_time
+
+  num_words = sum(int(state['num_words']) for state in results.values())
+  worker_secs = sum(float(state['secs']) for state in results.values())
+  report = {
+      'perplexity': _Perplexity(
+          sum(float(state['sum_num']) for state in results.values()),
+          sum(float(state['sum_den']) for state in results.values())),
+      'num_words': num_words,
+      'num_steps': sum(int(state['num_steps']) for state in results.values()),
+      'wall_secs': wall_secs,
+      # Throughput of this run, without the words evaluated by earlier runs.
+      'words_per_sec': (num_words - words_before_run) / max(wall_secs, 1e-6),
+      'words_per_sec_per_worker': num_words / max(worker_secs, 1e-6),
+      'shards': {
+          shard: {
+              'perplexity': _Perplexity(state['sum_num'], state['sum_den']),
+              'num_words': int(state['num_words']),
+              'secs': float(state['secs']),
+          } for shard, state in results.items()
+      },
+  }
+  with tf.gfile.Open(os.path.join(FLAGS.eval_dir, 'report.json'), 'w') as f:
+    json.dump(report, f, indent=2, sort_keys=True)
+  sys.stderr.write('Perplexity: %f over %d words, %.1f words/sec.\n' % (
+      report['perplexity'], num_words, report['words_per_sec']))
+
+
 def _SampleSoftmax(softmax):
   return min(np.sum(np.cumsum(softmax) < np.random.rand()), len(softmax) - 1)
 
@@ -291,7 +531,9 @@ def _DumpSentenceEmbedding(sentence, vocab):
 def main(unused_argv):
   vocab = data_utils.CharsVocabulary(FLAGS.vocab_file, MAX_WORD_LEN)
 
-  if FLAGS.mode == 'eval':
+  if FLAGS.mode == 'eval' and FLAGS.num_eval_workers > 0:
+    _ParallelEvalModel(vocab)
+  elif FLAGS.mode == 'eval':
     dataset = data_utils.LM1BDataset(FLAGS.input_data, vocab)
     _EvalModel(dataset)
   elif FLAGS.mode == 'sample':
@@ -27,15 +27,104 @@ import tensorflow as tf
 
 from object_detection.data_decoders import tf_example_decoder
 from object_detection.protos import input_reader_pb2
+from object_detection.utils import dataset_util
 
 parallel_reader = tf.contrib.slim.parallel_reader
 
 
-def build(input_reader_config):
+def _build_decoder(input_reader_config, decode_image=True):
+  """Builds a TfExampleDecoder based on the InputReader config."""
+  label_map_proto_file = None
+  if input_reader_config.HasField('label_map_path'):
+    label_map_proto_file = input_reader_config.label_map_path
+  label_in_image_level_map_proto_file = None
+  if input_reader_config.HasField('label_in_image_level_map_path'):
+    label_in_image_level_map_proto_file = input_reader_config.label_in_image_level_map_path
+
+  return tf_example_decoder.TfExampleDecoder(
+      load_instance_masks=input_reader_config.load_instance_masks,
+      label_map_proto_file=label_map_proto_file,
+      label_in_image_level_map_proto_file=label_in_image_level_map_proto_file,
+      decode_image=decode_image)
+
+
+def _get_tf_record_input_paths(input_reader_config):
+  """Returns the input paths of a tf_record_input_reader config.
+
+  Raises:
+    ValueError: On invalid input reader proto.
+    ValueError: If no input paths are specified.
+  """
+  if not isinstance(input_reader_config, input_reader_pb2.InputReader):
+    raise ValueError('input_reader_config not of type '
+                     'input_reader_pb2.InputReader.')
+
+  if input_reader_config.WhichOneof('input_reader') != 'tf_record_input_reader':
+    raise ValueError('Unsupported input_reader_config.')
+
+  config = input_reader_config.tf_record_input_reader
+  if not config.input_path:
+    raise ValueError('At least one input path must be specified in '
+                     '`input_reader_config`.')
+  return config.input_path[:]  # Convert `RepeatedScalarContainer` to list.
+
+
+def build_dataset(input_reader_config, decode_image=True):
+  """Builds a tf.data.Dataset of decoded tensor dicts from an InputReader config.
+
+  Input files are read with num_readers files interleaved in blocks of
+  read_block_length records, records are shuffled with a buffer of
+  min_after_dequeue elements, decoded with num_parallel_map_calls parallel
+  calls and prefetch_size decoded records are prefetched.
+
+  Args:
+    input_reader_config: A input_reader_pb2.InputReader object.
+    decode_image: Whether to decode images, see TfExampleDecoder.
+
+  Returns:
+    A tf.data.Dataset whose elements are tensor dicts as returned by
+    TfExampleDecoder.decode.
+
+  Raises:
+    ValueError: On invalid input reader proto.
+    ValueError: If no input paths are specified.
+  """
+  input_paths = _get_tf_record_input_paths(input_reader_config)
+  filenames = []
+  for input_path in input_paths:
+    filenames.extend(tf.gfile.Glob(input_path))
+  if not filenames:
+    raise ValueError('No files match the input paths in '
+                     '`input_reader_config`: %s' % input_paths)
+
+  dataset = tf.data.Dataset.from_tensor_slices(filenames)
+  if input_reader_config.shuffle:
+    dataset = dataset.shuffle(len(filenames))
+  dataset = dataset.repeat(input_reader_config.num_epochs or None)
+  dataset = dataset.interleave(
+      tf.data.TFRecordDataset,
+      cycle_length=min(input_reader_config.num_readers, len(filenames)),
+      block_length=input_reader_config.read_block_length)
+  if input_reader_config.shuffle:
+    dataset = dataset.shuffle(input_reader_config.min_after_dequeue)
+
+  decoder = _build_decoder(input_reader_config, decode_image)
+  dataset = dataset.map(
+      decoder.decode,
+      num_parallel_calls=input_reader_config.num_parallel_map_calls)
+  return dataset.prefetch(input_reader_config.prefetch_size)
+
+
+def build(input_reader_config, decode_image=True):
   """Builds a tensor dictionary based on the InputReader config.
 
+  If input_reader_config.use_tf_data is set, the tensor dictionary is read from
+  the dataset returned by build_dataset instead of a parallel reader queue.
+
   Args:
     input_reader_config: A input_reader_pb2.InputReader object.
+    decode_image: Whether to decode the image. If False, the tensor dict holds
+      the encoded image string instead, see TfExampleDecoder.
 
   Returns:
     A tensor dict based on the input_reader_config.
@@ -44,37 +133,20 @@ def build(input_reader_config):
     ValueError: On invalid input reader proto.
     ValueError: If no input paths are specified.
   """
-  if not isinstance(input_reader_config, input_reader_pb2.InputReader):
-    raise ValueError('input_reader_config not of type '
-                     'input_reader_pb2.InputReader.')
+  input_paths = _get_tf_record_input_paths(input_reader_config)
+  if input_reader_config.use_tf_data:
+    dataset = build_dataset(input_reader_config, decode_image)
+    return dataset_util.make_initializable_iterator(dataset).get_next()
 
-  if input_reader_config.WhichOneof('input_reader') == 'tf_record_input_reader':
-    config = input_reader_config.tf_record_input_reader
-    if not config.input_path:
-      raise ValueError('At least one input path must be specified in '
-                       '`input_reader_config`.')
-    _, string_tensor = parallel_reader.parallel_read(
-        config.input_path[:],  # Convert `RepeatedScalarContainer` to list.
-        reader_class=tf.TFRecordReader,
-        num_epochs=(input_reader_config.num_epochs
-                    if input_reader_config.num_epochs else None),
-        num_readers=input_reader_config.num_readers,
-        shuffle=input_reader_config.shuffle,
-        dtypes=[tf.string, tf.string],
-        capacity=input_reader_config.queue_capacity,
-        min_after_dequeue=input_reader_config.min_after_dequeue)
-
-    label_map_proto_file = None
-    if input_reader_config.HasField('label_map_path'):
-      label_map_proto_file = input_reader_config.label_map_path
-    label_in_image_level_map_proto_file = None
-    if input_reader_config.HasField('label_in_image_level_map_path'):
-      label_in_image_level_map_proto_file = input_reader_config.label_in_image_level_map_path
-
-    decoder = tf_example_decoder.TfExampleDecoder(
-        load_instance_masks=input_reader_config.load_instance_masks,
-        label_map_proto_file=label_map_proto_file,
-        label_in_image_level_map_proto_file=label_in_image_level_map_proto_file)
-    return decoder.decode(string_tensor)
-
-  raise ValueError('Unsupported input_reader_config.')
+  _, string_tensor = parallel_reader.parallel_read(
+      input_paths,
+      reader_class=tf.TFRecordReader,
+      num_epochs=(input_reader_config.num_epochs
+                  if input_reader_config.num_epochs else None),
+      num_readers=input_reader_config.num_readers,
+      shuffle=input_reader_config.shuffle,
+      dtypes=[tf.string, tf.string],
+      capacity=input_reader_config.queue_capacity,
+      min_after_dequeue=input_reader_config.min_after_dequeue)
+  return _build_decoder(input_reader_config, decode_image).decode(
+      string_tensor)
@@ -26,6 +26,7 @@ from tensorflow.core.example import feature_pb2
 from object_detection.builders import input_reader_builder
 from object_detection.core import standard_fields as fields
 from object_detection.protos import input_reader_pb2
+from object_detection.utils import dataset_util
 
 
 class InputReaderBuilderTest(tf.test.TestCase):
@@ -129,6 +130,72 @@ class InputReaderBuilderTest(tf.test.TestCase):
         (1, 4, 5),
         output_dict[fields.InputDataFields.groundtruth_instance_masks].shape)
 
+  def test_build_tf_record_input_reader_with_tf_data(self):
+    tf_record_path = self.create_tf_record()
+
+    input_reader_text_proto = """
+      shuffle: false
+      num_readers: 1
+      use_tf_data: true
+      tf_record_input_reader {{
+        input_path: '{0}'
+      }}
+    """.format(tf_record_path)
+    input_reader_proto = input_reader_pb2.InputReader()
+    text_format.Merge(input_reader_text_proto, input_reader_proto)
+    tensor_dict = input_reader_builder.build(input_reader_proto)
+
+    sv = tf.train.Supervisor(logdir=self.get_temp_dir())
+    with sv.prepare_or_wait_for_session() as sess:
+      output_dict = sess.run(tensor_dict)
+
+    self.assertEquals(
+        (4, 5, 3), output_dict[fields.InputDataFields.image].shape)
+    self.assertEquals(
+        [2], output_dict[fields.InputDataFields.groundtruth_classes])
+    self.assertAllEqual(
+        [0.0, 0.0, 1.0, 1.0],
+        output_dict[fields.InputDataFields.groundtruth_boxes][0])
+
+  def test_build_dataset_reads_num_epochs(self):
+    tf_record_path = self.create_tf_record()
+
+    input_reader_text_proto = """
+      shuffle: false
+      num_readers: 1
+      num_epochs: 2
+      use_tf_data: true
+      tf_record_input_reader {{
+        input_path: '{0}'
+      }}
+    """.format(tf_record_path)
+    input_reader_proto = input_reader_pb2.InputReader()
+    text_format.Merge(input_reader_text_proto, input_reader_proto)
+    dataset = input_reader_builder.build_dataset(input_reader_proto)
+    iterator = dataset_util.make_initializable_iterator(dataset)
+    tensor_dict = iterator.get_next()
+
+    with self.test_session() as sess:
+      sess.run(tf.tables_initializer())
+      for _ in range(2):
+        output_dict = sess.run(tensor_dict)
+        self.assertEquals(
+            [2], output_dict[fields.InputDataFields.groundtruth_classes])
+      with self.assertRaises(tf.errors.OutOfRangeError):
+        sess.run(tensor_dict)
+
+  def test_build_dataset_raises_error_with_unmatched_input_paths(self):
+    input_reader_text_proto = """
+      use_tf_data: true
+      tf_record_input_reader {{
+        input_path: '{0}'
+      }}
+    """.format(os.path.join(self.get_temp_dir(), 'missing-*'))
+    input_reader_proto = input_reader_pb2.InputReader()
+    text_format.Merge(input_reader_text_proto, input_reader_proto)
+    with self.assertRaises(ValueError):
+      input_reader_builder.build_dataset(input_reader_proto)
+
   def test_raises_error_with_no_input_paths(self):
     input_reader_text_proto = """
       shuffle: false
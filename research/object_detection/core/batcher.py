@@ -19,6 +19,7 @@ import collections
 import tensorflow as tf
 
 from object_detection.core import prefetcher
+from object_detection.utils import dataset_util
 
 rt_shape_str = '_runtime_shapes'
 
@@ -108,29 +109,114 @@ class BatchQueue(object):
     Returns:
       A list of tensor_dicts of the requested batch_size.
     """
-    batched_tensors = self._queue.dequeue()
-    # Separate input tensors from tensors containing their runtime shapes.
-    tensors = {}
-    shapes = {}
-    for key, batched_tensor in batched_tensors.items():
-      unbatched_tensor_list = tf.unstack(batched_tensor)
-      for i, unbatched_tensor in enumerate(unbatched_tensor_list):
-        if rt_shape_str in key:
-          shapes[(key[:-len(rt_shape_str)], i)] = unbatched_tensor
-        else:
-          tensors[(key, i)] = unbatched_tensor
-
-    # Undo that padding using shapes and create a list of size `batch_size` that
-    # contains tensor dictionaries.
-    tensor_dict_list = []
-    batch_size = self._batch_size
-    for batch_id in range(batch_size):
-      tensor_dict = {}
-      for key in self._static_shapes:
-        tensor_dict[key] = tf.slice(tensors[(key, batch_id)],
-                                    tf.zeros_like(shapes[(key, batch_id)]),
-                                    shapes[(key, batch_id)])
-        tensor_dict[key].set_shape(self._static_shapes[key])
-      tensor_dict_list.append(tensor_dict)
-
-    return tensor_dict_list
+    return _unbatch_and_unpad(self._queue.dequeue(), self._static_shapes,
+                              self._batch_size)
+
+
+class DatasetBatchQueue(object):
+  """DatasetBatchQueue class.
+
+  Batches a tf.data.Dataset of tensor_dicts and exposes the batches through the
+  same dequeue interface as BatchQueue. Batching and prefetching run in the
+  tf.data runtime rather than in queue runner threads.
+
+  Example input pipeline with batching:
+  ------------------------------------
+  dataset = input_reader_builder.build_dataset(input_reader_config)
+  dataset = dataset.map(preprocess_fn, num_parallel_calls=8)
+  batch_queue = batcher.DatasetBatchQueue(dataset,
+                                          batch_size=32,
+                                          prefetch_queue_capacity=20)
+  tensor_dict = batch_queue.dequeue()
+  outputs = Model(tensor_dict)
+  ...
+  -----------------------------------
+
+  Notes:
+  -----
+  As with BatchQueue, tensors of unequal sizes are zero padded by padded
+  batching and unpadded in dequeue, and the last batch is dropped if it is not
+  full.
+  """
+
+  def __init__(self, dataset, batch_size, prefetch_queue_capacity):
+    """Constructs a batch queue over the elements of dataset.
+
+    Args:
+      dataset: a tf.data.Dataset whose elements are dictionaries of tensors.
+      batch_size: batch size.
+      prefetch_queue_capacity: number of assembled batches to prefetch.
+    """
+    # Remember static shapes to set shapes of batched tensors.
+    static_shapes = collections.OrderedDict(
+        {key: shape for key, shape in dataset.output_shapes.items()})
+
+    def add_runtime_shapes(tensor_dict):
+      all_tensors = dict(tensor_dict)
+      # Remember runtime shapes to unpad tensors after batching.
+      all_tensors.update({(key + rt_shape_str): tf.shape(tensor)
+                          for key, tensor in tensor_dict.items()})
+      return all_tensors
+
+    dataset = dataset.map(add_runtime_shapes)
+    padded_shapes = {
+        key: tf.TensorShape([None] * shape.ndims)
+        for key, shape in dataset.output_shapes.items()}
+    dataset = dataset.padded_batch(batch_size, padded_shapes)
+    first_key = next(iter(static_shapes))
+    dataset = dataset.filter(
+        lambda batch: tf.equal(tf.shape(batch[first_key])[0], batch_size))
+    dataset = dataset.prefetch(prefetch_queue_capacity)
+
+    self._iterator = dataset_util.make_initializable_iterator(dataset)
+    self._static_shapes = static_shapes
+    self._batch_size = batch_size
+
+  def dequeue(self):
+    """Dequeues a batch of tensor_dict from the DatasetBatchQueue.
+
+    Returns:
+      A list of tensor_dicts of the requested batch_size.
+    """
+    return _unbatch_and_unpad(self._iterator.get_next(), self._static_shapes,
+                              self._batch_size)
+
+
+def _unbatch_and_unpad(batched_tensors, static_shapes, batch_size):
+  """Splits padded batched tensors into a list of unpadded tensor_dicts.
+
+  Args:
+    batched_tensors: dictionary of batched tensors, holding for every key of
+      static_shapes a padded tensor and, under key + rt_shape_str, the runtime
+      shapes of its unpadded elements.
+    static_shapes: dictionary mapping keys to the static shapes of the unbatched
+      tensors.
+    batch_size: batch size.
+
+  Returns:
+    A list of tensor_dicts of size batch_size.
+  """
+  # Separate input tensors from tensors containing their runtime shapes.
+  tensors = {}
+  shapes = {}
+  for key, batched_tensor in batched_tensors.items():
+    unbatched_tensor_list = tf.unstack(batched_tensor, num=batch_size)
+    for i, unbatched_tensor in enumerate(unbatched_tensor_list):
+      if rt_shape_str in key:
+        shapes[(key[:-len(rt_shape_str)], i)] = unbatched_tensor
+      else:
+        tensors[(key, i)] = unbatched_tensor
+
+  # Undo that padding using shapes and create a list of size `batch_size` that
+  # contains tensor dictionaries.
+  tensor_dict_list = []
+  for batch_id in range(batch_size):
+    tensor_dict = {}
+    for key in static_shapes:
+      tensor_dict[key] = tf.slice(tensors[(key, batch_id)],
+                                  tf.zeros_like(shapes[(key, batch_id)]),
+                                  shapes[(key, batch_id)])
+      tensor_dict[key].set_shape(static_shapes[key])
+    tensor_dict_list.append(tensor_dict)
+
+  return tensor_dict_list
@@ -154,5 +154,35 @@ class BatcherTest(tf.test.TestCase):
           sess.run(batch)
 
 
+class DatasetBatchQueueTest(tf.test.TestCase):
+
+  def test_batch_and_unpad_2d_tensors_of_different_sizes_in_all_dimensions(
+      self):
+    with self.test_session() as sess:
+      batch_size = 3
+      num_batches = 2
+      dataset = tf.data.Dataset.range(2, num_batches * batch_size + 3).map(
+          lambda i: {'image': tf.reshape(tf.range(i * i), tf.stack([i, i]))})
+      batch_queue = batcher.DatasetBatchQueue(
+          dataset, batch_size=batch_size, prefetch_queue_capacity=10)
+      batch = batch_queue.dequeue()
+
+      for tensor_dict in batch:
+        for tensor in tensor_dict.values():
+          self.assertAllEqual([None, None], tensor.get_shape().as_list())
+
+      sess.run(tf.tables_initializer())
+      i = 2
+      for _ in range(num_batches):
+        batch_np = sess.run(batch)
+        for tensor_dict in batch_np:
+          for tensor in tensor_dict.values():
+            self.assertAllEqual(tensor, np.arange(i * i).reshape((i, i)))
+            i += 1
+      # The last incomplete batch is dropped.
+      with self.assertRaises(tf.errors.OutOfRangeError):
+        sess.run(batch)
+
+
 if __name__ == '__main__':
   tf.test.main()
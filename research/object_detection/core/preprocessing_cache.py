@@ -0,0 +1,230 @@
+# Copyright 2017 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""On-disk cache of deterministic image preprocessing outputs.
+
+Evaluation preprocesses the same images (decode, resize_to_range/resize_image,
+normalize_image) for every checkpoint it evaluates. Since this preprocessing is
+deterministic, its output only depends on the image and on the preprocessing
+configuration, and can be cached across evaluations.
+
+The cache stores one .npz file per image in a subdirectory named after a hash
+of the preprocessing configuration, so that changing the configuration never
+serves stale entries. When the cache grows beyond its size limit, the least
+recently used entries are evicted.
+
+Example usage:
+  cache = preprocessing_cache.PreprocessingCache(
+      cache_dir, preprocessing_cache.config_hash(model_config),
+      max_size_bytes=10 * 2**30)
+  preprocessed_image, image_shape = preprocessing_cache.cached_preprocess(
+      cache, key, encoded_image, model.preprocess)
+"""
+import hashlib
+import logging
+import os
+import threading
+
+import numpy as np
+import tensorflow as tf
+
+_PREPROCESSED_IMAGE = 'preprocessed_image'
+_IMAGE_SHAPE = 'image_shape'
+
+
+def config_hash(*configs):
+  """Returns a hash of the protos that configure preprocessing.
+
+  Args:
+    *configs: protos, e.g. a model_pb2.DetectionModel.
+
+  Returns:
+    A hex string.
+  """
+  hasher = hashlib.sha256()
+  for config in configs:
+    hasher.update(config.SerializeToString(deterministic=True))
+  return hasher.hexdigest()[:16]
+
+
+class PreprocessingCache(object):
+  """On-disk cache of preprocessed images keyed by image key.
+
+  Keys must uniquely identify the encoded image, e.g. its sha256 hash as
+  decoded into fields.InputDataFields.key. The source_id of an image is not a
+  valid key, since it may be empty or shared across datasets.
+
+  The cache can be shared by the threads of a process, e.g. the queue runners
+  of an input pipeline.
+  """
+
+  def __init__(self, cache_dir, preprocessing_config_hash, max_size_bytes):
+    """Constructor.
+
+    Args:
+      cache_dir: directory holding the cache. Entries are stored in the
+        subdirectory preprocessing_config_hash.
+      preprocessing_config_hash: a string identifying the preprocessing
+        configuration, see config_hash.
+      max_size_bytes: the size limit of the entries for this configuration.
+
+    Raises:
+      ValueError: if max_size_bytes is not positive.
+    """
+    if max_size_bytes <= 0:
+      raise ValueError('max_size_bytes must be positive.')
+    self._cache_dir = os.path.join(cache_dir, preprocessing_config_hash)
+    if not os.path.isdir(self._cache_dir):
+      os.makedirs(self._cache_dir)
+    self._max_size_bytes = max_size_bytes
+    self._lock = threading.Lock()
+    self._size_bytes = sum(
+        os.path.getsize(path) for path in self._entry_paths())
+
+  @property
+  def size_bytes(self):
+    return self._size_bytes
+
+  def _entry_paths(self):
+    return [os.path.join(self._cache_dir, name)
+            for name in os.listdir(self._cache_dir) if name.endswith('.npz')]
+
+  def _entry_path(self, key):
+    if not isinstance(key, bytes):
+      key = key.encode('utf8')
+    return os.path.join(self._cache_dir,
+                        hashlib.sha1(key).hexdigest() + '.npz')
+
+  def lookup(self, key):
+    """Returns the cached outputs for key.
+
+    Args:
+      key: a string identifying the image.
+
+    Returns:
+      A tuple (preprocessed_image, image_shape) of numpy arrays, or None if key
+      is not cached.
+    """
+    path = self._entry_path(key)
+    try:
+      with np.load(path) as entry:
+        outputs = entry[_PREPROCESSED_IMAGE], entry[_IMAGE_SHAPE]
+      # Mark the entry as recently used for eviction.
+      os.utime(path, None)
+    except (IOError, OSError, ValueError, KeyError):
+      # Missing, concurrently evicted or partially written entries are misses.
+      return None
+    return outputs
+
+  def insert(self, key, preprocessed_image, image_shape):
+    """Caches the outputs for key and evicts entries beyond the size limit.
+
+    Args:
+      key: a string identifying the image.
+      preprocessed_image: a numpy array holding the preprocessed image.
+      image_shape: a numpy array holding the shape of the original image.
+    """
+    path = self._entry_path(key)
+    tmp_path = '{}.{}.tmp'.format(path, threading.current_thread().ident)
+    with open(tmp_path, 'wb') as fid:
+      np.savez(fid, **{_PREPROCESSED_IMAGE: preprocessed_image,
+                       _IMAGE_SHAPE: image_shape})
+    with self._lock:
+      previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+      os.rename(tmp_path, path)
+      self._size_bytes += os.path.getsize(path) - previous_size
+      if self._size_bytes > self._max_size_bytes:
+        self._evict()
+
+  def _evict(self):
+    """Removes least recently used entries until the cache fits its limit."""
+    entries = []
+    for path in self._entry_paths():
+      try:
+        stat = os.stat(path)
+      except OSError:
+        continue
+      entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort()
+    self._size_bytes = sum(size for _, size, _ in entries)
+    num_evicted = 0
+    for _, size, path in entries:
+      if self._size_bytes <= self._max_size_bytes:
+        break
+      os.remove(path)
+      self._size_bytes -= size
+      num_evicted += 1
+    logging.info('Evicted %d entries from preprocessing cache %s.',
+                 num_evicted, self._cache_dir)
+
+
+def cached_preprocess(cache, key, encoded_image, preprocess_fn):
+  """Decodes and preprocesses an image unless its outputs are cached.
+
+  The image is only decoded and preprocessed if key is not in the cache, in
+  which case the outputs are added to it. Images with an empty key are always
+  decoded and preprocessed, and never cached.
+
+  Args:
+    cache: a PreprocessingCache.
+    key: a string tensor uniquely identifying the encoded image, e.g.
+      fields.InputDataFields.key.
+    encoded_image: a string tensor holding the encoded image.
+    preprocess_fn: a deterministic function mapping a [1, height, width, 3]
+      float32 image to a float32 preprocessed image, e.g.
+      DetectionModel.preprocess.
+
+  Returns:
+    preprocessed_image: the output of preprocess_fn.
+    image_shape: a [4] int32 tensor holding the shape of the decoded image.
+  """
+  def lookup(key):
+    outputs = cache.lookup(key) if key else None
+    if outputs is None:
+      return (False, np.zeros([0, 0, 0, 0], dtype=np.float32),
+              np.zeros([4], dtype=np.int32))
+    preprocessed_image, image_shape = outputs
+    return (True, preprocessed_image.astype(np.float32),
+            image_shape.astype(np.int32))
+
+  def insert(key, preprocessed_image, image_shape):
+    if key:
+      cache.insert(key, preprocessed_image, image_shape)
+    return True
+
+  is_cached, cached_image, cached_image_shape = tf.py_func(
+      lookup, [key], [tf.bool, tf.float32, tf.int32], stateful=True)
+  is_cached.set_shape([])
+
+  static_shapes = {}
+
+  def decode_and_preprocess():
+    image = tf.image.decode_image(encoded_image, channels=3)
+    image.set_shape([None, None, 3])
+    image = tf.expand_dims(image, 0)
+    preprocessed_image = preprocess_fn(tf.to_float(image))
+    static_shapes[_PREPROCESSED_IMAGE] = preprocessed_image.get_shape()
+    image_shape = tf.shape(image)
+    inserted = tf.py_func(insert, [key, preprocessed_image, image_shape],
+                          tf.bool, stateful=True)
+    with tf.control_dependencies([inserted]):
+      return tf.identity(preprocessed_image), tf.identity(image_shape)
+
+  preprocessed_image, image_shape = tf.cond(
+      is_cached, lambda: (cached_image, cached_image_shape),
+      decode_and_preprocess)
+  preprocessed_image.set_shape(static_shapes[_PREPROCESSED_IMAGE])
+  image_shape.set_shape([4])
+  return preprocessed_image, image_shape
@@ -0,0 +1,132 @@
+# Copyright 2017 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for object_detection.core.preprocessing_cache."""
+import os
+import tempfile
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from object_detection.core import preprocessing_cache
+
+
+class PreprocessingCacheTest(tf.test.TestCase):
+
+  def setUp(self):
+    self._cache_dir = tempfile.mkdtemp(dir=self.get_temp_dir())
+
+  def test_lookup_returns_inserted_outputs(self):
+    cache = preprocessing_cache.PreprocessingCache(self._cache_dir, 'config',
+                                                   max_size_bytes=2**20)
+    self.assertIsNone(cache.lookup('image1'))
+    image = np.arange(12, dtype=np.float32).reshape([1, 2, 2, 3])
+    cache.insert('image1', image, np.array([1, 4, 4, 3]))
+
+    preprocessed_image, image_shape = cache.lookup('image1')
+    self.assertAllEqual(preprocessed_image, image)
+    self.assertAllEqual(image_shape, [1, 4, 4, 3])
+    self.assertIsNone(cache.lookup('image2'))
+
+  def test_entries_persist_per_config(self):
+    cache = preprocessing_cache.PreprocessingCache(self._cache_dir, 'config',
+                                                   max_size_bytes=2**20)
+    cache.insert('image1', np.zeros([1, 2, 2, 3]), np.array([1, 2, 2, 3]))
+
+    reopened_cache = preprocessing_cache.PreprocessingCache(
+        self._cache_dir, 'config', max_size_bytes=2**20)
+    self.assertEqual(reopened_cache.size_bytes, cache.size_bytes)
+    self.assertIsNotNone(reopened_cache.lookup('image1'))
+    other_config_cache = preprocessing_cache.PreprocessingCache(
+        self._cache_dir, 'other_config', max_size_bytes=2**20)
+    self.assertIsNone(other_config_cache.lookup('image1'))
+
+  def test_evicts_least_recently_used_entries(self):
+    image = np.zeros([1, 16, 16, 3], dtype=np.float32)
+    image_shape = np.array([1, 16, 16, 3])
+    cache = preprocessing_cache.PreprocessingCache(self._cache_dir, 'config',
+                                                   max_size_bytes=2**20)
+    cache.insert('image1', image, image_shape)
+    entry_size = cache.size_bytes
+
+    cache = preprocessing_cache.PreprocessingCache(
+        self._cache_dir, 'config', max_size_bytes=2 * entry_size)
+    cache.insert('image2', image, image_shape)
+    # Make sure that the entries have distinct access times.
+    now = time.time()
+    for key, age in [('image1', 10), ('image2', 20)]:
+      os.utime(cache._entry_path(key), (now - age, now - age))
+    cache.insert('image3', image, image_shape)
+
+    self.assertIsNotNone(cache.lookup('image1'))
+    self.assertIsNone(cache.lookup('image2'))
+    self.assertIsNotNone(cache.lookup('image3'))
+    self.assertEqual(cache.size_bytes, 2 * entry_size)
+
+  def test_config_hash_depends_on_config(self):
+    config1 = tf.train.Example()
+    config2 = tf.train.Example()
+    config2.features.feature['resizer'].int64_list.value.append(300)
+    self.assertEqual(preprocessing_cache.config_hash(config1),
+                     preprocessing_cache.config_hash(tf.train.Example()))
+    self.assertNotEqual(preprocessing_cache.config_hash(config1),
+                        preprocessing_cache.config_hash(config2))
+
+  def test_cached_preprocess(self):
+    cache = preprocessing_cache.PreprocessingCache(self._cache_dir, 'config',
+                                                   max_size_bytes=2**20)
+    image = np.random.randint(256, size=[4, 6, 3]).astype(np.uint8)
+    key = tf.placeholder(tf.string, shape=[])
+    encoded_image = tf.placeholder(tf.string, shape=[])
+    preprocessed_image, image_shape = preprocessing_cache.cached_preprocess(
+        cache, key, encoded_image, lambda image: image / 255.0)
+
+    with self.test_session() as sess:
+      encoded_png = sess.run(tf.image.encode_png(image))
+      outputs = sess.run([preprocessed_image, image_shape],
+                         feed_dict={key: 'image1', encoded_image: encoded_png})
+      self.assertAllClose(outputs[0][0], image / 255.0)
+      self.assertAllEqual(outputs[1], [1, 4, 6, 3])
+      self.assertIsNotNone(cache.lookup('image1'))
+
+      # A cache hit does not decode the image.
+      outputs = sess.run([preprocessed_image, image_shape],
+                         feed_dict={key: 'image1', encoded_image: 'invalid'})
+      self.assertAllClose(outputs[0][0], image / 255.0)
+      self.assertAllEqual(outputs[1], [1, 4, 6, 3])
+
+  def test_cached_preprocess_bypasses_empty_key(self):
+    cache = preprocessing_cache.PreprocessingCache(self._cache_dir, 'config',
+                                                   max_size_bytes=2**20)
+    image1 = np.zeros([4, 6, 3], dtype=np.uint8)
+    image2 = np.full([2, 2, 3], 255, dtype=np.uint8)
+    key = tf.placeholder(tf.string, shape=[])
+    encoded_image = tf.placeholder(tf.string, shape=[])
+    preprocessed_image, image_shape = preprocessing_cache.cached_preprocess(
+        cache, key, encoded_image, lambda image: image / 255.0)
+
+    with self.test_session() as sess:
+      for image in [image1, image2]:
+        encoded_png = sess.run(tf.image.encode_png(image))
+        outputs = sess.run([preprocessed_image, image_shape],
+                           feed_dict={key: '', encoded_image: encoded_png})
+        self.assertAllClose(outputs[0][0], image / 255.0)
+        self.assertAllEqual(outputs[1], [1] + list(image.shape))
+      self.assertEqual(0, cache.size_bytes)
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -34,6 +34,8 @@ class InputDataFields(object):
 
   Attributes:
     image: image.
+    encoded_image: encoded image string, used instead of image when the
+      decoder is asked not to decode images.
     original_image: image in the original input size.
     key: unique key corresponding to image.
     source_id: source of the original image.
@@ -59,6 +61,7 @@ class InputDataFields(object):
     groundtruth_label_scores: groundtruth label scores.
   """
   image = 'image'
+  encoded_image = 'encoded_image'
   audio = 'audio'
   original_image = 'original_image'
   key = 'key'
@@ -34,7 +34,8 @@ class TfExampleDecoder(data_decoder.DataDecoder):
                load_instance_masks=False,
                label_map_proto_file=None,
                label_in_image_level_map_proto_file=None,
-               use_display_name=False):
+               use_display_name=False,
+               decode_image=True):
     """Constructor sets keys_to_features and items_to_handlers.
 
     Args:
@@ -52,6 +53,9 @@ class TfExampleDecoder(data_decoder.DataDecoder):
       use_display_name: whether or not to use the `display_name` for label
         mapping (instead of `name`).  Only used if label_map_proto_file is
         provided.
+      decode_image: whether to decode the image. If False, the encoded image
+        string is returned in fields.InputDataFields.encoded_image instead of
+        the decoded image, e.g. to decode it only when it is actually needed.
     """
     self.keys_to_features = {
         'image/encoded':
@@ -130,6 +134,10 @@ class TfExampleDecoder(data_decoder.DataDecoder):
         fields.InputDataFields.groundtruth_group_of: (
             slim_example_decoder.Tensor('image/object/group_of'))
     }
+    if not decode_image:
+      del self.items_to_handlers[fields.InputDataFields.image]
+      self.items_to_handlers[fields.InputDataFields.encoded_image] = (
+          slim_example_decoder.Tensor('image/encoded'))
     if load_instance_masks:
       self.keys_to_features['image/object/mask'] = tf.VarLenFeature(tf.float32)
       self.items_to_handlers[
@@ -158,7 +166,8 @@ class TfExampleDecoder(data_decoder.DataDecoder):
     Returns:
       A dictionary of the following tensors.
       fields.InputDataFields.image - 3D uint8 tensor of shape [None, None, 3]
-        containing image.
+        containing image. Replaced by fields.InputDataFields.encoded_image, a
+        string tensor holding the encoded image, if decode_image is False.
       fields.InputDataFields.source_id - string tensor containing original
         image id.
       fields.InputDataFields.key - string tensor with unique sha256 hash key.
@@ -188,7 +197,8 @@ class TfExampleDecoder(data_decoder.DataDecoder):
     tensor_dict = dict(zip(keys, tensors))
     is_crowd = fields.InputDataFields.groundtruth_is_crowd
     tensor_dict[is_crowd] = tf.cast(tensor_dict[is_crowd], dtype=tf.bool)
-    tensor_dict[fields.InputDataFields.image].set_shape([None, None, 3])
+    if fields.InputDataFields.image in tensor_dict:
+      tensor_dict[fields.InputDataFields.image].set_shape([None, None, 3])
     #tensor_dict[fields.InputDataFields.audio].set_shape([None, None, 3])
     return tensor_dict
 
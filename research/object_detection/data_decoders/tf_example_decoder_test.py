@@ -77,6 +77,26 @@ class TfExampleDecoderTest(tf.test.TestCase):
     self.assertAllEqual(decoded_jpeg, tensor_dict[fields.InputDataFields.image])
     self.assertEqual('image_id', tensor_dict[fields.InputDataFields.source_id])
 
+  def testDecodeWithoutDecodingImage(self):
+    image_tensor = np.random.randint(255, size=(4, 5, 3)).astype(np.uint8)
+    encoded_jpeg = self._EncodeImage(image_tensor)
+    example = tf.train.Example(features=tf.train.Features(feature={
+        'image/encoded': self._BytesFeature(encoded_jpeg),
+        'image/format': self._BytesFeature('jpeg'),
+        'image/source_id': self._BytesFeature('image_id'),
+    })).SerializeToString()
+
+    example_decoder = tf_example_decoder.TfExampleDecoder(decode_image=False)
+    tensor_dict = example_decoder.decode(tf.convert_to_tensor(example))
+
+    self.assertFalse(fields.InputDataFields.image in tensor_dict)
+    with self.test_session() as sess:
+      tensor_dict = sess.run(tensor_dict)
+
+    self.assertEqual(encoded_jpeg,
+                     tensor_dict[fields.InputDataFields.encoded_image])
+    self.assertEqual('image_id', tensor_dict[fields.InputDataFields.source_id])
+
   def testDecodeImageKeyAndFilename(self):
     image_tensor = np.random.randint(255, size=(4, 5, 3)).astype(np.uint8)
     encoded_jpeg = self._EncodeImage(image_tensor)
@@ -30,12 +30,17 @@ Example usage:
     python object_detection/dataset_tools/create_kitti_tf_record.py \
         --data_dir=/home/user/kitti \
         --output_path=/home/user/kitti.record
+
+With --num_shards larger than 1 each output is written to
+<output_path>_<split>.tfrecord-<shard>-of-<num_shards>, and --num_workers
+processes convert the shards in parallel. An interrupted conversion can be
+continued with --resume.
 """
 from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-
+import functools
 import hashlib
 import io
 import os
@@ -44,6 +49,7 @@ import numpy as np
 import PIL.Image as pil
 import tensorflow as tf
 
+from object_detection.dataset_tools import parallel_tfrecord_creation
 from object_detection.utils import dataset_util
 from object_detection.utils import label_map_util
 from object_detection.utils.np_box_ops import iou
@@ -66,11 +72,18 @@ tf.app.flags.DEFINE_string('label_map_path', 'data/kitti_label_map.pbtxt',
                            'Path to label map proto.')
 tf.app.flags.DEFINE_integer('validation_set_size', '500', 'Number of images to'
                             'be used as a validation set.')
+tf.app.flags.DEFINE_integer('num_shards', 1, 'Number of shards of each output '
+                            'TFRecord.')
+tf.app.flags.DEFINE_integer('num_workers', 1, 'Number of processes converting '
+                            'shards.')
+tf.app.flags.DEFINE_boolean('resume', False, 'Whether to skip the shards '
+                            'completed by a previous, interrupted run.')
 FLAGS = tf.app.flags.FLAGS
 
 
 def convert_kitti_to_tfrecords(data_dir, output_path, classes_to_use,
-                               label_map_path, validation_set_size):
+                               label_map_path, validation_set_size,
+                               num_shards=1, num_workers=1, resume=False):
   """Convert the KITTI detection dataset to TFRecords.
 
   Args:
@@ -90,10 +103,12 @@ def convert_kitti_to_tfrecords(data_dir, output_path, classes_to_use,
     validation_set_size: How many images should be left as the validation set.
       (Ffirst `validation_set_size` examples are selected to be in the
       validation set).
+    num_shards: Number of shards of each output TFRecord, see
+      parallel_tfrecord_creation.get_sharded_output_paths.
+    num_workers: Number of processes converting shards.
+    resume: Whether to skip the shards completed by a previous run.
   """
   label_map_dict = label_map_util.get_label_map_dict(label_map_path)
-  train_count = 0
-  val_count = 0
 
   annotation_dir = os.path.join(data_dir,
                                 'training',
@@ -104,35 +119,58 @@ def convert_kitti_to_tfrecords(data_dir, output_path, classes_to_use,
                            'training',
                            'image_2')
 
-  train_writer = tf.python_io.TFRecordWriter('%s_train.tfrecord'%
-                                             output_path)
-  val_writer = tf.python_io.TFRecordWriter('%s_val.tfrecord'%
-                                           output_path)
-
+  train_images = []
+  val_images = []
   images = sorted(tf.gfile.ListDirectory(image_dir))
   for img_name in images:
     img_num = int(img_name.split('.')[0])
     is_validation_img = img_num < validation_set_size
-    img_anno = read_annotation_file(os.path.join(annotation_dir,
-                                                 str(img_num).zfill(6)+'.txt'))
+    if is_validation_img:
+      val_images.append(img_name)
+    else:
+      train_images.append(img_name)
+
+  image_to_tf_example_fn = functools.partial(
+      image_to_tf_example,
+      annotation_dir=annotation_dir,
+      image_dir=image_dir,
+      classes_to_use=classes_to_use,
+      label_map_dict=label_map_dict)
+  for split_images, split_output_path in [
+      (train_images, '%s_train.tfrecord' % output_path),
+      (val_images, '%s_val.tfrecord' % output_path)]:
+    parallel_tfrecord_creation.create_sharded_tfrecords(
+        split_output_path, split_images, image_to_tf_example_fn,
+        num_shards=num_shards, num_workers=num_workers, resume=resume)
+
+
+def image_to_tf_example(img_name, annotation_dir, image_dir, classes_to_use,
+                        label_map_dict):
+  """Reads the annotations of a KITTI image and converts them to a tf.Example.
 
-    image_path = os.path.join(image_dir, img_name)
+  Args:
+    img_name: File name of the image, e.g. "000042.png".
+    annotation_dir: Directory holding the annotation text files.
+    image_dir: Directory holding the images.
+    classes_to_use: List of strings naming the classes for which data should be
+      converted, see convert_kitti_to_tfrecords.
+    label_map_dict: A map from string label names to integers ids.
 
-    # Filter all bounding boxes of this frame that are of a legal class, and
-    # don't overlap with a dontcare region.
-    # TODO(talremez) filter out targets that are truncated or heavily occluded.
-    annotation_for_image = filter_annotations(img_anno, classes_to_use)
+  Returns:
+    example: The converted tf.Example.
+  """
+  img_num = int(img_name.split('.')[0])
+  img_anno = read_annotation_file(os.path.join(annotation_dir,
+                                               str(img_num).zfill(6)+'.txt'))
 
-    example = prepare_example(image_path, annotation_for_image, label_map_dict)
-    if is_validation_img:
-      val_writer.write(example.SerializeToString())
-      val_count += 1
-    else:
-      train_writer.write(example.SerializeToString())
-      train_count += 1
+  image_path = os.path.join(image_dir, img_name)
+
+  # Filter all bounding boxes of this frame that are of a legal class, and
+  # don't overlap with a dontcare region.
+  # TODO(talremez) filter out targets that are truncated or heavily occluded.
+  annotation_for_image = filter_annotations(img_anno, classes_to_use)
 
-  train_writer.close()
-  val_writer.close()
+  return prepare_example(image_path, annotation_for_image, label_map_dict)
 
 
 def prepare_example(image_path, annotations, label_map_dict):
@@ -304,7 +342,10 @@ def main(_):
       output_path=FLAGS.output_path,
       classes_to_use=FLAGS.classes_to_use,
       label_map_path=FLAGS.label_map_path,
-      validation_set_size=FLAGS.validation_set_size)
+      validation_set_size=FLAGS.validation_set_size,
+      num_shards=FLAGS.num_shards,
+      num_workers=FLAGS.num_workers,
+      resume=FLAGS.resume)
 
 if __name__ == '__main__':
   tf.app.run()
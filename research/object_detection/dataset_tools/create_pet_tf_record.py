@@ -24,8 +24,13 @@ Example usage:
     python object_detection/dataset_tools/create_pet_tf_record.py \
         --data_dir=/home/user/pet \
         --output_dir=/home/user/pet/output
+
+With --num_shards larger than 1 each output is written to
+<output_path>-<shard>-of-<num_shards>, and --num_workers processes convert the
+shards in parallel. An interrupted conversion can be continued with --resume.
 """
 
+import functools
 import hashlib
 import io
 import logging
@@ -38,6 +43,7 @@ import numpy as np
 import PIL.Image
 import tensorflow as tf
 
+from object_detection.dataset_tools import parallel_tfrecord_creation
 from object_detection.utils import dataset_util
 from object_detection.utils import label_map_util
 
@@ -50,6 +56,11 @@ flags.DEFINE_boolean('faces_only', True, 'If True, generates bounding boxes '
                      'for pet faces.  Otherwise generates bounding boxes (as '
                      'well as segmentations for full pet bodies).  Note that '
                      'in the latter case, the resulting files are much larger.')
+flags.DEFINE_integer('num_shards', 1, 'Number of shards of each output '
+                     'TFRecord.')
+flags.DEFINE_integer('num_workers', 1, 'Number of processes converting shards.')
+flags.DEFINE_boolean('resume', False, 'Whether to skip the shards completed by '
+                     'a previous, interrupted run.')
 FLAGS = flags.FLAGS
 
 
@@ -191,12 +202,53 @@ def dict_to_tf_example(data,
   return example
 
 
+def annotation_to_tf_example(example,
+                             label_map_dict,
+                             annotations_dir,
+                             image_dir,
+                             faces_only=True):
+  """Reads the annotations of an example and converts them to a tf.Example.
+
+  Args:
+    example: Name of the example, e.g. "american_pit_bull_terrier_105".
+    label_map_dict: The label map dictionary.
+    annotations_dir: Directory where annotation files are stored.
+    image_dir: Directory where image files are stored.
+    faces_only: If True, generates bounding boxes for pet faces.  Otherwise
+      generates bounding boxes (as well as segmentations for full pet bodies).
+
+  Returns:
+    The converted tf.Example, or None if the annotations are missing or
+    invalid.
+  """
+  xml_path = os.path.join(annotations_dir, 'xmls', example + '.xml')
+  mask_path = os.path.join(annotations_dir, 'trimaps', example + '.png')
+
+  if not os.path.exists(xml_path):
+    logging.warning('Could not find %s, ignoring example.', xml_path)
+    return None
+  with tf.gfile.GFile(xml_path, 'r') as fid:
+    xml_str = fid.read()
+  xml = etree.fromstring(xml_str)
+  data = dataset_util.recursive_parse_xml_to_dict(xml)['annotation']
+
+  try:
+    return dict_to_tf_example(
+        data, mask_path, label_map_dict, image_dir, faces_only=faces_only)
+  except ValueError:
+    logging.warning('Invalid example: %s, ignoring.', xml_path)
+    return None
+
+
 def create_tf_record(output_filename,
                      label_map_dict,
                      annotations_dir,
                      image_dir,
                      examples,
-                     faces_only=True):
+                     faces_only=True,
+                     num_shards=1,
+                     num_workers=1,
+                     resume=False):
   """Creates a TFRecord file from examples.
 
   Args:
@@ -207,30 +259,22 @@ def create_tf_record(output_filename,
     examples: Examples to parse and save to tf record.
     faces_only: If True, generates bounding boxes for pet faces.  Otherwise
       generates bounding boxes (as well as segmentations for full pet bodies).
+    num_shards: Number of output shards, see
+      parallel_tfrecord_creation.get_sharded_output_paths.
+    num_workers: Number of processes converting shards.
+    resume: Whether to skip the shards completed by a previous run.
   """
-  writer = tf.python_io.TFRecordWriter(output_filename)
-  for idx, example in enumerate(examples):
-    if idx % 100 == 0:
-      logging.info('On image %d of %d', idx, len(examples))
-    xml_path = os.path.join(annotations_dir, 'xmls', example + '.xml')
-    mask_path = os.path.join(annotations_dir, 'trimaps', example + '.png')
-
-    if not os.path.exists(xml_path):
-      logging.warning('Could not find %s, ignoring example.', xml_path)
-      continue
-    with tf.gfile.GFile(xml_path, 'r') as fid:
-      xml_str = fid.read()
-    xml = etree.fromstring(xml_str)
-    data = dataset_util.recursive_parse_xml_to_dict(xml)['annotation']
-
-    try:
-      tf_example = dict_to_tf_example(
-          data, mask_path, label_map_dict, image_dir, faces_only=faces_only)
-      writer.write(tf_example.SerializeToString())
-    except ValueError:
-      logging.warning('Invalid example: %s, ignoring.', xml_path)
-
-  writer.close()
+  parallel_tfrecord_creation.create_sharded_tfrecords(
+      output_filename, examples,
+      functools.partial(
+          annotation_to_tf_example,
+          label_map_dict=label_map_dict,
+          annotations_dir=annotations_dir,
+          image_dir=image_dir,
+          faces_only=faces_only),
+      num_shards=num_shards,
+      num_workers=num_workers,
+      resume=resume)
 
 
 # TODO(derekjchow): Add test for pet/PASCAL main files.
@@ -263,9 +307,13 @@ def main(_):
     val_output_path = os.path.join(FLAGS.output_dir,
                                    'pet_val_with_masks.record')
   create_tf_record(train_output_path, label_map_dict, annotations_dir,
-                   image_dir, train_examples, faces_only=FLAGS.faces_only)
+                   image_dir, train_examples, faces_only=FLAGS.faces_only,
+                   num_shards=FLAGS.num_shards, num_workers=FLAGS.num_workers,
+                   resume=FLAGS.resume)
   create_tf_record(val_output_path, label_map_dict, annotations_dir,
-                   image_dir, val_examples, faces_only=FLAGS.faces_only)
+                   image_dir, val_examples, faces_only=FLAGS.faces_only,
+                   num_shards=FLAGS.num_shards, num_workers=FLAGS.num_workers,
+                   resume=FLAGS.resume)
 
 
 if __name__ == '__main__':
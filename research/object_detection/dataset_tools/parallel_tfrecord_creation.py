@@ -0,0 +1,201 @@
+# Copyright 2017 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+r"""Utilities for converting datasets to sharded TFRecords with worker processes.
+
+The examples of a dataset (e.g. annotation file names) are assigned to output
+shards deterministically: example k is written to shard k % num_shards. Each
+shard is converted by a single worker and written to a temporary file that is
+renamed once the shard is complete. Completed shards are recorded in a
+manifest next to the output, so that an interrupted conversion can be resumed
+without converting them again.
+
+Example usage:
+  def create_tf_example(annotation_path, label_map_dict):
+    ...
+    return tf_example
+
+  parallel_tfrecord_creation.create_sharded_tfrecords(
+      '/path/to/output.record', annotation_paths,
+      functools.partial(create_tf_example, label_map_dict=label_map_dict),
+      num_shards=10, num_workers=8)
+
+create_tf_example_fn is called in the worker processes, so it has to be
+picklable, e.g. a module level function or a functools.partial of one.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import hashlib
+import json
+import logging
+import multiprocessing
+
+from six.moves import xrange
+import tensorflow as tf
+
+
+def get_sharded_output_paths(base_path, num_shards):
+  """Returns the output paths of the shards of a TFRecord.
+
+  Args:
+    base_path: The base path for all shards.
+    num_shards: The number of shards.
+
+  Returns:
+    A list with the path of shard k at position k. A single shard is written to
+    base_path itself, multiple shards to <base_path>-<k>-of-<num_shards>.
+  """
+  if num_shards == 1:
+    return [base_path]
+  return [
+      '{}-{:05d}-of-{:05d}'.format(base_path, idx, num_shards)
+      for idx in xrange(num_shards)
+  ]
+
+
+def _fingerprint(examples, num_shards):
+  """Returns a fingerprint of the shard assignment of examples."""
+  hasher = hashlib.sha256()
+  hasher.update(str(num_shards).encode('utf8'))
+  for example in examples:
+    hasher.update(repr(example).encode('utf8'))
+  return hasher.hexdigest()
+
+
+def _read_manifest(manifest_path):
+  if not tf.gfile.Exists(manifest_path):
+    return None
+  with tf.gfile.GFile(manifest_path, 'r') as fid:
+    return json.load(fid)
+
+
+def _write_manifest(manifest_path, manifest):
+  """Writes the manifest to a temporary file and renames it atomically."""
+  tmp_manifest_path = manifest_path + '.tmp'
+  with tf.gfile.GFile(tmp_manifest_path, 'w') as fid:
+    json.dump(manifest, fid, sort_keys=True)
+  tf.gfile.Rename(tmp_manifest_path, manifest_path, overwrite=True)
+
+
+def _write_shard(shard_task):
+  """Converts the examples of a shard and writes them to its TFRecord.
+
+  Args:
+    shard_task: A tuple (shard_idx, create_tf_example_fn, examples,
+      output_path).
+
+  Returns:
+    A tuple (shard_idx, number of written examples).
+  """
+  shard_idx, create_tf_example_fn, examples, output_path = shard_task
+  tmp_output_path = output_path + '.tmp'
+  num_written = 0
+  with tf.python_io.TFRecordWriter(tmp_output_path) as writer:
+    for example in examples:
+      tf_example = create_tf_example_fn(example)
+      if tf_example is None:
+        continue
+      writer.write(tf_example.SerializeToString())
+      num_written += 1
+  tf.gfile.Rename(tmp_output_path, output_path, overwrite=True)
+  return shard_idx, num_written
+
+
+def create_sharded_tfrecords(base_path,
+                             examples,
+                             create_tf_example_fn,
+                             num_shards=1,
+                             num_workers=1,
+                             resume=False):
+  """Converts examples to TF Examples and writes them to sharded TFRecords.
+
+  Args:
+    base_path: The base path for all shards, see get_sharded_output_paths. The
+      manifest is written to <base_path>.manifest.
+    examples: A list of examples, e.g. annotation file names, that identify the
+      records to write.
+    create_tf_example_fn: A picklable function that takes an example and
+      returns a tf.train.Example, or None if the example should be skipped.
+    num_shards: The number of output shards.
+    num_workers: The number of worker processes. With a single worker the
+      shards are converted in the calling process.
+    resume: If True, shards recorded as completed in the manifest of a previous
+      conversion of the same examples into the same number of shards are not
+      converted again. The manifest does not record the arguments bound in
+      create_tf_example_fn, so they must be unchanged as well.
+
+  Returns:
+    The number of TF Examples in all shards.
+
+  Raises:
+    ValueError: If num_shards or num_workers is smaller than 1.
+  """
+  if num_shards < 1:
+    raise ValueError('num_shards must be at least 1.')
+  if num_workers < 1:
+    raise ValueError('num_workers must be at least 1.')
+
+  examples = list(examples)
+  output_paths = get_sharded_output_paths(base_path, num_shards)
+  manifest_path = base_path + '.manifest'
+  fingerprint = _fingerprint(examples, num_shards)
+
+  completed_shards = {}
+  if resume:
+    manifest = _read_manifest(manifest_path)
+    if manifest and manifest['fingerprint'] == fingerprint:
+      for shard_idx, num_written in manifest['completed_shards'].items():
+        if tf.gfile.Exists(output_paths[int(shard_idx)]):
+          completed_shards[int(shard_idx)] = num_written
+      logging.info('Resuming conversion, %d of %d shards are complete.',
+                   len(completed_shards), num_shards)
+    elif manifest:
+      logging.warning('Ignoring manifest %s of a different conversion.',
+                      manifest_path)
+
+  shard_tasks = [
+      (shard_idx, create_tf_example_fn, examples[shard_idx::num_shards],
+       output_paths[shard_idx])
+      for shard_idx in xrange(num_shards) if shard_idx not in completed_shards
+  ]
+
+  def record_completed_shard(shard_idx, num_written):
+    completed_shards[shard_idx] = num_written
+    _write_manifest(manifest_path, {
+        'fingerprint': fingerprint,
+        'num_shards': num_shards,
+        'completed_shards': completed_shards,
+    })
+    logging.info('Wrote %d examples to %s (%d of %d shards complete).',
+                 num_written, output_paths[shard_idx], len(completed_shards),
+                 num_shards)
+
+  if num_workers > 1 and len(shard_tasks) > 1:
+    pool = multiprocessing.Pool(min(num_workers, len(shard_tasks)))
+    try:
+      for shard_idx, num_written in pool.imap_unordered(_write_shard,
+                                                        shard_tasks):
+        record_completed_shard(shard_idx, num_written)
+    finally:
+      # All results have been consumed unless an error occurred, in which case
+      # the remaining shards are abandoned.
+      pool.terminate()
+      pool.join()
+  else:
+    for shard_task in shard_tasks:
+      record_completed_shard(*_write_shard(shard_task))
+
+  return sum(completed_shards.values())
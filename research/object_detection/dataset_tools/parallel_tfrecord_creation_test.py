@@ -0,0 +1,106 @@
+# Copyright 2017 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for parallel_tfrecord_creation.py."""
+
+import os
+
+import tensorflow as tf
+
+from object_detection.dataset_tools import parallel_tfrecord_creation
+from object_detection.utils import dataset_util
+
+
+def create_tf_example(example):
+  if example % 5 == 4:
+    return None
+  return tf.train.Example(features=tf.train.Features(feature={
+      'value': dataset_util.int64_feature(example),
+  }))
+
+
+def create_tf_example_or_fail(example):
+  raise AssertionError('Example {} should not be converted.'.format(example))
+
+
+def read_values(tf_record_path):
+  return [
+      tf.train.Example.FromString(record).features.feature['value']
+      .int64_list.value[0]
+      for record in tf.python_io.tf_record_iterator(tf_record_path)
+  ]
+
+
+class CreateShardedTfrecordsTest(tf.test.TestCase):
+
+  def _base_path(self, name):
+    return os.path.join(self.get_temp_dir(), name)
+
+  def test_single_shard_is_written_to_base_path(self):
+    base_path = self._base_path('single.record')
+    num_written = parallel_tfrecord_creation.create_sharded_tfrecords(
+        base_path, range(10), create_tf_example)
+    self.assertEqual(num_written, 8)
+    self.assertAllEqual(read_values(base_path), [0, 1, 2, 3, 5, 6, 7, 8])
+
+  def test_deterministic_shard_assignment(self):
+    for num_workers in [1, 3]:
+      base_path = self._base_path('sharded{}.record'.format(num_workers))
+      num_written = parallel_tfrecord_creation.create_sharded_tfrecords(
+          base_path, range(10), create_tf_example, num_shards=3,
+          num_workers=num_workers)
+      self.assertEqual(num_written, 8)
+      output_paths = parallel_tfrecord_creation.get_sharded_output_paths(
+          base_path, 3)
+      self.assertEqual(output_paths[2], base_path + '-00002-of-00003')
+      self.assertAllEqual(read_values(output_paths[0]), [0, 3, 6])
+      self.assertAllEqual(read_values(output_paths[1]), [1, 7])
+      self.assertAllEqual(read_values(output_paths[2]), [2, 5, 8])
+
+  def test_resume_skips_completed_shards(self):
+    base_path = self._base_path('resume.record')
+    parallel_tfrecord_creation.create_sharded_tfrecords(
+        base_path, range(10), create_tf_example, num_shards=2)
+    output_paths = parallel_tfrecord_creation.get_sharded_output_paths(
+        base_path, 2)
+
+    tf.gfile.Remove(output_paths[1])
+    num_written = parallel_tfrecord_creation.create_sharded_tfrecords(
+        base_path, range(10), create_tf_example, num_shards=2, resume=True)
+    self.assertEqual(num_written, 8)
+    self.assertAllEqual(read_values(output_paths[1]), [1, 3, 5, 7])
+
+    num_written = parallel_tfrecord_creation.create_sharded_tfrecords(
+        base_path, range(10), create_tf_example_or_fail, num_shards=2,
+        resume=True)
+    self.assertEqual(num_written, 8)
+
+  def test_resume_ignores_manifest_of_different_examples(self):
+    base_path = self._base_path('changed.record')
+    parallel_tfrecord_creation.create_sharded_tfrecords(
+        base_path, range(10), create_tf_example)
+    num_written = parallel_tfrecord_creation.create_sharded_tfrecords(
+        base_path, range(3), create_tf_example, resume=True)
+    self.assertEqual(num_written, 3)
+    self.assertAllEqual(read_values(base_path), [0, 1, 2])
+
+  def test_raises_error_with_invalid_num_shards(self):
+    with self.assertRaises(ValueError):
+      parallel_tfrecord_creation.create_sharded_tfrecords(
+          self._base_path('invalid.record'), range(10), create_tf_example,
+          num_shards=0)
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -50,6 +50,7 @@ import tensorflow as tf
 from object_detection import evaluator
 from object_detection.builders import input_reader_builder
 from object_detection.builders import model_builder
+from object_detection.core import preprocessing_cache as preprocessing_cache_lib
 from object_detection.utils import config_util
 from object_detection.utils import label_map_util
 
@@ -113,9 +114,17 @@ def main(unused_argv):
       model_config=model_config,
       is_training=False)
 
+  preprocessing_cache = None
+  if eval_config.preprocessing_cache_dir:
+    preprocessing_cache = preprocessing_cache_lib.PreprocessingCache(
+        eval_config.preprocessing_cache_dir,
+        preprocessing_cache_lib.config_hash(model_config),
+        eval_config.preprocessing_cache_max_bytes)
+
   create_input_dict_fn = functools.partial(
       input_reader_builder.build,
-      input_config)
+      input_config,
+      decode_image=preprocessing_cache is None)
 
   label_map = label_map_util.load_labelmap(input_config.label_map_path)
   max_num_classes = max([item.id for item in label_map.item])
@@ -126,7 +135,8 @@ def main(unused_argv):
     eval_config.max_evals = 1
 
   evaluator.evaluate(create_input_dict_fn, model_fn, eval_config, categories,
-                     FLAGS.checkpoint_dir, FLAGS.eval_dir)
+                     FLAGS.checkpoint_dir, FLAGS.eval_dir,
+                     preprocessing_cache=preprocessing_cache)
 
 
 if __name__ == '__main__':
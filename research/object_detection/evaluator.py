@@ -23,6 +23,7 @@ import tensorflow as tf
 
 from object_detection import eval_util
 from object_detection.core import prefetcher
+from object_detection.core import preprocessing_cache as preprocessing_cache_lib
 from object_detection.core import standard_fields as fields
 from object_detection.utils import object_detection_evaluation
 
@@ -41,13 +42,22 @@ EVAL_METRICS_CLASS_DICT = {
 
 def _extract_prediction_tensors(model,
                                 create_input_dict_fn,
-                                ignore_groundtruth=False):
+                                ignore_groundtruth=False,
+                                preprocessing_cache=None,
+                                decode_original_image=True):
   """Restores the model in a tensorflow session.
 
   Args:
     model: model to perform predictions with.
     create_input_dict_fn: function to create input tensor dictionaries.
     ignore_groundtruth: whether groundtruth should be ignored.
+    preprocessing_cache: (optional) a preprocessing_cache.PreprocessingCache.
+      If given, create_input_dict_fn must return encoded images (see
+      input_reader_builder.build) and images are only decoded and preprocessed
+      if they are not cached yet.
+    decode_original_image: whether the original image of the result has to be
+      decoded when its preprocessed image is cached. If False, the original
+      image is replaced by zeros of the same shape.
 
   Returns:
     tensor_dict: A tensor dictionary with evaluations.
@@ -55,9 +65,24 @@ def _extract_prediction_tensors(model,
   input_dict = create_input_dict_fn()
   prefetch_queue = prefetcher.prefetch(input_dict, capacity=500)
   input_dict = prefetch_queue.dequeue()
-  original_image = tf.expand_dims(input_dict[fields.InputDataFields.image], 0)
+  if preprocessing_cache:
+    encoded_image = input_dict[fields.InputDataFields.encoded_image]
+    preprocessed_image, image_shape = (
+        preprocessing_cache_lib.cached_preprocess(
+            preprocessing_cache, input_dict[fields.InputDataFields.key],
+            encoded_image, lambda image: model.preprocess(image, False)))
+    if decode_original_image:
+      original_image = tf.expand_dims(
+          tf.image.decode_image(encoded_image, channels=3), 0)
+      original_image.set_shape([1, None, None, 3])
+    else:
+      # Only the shape of the original image is used for the evaluation.
+      original_image = tf.zeros(image_shape, dtype=tf.uint8)
+  else:
+    original_image = tf.expand_dims(
+        input_dict[fields.InputDataFields.image], 0)
+    preprocessed_image = model.preprocess(tf.to_float(original_image), False)
   original_audio = tf.expand_dims(input_dict[fields.InputDataFields.audio], 0)
-  preprocessed_image = model.preprocess(tf.to_float(original_image), False)
   preprocessed_audio = model.preprocess(tf.to_float(original_audio), True)
   prediction_dict = model.predict(preprocessed_image, preprocessed_audio)
   detections = model.postprocess(prediction_dict)
@@ -117,7 +142,7 @@ def get_evaluators(eval_config, categories):
 
 
 def evaluate(create_input_dict_fn, create_model_fn, eval_config, categories,
-             checkpoint_dir, eval_dir):
+             checkpoint_dir, eval_dir, preprocessing_cache=None):
   """Evaluation function for detection models.
 
   Args:
@@ -128,6 +153,10 @@ def evaluate(create_input_dict_fn, create_model_fn, eval_config, categories,
                 have an integer 'id' field and string 'name' field.
     checkpoint_dir: directory to load the checkpoints to evaluate from.
     eval_dir: directory to write evaluation metrics summary to.
+    preprocessing_cache: (optional) a preprocessing_cache.PreprocessingCache of
+      preprocessed images. If given, create_input_dict_fn must return encoded
+      images. Note that images are still decoded for visualization if
+      eval_config.num_visualizations is positive.
 
   Returns:
     metrics: A dictionary containing metric names and values from the latest
@@ -143,7 +172,9 @@ def evaluate(create_input_dict_fn, create_model_fn, eval_config, categories,
   tensor_dict = _extract_prediction_tensors(
       model=model,
       create_input_dict_fn=create_input_dict_fn,
-      ignore_groundtruth=eval_config.ignore_groundtruth)
+      ignore_groundtruth=eval_config.ignore_groundtruth,
+      preprocessing_cache=preprocessing_cache,
+      decode_original_image=eval_config.num_visualizations > 0)
 
   def _process_batch(tensor_dict, sess, batch_index, counters):
     """Evaluates tensors in tensor_dict, visualizing the first K examples.
@@ -15,6 +15,9 @@
 """Utility functions for detection inference."""
 from __future__ import division
 
+import threading
+import time
+
 import tensorflow as tf
 
 from object_detection.core import standard_fields
@@ -50,6 +53,27 @@ def build_input(tfrecord_paths):
   return serialized_example_tensor, image_tensor
 
 
+def _import_inference_graph(image_tensor, inference_graph_path):
+  """Imports the inference graph with image_tensor as its input.
+
+  Args:
+    image_tensor: The input images. uint8 tensor, shape=[batch, None, None, 3]
+    inference_graph_path: Path to the inference graph with embedded weights
+
+  Returns:
+    The default graph, holding the imported inference graph.
+  """
+  with tf.gfile.Open(inference_graph_path, 'r') as graph_def_file:
+    graph_content = graph_def_file.read()
+  graph_def = tf.GraphDef()
+  graph_def.MergeFromString(graph_content)
+
+  tf.import_graph_def(
+      graph_def, name='', input_map={'image_tensor': image_tensor})
+
+  return tf.get_default_graph()
+
+
 def build_inference_graph(image_tensor, inference_graph_path):
   """Loads the inference graph and connects it to the input image.
 
@@ -65,15 +89,7 @@ def build_inference_graph(image_tensor, inference_graph_path):
     detected_labels_tensor: Detected labels. Int64 tensor,
         shape=[num_detections]
   """
-  with tf.gfile.Open(inference_graph_path, 'r') as graph_def_file:
-    graph_content = graph_def_file.read()
-  graph_def = tf.GraphDef()
-  graph_def.MergeFromString(graph_content)
-
-  tf.import_graph_def(
-      graph_def, name='', input_map={'image_tensor': image_tensor})
-
-  g = tf.get_default_graph()
+  g = _import_inference_graph(image_tensor, inference_graph_path)
 
   num_detections_tensor = tf.squeeze(
       g.get_tensor_by_name('num_detections:0'), 0)
@@ -95,6 +111,100 @@ def build_inference_graph(image_tensor, inference_graph_path):
   return detected_boxes_tensor, detected_scores_tensor, detected_labels_tensor
 
 
+def build_batched_input(tfrecord_paths, batch_size, num_readers=1,
+                        num_decode_threads=4, num_prefetch_batches=2):
+  """Builds the graph's input for batched inference.
+
+  Examples are read with a tf.data pipeline, decoded in parallel and batched.
+  Images of a batch are zero padded at the bottom and right to the size of the
+  largest image in the batch; their unpadded shapes are returned so that
+  detections can be mapped back to the original images (see
+  build_batched_inference_graph). The last batch may hold fewer than
+  batch_size examples.
+
+  Args:
+    tfrecord_paths: List of paths to the input TFRecords
+    batch_size: Number of examples per batch
+    num_readers: Number of files read concurrently. With a single reader the
+        examples are produced in input order.
+    num_decode_threads: Number of examples parsed and decoded in parallel
+    num_prefetch_batches: Number of batches prepared ahead of inference
+
+  Returns:
+    serialized_examples_tensor: The next serialized examples. String tensor,
+        shape=[batch]
+    images_tensor: The decoded, zero padded images of the examples. Uint8
+        tensor, shape=[batch, None, None, 3]
+    image_shapes_tensor: The unpadded shapes of the images. Int32 tensor,
+        shape=[batch, 3]
+  """
+  def decode(serialized_example_tensor):
+    features = tf.parse_single_example(
+        serialized_example_tensor,
+        features={
+            standard_fields.TfExampleFields.image_encoded:
+                tf.FixedLenFeature([], tf.string),
+        })
+    encoded_image = features[standard_fields.TfExampleFields.image_encoded]
+    image_tensor = tf.image.decode_image(encoded_image, channels=3)
+    image_tensor.set_shape([None, None, 3])
+    return serialized_example_tensor, image_tensor, tf.shape(image_tensor)
+
+  dataset = tf.data.Dataset.from_tensor_slices(tfrecord_paths)
+  dataset = dataset.interleave(
+      tf.data.TFRecordDataset, cycle_length=num_readers, block_length=1)
+  dataset = dataset.map(decode, num_parallel_calls=num_decode_threads)
+  dataset = dataset.padded_batch(
+      batch_size, padded_shapes=([], [None, None, 3], [3]))
+  dataset = dataset.prefetch(num_prefetch_batches)
+  return dataset.make_one_shot_iterator().get_next()
+
+
+def build_batched_inference_graph(images_tensor, image_shapes_tensor,
+                                  inference_graph_path):
+  """Loads the inference graph and connects it to a batch of padded images.
+
+  The inference graph predicts boxes in coordinates normalized by the padded
+  image size. They are converted to coordinates normalized by the unpadded
+  image size. Note that the model sees the zero padding, so the detections of
+  a padded image can differ from the detections with batch size 1.
+
+  Args:
+    images_tensor: The input images. uint8 tensor, shape=[batch, None, None, 3]
+    image_shapes_tensor: The unpadded shapes of the images. int32 tensor,
+        shape=[batch, 3]
+    inference_graph_path: Path to the inference graph with embedded weights
+
+  Returns:
+    num_detections_tensor: Number of valid detections per image. Int32 tensor,
+        shape=[batch]
+    detected_boxes_tensor: Detected boxes. Float tensor,
+        shape=[batch, max_detections, 4]
+    detected_scores_tensor: Detected scores. Float tensor,
+        shape=[batch, max_detections]
+    detected_labels_tensor: Detected labels. Int64 tensor,
+        shape=[batch, max_detections]
+  """
+  g = _import_inference_graph(images_tensor, inference_graph_path)
+
+  num_detections_tensor = tf.cast(
+      g.get_tensor_by_name('num_detections:0'), tf.int32)
+
+  padded_shape = tf.to_float(tf.shape(images_tensor)[1:3])
+  image_shapes = tf.to_float(image_shapes_tensor[:, :2])
+  box_scale = tf.tile(padded_shape / image_shapes, [1, 2])
+  detected_boxes_tensor = tf.minimum(
+      g.get_tensor_by_name('detection_boxes:0') * tf.expand_dims(box_scale, 1),
+      1.0)
+
+  detected_scores_tensor = g.get_tensor_by_name('detection_scores:0')
+  detected_labels_tensor = tf.cast(
+      g.get_tensor_by_name('detection_classes:0'), tf.int64)
+
+  return (num_detections_tensor, detected_boxes_tensor, detected_scores_tensor,
+          detected_labels_tensor)
+
+
 def infer_detections_and_add_to_example(
     serialized_example_tensor, detected_boxes_tensor, detected_scores_tensor,
     detected_labels_tensor, discard_image_pixels):
@@ -112,12 +222,33 @@ def infer_detections_and_add_to_example(
   Returns:
     The de-serialized TF example augmented with the inferred detections.
   """
-  tf_example = tf.train.Example()
   (serialized_example, detected_boxes, detected_scores,
    detected_classes) = tf.get_default_session().run([
        serialized_example_tensor, detected_boxes_tensor, detected_scores_tensor,
        detected_labels_tensor
    ])
+  return add_detections_to_example(serialized_example, detected_boxes,
+                                   detected_scores, detected_classes,
+                                   discard_image_pixels)
+
+
+def add_detections_to_example(serialized_example, detected_boxes,
+                              detected_scores, detected_classes,
+                              discard_image_pixels):
+  """Adds detections to a serialized example.
+
+  Args:
+    serialized_example: Serialized TF example
+    detected_boxes: Detected boxes. Float numpy array, shape=[num_detections, 4]
+    detected_scores: Detected scores. Float numpy array,
+        shape=[num_detections]
+    detected_classes: Detected labels. Int64 numpy array,
+        shape=[num_detections]
+    discard_image_pixels: If true, discards the image from the result
+  Returns:
+    The de-serialized TF example augmented with the detections.
+  """
+  tf_example = tf.train.Example()
   detected_boxes = detected_boxes.T
 
   tf_example.ParseFromString(serialized_example)
@@ -139,3 +270,72 @@ def infer_detections_and_add_to_example(
     del feature[standard_fields.TfExampleFields.image_encoded]
 
   return tf_example
+
+
+def infer_detections_in_batches(
+    sess, serialized_examples_tensor, num_detections_tensor,
+    detected_boxes_tensor, detected_scores_tensor, detected_labels_tensor,
+    tf_record_writers, discard_image_pixels, log_every_n_batches=100):
+  """Runs batched inference concurrently and writes the augmented examples.
+
+  One thread is started per writer. Each thread repeatedly runs the batched
+  tensors in sess and writes the augmented examples of its batches to its own
+  writer, until the input is exhausted.
+
+  Args:
+    sess: The session to run the tensors in. Sessions are thread-safe, so
+        concurrent runs overlap input decoding, inference and serialization.
+    serialized_examples_tensor: Serialized TF examples. String tensor,
+        shape=[batch]
+    num_detections_tensor: Number of valid detections per example. Int32
+        tensor, shape=[batch]
+    detected_boxes_tensor: Detected boxes. Float tensor,
+        shape=[batch, max_detections, 4]
+    detected_scores_tensor: Detected scores. Float tensor,
+        shape=[batch, max_detections]
+    detected_labels_tensor: Detected labels. Int64 tensor,
+        shape=[batch, max_detections]
+    tf_record_writers: List of tf.python_io.TFRecordWriter, one per thread.
+    discard_image_pixels: If true, discards the images from the results
+    log_every_n_batches: Number of batches of the first thread between two
+        throughput reports
+
+  Returns:
+    The number of processed examples.
+  """
+  coord = tf.train.Coordinator()
+  num_examples_per_thread = [0] * len(tf_record_writers)
+  start_time = time.time()
+
+  def run_inference(thread_index):
+    tf_record_writer = tf_record_writers[thread_index]
+    num_batches = 0
+    with coord.stop_on_exception():
+      while not coord.should_stop():
+        (serialized_examples, num_detections, detected_boxes, detected_scores,
+         detected_classes) = sess.run([
+             serialized_examples_tensor, num_detections_tensor,
+             detected_boxes_tensor, detected_scores_tensor,
+             detected_labels_tensor
+         ])
+        for i, serialized_example in enumerate(serialized_examples):
+          n = num_detections[i]
+          tf_example = add_detections_to_example(
+              serialized_example, detected_boxes[i][:n],
+              detected_scores[i][:n], detected_classes[i][:n],
+              discard_image_pixels)
+          tf_record_writer.write(tf_example.SerializeToString())
+        num_examples_per_thread[thread_index] += len(serialized_examples)
+        num_batches += 1
+        if thread_index == 0 and num_batches % log_every_n_batches == 0:
+          num_examples = sum(num_examples_per_thread)
+          tf.logging.info('Processed %d images (%.1f images/sec)...',
+                          num_examples,
+                          num_examples / (time.time() - start_time))
+
+  threads = [threading.Thread(target=run_inference, args=(i,))
+             for i in range(len(tf_record_writers))]
+  for thread in threads:
+    thread.start()
+  coord.join(threads)
+  return sum(num_examples_per_thread)
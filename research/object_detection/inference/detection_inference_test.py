@@ -72,6 +72,48 @@ def create_mock_graph():
     fl.write(graph_def.SerializeToString())
 
 
+def create_mock_tfrecord_with_two_image_sizes():
+  tf_examples = []
+  for height, width in [(1, 1), (2, 4)]:
+    pil_image = Image.fromarray(
+        np.ones((height, width, 3), dtype=np.uint8), 'RGB')
+    image_output_stream = StringIO.StringIO()
+    pil_image.save(image_output_stream, format='png')
+    feature_map = {
+        standard_fields.TfExampleFields.image_encoded:
+            dataset_util.bytes_feature(image_output_stream.getvalue()),
+    }
+    tf_examples.append(
+        tf.train.Example(features=tf.train.Features(feature=feature_map)))
+  with tf.python_io.TFRecordWriter(get_mock_tfrecord_path()) as writer:
+    for tf_example in tf_examples:
+      writer.write(tf_example.SerializeToString())
+
+
+def create_mock_batched_graph():
+  g = tf.Graph()
+  with g.as_default():
+    in_image_tensor = tf.placeholder(
+        tf.uint8, shape=[None, None, None, 3], name='image_tensor')
+    batch_size = tf.shape(in_image_tensor)[0]
+    tf.fill(tf.expand_dims(batch_size, 0), 2.0, name='num_detections')
+    tf.tile(
+        tf.constant([[[0, 0, 0.5, 0.25], [0.1, 0.2, 0.8, 0.9],
+                      [0.2, 0.3, 0.4, 0.5]]]), tf.stack([batch_size, 1, 1]),
+        name='detection_boxes')
+    tf.tile(tf.constant([[0.1, 0.2, 0.3]]), tf.stack([batch_size, 1]),
+            name='detection_scores')
+    tf.identity(
+        tf.constant([[1.0, 2.0, 3.0]]) * tf.reduce_sum(
+            tf.cast(in_image_tensor, dtype=tf.float32), [1, 2, 3],
+            keep_dims=True)[:, :, 0, 0],
+        name='detection_classes')
+    graph_def = g.as_graph_def()
+
+  with tf.gfile.Open(get_mock_graph_path(), 'w') as fl:
+    fl.write(graph_def.SerializeToString())
+
+
 class InferDetectionsTests(tf.test.TestCase):
 
   def test_simple(self):
@@ -172,5 +214,75 @@ class InferDetectionsTests(tf.test.TestCase):
     """, tf_example)
 
 
+  def test_batched(self):
+    create_mock_batched_graph()
+    create_mock_tfrecord_with_two_image_sizes()
+
+    (serialized_examples_tensor, images_tensor,
+     image_shapes_tensor) = detection_inference.build_batched_input(
+         [get_mock_tfrecord_path()], batch_size=2)
+    self.assertAllEqual(images_tensor.get_shape().as_list(),
+                        [None, None, None, 3])
+
+    (num_detections_tensor, detected_boxes_tensor, detected_scores_tensor,
+     detected_labels_tensor) = detection_inference.build_batched_inference_graph(
+         images_tensor, image_shapes_tensor, get_mock_graph_path())
+
+    output_path = os.path.join(tf.test.get_temp_dir(), 'batched.tfrec')
+    with self.test_session(use_gpu=False) as sess:
+      with tf.python_io.TFRecordWriter(output_path) as writer:
+        num_examples = detection_inference.infer_detections_in_batches(
+            sess, serialized_examples_tensor, num_detections_tensor,
+            detected_boxes_tensor, detected_scores_tensor,
+            detected_labels_tensor, [writer], True)
+    self.assertEqual(num_examples, 2)
+
+    tf_examples = [tf.train.Example.FromString(record)
+                   for record in tf.python_io.tf_record_iterator(output_path)]
+    # The 1x1 image is padded to 2x4, so its boxes are rescaled and clipped.
+    self.assertProtoEquals(r"""
+        features {
+          feature {
+            key: "image/detection/bbox/ymin"
+            value { float_list { value: [0.0, 0.2] } } }
+          feature {
+            key: "image/detection/bbox/xmin"
+            value { float_list { value: [0.0, 0.8] } } }
+          feature {
+            key: "image/detection/bbox/ymax"
+            value { float_list { value: [1.0, 1.0] } } }
+          feature {
+            key: "image/detection/bbox/xmax"
+            value { float_list { value: [1.0, 1.0] } } }
+          feature {
+            key: "image/detection/label"
+            value { int64_list { value: [3, 6] } } }
+          feature {
+            key: "image/detection/score"
+            value { float_list { value: [0.1, 0.2] } } } }
+    """, tf_examples[0])
+    self.assertProtoEquals(r"""
+        features {
+          feature {
+            key: "image/detection/bbox/ymin"
+            value { float_list { value: [0.0, 0.1] } } }
+          feature {
+            key: "image/detection/bbox/xmin"
+            value { float_list { value: [0.0, 0.2] } } }
+          feature {
+            key: "image/detection/bbox/ymax"
+            value { float_list { value: [0.5, 0.8] } } }
+          feature {
+            key: "image/detection/bbox/xmax"
+            value { float_list { value: [0.25, 0.9] } } }
+          feature {
+            key: "image/detection/label"
+            value { int64_list { value: [24, 48] } } }
+          feature {
+            key: "image/detection/score"
+            value { float_list { value: [0.1, 0.2] } } } }
+    """, tf_examples[1])
+
+
 if __name__ == '__main__':
   tf.test.main()
@@ -32,9 +32,17 @@ The script can also discard the image pixels in the output. This greatly
 reduces the output size and can potentially accelerate reading data in
 subsequent processing steps that don't require the images (e.g. computing
 metrics).
+
+With --batch_size or --num_inference_threads larger than 1, examples are
+decoded in parallel, batched with zero padding and run through the inference
+graph by several concurrent session runs. Each thread writes to its own output
+shard, named <output_tfrecord_path>-<shard>-of-<num_shards>, and the order of
+the examples across shards is not preserved.
 """
 
 import itertools
+import time
+
 import tensorflow as tf
 from object_detection.inference import detection_inference
 
@@ -49,6 +57,17 @@ tf.flags.DEFINE_boolean('discard_image_pixels', False,
                         ' significantly reduces the output size and is useful'
                         ' if the subsequent tools don\'t need access to the'
                         ' images (e.g. when computing evaluation measures).')
+tf.flags.DEFINE_integer('batch_size', 1,
+                        'Number of images per inference run. Images of a batch'
+                        ' are zero padded to the same size.')
+tf.flags.DEFINE_integer('num_inference_threads', 1,
+                        'Number of concurrent inference runs in batched mode.'
+                        ' Each thread writes to its own output shard.')
+tf.flags.DEFINE_integer('num_readers', 1,
+                        'Number of input files read concurrently in batched'
+                        ' mode.')
+tf.flags.DEFINE_integer('num_decode_threads', 4,
+                        'Number of images decoded in parallel in batched mode.')
 
 FLAGS = tf.flags.FLAGS
 
@@ -62,10 +81,23 @@ def main(_):
     if not getattr(FLAGS, flag_name):
       raise ValueError('Flag --{} is required'.format(flag_name))
 
+  input_tfrecord_paths = [
+      v for v in FLAGS.input_tfrecord_paths.split(',') if v]
+  tf.logging.info('Reading input from %d files', len(input_tfrecord_paths))
+  start_time = time.time()
+  if FLAGS.batch_size > 1 or FLAGS.num_inference_threads > 1:
+    num_images = _infer_detections_in_batches(input_tfrecord_paths)
+  else:
+    num_images = _infer_detections(input_tfrecord_paths)
+  elapsed_time = time.time() - start_time
+  tf.logging.info('Processed %d images in %.1f seconds (%.1f images/sec)',
+                  num_images, elapsed_time, num_images / max(elapsed_time, 1e-6))
+
+
+def _infer_detections(input_tfrecord_paths):
+  """Runs inference one image at a time and returns the number of images."""
+  counter = 0
   with tf.Session() as sess:
-    input_tfrecord_paths = [
-        v for v in FLAGS.input_tfrecord_paths.split(',') if v]
-    tf.logging.info('Reading input from %d files', len(input_tfrecord_paths))
     serialized_example_tensor, image_tensor = detection_inference.build_input(
         input_tfrecord_paths)
     tf.logging.info('Reading graph and building model...')
@@ -90,6 +122,42 @@ def main(_):
           tf_record_writer.write(tf_example.SerializeToString())
       except tf.errors.OutOfRangeError:
         tf.logging.info('Finished processing records')
+  return counter
+
+
+def _infer_detections_in_batches(input_tfrecord_paths):
+  """Runs batched, concurrent inference and returns the number of images."""
+  with tf.Session() as sess:
+    (serialized_examples_tensor, images_tensor,
+     image_shapes_tensor) = detection_inference.build_batched_input(
+         input_tfrecord_paths, FLAGS.batch_size,
+         num_readers=FLAGS.num_readers,
+         num_decode_threads=FLAGS.num_decode_threads,
+         num_prefetch_batches=FLAGS.num_inference_threads)
+    tf.logging.info('Reading graph and building model...')
+    (num_detections_tensor, detected_boxes_tensor, detected_scores_tensor,
+     detected_labels_tensor) = detection_inference.build_batched_inference_graph(
+         images_tensor, image_shapes_tensor, FLAGS.inference_graph)
+
+    num_shards = FLAGS.num_inference_threads
+    output_paths = ['{}-{:05d}-of-{:05d}'.format(
+        FLAGS.output_tfrecord_path, shard, num_shards)
+                    for shard in range(num_shards)]
+    tf.logging.info('Running inference with batch size %d on %d threads and '
+                    'writing output to %s', FLAGS.batch_size, num_shards,
+                    ', '.join(output_paths))
+    tf_record_writers = [tf.python_io.TFRecordWriter(path)
+                         for path in output_paths]
+    try:
+      num_images = detection_inference.infer_detections_in_batches(
+          sess, serialized_examples_tensor, num_detections_tensor,
+          detected_boxes_tensor, detected_scores_tensor, detected_labels_tensor,
+          tf_record_writers, FLAGS.discard_image_pixels)
+    finally:
+      for tf_record_writer in tf_record_writers:
+        tf_record_writer.close()
+    tf.logging.info('Finished processing records')
+  return num_images
 
 
 if __name__ == '__main__':
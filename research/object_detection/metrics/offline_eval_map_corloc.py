@@ -30,10 +30,16 @@ Example usage:
         --eval_dir=path/to/eval_dir \
         --eval_config_path=path/to/evaluation/configuration/file \
         --input_config_path=path/to/input/configuration/file
+
+To evaluate inference dumps that do not fit in memory, pass
+--images_per_chunk to match detections in chunks of images whose groundtruth
+is released once they are matched, and --num_workers to match the chunks in
+parallel worker processes.
 """
 import csv
 import os
 import re
+import time
 import tensorflow as tf
 
 from object_detection import evaluator
@@ -41,15 +47,30 @@ from object_detection.core import standard_fields
 from object_detection.metrics import tf_example_parser
 from object_detection.utils import config_util
 from object_detection.utils import label_map_util
+from object_detection.utils import object_detection_evaluation
 
 flags = tf.app.flags
 tf.logging.set_verbosity(tf.logging.INFO)
 
+# Number of images per chunk when worker processes are used without an explicit
+# --images_per_chunk.
+_DEFAULT_IMAGES_PER_CHUNK = 100
+
 flags.DEFINE_string('eval_dir', None, 'Directory to write eval summaries to.')
 flags.DEFINE_string('eval_config_path', None,
                     'Path to an eval_pb2.EvalConfig config file.')
 flags.DEFINE_string('input_config_path', None,
                     'Path to an eval_pb2.InputConfig config file.')
+flags.DEFINE_integer('images_per_chunk', 0,
+                     'If positive, images are evaluated in streaming mode, in '
+                     'chunks of this many images.')
+flags.DEFINE_integer('num_workers', 0,
+                     'Number of worker processes used in streaming mode. If 0, '
+                     'chunks are evaluated in the main process. If positive '
+                     'without --images_per_chunk, chunks of {} images are '
+                     'used.'.format(_DEFAULT_IMAGES_PER_CHUNK))
+flags.DEFINE_integer('log_every_n_images', 1000,
+                     'How often to report progress and throughput.')
 
 FLAGS = flags.FLAGS
 
@@ -73,7 +94,49 @@ def _generate_filenames(filenames):
   return result
 
 
-def read_data_and_evaluate(input_config, eval_config):
+def _read_image_infos(input_paths, counters, log_every_n_images=1000):
+  """Reads and parses detections and groundtruth one record at a time.
+
+  Args:
+    input_paths: list of (possibly sharded) TFRecord file names.
+    counters: a dictionary whose 'processed' and 'skipped' fields are updated
+      with the number of records read and the number of records that could not
+      be parsed.
+    log_every_n_images: how often to report progress and throughput.
+
+  Yields:
+    (image_id, groundtruth_dict, detections_dict) tuples, where both
+    dictionaries are the dictionary returned by the parser.
+  """
+  data_parser = tf_example_parser.TfExampleDetectionAndGTParser()
+  example = tf.train.Example()
+  start_time = time.time()
+  for input_path in _generate_filenames(input_paths):
+    tf.logging.info('Processing file: {0}'.format(input_path))
+
+    for string_record in tf.python_io.tf_record_iterator(path=input_path):
+      counters['processed'] += 1
+      if not counters['processed'] % log_every_n_images:
+        tf.logging.info('Processed %d images (%.1f images/sec)...',
+                        counters['processed'],
+                        counters['processed'] / (time.time() - start_time))
+
+      example.ParseFromString(string_record)
+      decoded_dict = data_parser.parse(example)
+
+      if decoded_dict:
+        image_id = decoded_dict[standard_fields.DetectionResultFields.key]
+        yield image_id, decoded_dict, decoded_dict
+      else:
+        counters['skipped'] += 1
+        tf.logging.info('Skipped images: {0}'.format(counters['skipped']))
+
+
+def read_data_and_evaluate(input_config,
+                           eval_config,
+                           images_per_chunk=0,
+                           num_workers=0,
+                           log_every_n_images=1000):
   """Reads pre-computed object detections and groundtruth from tf_record.
 
   Args:
@@ -81,6 +144,14 @@ def read_data_and_evaluate(input_config, eval_config):
       object_detection.protos.InputReader.
     eval_config: evaluation config proto of type
       object_detection.protos.EvalConfig.
+    images_per_chunk: if positive, the records are evaluated in streaming mode:
+      detections are matched in chunks of this many images and the groundtruth
+      of a chunk is released once it has been matched.
+    num_workers: number of worker processes matching chunks in streaming mode.
+      If 0, chunks are matched in the main process. If positive, streaming mode
+      is used even if images_per_chunk is not, with chunks of
+      _DEFAULT_IMAGES_PER_CHUNK images.
+    log_every_n_images: how often to report progress and throughput.
 
   Returns:
     Evaluated detections metrics.
@@ -101,33 +172,29 @@ def read_data_and_evaluate(input_config, eval_config):
     # Support a single evaluator
     object_detection_evaluator = object_detection_evaluators[0]
 
-    skipped_images = 0
-    processed_images = 0
-    for input_path in _generate_filenames(input_paths):
-      tf.logging.info('Processing file: {0}'.format(input_path))
-
-      record_iterator = tf.python_io.tf_record_iterator(path=input_path)
-      data_parser = tf_example_parser.TfExampleDetectionAndGTParser()
-
-      for string_record in record_iterator:
-        tf.logging.log_every_n(tf.logging.INFO, 'Processed %d images...', 1000,
-                               processed_images)
-        processed_images += 1
-
-        example = tf.train.Example()
-        example.ParseFromString(string_record)
-        decoded_dict = data_parser.parse(example)
-
-        if decoded_dict:
-          object_detection_evaluator.add_single_ground_truth_image_info(
-              decoded_dict[standard_fields.DetectionResultFields.key],
-              decoded_dict)
-          object_detection_evaluator.add_single_detected_image_info(
-              decoded_dict[standard_fields.DetectionResultFields.key],
-              decoded_dict)
-        else:
-          skipped_images += 1
-          tf.logging.info('Skipped images: {0}'.format(skipped_images))
+    counters = {'processed': 0, 'skipped': 0}
+    image_infos = _read_image_infos(input_paths, counters, log_every_n_images)
+    start_time = time.time()
+    if num_workers > 0 and images_per_chunk <= 0:
+      images_per_chunk = _DEFAULT_IMAGES_PER_CHUNK
+    if images_per_chunk > 0 and num_workers > 0:
+      object_detection_evaluation.add_image_infos_in_parallel(
+          object_detection_evaluator, image_infos, num_workers=num_workers,
+          images_per_shard=images_per_chunk)
+    elif images_per_chunk > 0:
+      object_detection_evaluation.add_image_infos_in_chunks(
+          object_detection_evaluator, image_infos, images_per_chunk)
+    else:
+      for image_id, groundtruth_dict, detections_dict in image_infos:
+        object_detection_evaluator.add_single_ground_truth_image_info(
+            image_id, groundtruth_dict)
+        object_detection_evaluator.add_single_detected_image_info(
+            image_id, detections_dict)
+    elapsed_time = time.time() - start_time
+    tf.logging.info('Processed %d images (%d skipped) in %.1f sec '
+                    '(%.1f images/sec).', counters['processed'],
+                    counters['skipped'], elapsed_time,
+                    counters['processed'] / max(elapsed_time, 1e-6))
 
     return object_detection_evaluator.evaluate()
 
@@ -163,7 +230,12 @@ def main(argv):
   eval_config = configs['eval_config']
   input_config = configs['eval_input_config']
 
-  metrics = read_data_and_evaluate(input_config, eval_config)
+  metrics = read_data_and_evaluate(
+      input_config,
+      eval_config,
+      images_per_chunk=FLAGS.images_per_chunk,
+      num_workers=FLAGS.num_workers,
+      log_every_n_images=FLAGS.log_every_n_images)
 
   # Save metrics
   write_metrics(metrics, FLAGS.eval_dir)
@@ -114,8 +114,12 @@ def main(_):
       model_config=model_config,
       is_training=True)
 
-  create_input_dict_fn = functools.partial(
-      input_reader_builder.build, input_config)
+  if input_config.use_tf_data:
+    create_input_dict_fn = functools.partial(
+        input_reader_builder.build_dataset, input_config)
+  else:
+    create_input_dict_fn = functools.partial(
+        input_reader_builder.build, input_config)
 
   env = json.loads(os.environ.get('TF_CONFIG', '{}'))
   cluster_data = env.get('cluster', None)
@@ -35,29 +35,18 @@ from deployment import model_deploy
 slim = tf.contrib.slim
 
 
-def create_input_queue(batch_size_per_clone, create_tensor_dict_fn,
-                       batch_queue_capacity, num_batch_queue_threads,
-                       prefetch_queue_capacity, data_augmentation_options):
-  """Sets up reader, prefetcher and returns input queue.
+def _preprocess_tensor_dict(tensor_dict, data_augmentation_options):
+  """Converts the image and audio of tensor_dict to float and augments it.
 
   Args:
-    batch_size_per_clone: batch size to use per clone.
-    create_tensor_dict_fn: function to create tensor dictionary.
-    batch_queue_capacity: maximum number of elements to store within a queue.
-    num_batch_queue_threads: number of threads to use for batching.
-    prefetch_queue_capacity: maximum capacity of the queue used to prefetch
-                             assembled batches.
+    tensor_dict: dictionary of decoded input tensors.
     data_augmentation_options: a list of tuples, where each tuple contains a
       data augmentation function and a dictionary containing arguments and their
       values (see preprocessor.py).
 
   Returns:
-    input queue: a batcher.BatchQueue object holding enqueued tensor_dicts
-      (which hold images, boxes and targets).  To get a batch of tensor_dicts,
-      call input_queue.Dequeue().
+    The preprocessed tensor_dict.
   """
-  tensor_dict = create_tensor_dict_fn()
-
   tensor_dict[fields.InputDataFields.image] = tf.expand_dims(
       tensor_dict[fields.InputDataFields.image], 0)
 
@@ -83,7 +72,50 @@ def create_input_queue(batch_size_per_clone, create_tensor_dict_fn,
         func_arg_map=preprocessor.get_default_func_arg_map(
             include_instance_masks=include_instance_masks,
             include_keypoints=include_keypoints))
+  return tensor_dict
+
+
+def create_input_queue(batch_size_per_clone, create_tensor_dict_fn,
+                       batch_queue_capacity, num_batch_queue_threads,
+                       prefetch_queue_capacity, data_augmentation_options):
+  """Sets up reader, prefetcher and returns input queue.
+
+  If create_tensor_dict_fn returns a tf.data.Dataset (see
+  input_reader_builder.build_dataset), its elements are preprocessed with
+  num_batch_queue_threads parallel calls and batched with a
+  batcher.DatasetBatchQueue instead of a batcher.BatchQueue.
+
+  Args:
+    batch_size_per_clone: batch size to use per clone.
+    create_tensor_dict_fn: function to create a tensor dictionary or a
+      tf.data.Dataset of tensor dictionaries.
+    batch_queue_capacity: maximum number of elements to store within a queue.
+      Unused with a tf.data.Dataset.
+    num_batch_queue_threads: number of threads to use for batching.
+    prefetch_queue_capacity: maximum capacity of the queue used to prefetch
+                             assembled batches.
+    data_augmentation_options: a list of tuples, where each tuple contains a
+      data augmentation function and a dictionary containing arguments and their
+      values (see preprocessor.py).
+
+  Returns:
+    input queue: a batcher.BatchQueue or batcher.DatasetBatchQueue object
+      holding enqueued tensor_dicts (which hold images, boxes and targets). To
+      get a batch of tensor_dicts, call input_queue.Dequeue().
+  """
+  tensor_dict = create_tensor_dict_fn()
 
+  if isinstance(tensor_dict, tf.data.Dataset):
+    dataset = tensor_dict.map(
+        functools.partial(_preprocess_tensor_dict,
+                          data_augmentation_options=data_augmentation_options),
+        num_parallel_calls=num_batch_queue_threads)
+    return batcher.DatasetBatchQueue(
+        dataset,
+        batch_size=batch_size_per_clone,
+        prefetch_queue_capacity=prefetch_queue_capacity)
+
+  tensor_dict = _preprocess_tensor_dict(tensor_dict, data_augmentation_options)
   input_queue = batcher.BatchQueue(
       tensor_dict,
       batch_size=batch_size_per_clone,
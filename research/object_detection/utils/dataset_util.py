@@ -13,7 +13,7 @@
 # limitations under the License.
 # ==============================================================================
 
-"""Utility functions for creating TFRecord data sets."""
+"""Utility functions for creating and reading TFRecord data sets."""
 
 import tensorflow as tf
 
@@ -85,3 +85,21 @@ def recursive_parse_xml_to_dict(xml):
         result[child.tag] = []
       result[child.tag].append(child_result[child.tag])
   return {xml.tag: result}
+
+
+def make_initializable_iterator(dataset):
+  """Creates an iterator over dataset and registers its initializer.
+
+  The initializer is added to the TABLE_INITIALIZERS collection, so that it runs
+  together with tf.tables_initializer(), e.g. as part of the Supervisor's local
+  init op, and callers reading the dataset do not have to run it themselves.
+
+  Args:
+    dataset: A tf.data.Dataset object.
+
+  Returns:
+    A tf.data.Iterator.
+  """
+  iterator = dataset.make_initializable_iterator()
+  tf.add_to_collection(tf.GraphKeys.TABLE_INITIALIZERS, iterator.initializer)
+  return iterator
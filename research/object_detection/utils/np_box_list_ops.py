@@ -38,6 +38,25 @@ class SortOrder(object):
   DESCEND = 2
 
 
+class NmsBackend(object):
+  """Enum class for the implementation used by non maximum suppression.
+
+  Attributes:
+    LOOP: reference implementation which recomputes the IOU between each
+      selected box and all remaining valid boxes.
+    VECTORIZED: sorts the boxes once and reads overlaps from tiles of the
+      pairwise IOU matrix. Multi-class suppression is done in a single pass
+      over all (box, class) candidates instead of once per class.
+  """
+  LOOP = 1
+  VECTORIZED = 2
+
+
+# Number of rows of the pairwise IOU matrix computed at a time by the
+# vectorized non maximum suppression, which bounds its memory footprint.
+_NMS_TILE_SIZE = 64
+
+
 def area(boxlist):
   """Computes area of boxes.
 
@@ -163,7 +182,8 @@ def sort_by_field(boxlist, field, order=SortOrder.DESCEND):
 def non_max_suppression(boxlist,
                         max_output_size=10000,
                         iou_threshold=1.0,
-                        score_threshold=-10.0):
+                        score_threshold=-10.0,
+                        backend=NmsBackend.LOOP):
   """Non maximum suppression.
 
   This op greedily selects a subset of detection bounding boxes, pruning
@@ -180,6 +200,8 @@ def non_max_suppression(boxlist,
                      less than this value. Default value is set to -10. A very
                      low threshold to pass pretty much all the boxes, unless
                      the user sets a different score threshold.
+    backend: (optional) NmsBackend used to perform the suppression. Both
+      backends return the same boxes.
 
   Returns:
     a BoxList holding M boxes where M <= max_output_size
@@ -187,6 +209,7 @@ def non_max_suppression(boxlist,
     ValueError: if 'scores' field does not exist
     ValueError: if threshold is not in [0, 1]
     ValueError: if max_output_size < 0
+    ValueError: if backend is not a valid NmsBackend
   """
   if not boxlist.has_field('scores'):
     raise ValueError('Field scores does not exist')
@@ -194,6 +217,8 @@ def non_max_suppression(boxlist,
     raise ValueError('IOU threshold must be in [0, 1]')
   if max_output_size < 0:
     raise ValueError('max_output_size must be bigger than 0.')
+  if backend != NmsBackend.LOOP and backend != NmsBackend.VECTORIZED:
+    raise ValueError('Invalid nms backend')
 
   boxlist = filter_scores_greater_than(boxlist, score_threshold)
   if boxlist.num_boxes() == 0:
@@ -210,6 +235,10 @@ def non_max_suppression(boxlist,
       return boxlist
 
   boxes = boxlist.get()
+  if backend == NmsBackend.VECTORIZED:
+    return gather(boxlist,
+                  _greedy_nms_indices(boxes, max_output_size, iou_threshold))
+
   num_boxes = boxlist.num_boxes()
   # is_index_valid is True only for all remaining valid boxes,
   is_index_valid = np.full(num_boxes, 1, dtype=bool)
@@ -231,11 +260,11 @@ def non_max_suppression(boxlist,
         is_index_valid[valid_indices] = np.logical_and(
             is_index_valid[valid_indices],
             intersect_over_union <= iou_threshold)
-  return gather(boxlist, np.array(selected_indices))
+  return gather(boxlist, np.array(selected_indices, dtype=int))
 
 
 def multi_class_non_max_suppression(boxlist, score_thresh, iou_thresh,
-                                    max_output_size):
+                                    max_output_size, backend=NmsBackend.LOOP):
   """Multi-class version of non maximum suppression.
 
   This op greedily selects a subset of detection bounding boxes, pruning
@@ -257,6 +286,9 @@ def multi_class_non_max_suppression(boxlist, score_thresh, iou_thresh,
     iou_thresh: scalar threshold for IOU (boxes that that high IOU overlap
       with previously selected boxes are removed).
     max_output_size: maximum number of retained boxes per class.
+    backend: (optional) NmsBackend used to perform the suppression. Both
+      backends return the same boxes as long as the scores within a class
+      are distinct (ties may be broken differently).
 
   Returns:
     a BoxList holding M boxes with a rank-1 scores field representing
@@ -265,9 +297,12 @@ def multi_class_non_max_suppression(boxlist, score_thresh, iou_thresh,
   Raises:
     ValueError: if iou_thresh is not in [0, 1] or if input boxlist does not have
       a valid scores field.
+    ValueError: if backend is not a valid NmsBackend
   """
   if not 0 <= iou_thresh <= 1.0:
     raise ValueError('thresh must be between 0 and 1')
+  if backend != NmsBackend.LOOP and backend != NmsBackend.VECTORIZED:
+    raise ValueError('Invalid nms backend')
   if not isinstance(boxlist, np_box_list.BoxList):
     raise ValueError('boxlist must be a BoxList')
   if not boxlist.has_field('scores'):
@@ -288,6 +323,10 @@ def multi_class_non_max_suppression(boxlist, score_thresh, iou_thresh,
   if num_boxes != num_scores:
     raise ValueError('Incorrect scores field length: actual vs expected.')
 
+  if backend == NmsBackend.VECTORIZED:
+    return _multi_class_non_max_suppression_vectorized(
+        boxlist.get(), scores, score_thresh, iou_thresh, max_output_size)
+
   selected_boxes_list = []
   for class_idx in range(num_classes):
     boxlist_and_class_scores = np_box_list.BoxList(boxlist.get())
@@ -307,6 +346,113 @@ def multi_class_non_max_suppression(boxlist, score_thresh, iou_thresh,
   return sorted_boxes
 
 
+def _multi_class_non_max_suppression_vectorized(boxes, scores, score_thresh,
+                                                iou_thresh, max_output_size):
+  """Multi-class non maximum suppression performed in a single pass.
+
+  Every (box, class) pair scoring above score_thresh becomes a candidate.
+  Candidates are sorted once by class and then by descending score, and are
+  suppressed in one greedy pass in which boxes of different classes never
+  overlap.
+
+  Args:
+    boxes: a numpy array of shape [N, 4] holding N boxes.
+    scores: a numpy array of shape [N, num_classes] holding the class scores.
+    score_thresh: scalar threshold for score (low scoring boxes are removed).
+    iou_thresh: scalar threshold for IOU.
+    max_output_size: maximum number of retained boxes per class.
+
+  Returns:
+    a BoxList holding M boxes with rank-1 'scores' and 'classes' fields, sorted
+      by decreasing score.
+  """
+  box_indices, class_indices = np.nonzero(np.greater(scores, score_thresh))
+  candidate_scores = scores[box_indices, class_indices]
+  order = np.lexsort((-candidate_scores, class_indices))
+  box_indices = box_indices[order]
+  class_indices = class_indices[order]
+  candidate_scores = candidate_scores[order]
+
+  selected_indices = _greedy_nms_indices(
+      boxes[box_indices, :], max_output_size, iou_thresh,
+      classes=class_indices)
+  selected_boxes = np_box_list.BoxList(
+      np.reshape(boxes[box_indices[selected_indices], :], [-1, 4]))
+  selected_boxes.add_field('scores', candidate_scores[selected_indices])
+  selected_boxes.add_field(
+      'classes',
+      class_indices[selected_indices].astype(candidate_scores.dtype))
+  return sort_by_field(selected_boxes, 'scores')
+
+
+def _greedy_nms_indices(boxes, max_output_size, iou_threshold, classes=None):
+  """Greedily selects boxes that are sorted by descending score.
+
+  The pairwise IOU matrix is computed in tiles of at most _NMS_TILE_SIZE rows.
+  Each tile is restricted to the boxes that are still valid when the tile is
+  reached, and to the columns that its rows can still suppress.
+
+  Args:
+    boxes: a numpy array of shape [N, 4] holding N boxes sorted by descending
+      score (within each class if classes is given).
+    max_output_size: maximum number of selected boxes (per class if classes is
+      given).
+    iou_threshold: boxes whose IOU with a selected box of the same class is
+      larger than this threshold are suppressed.
+    classes: (optional) an integer numpy array of shape [N] sorted in
+      ascending order. If None, all boxes belong to the same class.
+
+  Returns:
+    an int numpy array with the indices of the selected boxes, in selection
+      order.
+  """
+  num_boxes = boxes.shape[0]
+  if num_boxes == 0 or max_output_size == 0:
+    return np.array([], dtype=int)
+  if classes is None:
+    classes = np.zeros(num_boxes, dtype=int)
+  # Prevent further computation if NMS is disabled, as non_max_suppression
+  # does. Computing IOUs would also suppress zero-area boxes, whose IOU is NaN.
+  if iou_threshold == 1.0:
+    class_start = np.searchsorted(classes, classes, side='left')
+    return np.where(np.arange(num_boxes) - class_start < max_output_size)[0]
+  # class_end[i] is one past the last box that has the same class as box i.
+  class_end = np.searchsorted(classes, classes, side='right')
+
+  is_index_valid = np.full(num_boxes, 1, dtype=bool)
+  selected_indices = []
+  num_selected_in_class = 0
+  for tile_start in xrange(0, num_boxes, _NMS_TILE_SIZE):
+    tile_end = min(tile_start + _NMS_TILE_SIZE, num_boxes)
+    rows = tile_start + np.where(is_index_valid[tile_start:tile_end])[0]
+    if rows.size == 0:
+      continue
+    # Only valid boxes up to the end of the class of the last row can still
+    # be suppressed by the rows of this tile.
+    columns = rows[0] + np.where(
+        is_index_valid[rows[0]:class_end[rows[-1]]])[0]
+    tile_iou = np_box_ops.iou(boxes[rows, :], boxes[columns, :])
+    tile_iou[np.not_equal(np.expand_dims(classes[rows], 1),
+                          np.expand_dims(classes[columns], 0))] = 0.0
+    row_columns = np.searchsorted(columns, rows)
+    for row, i in enumerate(rows):
+      if not is_index_valid[i]:
+        continue
+      if not selected_indices or classes[selected_indices[-1]] != classes[i]:
+        num_selected_in_class = 0
+      selected_indices.append(i)
+      num_selected_in_class += 1
+      if num_selected_in_class >= max_output_size:
+        is_index_valid[i:class_end[i]] = False
+        continue
+      next_column = row_columns[row] + 1
+      later_indices = columns[next_column:]
+      is_index_valid[later_indices] = np.logical_and(
+          is_index_valid[later_indices],
+          tile_iou[row, next_column:] <= iou_threshold)
+  return np.array(selected_indices, dtype=int)
+
+
 def scale(boxlist, y_scale, x_scale):
   """Scale box coordinates in x and y dimensions.
 
@@ -0,0 +1,87 @@
+# Copyright 2017 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Benchmarks the non maximum suppression backends of np_box_list_ops.
+
+Example usage:
+    python object_detection/utils/np_box_list_ops_benchmark.py \
+        --benchmarks=.
+"""
+import functools
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from object_detection.utils import np_box_list
+from object_detection.utils import np_box_list_ops
+
+
+def _random_boxlist(num_boxes, num_classes=None, seed=0):
+  """Returns a BoxList with random boxes and scores.
+
+  Args:
+    num_boxes: number of boxes.
+    num_classes: (optional) number of classes. If None, the scores field has
+      shape [num_boxes], otherwise [num_boxes, num_classes].
+    seed: random seed.
+  """
+  random_state = np.random.RandomState(seed)
+  corners = random_state.uniform(0.0, 1000.0, size=(num_boxes, 2))
+  sizes = random_state.uniform(10.0, 200.0, size=(num_boxes, 2))
+  boxlist = np_box_list.BoxList(
+      np.hstack([corners, corners + sizes]).astype(np.float32))
+  scores_shape = [num_boxes] if num_classes is None else [num_boxes,
+                                                          num_classes]
+  boxlist.add_field(
+      'scores', random_state.uniform(size=scores_shape).astype(np.float32))
+  return boxlist
+
+
+class NonMaxSuppressionBenchmark(tf.test.Benchmark):
+  """Compares the loop and vectorized non maximum suppression backends."""
+
+  def _run(self, name, fn, num_iters=3):
+    start_time = time.time()
+    for _ in range(num_iters):
+      fn()
+    wall_time = (time.time() - start_time) / num_iters
+    self.report_benchmark(name=name, iters=num_iters, wall_time=wall_time)
+
+  def benchmark_single_class_nms(self):
+    boxlist = _random_boxlist(num_boxes=5000)
+    for backend_name, backend in [('loop', np_box_list_ops.NmsBackend.LOOP),
+                                  ('vectorized',
+                                   np_box_list_ops.NmsBackend.VECTORIZED)]:
+      self._run(
+          'single_class_nms_%s' % backend_name,
+          functools.partial(np_box_list_ops.non_max_suppression, boxlist,
+                            max_output_size=5000, iou_threshold=0.5,
+                            backend=backend))
+
+  def benchmark_multi_class_nms(self):
+    boxlist = _random_boxlist(num_boxes=2000, num_classes=500)
+    for backend_name, backend in [('loop', np_box_list_ops.NmsBackend.LOOP),
+                                  ('vectorized',
+                                   np_box_list_ops.NmsBackend.VECTORIZED)]:
+      self._run(
+          'multi_class_nms_%s' % backend_name,
+          functools.partial(np_box_list_ops.multi_class_non_max_suppression,
+                            boxlist, score_thresh=0.9, iou_thresh=0.5,
+                            max_output_size=100, backend=backend))
+
+
+if __name__ == '__main__':
+  tf.test.main()
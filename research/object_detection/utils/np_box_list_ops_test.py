@@ -409,6 +409,92 @@ class NonMaximumSuppressionTest(tf.test.TestCase):
     self.assertAllClose(classes_clean, expected_classes)
     self.assertAllClose(boxes, expected_boxes)
 
+  def test_multiclass_nms_vectorized_backend(self):
+    boxlist = np_box_list.BoxList(
+        np.array(
+            [[0.2, 0.4, 0.8, 0.8], [0.4, 0.2, 0.8, 0.8], [0.6, 0.0, 1.0, 1.0]],
+            dtype=np.float32))
+    scores = np.array([[-0.2, 0.1, 0.5, -0.4, 0.3],
+                       [0.7, -0.7, 0.6, 0.2, -0.9],
+                       [0.4, 0.34, -0.9, 0.2, 0.31]],
+                      dtype=np.float32)
+    boxlist.add_field('scores', scores)
+    boxlist_clean = np_box_list_ops.multi_class_non_max_suppression(
+        boxlist, score_thresh=0.25, iou_thresh=0.1, max_output_size=3,
+        backend=np_box_list_ops.NmsBackend.VECTORIZED)
+
+    scores_clean = boxlist_clean.get_field('scores')
+    classes_clean = boxlist_clean.get_field('classes')
+    boxes = boxlist_clean.get()
+    expected_scores = np.array([0.7, 0.6, 0.34, 0.31])
+    expected_classes = np.array([0, 2, 1, 4])
+    expected_boxes = np.array([[0.4, 0.2, 0.8, 0.8],
+                               [0.4, 0.2, 0.8, 0.8],
+                               [0.6, 0.0, 1.0, 1.0],
+                               [0.6, 0.0, 1.0, 1.0]],
+                              dtype=np.float32)
+    self.assertAllClose(scores_clean, expected_scores)
+    self.assertAllClose(classes_clean, expected_classes)
+    self.assertAllClose(boxes, expected_boxes)
+
+  def test_invalid_backend(self):
+    boxlist = np_box_list.BoxList(self._boxes)
+    boxlist.add_field('scores',
+                      np.array([.9, .75, .6, .95, .2, .3], dtype=float))
+    with self.assertRaises(ValueError):
+      np_box_list_ops.non_max_suppression(boxlist, 3, 0.5, backend=3)
+    with self.assertRaises(ValueError):
+      np_box_list_ops.multi_class_non_max_suppression(boxlist, 0.1, 0.5, 3,
+                                                      backend=3)
+
+
+class VectorizedNonMaximumSuppressionTest(tf.test.TestCase):
+
+  def setUp(self):
+    random_state = np.random.RandomState(0)
+    num_boxes = 500
+    num_classes = 20
+    corners = random_state.uniform(0.0, 100.0, size=(num_boxes, 2))
+    sizes = random_state.uniform(1.0, 30.0, size=(num_boxes, 2))
+    self._boxes = np.hstack([corners, corners + sizes]).astype(np.float32)
+    # Zero-area boxes, some of them identical, have NaN IOUs with each other.
+    self._boxes[-10:] = 0.0
+    self._boxes[-5:, 2:] = 1.0
+    self._boxes[-5:, 3] = 0.0
+    # Scores are distinct so that both backends break no ties.
+    self._scores = (random_state.permutation(num_boxes * num_classes).reshape(
+        [num_boxes, num_classes]).astype(np.float32) /
+                    (num_boxes * num_classes))
+
+  def test_single_class_matches_loop_backend(self):
+    boxlist = np_box_list.BoxList(self._boxes)
+    boxlist.add_field('scores', self._scores[:, 0])
+    for iou_threshold in [0.0, 0.3, 0.5, 0.9, 1.0]:
+      for max_output_size in [0, 1, 20, 10000]:
+        expected_boxlist = np_box_list_ops.non_max_suppression(
+            boxlist, max_output_size, iou_threshold)
+        nms_boxlist = np_box_list_ops.non_max_suppression(
+            boxlist, max_output_size, iou_threshold,
+            backend=np_box_list_ops.NmsBackend.VECTORIZED)
+        self.assertAllEqual(nms_boxlist.get(), expected_boxlist.get())
+        self.assertAllEqual(nms_boxlist.get_field('scores'),
+                            expected_boxlist.get_field('scores'))
+
+  def test_multiclass_matches_loop_backend(self):
+    boxlist = np_box_list.BoxList(self._boxes)
+    boxlist.add_field('scores', self._scores)
+    for iou_threshold in [0.0, 0.3, 0.5, 1.0]:
+      for max_output_size in [0, 5, 10000]:
+        expected_boxlist = np_box_list_ops.multi_class_non_max_suppression(
+            boxlist, 0.5, iou_threshold, max_output_size)
+        nms_boxlist = np_box_list_ops.multi_class_non_max_suppression(
+            boxlist, 0.5, iou_threshold, max_output_size,
+            backend=np_box_list_ops.NmsBackend.VECTORIZED)
+        self.assertAllEqual(nms_boxlist.get(), expected_boxlist.get())
+        for field in ['scores', 'classes']:
+          self.assertAllEqual(nms_boxlist.get_field(field),
+                              expected_boxlist.get_field(field))
+
 
 if __name__ == '__main__':
   tf.test.main()
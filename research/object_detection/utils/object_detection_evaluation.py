@@ -30,12 +30,16 @@ Note: This module operates on numpy boxes and box lists.
 from abc import ABCMeta
 from abc import abstractmethod
 import collections
+import copy
+import itertools
 import logging
+import multiprocessing
 import numpy as np
 
 from object_detection.core import standard_fields
 from object_detection.utils import label_map_util
 from object_detection.utils import metrics
+from object_detection.utils import np_box_list_ops
 from object_detection.utils import per_image_evaluation
 
 
@@ -282,6 +286,42 @@ class ObjectDetectionEvaluator(DetectionEvaluator):
         label_id_offset=self._label_id_offset)
     self._image_ids.clear()
 
+  def empty_copy(self):
+    """Returns an evaluator with the same configuration and no images.
+
+    Unlike copy.deepcopy, the groundtruth and detections added so far are not
+    copied.
+    """
+    evaluator = copy.copy(self)
+    evaluator._image_ids = set()
+    evaluator.clear()
+    return evaluator
+
+  def get_accumulators(self):
+    """Returns the partial evaluation state of the images added so far.
+
+    Returns:
+      An EvaluationAccumulators namedtuple which can be pickled and merged into
+      another evaluator with the same configuration using merge_accumulators.
+    """
+    return self._evaluation.get_accumulators()
+
+  def merge_accumulators(self, accumulators):
+    """Merges the partial evaluation state of a disjoint set of images.
+
+    Args:
+      accumulators: An EvaluationAccumulators namedtuple returned by
+        get_accumulators of an evaluator with the same configuration.
+
+    Raises:
+      ValueError: If groundtruth for an image was added to both evaluators.
+    """
+    if self._image_ids & accumulators.groundtruth_keys:
+      raise ValueError('Images {} already added.'.format(
+          sorted(self._image_ids & accumulators.groundtruth_keys)))
+    self._evaluation.merge_accumulators(accumulators)
+    self._image_ids.update(accumulators.groundtruth_keys)
+
 
 class PascalDetectionEvaluator(ObjectDetectionEvaluator):
   """A class to evaluate detections using PASCAL metrics."""
@@ -385,15 +425,29 @@ class OpenImagesDetectionEvaluator(ObjectDetectionEvaluator):
         logging.warn(
             'image %s does not have groundtruth group_of flag specified',
             image_id)
+    groundtruth_image_classes = groundtruth_dict[
+        standard_fields.InputDataFields.groundtruth_image_classes]
+    groundtruth_image_classes -= self._label_id_offset
     self._evaluation.add_single_ground_truth_image_info(
         image_id,
         groundtruth_dict[standard_fields.InputDataFields.groundtruth_boxes],
         groundtruth_classes,
+        groundtruth_image_classes,
         groundtruth_is_difficult_list=None,
         groundtruth_is_group_of_list=groundtruth_group_of)
     self._image_ids.update([image_id])
 
 
+EvaluationAccumulators = collections.namedtuple(
+    'EvaluationAccumulators', [
+        'groundtruth_keys', 'detection_keys', 'num_gt_instances_per_class',
+        'num_gt_imgs_per_class', 'scores_per_class', 'tp_fp_labels_per_class',
+        'num_images_correctly_detected_per_class',
+        'groundtruth_image_class_labels', 'detected_image_scores',
+        'detected_image_class_labels', 'eval_result_in_box_classifcation'
+    ])
+
+
 ObjectDetectionEvalMetrics = collections.namedtuple(
     'ObjectDetectionEvalMetrics', [
     
@@ -411,10 +465,11 @@ class ObjectDetectionEvaluation(object):
                nms_iou_threshold=1.0,
                nms_max_output_boxes=10000,
                use_weighted_mean_ap=False,
-               label_id_offset=0):
+               label_id_offset=0,
+               nms_backend=np_box_list_ops.NmsBackend.LOOP):
     self.per_image_eval = per_image_evaluation.PerImageEvaluation(
         num_groundtruth_classes, matching_iou_threshold, nms_iou_threshold,
-        nms_max_output_boxes)
+        nms_max_output_boxes, nms_backend)
     self.num_class = num_groundtruth_classes
     self.label_id_offset = label_id_offset
 
@@ -446,7 +501,7 @@ class ObjectDetectionEvaluation(object):
     self.eval_result_in_box_classifcation = []
 
   def clear_detections(self):
-    self.detection_keys = {}
+    self.detection_keys = set()
     self.scores_per_class = [[] for _ in range(self.num_class)]
     self.tp_fp_labels_per_class = [[] for _ in range(self.num_class)]
     self.num_images_correctly_detected_per_class = np.zeros(self.num_class)
@@ -591,6 +646,85 @@ class ObjectDetectionEvaluation(object):
 
     #print (self.eval_result_in_box_classifcation)
 
+  def get_accumulators(self):
+    """Returns the partial state needed by evaluate() as a picklable tuple.
+
+    Per-image groundtruth boxes are not part of the accumulators, so the
+    detections of an image must be added to the same instance as its
+    groundtruth before the accumulators are extracted.
+
+    Returns:
+      An EvaluationAccumulators namedtuple. The scores and tp_fp_labels of
+      each class are concatenated into a single numpy array.
+    """
+    scores_per_class = []
+    tp_fp_labels_per_class = []
+    for class_index in range(self.num_class):
+      if self.scores_per_class[class_index]:
+        scores_per_class.append(
+            np.concatenate(self.scores_per_class[class_index]))
+        tp_fp_labels_per_class.append(
+            np.concatenate(self.tp_fp_labels_per_class[class_index]))
+      else:
+        scores_per_class.append(np.array([], dtype=float))
+        tp_fp_labels_per_class.append(np.array([], dtype=bool))
+    return EvaluationAccumulators(
+        groundtruth_keys=set(self.groundtruth_boxes),
+        detection_keys=set(self.detection_keys),
+        num_gt_instances_per_class=self.num_gt_instances_per_class.copy(),
+        num_gt_imgs_per_class=self.num_gt_imgs_per_class.copy(),
+        scores_per_class=scores_per_class,
+        tp_fp_labels_per_class=tp_fp_labels_per_class,
+        num_images_correctly_detected_per_class=(
+            self.num_images_correctly_detected_per_class.copy()),
+        groundtruth_image_class_labels=list(
+            self.groundtruth_image_class_labels),
+        detected_image_scores=list(self.detected_image_scores),
+        detected_image_class_labels=list(self.detected_image_class_labels),
+        eval_result_in_box_classifcation=list(
+            self.eval_result_in_box_classifcation))
+
+  def merge_accumulators(self, accumulators):
+    """Merges accumulators computed on a disjoint set of images.
+
+    Merging the accumulators of every shard of a dataset, in any order, yields
+    the same evaluate() output as adding all images to a single instance, up
+    to the order of the image-level classification results.
+
+    Args:
+      accumulators: An EvaluationAccumulators namedtuple returned by
+        get_accumulators of an instance with the same configuration.
+
+    Raises:
+      ValueError: if the number of classes differ or if detections for an
+        image were added to both instances.
+    """
+    if len(accumulators.scores_per_class) != self.num_class:
+      raise ValueError('Cannot merge accumulators with {} classes into an '
+                       'evaluation with {} classes.'.format(
+                           len(accumulators.scores_per_class), self.num_class))
+    if self.detection_keys & accumulators.detection_keys:
+      raise ValueError('Detections for images {} were added twice.'.format(
+          sorted(self.detection_keys & accumulators.detection_keys)))
+    self.detection_keys.update(accumulators.detection_keys)
+    self.num_gt_instances_per_class += accumulators.num_gt_instances_per_class
+    self.num_gt_imgs_per_class += accumulators.num_gt_imgs_per_class
+    for class_index in range(self.num_class):
+      if accumulators.scores_per_class[class_index].shape[0] > 0:
+        self.scores_per_class[class_index].append(
+            accumulators.scores_per_class[class_index])
+        self.tp_fp_labels_per_class[class_index].append(
+            accumulators.tp_fp_labels_per_class[class_index])
+    self.num_images_correctly_detected_per_class += (
+        accumulators.num_images_correctly_detected_per_class)
+    self.groundtruth_image_class_labels.extend(
+        accumulators.groundtruth_image_class_labels)
+    self.detected_image_scores.extend(accumulators.detected_image_scores)
+    self.detected_image_class_labels.extend(
+        accumulators.detected_image_class_labels)
+    self.eval_result_in_box_classifcation.extend(
+        accumulators.eval_result_in_box_classifcation)
+
   def _update_ground_truth_statistics(self, groundtruth_class_labels,
                                       groundtruth_is_difficult_list,
                                       groundtruth_is_group_of_list):
@@ -686,3 +820,136 @@ class ObjectDetectionEvaluation(object):
     return ObjectDetectionEvalMetrics(
         self.average_precision_per_class, mean_ap, self.precisions_per_class,
         self.recalls_per_class, self.corloc_per_class, mean_corloc, img_cls_accuracy, total_accuracy)
+
+
+# Evaluator used by the worker processes of add_image_infos_in_parallel.
+_shard_evaluator = None
+
+
+def _init_shard_evaluator(evaluator):
+  global _shard_evaluator
+  _shard_evaluator = evaluator
+
+
+def _evaluate_shard(image_infos):
+  """Matches detections of a shard of images and returns its accumulators."""
+  _shard_evaluator.clear()
+  for image_id, groundtruth_dict, detections_dict in image_infos:
+    _shard_evaluator.add_single_ground_truth_image_info(image_id,
+                                                        groundtruth_dict)
+    _shard_evaluator.add_single_detected_image_info(image_id, detections_dict)
+  return _shard_evaluator.get_accumulators()
+
+
+def add_image_infos_in_chunks(evaluator, image_infos, images_per_chunk=1000):
+  """Adds groundtruth and detections of many images in bounded memory.
+
+  Images are matched in chunks by an empty copy of `evaluator`, whose
+  accumulators are merged into `evaluator` after each chunk. Unlike adding the
+  images directly, the per-image groundtruth boxes are released once a chunk
+  has been matched.
+
+  Args:
+    evaluator: An ObjectDetectionEvaluator.
+    image_infos: An iterable of (image_id, groundtruth_dict, detections_dict)
+      tuples, consumed lazily.
+    images_per_chunk: Number of images matched before their groundtruth is
+      released.
+
+  Returns:
+    The number of images that were added.
+
+  Raises:
+    ValueError: If images_per_chunk is not positive.
+  """
+  if images_per_chunk <= 0:
+    raise ValueError('images_per_chunk must be positive.')
+  chunk_evaluator = evaluator.empty_copy()
+  image_infos = iter(image_infos)
+  num_images = 0
+  for chunk in iter(
+      lambda: list(itertools.islice(image_infos, images_per_chunk)), []):
+    chunk_evaluator.clear()
+    for image_id, groundtruth_dict, detections_dict in chunk:
+      chunk_evaluator.add_single_ground_truth_image_info(image_id,
+                                                         groundtruth_dict)
+      chunk_evaluator.add_single_detected_image_info(image_id,
+                                                     detections_dict)
+    evaluator.merge_accumulators(chunk_evaluator.get_accumulators())
+    num_images += len(chunk)
+  return num_images
+
+
+def _merge_shard_result(evaluator, async_result, num_merged_images):
+  """Merges the accumulators of a shard and returns its number of images."""
+  accumulators = async_result.get()
+  evaluator.merge_accumulators(accumulators)
+  num_images = len(accumulators.groundtruth_keys | accumulators.detection_keys)
+  logging.info('Merged evaluation results of %d images.',
+               num_merged_images + num_images)
+  return num_images
+
+
+def add_image_infos_in_parallel(evaluator,
+                                image_infos,
+                                num_workers=None,
+                                images_per_shard=100,
+                                max_pending_shards=None):
+  """Adds groundtruth and detections of many images using a process pool.
+
+  The images are split into shards of consecutive images. Detections of each
+  shard are matched to groundtruth in a worker process holding an empty copy
+  of `evaluator`, and the accumulators of the shards are merged back into
+  `evaluator` in order. Calling evaluator.evaluate() afterwards returns the
+  same metrics as adding all images sequentially.
+
+  `image_infos` is consumed lazily: at most `max_pending_shards` shards are
+  read ahead of the merged results, so it may be a stream over a dataset that
+  does not fit in memory.
+
+  Args:
+    evaluator: An ObjectDetectionEvaluator, e.g. a PascalDetectionEvaluator,
+      WeightedPascalDetectionEvaluator or OpenImagesDetectionEvaluator. Its
+      configuration is copied to the workers.
+    image_infos: An iterable of (image_id, groundtruth_dict, detections_dict)
+      tuples, where the dictionaries are the ones expected by
+      add_single_ground_truth_image_info and add_single_detected_image_info.
+    num_workers: Number of worker processes. Defaults to the number of CPUs.
+    images_per_shard: Number of images matched by a worker per task.
+    max_pending_shards: Maximum number of shards dispatched to the workers but
+      not merged yet. Defaults to twice the number of workers.
+
+  Returns:
+    The number of images that were added.
+
+  Raises:
+    ValueError: If images_per_shard is not positive.
+  """
+  if images_per_shard <= 0:
+    raise ValueError('images_per_shard must be positive.')
+  num_workers = num_workers or multiprocessing.cpu_count()
+  max_pending_shards = max_pending_shards or 2 * num_workers
+  shard_evaluator = evaluator.empty_copy()
+
+  image_infos = iter(image_infos)
+  shards = iter(lambda: list(itertools.islice(image_infos, images_per_shard)),
+                [])
+  num_images = 0
+  pending_results = collections.deque()
+  pool = multiprocessing.Pool(num_workers, initializer=_init_shard_evaluator,
+                              initargs=(shard_evaluator,))
+  try:
+    for shard in shards:
+      pending_results.append(pool.apply_async(_evaluate_shard, (shard,)))
+      # Results are merged in dispatch order so that they are deterministic.
+      if len(pending_results) >= max_pending_shards:
+        num_images += _merge_shard_result(evaluator,
+                                          pending_results.popleft(),
+                                          num_images)
+    while pending_results:
+      num_images += _merge_shard_result(evaluator, pending_results.popleft(),
+                                        num_images)
+  finally:
+    pool.close()
+    pool.join()
+  return num_images
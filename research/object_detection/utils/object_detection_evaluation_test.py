@@ -432,5 +432,189 @@ class ObjectDetectionEvaluationTest(tf.test.TestCase):
     self.assertAlmostEqual(expected_mean_corloc, mean_corloc)
 
 
+class MergeAccumulatorsTest(tf.test.TestCase):
+
+  def setUp(self):
+    self.categories = [{'id': 1, 'name': 'cat'},
+                       {'id': 2, 'name': 'dog'},
+                       {'id': 3, 'name': 'elephant'}]
+    random_state = np.random.RandomState(0)
+    self.image_infos = []
+    for image_index in range(20):
+      num_groundtruth = random_state.randint(1, 5)
+      num_detections = random_state.randint(0, 8)
+      groundtruth_boxes = self._random_boxes(random_state, num_groundtruth)
+      detected_boxes = np.concatenate([
+          groundtruth_boxes + random_state.uniform(
+              -2, 2, size=groundtruth_boxes.shape),
+          self._random_boxes(random_state, num_detections)])
+      groundtruth_dict = {
+          standard_fields.InputDataFields.groundtruth_boxes:
+              groundtruth_boxes,
+          standard_fields.InputDataFields.groundtruth_classes:
+              random_state.randint(1, 4, size=num_groundtruth),
+          standard_fields.InputDataFields.groundtruth_difficult:
+              random_state.uniform(size=num_groundtruth) < 0.2,
+          standard_fields.InputDataFields.groundtruth_image_classes:
+              np.array([1], dtype=int)
+      }
+      detections_dict = {
+          standard_fields.DetectionResultFields.detection_boxes:
+              detected_boxes,
+          standard_fields.DetectionResultFields.detection_scores:
+              random_state.uniform(size=detected_boxes.shape[0]),
+          standard_fields.DetectionResultFields.detection_classes:
+              random_state.randint(1, 4, size=detected_boxes.shape[0]),
+          standard_fields.DetectionResultFields.detection_scores_in_image_level:
+              np.array([0.9], dtype=float),
+          standard_fields.DetectionResultFields
+          .detection_classes_in_image_level:
+              np.array([1], dtype=int)
+      }
+      self.image_infos.append(
+          ('img{}'.format(image_index), groundtruth_dict, detections_dict))
+
+  def _random_boxes(self, random_state, num_boxes):
+    corners = random_state.uniform(0, 100, size=(num_boxes, 2))
+    sizes = random_state.uniform(5, 50, size=(num_boxes, 2))
+    return np.hstack([corners, corners + sizes])
+
+  def _copy_image_infos(self):
+    # Evaluators shift class labels in place, so each one gets its own copy.
+    return [(image_id, dict((key, np.copy(value))
+                            for key, value in groundtruth_dict.items()),
+             dict((key, np.copy(value))
+                  for key, value in detections_dict.items()))
+            for image_id, groundtruth_dict, detections_dict
+            in self.image_infos]
+
+  def _add_image_infos(self, evaluator, image_infos):
+    for image_id, groundtruth_dict, detections_dict in image_infos:
+      evaluator.add_single_ground_truth_image_info(image_id, groundtruth_dict)
+      evaluator.add_single_detected_image_info(image_id, detections_dict)
+
+  def _copy_open_images_infos(self):
+    """Returns copies of the image infos where some boxes are group-of."""
+    image_infos = self._copy_image_infos()
+    random_state = np.random.RandomState(1)
+    for _, groundtruth_dict, _ in image_infos:
+      num_groundtruth = groundtruth_dict[
+          standard_fields.InputDataFields.groundtruth_classes].shape[0]
+      groundtruth_dict[standard_fields.InputDataFields.groundtruth_group_of] = (
+          random_state.uniform(size=num_groundtruth) < 0.4)
+    return image_infos
+
+  def test_merged_shards_match_sequential_evaluation(self):
+    for evaluator_class in [
+        object_detection_evaluation.PascalDetectionEvaluator,
+        object_detection_evaluation.WeightedPascalDetectionEvaluator
+    ]:
+      sequential_evaluator = evaluator_class(self.categories)
+      self._add_image_infos(sequential_evaluator, self._copy_image_infos())
+
+      merged_evaluator = evaluator_class(self.categories)
+      image_infos = self._copy_image_infos()
+      for shard_start in range(0, len(image_infos), 7):
+        shard_evaluator = evaluator_class(self.categories)
+        self._add_image_infos(shard_evaluator,
+                              image_infos[shard_start:shard_start + 7])
+        merged_evaluator.merge_accumulators(
+            shard_evaluator.get_accumulators())
+
+      expected_metrics = sequential_evaluator.evaluate()
+      metrics = merged_evaluator.evaluate()
+      self.assertItemsEqual(expected_metrics.keys(), metrics.keys())
+      for key in expected_metrics:
+        self.assertAllClose(expected_metrics[key], metrics[key])
+
+  def test_merge_raises_on_duplicate_images(self):
+    image_infos = self._copy_image_infos()
+    evaluator = object_detection_evaluation.PascalDetectionEvaluator(
+        self.categories)
+    self._add_image_infos(evaluator, image_infos[:2])
+    other_evaluator = object_detection_evaluation.PascalDetectionEvaluator(
+        self.categories)
+    self._add_image_infos(other_evaluator, self._copy_image_infos()[1:3])
+    with self.assertRaises(ValueError):
+      evaluator.merge_accumulators(other_evaluator.get_accumulators())
+
+  def test_add_image_infos_in_chunks(self):
+    sequential_evaluator = (
+        object_detection_evaluation.PascalDetectionEvaluator(self.categories))
+    self._add_image_infos(sequential_evaluator, self._copy_image_infos())
+
+    chunked_evaluator = (
+        object_detection_evaluation.PascalDetectionEvaluator(self.categories))
+    num_images = object_detection_evaluation.add_image_infos_in_chunks(
+        chunked_evaluator, iter(self._copy_image_infos()), images_per_chunk=6)
+
+    self.assertEqual(num_images, len(self.image_infos))
+    expected_metrics = sequential_evaluator.evaluate()
+    metrics = chunked_evaluator.evaluate()
+    for key in expected_metrics:
+      self.assertAllClose(expected_metrics[key], metrics[key])
+
+  def test_add_image_infos_in_parallel(self):
+    sequential_evaluator = (
+        object_detection_evaluation.PascalDetectionEvaluator(self.categories))
+    self._add_image_infos(sequential_evaluator, self._copy_image_infos())
+
+    parallel_evaluator = (
+        object_detection_evaluation.PascalDetectionEvaluator(self.categories))
+    num_images = object_detection_evaluation.add_image_infos_in_parallel(
+        parallel_evaluator, iter(self._copy_image_infos()), num_workers=2,
+        images_per_shard=3, max_pending_shards=2)
+
+    self.assertEqual(num_images, len(self.image_infos))
+    expected_metrics = sequential_evaluator.evaluate()
+    metrics = parallel_evaluator.evaluate()
+    for key in expected_metrics:
+      self.assertAllClose(expected_metrics[key], metrics[key])
+
+  def test_open_images_merged_shards_match_sequential_evaluation(self):
+    evaluator_class = object_detection_evaluation.OpenImagesDetectionEvaluator
+    sequential_evaluator = evaluator_class(self.categories,
+                                           evaluate_corlocs=True)
+    self._add_image_infos(sequential_evaluator,
+                          self._copy_open_images_infos())
+    expected_metrics = sequential_evaluator.evaluate()
+
+    merged_evaluator = evaluator_class(self.categories, evaluate_corlocs=True)
+    image_infos = self._copy_open_images_infos()
+    for shard_start in range(0, len(image_infos), 7):
+      shard_evaluator = evaluator_class(self.categories, evaluate_corlocs=True)
+      self._add_image_infos(shard_evaluator,
+                            image_infos[shard_start:shard_start + 7])
+      merged_evaluator.merge_accumulators(shard_evaluator.get_accumulators())
+
+    chunked_evaluator = evaluator_class(self.categories, evaluate_corlocs=True)
+    object_detection_evaluation.add_image_infos_in_chunks(
+        chunked_evaluator, iter(self._copy_open_images_infos()),
+        images_per_chunk=6)
+
+    parallel_evaluator = evaluator_class(self.categories, evaluate_corlocs=True)
+    object_detection_evaluation.add_image_infos_in_parallel(
+        parallel_evaluator, iter(self._copy_open_images_infos()),
+        num_workers=2, images_per_shard=3, max_pending_shards=2)
+
+    for evaluator in [merged_evaluator, chunked_evaluator, parallel_evaluator]:
+      metrics = evaluator.evaluate()
+      self.assertItemsEqual(expected_metrics.keys(), metrics.keys())
+      for key in expected_metrics:
+        self.assertAllClose(expected_metrics[key], metrics[key])
+
+  def test_empty_copy_keeps_configuration_only(self):
+    evaluator = object_detection_evaluation.OpenImagesDetectionEvaluator(
+        self.categories, evaluate_corlocs=True)
+    self._add_image_infos(evaluator, self._copy_open_images_infos()[:3])
+    empty_evaluator = evaluator.empty_copy()
+    accumulators = empty_evaluator.get_accumulators()
+    self.assertFalse(accumulators.groundtruth_keys)
+    self.assertFalse(accumulators.detection_keys)
+    self.assertEqual(3, len(evaluator.get_accumulators().groundtruth_keys))
+    # The copy accepts the images already added to the original.
+    self._add_image_infos(empty_evaluator, self._copy_open_images_infos()[:3])
+
+
 if __name__ == '__main__':
   tf.test.main()
@@ -31,7 +31,8 @@ class PerImageEvaluation(object):
                num_groundtruth_classes,
                matching_iou_threshold=0.5,
                nms_iou_threshold=0.3,
-               nms_max_output_boxes=50):
+               nms_max_output_boxes=50,
+               nms_backend=np_box_list_ops.NmsBackend.LOOP):
     """Initialized PerImageEvaluation by evaluation parameters.
 
     Args:
@@ -40,10 +41,13 @@ class PerImageEvaluation(object):
           the threshold to consider whether a detection is true positive or not
       nms_iou_threshold: IOU threshold used in Non Maximum Suppression.
       nms_max_output_boxes: Number of maximum output boxes in NMS.
+      nms_backend: np_box_list_ops.NmsBackend used to run Non Maximum
+          Suppression.
     """
     self.matching_iou_threshold = matching_iou_threshold
     self.nms_iou_threshold = nms_iou_threshold
     self.nms_max_output_boxes = nms_max_output_boxes
+    self.nms_backend = nms_backend
     self.num_groundtruth_classes = num_groundtruth_classes
 
   def compute_object_detection_metrics(
@@ -123,16 +127,18 @@ class PerImageEvaluation(object):
     """
     is_class_correctly_detected_in_image = np.zeros(
         self.num_groundtruth_classes, dtype=int)
-    for i in range(self.num_groundtruth_classes):
-      gt_boxes_at_ith_class = groundtruth_boxes[groundtruth_class_labels ==
-                                                i, :]
-      detected_boxes_at_ith_class = detected_boxes[detected_class_labels ==
-                                                   i, :]
-      detected_scores_at_ith_class = detected_scores[detected_class_labels == i]
+    detected_order, detected_bounds = self._group_by_class(
+        detected_class_labels)
+    gt_order, gt_bounds = self._group_by_class(groundtruth_class_labels)
+    for i in self._classes_present_in(detected_bounds, gt_bounds):
+      detected_indices = detected_order[
+          detected_bounds[i]:detected_bounds[i + 1]]
+      gt_indices = gt_order[gt_bounds[i]:gt_bounds[i + 1]]
       is_class_correctly_detected_in_image[i] = (
           self._compute_is_aclass_correctly_detected_in_image(
-              detected_boxes_at_ith_class, detected_scores_at_ith_class,
-              gt_boxes_at_ith_class))
+              detected_boxes[detected_indices, :],
+              detected_scores[detected_indices],
+              groundtruth_boxes[gt_indices, :]))
 
     return is_class_correctly_detected_in_image
 
@@ -194,26 +200,54 @@ class PerImageEvaluation(object):
           shape [K, 1], representing K True/False positive label of object
           instances detected with class label c
     """
-    result_scores = []
-    result_tp_fp_labels = []
-    for i in range(self.num_groundtruth_classes):
-      gt_boxes_at_ith_class = groundtruth_boxes[(groundtruth_class_labels == i
-                                                ), :]
-      groundtruth_is_difficult_list_at_ith_class = (
-          groundtruth_is_difficult_lists[groundtruth_class_labels == i])
-      groundtruth_is_group_of_list_at_ith_class = (
-          groundtruth_is_group_of_list[groundtruth_class_labels == i])
-      detected_boxes_at_ith_class = detected_boxes[(detected_class_labels == i
-                                                   ), :]
-      detected_scores_at_ith_class = detected_scores[detected_class_labels == i]
+    result_scores = [
+        np.array([], dtype=float) for _ in range(self.num_groundtruth_classes)
+    ]
+    result_tp_fp_labels = [
+        np.array([], dtype=bool) for _ in range(self.num_groundtruth_classes)
+    ]
+    detected_order, detected_bounds = self._group_by_class(
+        detected_class_labels)
+    gt_order, gt_bounds = self._group_by_class(groundtruth_class_labels)
+    # Classes without detections have no true or false positives.
+    for i in self._classes_present_in(detected_bounds):
+      detected_indices = detected_order[
+          detected_bounds[i]:detected_bounds[i + 1]]
+      gt_indices = gt_order[gt_bounds[i]:gt_bounds[i + 1]]
       scores, tp_fp_labels = self._compute_tp_fp_for_single_class(
-          detected_boxes_at_ith_class, detected_scores_at_ith_class,
-          gt_boxes_at_ith_class, groundtruth_is_difficult_list_at_ith_class,
-          groundtruth_is_group_of_list_at_ith_class)
-      result_scores.append(scores)
-      result_tp_fp_labels.append(tp_fp_labels)
+          detected_boxes[detected_indices, :],
+          detected_scores[detected_indices],
+          groundtruth_boxes[gt_indices, :],
+          groundtruth_is_difficult_lists[gt_indices],
+          groundtruth_is_group_of_list[gt_indices])
+      result_scores[i] = scores
+      result_tp_fp_labels[i] = tp_fp_labels
     return result_scores, result_tp_fp_labels
 
+  def _group_by_class(self, class_labels):
+    """Groups the indices of boxes by class label with a single sort.
+
+    Args:
+      class_labels: An integer numpy array of length N.
+
+    Returns:
+      order: An integer numpy array of length N holding the box indices sorted
+          by class label. Boxes of the same class keep their relative order.
+      bounds: An integer numpy array of length num_groundtruth_classes + 1.
+          The boxes of class c are order[bounds[c]:bounds[c + 1]].
+    """
+    order = np.argsort(class_labels, kind='mergesort')
+    bounds = np.searchsorted(class_labels[order],
+                             np.arange(self.num_groundtruth_classes + 1))
+    return order, bounds
+
+  def _classes_present_in(self, *all_bounds):
+    """Returns the classes which have boxes in each of the given groupings."""
+    is_present = np.ones(self.num_groundtruth_classes, dtype=bool)
+    for bounds in all_bounds:
+      is_present &= bounds[1:] > bounds[:-1]
+    return np.nonzero(is_present)[0]
+
   def _remove_invalid_boxes(self, detected_boxes, detected_scores,
                             detected_class_labels):
     valid_indices = np.logical_and(detected_boxes[:, 0] < detected_boxes[:, 2],
@@ -256,7 +290,8 @@ class PerImageEvaluation(object):
     detected_boxlist = np_box_list.BoxList(detected_boxes)
     detected_boxlist.add_field('scores', detected_scores)
     detected_boxlist = np_box_list_ops.non_max_suppression(
-        detected_boxlist, self.nms_max_output_boxes, self.nms_iou_threshold)
+        detected_boxlist, self.nms_max_output_boxes, self.nms_iou_threshold,
+        backend=self.nms_backend)
 
     scores = detected_boxlist.get_field('scores')
 
@@ -283,17 +318,19 @@ class PerImageEvaluation(object):
           ~groundtruth_is_group_of_list]
       iou = np_box_list_ops.iou(detected_boxlist, gt_non_group_of_boxlist)
       max_overlap_gt_ids = np.argmax(iou, axis=1)
-      is_gt_box_detected = np.zeros(
-          gt_non_group_of_boxlist.num_boxes(), dtype=bool)
-      for i in range(detected_boxlist.num_boxes()):
-        gt_id = max_overlap_gt_ids[i]
-        if iou[i, gt_id] >= self.matching_iou_threshold:
-          if not groundtruth_nongroup_of_is_difficult_list[gt_id]:
-            if not is_gt_box_detected[gt_id]:
-              tp_fp_labels[i] = True
-              is_gt_box_detected[gt_id] = True
-          else:
-            is_matched_to_difficult_box[i] = True
+      is_matched = (
+          iou[np.arange(detected_boxlist.num_boxes()), max_overlap_gt_ids] >=
+          self.matching_iou_threshold)
+      is_matched_to_difficult_box = np.logical_and(
+          is_matched,
+          groundtruth_nongroup_of_is_difficult_list[max_overlap_gt_ids])
+      # Detections are sorted by decreasing score, so each non difficult
+      # groundtruth box is detected by the first detection matched to it.
+      candidate_ids = np.nonzero(
+          np.logical_and(is_matched, ~is_matched_to_difficult_box))[0]
+      _, first_candidates = np.unique(
+          max_overlap_gt_ids[candidate_ids], return_index=True)
+      tp_fp_labels[candidate_ids[first_candidates]] = True
 
     # Tp-fp evaluation for group of boxes.
     gt_group_of_boxlist = np_box_list.BoxList(
@@ -301,10 +338,9 @@ class PerImageEvaluation(object):
     if gt_group_of_boxlist.num_boxes() > 0:
       ioa = np_box_list_ops.ioa(gt_group_of_boxlist, detected_boxlist)
       max_overlap_group_of_gt = np.max(ioa, axis=0)
-      for i in range(detected_boxlist.num_boxes()):
-        if (not tp_fp_labels[i] and not is_matched_to_difficult_box[i] and
-            max_overlap_group_of_gt[i] >= self.matching_iou_threshold):
-          is_matched_to_group_of_box[i] = True
+      is_matched_to_group_of_box = (
+          ~tp_fp_labels & ~is_matched_to_difficult_box &
+          (max_overlap_group_of_gt >= self.matching_iou_threshold))
 
     return scores[~is_matched_to_difficult_box
                   & ~is_matched_to_group_of_box], tp_fp_labels[
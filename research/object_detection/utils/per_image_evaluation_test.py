@@ -18,6 +18,8 @@
 import numpy as np
 import tensorflow as tf
 
+from object_detection.utils import np_box_list_ops
+from object_detection.utils import np_box_ops
 from object_detection.utils import per_image_evaluation
 
 
@@ -221,6 +223,124 @@ class MultiClassesTpFpTest(tf.test.TestCase):
       self.assertTrue(np.array_equal(expected_tp_fp_labels[i], tp_fp_labels[i]))
 
 
+class SingleClassTpFpWithNmsTest(tf.test.TestCase):
+
+  def setUp(self):
+    self.detected_boxes = np.array([[0, 0, 1, 1], [0, 0, 1.1, 1.1],
+                                    [0, 0, 3, 3], [5, 5, 6, 6]],
+                                   dtype=float)
+    self.detected_scores = np.array([0.6, 0.8, 0.5, 0.7], dtype=float)
+    self.groundtruth_boxes = np.array([[0, 0, 1, 1], [5, 5, 6, 6]],
+                                      dtype=float)
+    self.groundtruth_is_difficult_list = np.zeros(2, dtype=bool)
+    self.groundtruth_is_group_of_list = np.zeros(2, dtype=bool)
+
+  def test_vectorized_nms_backend_matches_loop_backend(self):
+    loop_eval = per_image_evaluation.PerImageEvaluation(
+        num_groundtruth_classes=1, matching_iou_threshold=0.5,
+        nms_iou_threshold=0.5, nms_max_output_boxes=10)
+    vectorized_eval = per_image_evaluation.PerImageEvaluation(
+        num_groundtruth_classes=1, matching_iou_threshold=0.5,
+        nms_iou_threshold=0.5, nms_max_output_boxes=10,
+        nms_backend=np_box_list_ops.NmsBackend.VECTORIZED)
+    expected_scores = np.array([0.8, 0.7, 0.5], dtype=float)
+    expected_tp_fp_labels = np.array([True, True, False], dtype=bool)
+    for evaluator in [loop_eval, vectorized_eval]:
+      scores, tp_fp_labels = evaluator._compute_tp_fp_for_single_class(
+          self.detected_boxes, self.detected_scores, self.groundtruth_boxes,
+          self.groundtruth_is_difficult_list,
+          self.groundtruth_is_group_of_list)
+      self.assertTrue(np.allclose(expected_scores, scores))
+      self.assertTrue(np.array_equal(expected_tp_fp_labels, tp_fp_labels))
+
+
+def _reference_tp_fp_for_single_class(detected_boxes, detected_scores,
+                                      groundtruth_boxes,
+                                      groundtruth_is_difficult_list,
+                                      groundtruth_is_group_of_list,
+                                      matching_iou_threshold):
+  """Greedy per-detection tp/fp matching, without non maximum suppression."""
+  order = np.argsort(detected_scores)[::-1]
+  detected_boxes = detected_boxes[order]
+  scores = detected_scores[order]
+  num_detections = detected_boxes.shape[0]
+  tp_fp_labels = np.zeros(num_detections, dtype=bool)
+  is_ignored = np.zeros(num_detections, dtype=bool)
+  non_group_of_boxes = groundtruth_boxes[~groundtruth_is_group_of_list]
+  non_group_of_is_difficult = groundtruth_is_difficult_list[
+      ~groundtruth_is_group_of_list]
+  if non_group_of_boxes.shape[0] > 0:
+    iou = np_box_ops.iou(detected_boxes, non_group_of_boxes)
+    is_gt_box_detected = np.zeros(non_group_of_boxes.shape[0], dtype=bool)
+    for i in range(num_detections):
+      gt_id = np.argmax(iou[i])
+      if iou[i, gt_id] >= matching_iou_threshold:
+        if non_group_of_is_difficult[gt_id]:
+          is_ignored[i] = True
+        elif not is_gt_box_detected[gt_id]:
+          tp_fp_labels[i] = True
+          is_gt_box_detected[gt_id] = True
+  group_of_boxes = groundtruth_boxes[groundtruth_is_group_of_list]
+  if group_of_boxes.shape[0] > 0:
+    ioa = np_box_ops.ioa(group_of_boxes, detected_boxes)
+    for i in range(num_detections):
+      if (not tp_fp_labels[i] and not is_ignored[i] and
+          np.max(ioa[:, i]) >= matching_iou_threshold):
+        is_ignored[i] = True
+  return scores[~is_ignored], tp_fp_labels[~is_ignored]
+
+
+class MultiClassesTpFpEquivalenceTest(tf.test.TestCase):
+
+  def _random_boxes(self, random_state, num_boxes):
+    corners = random_state.uniform(0, 50, size=(num_boxes, 2))
+    sizes = random_state.uniform(1, 20, size=(num_boxes, 2))
+    return np.hstack([corners, corners + sizes])
+
+  def test_matches_per_class_reference(self):
+    num_groundtruth_classes = 50
+    matching_iou_threshold = 0.3
+    eval1 = per_image_evaluation.PerImageEvaluation(
+        num_groundtruth_classes, matching_iou_threshold,
+        nms_iou_threshold=1.0, nms_max_output_boxes=10000)
+    random_state = np.random.RandomState(0)
+    for _ in range(20):
+      num_detections = random_state.randint(0, 100)
+      num_groundtruth = random_state.randint(0, 30)
+      detected_boxes = self._random_boxes(random_state, num_detections)
+      detected_scores = random_state.permutation(num_detections) / 100.0
+      detected_class_labels = random_state.randint(
+          0, 5, size=num_detections) * 10
+      groundtruth_boxes = self._random_boxes(random_state, num_groundtruth)
+      groundtruth_class_labels = random_state.randint(
+          0, 5, size=num_groundtruth) * 10
+      groundtruth_is_difficult_list = (
+          random_state.uniform(size=num_groundtruth) < 0.2)
+      groundtruth_is_group_of_list = (
+          random_state.uniform(size=num_groundtruth) < 0.2)
+
+      scores, tp_fp_labels, _ = eval1.compute_object_detection_metrics(
+          detected_boxes, detected_scores, detected_class_labels,
+          groundtruth_boxes, groundtruth_class_labels,
+          groundtruth_is_difficult_list, groundtruth_is_group_of_list)
+
+      self.assertEqual(len(scores), num_groundtruth_classes)
+      self.assertEqual(len(tp_fp_labels), num_groundtruth_classes)
+      for i in range(num_groundtruth_classes):
+        detected_at_ith_class = detected_class_labels == i
+        gt_at_ith_class = groundtruth_class_labels == i
+        expected_scores, expected_tp_fp_labels = (
+            _reference_tp_fp_for_single_class(
+                detected_boxes[detected_at_ith_class],
+                detected_scores[detected_at_ith_class],
+                groundtruth_boxes[gt_at_ith_class],
+                groundtruth_is_difficult_list[gt_at_ith_class],
+                groundtruth_is_group_of_list[gt_at_ith_class],
+                matching_iou_threshold))
+        self.assertTrue(np.array_equal(expected_scores, scores[i]))
+        self.assertTrue(np.array_equal(expected_tp_fp_labels, tp_fp_labels[i]))
+
+
 class CorLocTest(tf.test.TestCase):
 
   def test_compute_corloc_with_normal_iou_threshold(self):
@@ -30,9 +30,6 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-import collections
-
-
 import numpy as np
 import tensorflow as tf
 
@@ -47,7 +44,7 @@ class EncoderManager(object):
     self.sessions = []
 
   def load_model(self, model_config, vocabulary_file, embedding_matrix_file,
-                 checkpoint_path):
+                 checkpoint_path, mmap_embeddings=False):
     """Loads a skip-thoughts model.
 
     Args:
@@ -59,6 +56,10 @@ class EncoderManager(object):
         [vocab_size, embedding_dim].
       checkpoint_path: SkipThoughtsModel checkpoint file or a directory
         containing a checkpoint file.
+      mmap_embeddings: If True, memory map the embedding matrix instead of
+        reading it into memory. Only the embeddings of the encoded words are
+        then read, which is much faster for the large embedding matrix of an
+        expanded vocabulary. Requires embedding_matrix_file to be a local file.
     """
     tf.logging.info("Reading vocabulary from %s", vocabulary_file)
     with tf.gfile.GFile(vocabulary_file, mode="r") as f:
@@ -67,19 +68,20 @@ class EncoderManager(object):
     tf.logging.info("Loaded vocabulary with %d words.", len(reverse_vocab))
 
     tf.logging.info("Loading embedding matrix from %s", embedding_matrix_file)
-    # Note: tf.gfile.GFile doesn't work here because np.load() calls f.seek()
-    # with 3 arguments.
-    with open(embedding_matrix_file, "r") as f:
-      embedding_matrix = np.load(f)
+    if mmap_embeddings:
+      embedding_matrix = np.load(embedding_matrix_file, mmap_mode="r")
+    else:
+      # Note: tf.gfile.GFile doesn't work here because np.load() calls f.seek()
+      # with 3 arguments.
+      with open(embedding_matrix_file, "r") as f:
+        embedding_matrix = np.load(f)
     tf.logging.info("Loaded embedding matrix with shape %s",
                     embedding_matrix.shape)
 
-    word_embeddings = collections.OrderedDict(
-        zip(reverse_vocab, embedding_matrix))
-
     g = tf.Graph()
     with g.as_default():
-      encoder = skip_thoughts_encoder.SkipThoughtsEncoder(word_embeddings)
+      encoder = skip_thoughts_encoder.SkipThoughtsEncoder(
+          vocab=reverse_vocab, embedding_matrix=embedding_matrix)
       restore_model = encoder.build_graph_from_config(model_config,
                                                       checkpoint_path)
 
@@ -94,7 +96,8 @@ class EncoderManager(object):
              use_norm=True,
              verbose=False,
              batch_size=128,
-             use_eos=False):
+             use_eos=False,
+             num_processes=1):
     """Encodes a sequence of sentences as skip-thought vectors.
 
     Args:
@@ -103,6 +106,7 @@ class EncoderManager(object):
       verbose: Whether to log every batch.
       batch_size: Batch size for the RNN encoders.
       use_eos: If True, append the end-of-sentence word to each input sentence.
+      num_processes: Number of processes for tokenizing input strings.
 
     Returns:
       thought_vectors: A list of numpy arrays corresponding to 'data'.
@@ -124,7 +128,8 @@ class EncoderManager(object):
                   use_norm=use_norm,
                   verbose=verbose,
                   batch_size=batch_size,
-                  use_eos=use_eos)))
+                  use_eos=use_eos,
+                  num_processes=num_processes)))
 
     return np.concatenate(encoded, axis=1)
 
@@ -29,6 +29,8 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import collections
+import multiprocessing
 import os.path
 
 
@@ -41,67 +43,111 @@ from skip_thoughts import skip_thoughts_model
 from skip_thoughts.data import special_words
 
 
-def _pad(seq, target_len):
-  """Pads a sequence of word embeddings up to the target length.
+# Punkt sentence detector of a tokenization worker process.
+_worker_sentence_detector = None
 
-  Args:
-    seq: Sequence of word embeddings.
-    target_len: Desired padded sequence length.
 
-  Returns:
-    embeddings: Input sequence padded with zero embeddings up to the target
-      length.
-    mask: A 0/1 vector with zeros corresponding to padded embeddings.
+def _load_sentence_detector():
+  return nltk.data.load("tokenizers/punkt/english.pickle")
 
-  Raises:
-    ValueError: If len(seq) is not in the interval (0, target_len].
-  """
-  seq_len = len(seq)
-  if seq_len <= 0 or seq_len > target_len:
-    raise ValueError("Expected 0 < len(seq) <= %d, got %d" % (target_len,
-                                                              seq_len))
 
-  emb_dim = seq[0].shape[0]
-  padded_seq = np.zeros(shape=(target_len, emb_dim), dtype=seq[0].dtype)
-  mask = np.zeros(shape=(target_len,), dtype=np.int8)
-  for i in range(seq_len):
-    padded_seq[i] = seq[i]
-    mask[i] = 1
-  return padded_seq, mask
+def _init_tokenize_worker():
+  """Loads the sentence detector in a tokenization worker process."""
+  global _worker_sentence_detector
+  _worker_sentence_detector = _load_sentence_detector()
+
+
+def _tokenize_in_worker(item):
+  return _tokenize(_worker_sentence_detector, item)
+
+
+def _tokenize(sentence_detector, item):
+  """Tokenizes an input string into a list of words."""
+  tokenized = []
+  for s in sentence_detector.tokenize(item):
+    tokenized.extend(nltk.tokenize.word_tokenize(s))
+
+  return tokenized
 
 
-def _batch_and_pad(sequences):
-  """Batches and pads sequences of word embeddings into a 2D array.
+def _gather_batch(embedding_matrix, ids, out=None):
+  """Gathers the word embeddings of a batch into a padded array.
 
   Args:
-    sequences: A list of batch_size sequences of word embeddings.
+    embedding_matrix: Numpy array with shape [vocab_size, emb_dim].
+    ids: A list of batch_size 1D numpy arrays of word ids.
+    out: Optional flat numpy array of at least batch_size * padded_length *
+      emb_dim elements to use as storage for the embeddings.
 
   Returns:
     embeddings: A numpy array with shape [batch_size, padded_length, emb_dim].
     mask: A numpy 0/1 array with shape [batch_size, padded_length] with zeros
       corresponding to padded elements.
+
+  Raises:
+    ValueError: If any of the sequences is empty.
   """
-  batch_embeddings = []
-  batch_mask = []
-  batch_len = max([len(seq) for seq in sequences])
-  for seq in sequences:
-    embeddings, mask = _pad(seq, batch_len)
-    batch_embeddings.append(embeddings)
-    batch_mask.append(mask)
-  return np.array(batch_embeddings), np.array(batch_mask)
+  lengths = np.array([len(seq) for seq in ids])
+  if np.any(lengths <= 0):
+    raise ValueError("Expected non-empty sequences, got %d empty sequences" %
+                     np.sum(lengths <= 0))
+
+  batch_len = lengths.max()
+  mask = (np.arange(batch_len) < lengths[:, np.newaxis]).astype(np.int8)
+  shape = (len(ids), batch_len, embedding_matrix.shape[1])
+  if out is None:
+    embeddings = np.zeros(shape, dtype=embedding_matrix.dtype)
+  else:
+    embeddings = out[:np.prod(shape)].reshape(shape)
+    embeddings.fill(0)
+  embeddings[mask.astype(np.bool_)] = np.take(
+      embedding_matrix, np.concatenate(ids), axis=0)
+  return embeddings, mask
 
 
 class SkipThoughtsEncoder(object):
   """Skip-thoughts sentence encoder."""
 
-  def __init__(self, embeddings):
+  def __init__(self,
+               embeddings=None,
+               vocab=None,
+               embedding_matrix=None,
+               cache_size=100000):
     """Initializes the encoder.
 
+    The word embeddings are given either as a dictionary or as a vocabulary
+    list with a corresponding embedding matrix, which avoids copying the
+    embeddings of a large vocabulary.
+
     Args:
       embeddings: Dictionary of word to embedding vector (1D numpy array).
+      vocab: List of words, where vocab[i] is the word with id i.
+      embedding_matrix: Numpy array with shape [len(vocab), emb_dim], e.g. a
+        memory mapped array.
+      cache_size: Maximum number of tokenized input strings to cache.
+
+    Raises:
+      ValueError: If not exactly one of embeddings and vocab is given, or if
+        the vocabulary does not contain the unknown word.
     """
-    self._sentence_detector = nltk.data.load("tokenizers/punkt/english.pickle")
-    self._embeddings = embeddings
+    if (embeddings is None) == (vocab is None):
+      raise ValueError("Expected exactly one of embeddings and vocab.")
+    if embeddings is not None:
+      vocab = list(embeddings.keys())
+      embedding_matrix = np.array(list(embeddings.values()))
+    elif embedding_matrix is None or len(embedding_matrix) != len(vocab):
+      raise ValueError("Expected an embedding matrix with %d rows." %
+                       len(vocab))
+
+    self._sentence_detector = _load_sentence_detector()
+    self._word_to_id = dict((w, i) for i, w in enumerate(vocab))
+    if special_words.UNK not in self._word_to_id:
+      raise ValueError("Vocabulary does not contain %s." % special_words.UNK)
+    self._embedding_matrix = embedding_matrix
+
+    # Least recently used cache of input string to word ids.
+    self._cache_size = cache_size
+    self._cache = collections.OrderedDict()
 
   def _create_restore_fn(self, checkpoint_path, saver):
     """Creates a function that restores a model from checkpoint.
@@ -182,36 +228,67 @@ class SkipThoughtsEncoder(object):
 
     return self._create_restore_fn(checkpoint_path, saver)
 
-  def _tokenize(self, item):
-    """Tokenizes an input string into a list of words."""
-    tokenized = []
-    for s in self._sentence_detector.tokenize(item):
-      tokenized.extend(nltk.tokenize.word_tokenize(s))
-
-    return tokenized
+  def _word_ids(self, words):
+    """Returns the ids of a list of words."""
+    unk_id = self._word_to_id[special_words.UNK]
+    return np.array([self._word_to_id.get(w, unk_id) for w in words],
+                    dtype=np.int32)
 
-  def _word_to_embedding(self, w):
-    """Returns the embedding of a word."""
-    return self._embeddings.get(w, self._embeddings[special_words.UNK])
+  def _preprocess(self, data, use_eos, num_processes):
+    """Maps input strings to word ids.
 
-  def _preprocess(self, data, use_eos):
-    """Preprocesses text for the encoder.
+    Strings that are not in the cache are tokenized, in num_processes worker
+    processes if num_processes > 1.
 
     Args:
       data: A list of input strings.
       use_eos: Whether to append the end-of-sentence word to each sentence.
+      num_processes: Number of tokenization processes.
 
     Returns:
-      embeddings: A list of word embedding sequences corresponding to the input
+      ids: A list of 1D numpy arrays of word ids corresponding to the input
         strings.
     """
-    preprocessed_data = []
-    for item in data:
-      tokenized = self._tokenize(item)
-      if use_eos:
-        tokenized.append(special_words.EOS)
-      preprocessed_data.append([self._word_to_embedding(w) for w in tokenized])
-    return preprocessed_data
+    ids = [None] * len(data)
+    misses = collections.OrderedDict()
+    for i, item in enumerate(data):
+      cached = self._cache.pop(item, None)
+      if cached is not None:
+        # Reinserting marks the entry as most recently used.
+        self._cache[item] = cached
+        ids[i] = cached
+      else:
+        misses.setdefault(item, []).append(i)
+
+    items = list(misses.keys())
+    if num_processes > 1 and len(items) > 1:
+      pool = multiprocessing.Pool(
+          min(num_processes, len(items)), initializer=_init_tokenize_worker)
+      try:
+        tokenized = pool.map(
+            _tokenize_in_worker, items,
+            chunksize=max(1, len(items) // (4 * num_processes)))
+      finally:
+        pool.terminate()
+        pool.join()
+    else:
+      tokenized = [_tokenize(self._sentence_detector, item) for item in items]
+
+    for item, words in zip(items, tokenized):
+      item_ids = self._word_ids(words)
+      for i in misses[item]:
+        ids[i] = item_ids
+      if self._cache_size > 0:
+        self._cache[item] = item_ids
+
+    while len(self._cache) > self._cache_size:
+      self._cache.popitem(last=False)
+
+    if use_eos:
+      eos_id = self._word_to_id[special_words.EOS]
+      ids = [np.append(item_ids, eos_id) for item_ids in ids]
+
+    return ids
 
   def encode(self,
              sess,
@@ -219,9 +296,13 @@ class SkipThoughtsEncoder(object):
              use_norm=True,
              verbose=True,
              batch_size=128,
-             use_eos=False):
+             use_eos=False,
+             num_processes=1):
     """Encodes a sequence of sentences as skip-thought vectors.
 
+    The sentences are batched in order of decreasing length to minimize
+    padding.
+
     Args:
       sess: TensorFlow Session.
       data: A list of input strings.
@@ -230,29 +311,47 @@ class SkipThoughtsEncoder(object):
       batch_size: Batch size for the encoder.
       use_eos: Whether to append the end-of-sentence word to each input
         sentence.
+      num_processes: Number of processes for tokenizing input strings that
+        are not cached.
 
     Returns:
       thought_vectors: A list of numpy arrays corresponding to the skip-thought
         encodings of sentences in 'data'.
     """
-    data = self._preprocess(data, use_eos)
-    thought_vectors = []
-
+    data = self._preprocess(data, use_eos, num_processes)
+    if not data:
+      return []
+
+    lengths = np.array([len(item_ids) for item_ids in data])
+    order = np.argsort(-lengths, kind="mergesort")
+    # Storage for the embeddings of the longest (first) batch, which is reused
+    # by all batches.
+    buf = np.empty(
+        min(batch_size, len(data)) * lengths.max() *
+        self._embedding_matrix.shape[1],
+        dtype=self._embedding_matrix.dtype)
+
+    thought_vectors = None
     batch_indices = np.arange(0, len(data), batch_size)
     for batch, start_index in enumerate(batch_indices):
       if verbose:
         tf.logging.info("Batch %d / %d.", batch, len(batch_indices))
 
-      embeddings, mask = _batch_and_pad(
-          data[start_index:start_index + batch_size])
+      batch_order = order[start_index:start_index + batch_size]
+      embeddings, mask = _gather_batch(
+          self._embedding_matrix, [data[i] for i in batch_order], out=buf)
       feed_dict = {
           "encode_emb:0": embeddings,
           "encode_mask:0": mask,
       }
-      thought_vectors.extend(
-          sess.run("encoder/thought_vectors:0", feed_dict=feed_dict))
+      batch_vectors = sess.run("encoder/thought_vectors:0",
+                               feed_dict=feed_dict)
+      if thought_vectors is None:
+        thought_vectors = np.empty(
+            (len(data),) + batch_vectors.shape[1:], dtype=batch_vectors.dtype)
+      thought_vectors[batch_order] = batch_vectors
 
     if use_norm:
-      thought_vectors = [v / np.linalg.norm(v) for v in thought_vectors]
+      thought_vectors /= np.linalg.norm(thought_vectors, axis=1, keepdims=True)
 
-    return thought_vectors
+    return list(thought_vectors)
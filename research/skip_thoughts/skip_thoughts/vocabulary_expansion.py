@@ -63,6 +63,13 @@ tf.flags.DEFINE_string("word2vec_model", None,
 
 tf.flags.DEFINE_string("output_dir", None, "Output directory.")
 
+tf.flags.DEFINE_integer("batch_size", 0,
+                        "If positive, predict the expanded embeddings in "
+                        "batches of this many words and write them directly "
+                        "to the embeddings file, which can then be memory "
+                        "mapped. Otherwise the expanded embeddings are "
+                        "predicted one word at a time and held in memory.")
+
 tf.logging.set_verbosity(tf.logging.INFO)
 
 
@@ -116,8 +123,8 @@ def _load_vocabulary(filename):
   return vocab
 
 
-def _expand_vocabulary(skip_thoughts_emb, skip_thoughts_vocab, word2vec):
-  """Runs vocabulary expansion on a skip-thoughts model using a word2vec model.
+def _fit_linear_model(skip_thoughts_emb, skip_thoughts_vocab, word2vec):
+  """Fits a linear mapping from word2vec to skip-thoughts embeddings.
 
   Args:
     skip_thoughts_emb: A numpy array of shape [skip_thoughts_vocab_size,
@@ -126,7 +133,8 @@ def _expand_vocabulary(skip_thoughts_emb, skip_thoughts_vocab, word2vec):
     word2vec: An instance of gensim.models.Word2Vec.
 
   Returns:
-    combined_emb: A dictionary mapping words to embedding vectors.
+    model: An instance of sklearn.linear_model.LinearRegression trained on the
+        words shared between the two vocabularies.
   """
   # Find words shared between the two vocabularies.
   tf.logging.info("Finding shared words")
@@ -144,6 +152,23 @@ def _expand_vocabulary(skip_thoughts_emb, skip_thoughts_vocab, word2vec):
   model = sklearn.linear_model.LinearRegression()
   model.fit(shared_w2v_emb, shared_st_emb)
 
+  return model
+
+
+def _expand_vocabulary(skip_thoughts_emb, skip_thoughts_vocab, word2vec):
+  """Runs vocabulary expansion on a skip-thoughts model using a word2vec model.
+
+  Args:
+    skip_thoughts_emb: A numpy array of shape [skip_thoughts_vocab_size,
+        skip_thoughts_embedding_dim].
+    skip_thoughts_vocab: A dictionary of word to id.
+    word2vec: An instance of gensim.models.Word2Vec.
+
+  Returns:
+    combined_emb: A dictionary mapping words to embedding vectors.
+  """
+  model = _fit_linear_model(skip_thoughts_emb, skip_thoughts_vocab, word2vec)
+
   # Create the expanded vocabulary.
   tf.logging.info("Creating embeddings for expanded vocabuary")
   combined_emb = collections.OrderedDict()
@@ -161,6 +186,63 @@ def _expand_vocabulary(skip_thoughts_emb, skip_thoughts_vocab, word2vec):
   return combined_emb
 
 
+def _expand_vocabulary_to_file(skip_thoughts_emb, skip_thoughts_vocab,
+                               word2vec, output_dir, batch_size):
+  """Runs vocabulary expansion in batches and writes the output files.
+
+  The expanded vocabulary has the same words in the same order as the output
+  of _expand_vocabulary, but the embeddings are predicted batch_size words at a
+  time and written directly to a .npy file, so that neither the expanded
+  embeddings nor a per-word dictionary are ever held in memory.
+
+  Args:
+    skip_thoughts_emb: A numpy array of shape [skip_thoughts_vocab_size,
+        skip_thoughts_embedding_dim].
+    skip_thoughts_vocab: A dictionary of word to id.
+    word2vec: An instance of gensim.models.Word2Vec.
+    output_dir: Directory to write vocab.txt and embeddings.npy to.
+    batch_size: Number of words to predict embeddings for at a time.
+  """
+  model = _fit_linear_model(skip_thoughts_emb, skip_thoughts_vocab, word2vec)
+
+  # Ignore words with underscores (spaces).
+  w2v_words = [w for w in word2vec.vocab if "_" not in w]
+  word_ids = dict((w, i) for i, w in enumerate(w2v_words))
+  vocab = w2v_words + [w for w in skip_thoughts_vocab if w not in word_ids]
+  for w in vocab[len(w2v_words):]:
+    word_ids[w] = len(word_ids)
+
+  embeddings_file = os.path.join(output_dir, "embeddings.npy")
+  embeddings = np.lib.format.open_memmap(
+      embeddings_file,
+      mode="w+",
+      dtype=skip_thoughts_emb.dtype,
+      shape=(len(vocab), skip_thoughts_emb.shape[1]))
+
+  tf.logging.info("Creating embeddings for expanded vocabulary")
+  for start in range(0, len(w2v_words), batch_size):
+    batch_words = w2v_words[start:start + batch_size]
+    embeddings[start:start + len(batch_words)] = model.predict(
+        word2vec[batch_words])
+    tf.logging.info("Predicted embeddings for %d of %d words",
+                    start + len(batch_words), len(w2v_words))
+
+  # Skip-thoughts embeddings replace the predicted embeddings of shared words.
+  st_words = list(skip_thoughts_vocab.keys())
+  embeddings[[word_ids[w] for w in st_words]] = skip_thoughts_emb[[
+      skip_thoughts_vocab[w] for w in st_words
+  ]]
+  embeddings.flush()
+  del embeddings
+  tf.logging.info("Wrote embeddings file to %s", embeddings_file)
+
+  vocab_file = os.path.join(output_dir, "vocab.txt")
+  with tf.gfile.GFile(vocab_file, "w") as f:
+    f.write("\n".join(vocab))
+  tf.logging.info("Wrote vocabulary file of %d words to %s", len(vocab),
+                  vocab_file)
+
+
 def main(unused_argv):
   if not FLAGS.skip_thoughts_model:
     raise ValueError("--skip_thoughts_model is required.")
@@ -182,6 +264,11 @@ def main(unused_argv):
   word2vec = gensim.models.Word2Vec.load_word2vec_format(
       FLAGS.word2vec_model, binary=True)
 
+  if FLAGS.batch_size > 0:
+    _expand_vocabulary_to_file(skip_thoughts_emb, skip_thoughts_vocab,
+                               word2vec, FLAGS.output_dir, FLAGS.batch_size)
+    return
+
   # Run vocabulary expansion.
   embedding_map = _expand_vocabulary(skip_thoughts_emb, skip_thoughts_vocab,
                                      word2vec)
@@ -14,31 +14,135 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""Simple tool for inspecting nearest neighbors and analogies."""
+"""Simple tool for inspecting nearest neighbors and analogies.
+
+Usage:
+
+  nearest.py -v <vocab> -e <embeddings> [options]
+
+Options:
+
+  -v <filename>, --vocab <filename>
+    The vocabulary file.
+
+  -e <filename>, --embeddings <filename>
+    The binary vector file (see "text2bin.py").
+
+  --normalized
+    The embeddings were written by --write_normalized and are memory mapped
+    without loading them into memory.
+
+  --write_normalized <filename>
+    Writes the normalized embeddings to <filename> and exits.
+
+  -k <n>
+    The number of neighbors to show (default 20).
+
+  --clusters <n>
+    Answers queries with an approximate index of <n> clusters, which is
+    loaded from --index if that exists, and otherwise built (and saved to
+    --index, if given).
+
+  --index <filename>
+    The file of the approximate index.
+
+  --probes <n>
+    The number of clusters searched per query (default 8).
+
+  --recall <n>
+    Measures the recall of the approximate index on <n> random words and exits.
+"""
 
 from __future__ import print_function
+import os
 import re
 import sys
+import time
 from getopt import GetoptError, getopt
 
-from vecs import Vecs
+import numpy as np
+
+from vecs import ClusterIndex, Vecs, measure_recall, write_normalized
 
 try:
-  opts, args = getopt(sys.argv[1:], 'v:e:', ['vocab=', 'embeddings='])
+  opts, args = getopt(sys.argv[1:], 'v:e:k:', [
+      'vocab=', 'embeddings=', 'normalized', 'write_normalized=', 'clusters=',
+      'index=', 'probes=', 'recall='])
 except GetoptError as e:
   print(e, file=sys.stderr)
   sys.exit(2)
 
 opt_vocab = 'vocab.txt'
 opt_embeddings = None
+opt_normalized = False
+opt_write_normalized = None
+opt_k = 20
+opt_clusters = 0
+opt_index = None
+opt_probes = 8
+opt_recall = 0
 
 for o, a in opts:
   if o in ('-v', '--vocab'):
     opt_vocab = a
   if o in ('-e', '--embeddings'):
     opt_embeddings = a
-
-vecs = Vecs(opt_vocab, opt_embeddings)
+  if o == '--normalized':
+    opt_normalized = True
+  if o == '--write_normalized':
+    opt_write_normalized = a
+  if o == '-k':
+    opt_k = int(a)
+  if o == '--clusters':
+    opt_clusters = int(a)
+  if o == '--index':
+    opt_index = a
+  if o == '--probes':
+    opt_probes = int(a)
+  if o == '--recall':
+    opt_recall = int(a)
+
+if opt_write_normalized:
+  write_normalized(opt_vocab, opt_embeddings, opt_write_normalized)
+  sys.exit(0)
+
+vecs = Vecs(opt_vocab, opt_embeddings, normalized=opt_normalized)
+
+index = None
+if opt_clusters:
+  start = time.time()
+  if opt_index and os.path.exists(opt_index):
+    index = ClusterIndex.load(vecs, opt_index)
+  else:
+    index = ClusterIndex.build(vecs, opt_clusters)
+    if opt_index:
+      index.save(opt_index)
+  print('index ready in %0.1fs' % (time.time() - start))
+
+if opt_recall:
+  if not index:
+    print('--recall requires --clusters', file=sys.stderr)
+    sys.exit(2)
+  sample = np.random.RandomState(0).choice(
+      len(vecs.vocab), min(opt_recall, len(vecs.vocab)), replace=False)
+  recall = measure_recall(index, vecs.vecs[np.sort(sample)], opt_k, opt_probes)
+  print('recall@%d with %d probes: %0.4f' % (opt_k, opt_probes, recall))
+  sys.exit(0)
+
+
+def neighbors(query):
+  """Returns the nearest neighbors of a word or vector, using the index."""
+  if not index:
+    return vecs.neighbors(query, opt_k)
+
+  if not isinstance(query, np.ndarray):
+    query = vecs.lookup(query)
+    if query is None:
+      return None
+
+  indices, scores = index.search(query, opt_k, opt_probes)
+  return [(vecs.vocab[idx], score)
+          for idx, score in zip(indices[0], scores[0]) if idx >= 0]
 
 while True:
   sys.stdout.write('query> ')
@@ -51,7 +155,7 @@ while True:
   parts = re.split(r'\s+', query)
 
   if len(parts) == 1:
-    res = vecs.neighbors(parts[0])
+    res = neighbors(parts[0])
 
   elif len(parts) == 3:
     vs = [vecs.lookup(w) for w in parts]
@@ -61,7 +165,7 @@ while True:
 
       continue
 
-    res = vecs.neighbors(vs[2] - vs[0] + vs[1])
+    res = neighbors(vs[2] - vs[0] + vs[1])
 
   else:
     print('use a single word to query neighbors, or three words for analogy')
@@ -70,7 +174,7 @@ while True:
   if not res:
     continue
 
-  for word, sim in res[:20]:
+  for word, sim in res[:opt_k]:
     print('%0.4f: %s' % (sim, word))
 
   print()
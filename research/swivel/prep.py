@@ -53,14 +53,21 @@ Options:
   --bufsz <int>
       The number of co-occurrences that are buffered; default 16M.
 
+  --num_workers <int>
+      The number of processes counting co-occurrences; default 1. With more
+      than one worker, the corpus is split into byte ranges that are counted
+      in parallel, and the partial counts are merged per shard.
+
 """
 
 import itertools
 import math
+import multiprocessing
 import os
 import struct
 import sys
 
+import numpy as np
 from six.moves import xrange
 import tensorflow as tf
 
@@ -78,6 +85,8 @@ flags.DEFINE_string('vocab', '', 'Vocabulary to use instead of generating one')
 flags.DEFINE_integer('window_size', 10, 'The window size')
 flags.DEFINE_integer('bufsz', 16 * 1024 * 1024,
                      'The number of co-occurrences to buffer')
+flags.DEFINE_integer('num_workers', 1,
+                     'The number of processes counting co-occurrences')
 
 FLAGS = flags.FLAGS
 
@@ -214,6 +223,30 @@ def compute_coocs(lines, vocab):
   return shardfiles, sums
 
 
+def write_shard(row, col, num_shards, local_rows, local_cols, values):
+  """Writes the co-occurrences of a shard as a tf.Example proto."""
+  def _int64s(xs):
+    return tf.train.Feature(int64_list=tf.train.Int64List(value=list(xs)))
+
+  def _floats(xs):
+    return tf.train.Feature(float_list=tf.train.FloatList(value=list(xs)))
+
+  example = tf.train.Example(features=tf.train.Features(feature={
+      'global_row': _int64s(
+          row + num_shards * i for i in range(FLAGS.shard_size)),
+      'global_col': _int64s(
+          col + num_shards * i for i in range(FLAGS.shard_size)),
+
+      'sparse_local_row': _int64s(local_rows),
+      'sparse_local_col': _int64s(local_cols),
+      'sparse_value': _floats(values),
+  }))
+
+  filename = os.path.join(FLAGS.output_dir, 'shard-%03d-%03d.pb' % (row, col))
+  with open(filename, 'w') as out:
+    out.write(example.SerializeToString())
+
+
 def write_shards(vocab, shardfiles):
   """Processes the temporary files to generate the final shard data.
 
@@ -261,29 +294,264 @@ def write_shards(vocab, shardfiles):
 
       coocs = coocs[:(1 + current_pos)]
 
-    # Convert to a TF Example proto.
-    def _int64s(xs):
-      return tf.train.Feature(int64_list=tf.train.Int64List(value=list(xs)))
+    write_shard(row, col, num_shards,
+                (cooc[0] for cooc in coocs),
+                (cooc[1] for cooc in coocs),
+                (cooc[2] for cooc in coocs))
 
-    def _floats(xs):
-      return tf.train.Feature(float_list=tf.train.FloatList(value=list(xs)))
+  sys.stdout.write('\n')
 
-    example = tf.train.Example(features=tf.train.Features(feature={
-        'global_row': _int64s(
-            row + num_shards * i for i in range(FLAGS.shard_size)),
-        'global_col': _int64s(
-            col + num_shards * i for i in range(FLAGS.shard_size)),
 
-        'sparse_local_row': _int64s(cooc[0] for cooc in coocs),
-        'sparse_local_col': _int64s(cooc[1] for cooc in coocs),
-        'sparse_value': _floats(cooc[2] for cooc in coocs),
-    }))
+# The vocabulary of the worker processes, set by _init_worker.
+_worker_word_to_id = None
 
-    filename = os.path.join(FLAGS.output_dir, 'shard-%03d-%03d.pb' % (row, col))
-    with open(filename, 'w') as out:
-      out.write(example.SerializeToString())
 
-  sys.stdout.write('\n')
+def _init_worker(word_to_id):
+  global _worker_word_to_id
+  _worker_word_to_id = word_to_id
+
+
+def split_corpus(filename, num_chunks):
+  """Splits a file into byte ranges of roughly equal size.
+
+  Each range is later extended to the end of the line it ends in, and skips the
+  partial line it starts in, so that every line is read by exactly one range.
+  """
+  nbytes = os.path.getsize(filename)
+  bounds = [nbytes * i // num_chunks for i in range(num_chunks + 1)]
+  return [(start, end) for start, end in zip(bounds[:-1], bounds[1:])
+          if end > start]
+
+
+def _read_lines(filename, start, end):
+  """Yields the lines of a file that start within the byte range [start, end).
+  """
+  with open(filename, 'rb') as lines:
+    if start > 0:
+      # Skip to the start of the first line that starts at or after `start`.
+      lines.seek(start - 1)
+      pos = start - 1 + len(lines.readline())
+    else:
+      pos = 0
+
+    while pos < end:
+      line = lines.readline()
+      if not line:
+        break
+
+      pos += len(line)
+      if not isinstance(line, str):
+        line = line.decode('utf-8')
+
+      yield line
+
+
+class _CoocBuffer(object):
+  """Accumulates co-occurrence counts in compact arrays.
+
+  Counts for the pairs (a, b) with a <= b are buffered as flat int64 keys
+  a * vocab_size + b and float64 values, and compacted by summing the values
+  of equal keys. When more than max_size distinct pairs are buffered, the
+  buffer is spilled to a sorted run on disk (see _write_run).
+  """
+
+  def __init__(self, vocab_size, max_size, run_prefix):
+    self.vocab_size = vocab_size
+    self.max_size = max_size
+    self.run_prefix = run_prefix
+    self.runs = []
+    self._keys = []
+    self._values = []
+    self._num_buffered = 0
+    self._num_compacted = 0
+
+  def add(self, lids, rids, counts):
+    self._keys.append(np.minimum(lids, rids) * self.vocab_size +
+                      np.maximum(lids, rids))
+    self._values.append(counts)
+    self._num_buffered += len(lids)
+    if self._num_buffered > self._num_compacted + self.max_size:
+      self._compact()
+      if self._num_compacted > self.max_size:
+        self.spill()
+
+  def _compact(self):
+    if len(self._keys) > 1 or self._num_buffered > self._num_compacted:
+      keys, inverse = np.unique(np.concatenate(self._keys),
+                                return_inverse=True)
+      values = np.bincount(inverse, weights=np.concatenate(self._values))
+      self._keys, self._values = [keys], [values]
+    self._num_buffered = self._num_compacted = (
+        len(self._keys[0]) if self._keys else 0)
+
+  def spill(self):
+    """Writes the buffered counts to a new run and clears the buffer."""
+    self._compact()
+    if self._keys:
+      run_prefix = '%s-%03d' % (self.run_prefix, len(self.runs))
+      _write_run(run_prefix, self._keys[0], self._values[0], self.vocab_size)
+      self.runs.append(run_prefix)
+
+    self._keys, self._values = [], []
+    self._num_buffered = self._num_compacted = 0
+
+
+def _write_run(run_prefix, keys, values, vocab_size):
+  """Writes compacted co-occurrence counts to disk, grouped by shard.
+
+  Since only (a, b) with a <= b is counted, both (a, b) and (b, a) are emitted,
+  as in compute_coocs. The run consists of three .npy files: the shard-major
+  keys (shard * shard_size^2 + local_row * shard_size + local_col) sorted in
+  increasing order, their values, and the offsets of each shard's keys.
+  """
+  num_shards = vocab_size // FLAGS.shard_size
+  lo, hi = keys // vocab_size, keys % vocab_size
+  rows = np.concatenate([lo, hi])
+  cols = np.concatenate([hi, lo])
+  shard = (rows % num_shards) * num_shards + cols % num_shards
+  shard_keys = ((shard * FLAGS.shard_size + rows // num_shards) *
+                FLAGS.shard_size + cols // num_shards)
+  order = np.argsort(shard_keys, kind='mergesort')
+  shard_keys = shard_keys[order]
+  offsets = np.searchsorted(
+      shard_keys,
+      np.arange(num_shards * num_shards + 1) * FLAGS.shard_size ** 2)
+
+  np.save(run_prefix + '.keys.npy', shard_keys)
+  np.save(run_prefix + '.values.npy', np.concatenate([values, values])[order])
+  np.save(run_prefix + '.offsets.npy', offsets)
+
+
+def _count_coocs_in_range(args):
+  """Counts the co-occurrences of the lines in a byte range of the corpus.
+
+  Returns:
+    A tuple (runs, sums) of the run prefixes holding the counts and the
+    marginal sums of the range.
+  """
+  filename, start, end, run_prefix = args
+  word_to_id = _worker_word_to_id
+  vocab_size = len(word_to_id)
+  buf = _CoocBuffer(vocab_size, FLAGS.bufsz, run_prefix)
+  sums = np.zeros(vocab_size)
+
+  def count_block(ids, line_ids):
+    if not ids:
+      return
+
+    ids = np.array(ids, dtype=np.int64)
+    line_ids = np.array(line_ids, dtype=np.int64)
+
+    # Every token co-occurs with itself; only add 1/2 since (a, a) is emitted
+    # twice.
+    sums[:] += np.bincount(ids, minlength=vocab_size)
+    buf.add(ids, ids, np.full(len(ids), 0.5))
+
+    for off in xrange(1, FLAGS.window_size + 1):
+      same_line = line_ids[:-off] == line_ids[off:]
+      if not np.any(same_line):
+        break
+
+      lids = ids[:-off][same_line]
+      rids = ids[off:][same_line]
+      count = 1.0 / off
+      sums[:] += count * (np.bincount(lids, minlength=vocab_size) +
+                          np.bincount(rids, minlength=vocab_size))
+      buf.add(lids, rids, np.full(len(lids), count))
+
+  # Lines are batched into blocks of tokens, so that the pairs of all lines in
+  # a block are counted with a few array operations.
+  ids, line_ids = [], []
+  for lineno, line in enumerate(_read_lines(filename, start, end)):
+    # Computes the word IDs for each word in the sentence.  This has the effect
+    # of "stretching" the window past OOV tokens.
+    wids = [wid for wid in (word_to_id.get(w) for w in words(line))
+            if wid is not None]
+    ids.extend(wids)
+    line_ids.extend([lineno] * len(wids))
+    if len(ids) >= 1024 * 1024:
+      count_block(ids, line_ids)
+      ids, line_ids = [], []
+
+  count_block(ids, line_ids)
+  buf.spill()
+  return buf.runs, sums
+
+
+def _merge_shard(args):
+  """Merges the partial counts of a shard from all runs and writes it."""
+  shard, runs, num_shards = args
+  keys, values = [], []
+  for run_prefix in runs:
+    offsets = np.load(run_prefix + '.offsets.npy')
+    begin, end = offsets[shard], offsets[shard + 1]
+    if begin < end:
+      keys.append(np.load(run_prefix + '.keys.npy', mmap_mode='r')[begin:end])
+      values.append(
+          np.load(run_prefix + '.values.npy', mmap_mode='r')[begin:end])
+
+  local_keys = np.zeros(0, dtype=np.int64)
+  local_values = np.zeros(0)
+  if keys:
+    local_keys, inverse = np.unique(
+        np.concatenate(keys) % FLAGS.shard_size ** 2, return_inverse=True)
+    local_values = np.bincount(inverse, weights=np.concatenate(values))
+
+  write_shard(shard // num_shards, shard % num_shards, num_shards,
+              local_keys // FLAGS.shard_size, local_keys % FLAGS.shard_size,
+              local_values)
+
+
+def compute_coocs_parallel(filename, vocab, num_workers):
+  """Computes the co-occurrence shards from the text with worker processes.
+
+  The corpus is split into byte ranges whose co-occurrences are counted in
+  parallel. Each worker accumulates compact count arrays that are spilled to
+  sorted runs (see _write_run), and the runs are then merged shard by shard,
+  also in parallel, to write the final shards.
+
+  Returns:
+    The marginal sums.
+  """
+  word_to_id = {tok: idx for idx, tok in enumerate(vocab)}
+  num_shards = len(vocab) // FLAGS.shard_size
+  ranges = split_corpus(filename, 4 * num_workers)
+  tasks = [(filename, start, end,
+            os.path.join(FLAGS.output_dir, 'coocs-%03d' % ix))
+           for ix, (start, end) in enumerate(ranges)]
+
+  pool = multiprocessing.Pool(
+      num_workers, initializer=_init_worker, initargs=(word_to_id,))
+  try:
+    runs = []
+    sums = np.zeros(len(vocab))
+    for ix, (range_runs, range_sums) in enumerate(
+        pool.imap_unordered(_count_coocs_in_range, tasks), start=1):
+      runs.extend(range_runs)
+      sums += range_sums
+      sys.stdout.write('\rComputing co-occurrences: %d/%d ranges...' % (
+          ix, len(tasks)))
+      sys.stdout.flush()
+
+    sys.stdout.write('\n')
+
+    merge_tasks = [(shard, runs, num_shards)
+                   for shard in range(num_shards * num_shards)]
+    for ix, _ in enumerate(pool.imap_unordered(_merge_shard, merge_tasks),
+                           start=1):
+      sys.stdout.write('\rwriting shard %d/%d' % (ix, len(merge_tasks)))
+      sys.stdout.flush()
+
+    sys.stdout.write('\n')
+  finally:
+    pool.terminate()
+    pool.join()
+
+  for run_prefix in runs:
+    for suffix in ('.keys.npy', '.values.npy', '.offsets.npy'):
+      os.unlink(run_prefix + suffix)
+
+  return sums
 
 
 def main(_):
@@ -300,11 +568,14 @@ def main(_):
       vocab = create_vocabulary(lines)
 
   # Now read the file again to determine the co-occurrence stats.
-  with open(FLAGS.input, 'r') as lines:
-    shardfiles, sums = compute_coocs(lines, vocab)
+  if FLAGS.num_workers > 1:
+    sums = compute_coocs_parallel(FLAGS.input, vocab, FLAGS.num_workers)
+  else:
+    with open(FLAGS.input, 'r') as lines:
+      shardfiles, sums = compute_coocs(lines, vocab)
 
-  # Collect individual shards into the shards.recs file.
-  write_shards(vocab, shardfiles)
+    # Collect individual shards into the shards.recs file.
+    write_shards(vocab, shardfiles)
 
   # Now write the marginals.  They're symmetric for this application.
   write_vocab_and_sums(vocab, sums, 'row_vocab.txt', 'row_sums.txt')
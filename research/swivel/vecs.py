@@ -12,67 +12,149 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import mmap
 import numpy as np
 import os
 
 from six import string_types
 
+# Number of vectors processed at once when normalizing or scoring, which bounds
+# the memory used on top of the memory mapped vectors.
+CHUNK_SIZE = 65536
 
-class Vecs(object):
-  def __init__(self, vocab_filename, rows_filename, cols_filename=None):
-    """Initializes the vectors from a text vocabulary and binary data."""
-    with open(vocab_filename, 'r') as lines:
-      self.vocab = [line.split()[0] for line in lines]
-      self.word_to_idx = {word: idx for idx, word in enumerate(self.vocab)}
-
-    n = len(self.vocab)
-
-    with open(rows_filename, 'r') as rows_fh:
-      rows_fh.seek(0, os.SEEK_END)
-      size = rows_fh.tell()
-
-      # Make sure that the file size seems reasonable.
-      if size % (4 * n) != 0:
-        raise IOError(
-            'unexpected file size for binary vector file %s' % rows_filename)
-
-      # Memory map the rows.
-      dim = size / (4 * n)
-      rows_mm = mmap.mmap(rows_fh.fileno(), 0, prot=mmap.PROT_READ)
-      rows = np.matrix(
-          np.frombuffer(rows_mm, dtype=np.float32).reshape(n, dim))
-
-      # If column vectors were specified, then open them and add them to the
-      # row vectors.
-      if cols_filename:
-        with open(cols_filename, 'r') as cols_fh:
-          cols_mm = mmap.mmap(cols_fh.fileno(), 0, prot=mmap.PROT_READ)
-          cols_fh.seek(0, os.SEEK_END)
-          if cols_fh.tell() != size:
-            raise IOError('row and column vector files have different sizes')
 
-          cols = np.matrix(
-              np.frombuffer(cols_mm, dtype=np.float32).reshape(n, dim))
+def _read_vocab(vocab_filename):
+  with open(vocab_filename, 'r') as lines:
+    return [line.split()[0] for line in lines]
+
+
+def _map_vectors(filename, n):
+  """Memory maps an n x dim float32 binary vector file."""
+  size = os.path.getsize(filename)
+
+  # Make sure that the file size seems reasonable.
+  if n == 0 or size % (4 * n) != 0:
+    raise IOError('unexpected file size for binary vector file %s' % filename)
+
+  return np.memmap(filename, dtype=np.float32, mode='r',
+                   shape=(n, size // (4 * n)))
+
+
+def _normalized_chunks(vocab_filename, rows_filename, cols_filename=None):
+  """Yields chunks of the normalized sum of the row and column vectors."""
+  n = len(_read_vocab(vocab_filename))
+  rows = _map_vectors(rows_filename, n)
+  cols = None
+  if cols_filename:
+    cols = _map_vectors(cols_filename, n)
+    if cols.shape != rows.shape:
+      raise IOError('row and column vector files have different sizes')
+
+  for start in range(0, n, CHUNK_SIZE):
+    chunk = np.array(rows[start:start + CHUNK_SIZE])
+    if cols is not None:
+      chunk += cols[start:start + CHUNK_SIZE]
+
+    # Normalize so that dot products are just cosine similarity.
+    chunk /= np.linalg.norm(chunk, axis=1, keepdims=True)
+    yield chunk
+
 
-          rows += cols
-          cols_mm.close()
+def write_normalized(vocab_filename, rows_filename, output_filename,
+                     cols_filename=None):
+  """Writes the normalized vectors to a binary vector file.
 
-      # Normalize so that dot products are just cosine similarity.
-      self.vecs = rows / np.linalg.norm(rows, axis=1).reshape(n, 1)
-      rows_mm.close()
+  The output has the same format as the input vector files, so that it can be
+  memory mapped by Vecs(..., normalized=True) without copying or normalizing
+  the vectors again.
+  """
+  with open(output_filename, 'wb') as out:
+    for chunk in _normalized_chunks(vocab_filename, rows_filename,
+                                    cols_filename):
+      out.write(chunk.tobytes())
+
+
+def _top_k(scores, k):
+  """Returns the indices and scores of the k largest scores of each row.
+
+  Only the k largest scores are sorted, using argpartition to select them.
+  """
+  k = min(k, scores.shape[1])
+  rows = np.arange(scores.shape[0])[:, np.newaxis]
+  if k < scores.shape[1]:
+    indices = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+  else:
+    indices = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+
+  indices = indices[rows, np.argsort(-scores[rows, indices], axis=1)]
+  return indices, scores[rows, indices]
+
+
+class Vecs(object):
+  def __init__(self, vocab_filename, rows_filename, cols_filename=None,
+               normalized=False):
+    """Initializes the vectors from a text vocabulary and binary data.
+
+    If normalized is True, rows_filename is a file written by write_normalized
+    and is memory mapped as is. Otherwise the row vectors (plus the column
+    vectors, if given) are normalized into memory.
+    """
+    self.vocab = _read_vocab(vocab_filename)
+    self.word_to_idx = {word: idx for idx, word in enumerate(self.vocab)}
+
+    if normalized:
+      if cols_filename:
+        raise ValueError('normalized vectors already include the columns')
+      self.vecs = _map_vectors(rows_filename, len(self.vocab))
+    else:
+      self.vecs = np.empty(_map_vectors(rows_filename, len(self.vocab)).shape,
+                           dtype=np.float32)
+      start = 0
+      for chunk in _normalized_chunks(vocab_filename, rows_filename,
+                                      cols_filename):
+        self.vecs[start:start + len(chunk)] = chunk
+        start += len(chunk)
 
   def similarity(self, word1, word2):
     """Computes the similarity of two tokens."""
     idx1 = self.word_to_idx.get(word1)
     idx2 = self.word_to_idx.get(word2)
-    if not idx1 or not idx2:
+    if idx1 is None or idx2 is None:
       return None
 
-    return float(self.vecs[idx1] * self.vecs[idx2].transpose())
+    return float(np.dot(self.vecs[idx1], self.vecs[idx2]))
+
+  def search(self, queries, k):
+    """Finds the k nearest neighbors of a batch of query vectors.
 
-  def neighbors(self, query):
-    """Returns the nearest neighbors to the query (a word or vector)."""
+    The vectors are scored in chunks, so that only the top k of each chunk is
+    kept in memory.
+
+    Args:
+      queries: a [num_queries, dim] array of query vectors.
+      k: the number of neighbors per query.
+
+    Returns:
+      A tuple (indices, scores) of [num_queries, k] arrays, sorted by
+      decreasing similarity.
+    """
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    rows = np.arange(len(queries))[:, np.newaxis]
+    best_indices = np.zeros((len(queries), 0), dtype=np.int64)
+    best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+    for start in range(0, len(self.vecs), CHUNK_SIZE):
+      indices, scores = _top_k(
+          np.dot(queries, self.vecs[start:start + CHUNK_SIZE].T), k)
+      candidate_indices = np.hstack([best_indices, indices + start])
+      order, best_scores = _top_k(np.hstack([best_scores, scores]), k)
+      best_indices = candidate_indices[rows, order]
+
+    return best_indices, best_scores
+
+  def neighbors(self, query, k=None):
+    """Returns the nearest neighbors to the query (a word or vector).
+
+    If k is given, only the k nearest neighbors are returned.
+    """
     if isinstance(query, string_types):
       idx = self.word_to_idx.get(query)
       if idx is None:
@@ -80,13 +162,119 @@ class Vecs(object):
 
       query = self.vecs[idx]
 
-    neighbors = self.vecs * query.transpose()
+    indices, scores = self.search(
+        np.asarray(query).reshape(1, -1), k or len(self.vocab))
 
-    return sorted(
-      zip(self.vocab, neighbors.flat),
-      key=lambda kv: kv[1], reverse=True)
+    return [(self.vocab[idx], float(score))
+            for idx, score in zip(indices[0], scores[0])]
 
   def lookup(self, word):
     """Returns the embedding for a token, or None if no embedding exists."""
     idx = self.word_to_idx.get(word)
     return None if idx is None else self.vecs[idx]
+
+
+class ClusterIndex(object):
+  """Approximate nearest neighbor index over Vecs.
+
+  The vectors are clustered with spherical k-means, and a query is only scored
+  against the vectors of the num_probes clusters whose centroids are most
+  similar to it. More probes trade speed for recall, see measure_recall.
+  """
+
+  def __init__(self, vecs, centroids, order, offsets):
+    """Initializes the index.
+
+    Args:
+      vecs: the indexed Vecs.
+      centroids: a [num_clusters, dim] array of normalized cluster centroids.
+      order: the indices of the vectors, grouped by cluster.
+      offsets: a [num_clusters + 1] array; the vectors of cluster c are
+        order[offsets[c]:offsets[c + 1]].
+    """
+    self.vecs = vecs
+    self.centroids = centroids
+    self.order = order
+    self.offsets = offsets
+
+  @classmethod
+  def build(cls, vecs, num_clusters, num_iterations=10, sample_size=100000,
+            seed=0):
+    """Clusters the vectors of vecs into num_clusters clusters.
+
+    The centroids are trained on a random sample of sample_size vectors, then
+    every vector is assigned to its most similar centroid.
+    """
+    rng = np.random.RandomState(seed)
+    n = len(vecs.vecs)
+    num_clusters = min(num_clusters, n)
+    sample = vecs.vecs[np.sort(rng.choice(n, min(sample_size, n),
+                                          replace=False))]
+    centroids = sample[rng.choice(len(sample), num_clusters, replace=False)]
+    for _ in range(num_iterations):
+      assignments = np.argmax(np.dot(sample, centroids.T), axis=1)
+      sums = np.zeros_like(centroids)
+      np.add.at(sums, assignments, sample)
+      empty = ~np.any(sums, axis=1)
+      # Restart empty clusters from random sample vectors.
+      sums[empty] = sample[rng.choice(len(sample), np.sum(empty))]
+      centroids = sums / np.linalg.norm(sums, axis=1, keepdims=True)
+
+    assignments = np.concatenate([
+        np.argmax(np.dot(vecs.vecs[start:start + CHUNK_SIZE], centroids.T),
+                  axis=1)
+        for start in range(0, n, CHUNK_SIZE)])
+    order = np.argsort(assignments, kind='mergesort')
+    offsets = np.searchsorted(assignments[order], np.arange(num_clusters + 1))
+    return cls(vecs, centroids.astype(np.float32), order, offsets)
+
+  def save(self, filename):
+    """Saves the clustering to filename (a .npz file)."""
+    with open(filename, 'wb') as out:
+      np.savez(out, centroids=self.centroids, order=self.order,
+               offsets=self.offsets)
+
+  @classmethod
+  def load(cls, vecs, filename):
+    """Loads a clustering of vecs saved by save."""
+    with np.load(filename) as index:
+      return cls(vecs, index['centroids'], index['order'], index['offsets'])
+
+  def search(self, queries, k, num_probes=8):
+    """Approximately finds the k nearest neighbors of a batch of queries.
+
+    Args:
+      queries: a [num_queries, dim] array of query vectors.
+      k: the number of neighbors per query.
+      num_probes: the number of clusters searched per query.
+
+    Returns:
+      A tuple (indices, scores) as returned by Vecs.search. If the probed
+      clusters hold fewer than k vectors, the missing neighbors have index -1
+      and score -inf.
+    """
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    probes, _ = _top_k(np.dot(queries, self.centroids.T), num_probes)
+    indices = np.full((len(queries), k), -1, dtype=np.int64)
+    scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    for i, query in enumerate(queries):
+      candidates = np.concatenate([
+          self.order[self.offsets[c]:self.offsets[c + 1]] for c in probes[i]])
+      if not len(candidates):
+        continue
+      candidates.sort()
+      top, top_scores = _top_k(
+          np.dot(self.vecs.vecs[candidates], query)[np.newaxis, :], k)
+      indices[i, :top.shape[1]] = candidates[top[0]]
+      scores[i, :top.shape[1]] = top_scores[0]
+
+    return indices, scores
+
+
+def measure_recall(index, queries, k, num_probes=8):
+  """Returns the fraction of the exact k nearest neighbors found by index."""
+  exact_indices, _ = index.vecs.search(queries, k)
+  approx_indices, _ = index.search(queries, k, num_probes)
+  found = sum(len(np.intersect1d(exact, approx))
+              for exact, approx in zip(exact_indices, approx_indices))
+  return float(found) / exact_indices.size
@@ -14,6 +14,10 @@
 # ==============================================================================
 
 """Utilities for reading and writing sentences in dragnn."""
+import random
+import threading
+
+from six.moves import queue
 import tensorflow as tf
 from syntaxnet.ops import gen_parser_ops
 
@@ -100,3 +104,146 @@ class ConllSentenceReader(FormatSentenceReader):
         batch_size=batch_size,
         projectivize=projectivize,
         morph_to_pos=morph_to_pos)
+
+
+class StreamingSentenceReader(object):
+  """Streams shuffled batches of sentences without loading the whole corpus.
+
+  A background thread reads sentences from a FormatSentenceReader, shuffles them
+  through a buffer of at most |shuffle_buffer_size| sentences and groups them
+  into batches, of which at most |prefetch_batches| are kept ready. Each pass
+  over the corpus uses a new reader created by |reader_fn|. Sentences are
+  shuffled only within the buffer, so the buffer should be large compared to
+  any ordering of the corpus, e.g. by document.
+
+  The reader is an iterator over batches, i.e. lists of serialized sentences.
+  All batches have |batch_size| sentences, except for the last one when the
+  number of epochs is limited. Call close() to stop the background thread
+  before the stream is exhausted.
+
+  Example usage:
+    reader = StreamingSentenceReader(
+        functools.partial(ConllSentenceReader, corpus_path), batch_size=32)
+    for batch in reader:
+      ...
+  """
+
+  def __init__(self,
+               reader_fn,
+               batch_size,
+               shuffle_buffer_size=10000,
+               prefetch_batches=8,
+               num_epochs=None,
+               seed=None,
+               transform_fn=None):
+    """Starts streaming.
+
+    Args:
+      reader_fn: Function without arguments that returns a new
+        FormatSentenceReader over the corpus.
+      batch_size: Number of sentences per batch.
+      shuffle_buffer_size: Maximum number of sentences held for shuffling. If
+        zero, sentences are streamed in corpus order.
+      prefetch_batches: Maximum number of batches read ahead.
+      num_epochs: Number of passes over the corpus, or None to repeat it
+        forever.
+      seed: Seed of the shuffling.
+      transform_fn: Optional function applied to each list of sentences read
+        from the corpus, e.g. to convert them into char-based sentences.
+    """
+    self._reader_fn = reader_fn
+    self._batch_size = batch_size
+    self._shuffle_buffer_size = shuffle_buffer_size
+    self._num_epochs = num_epochs
+    self._transform_fn = transform_fn
+    self._random = random.Random(seed)
+    self._batches = queue.Queue(maxsize=prefetch_batches)
+    self._stopped = threading.Event()
+    self._done = False
+    self._thread = threading.Thread(target=self._produce)
+    self._thread.daemon = True
+    self._thread.start()
+
+  def _put(self, item):
+    """Queues |item|, returning False if the reader was closed first."""
+    while not self._stopped.is_set():
+      try:
+        self._batches.put(item, timeout=0.1)
+        return True
+      except queue.Full:
+        pass
+    return False
+
+  def _sentences(self):
+    """Yields the shuffled sentences of all epochs."""
+    shuffle_buffer = []
+    epoch = 0
+    while self._num_epochs is None or epoch < self._num_epochs:
+      reader = self._reader_fn()
+      num_read = 0
+      is_last = False
+      while not is_last and not self._stopped.is_set():
+        sentences, is_last = reader.read()
+        if self._transform_fn and sentences:
+          sentences = self._transform_fn(sentences)
+        num_read += len(sentences)
+        for sentence in sentences:
+          if len(shuffle_buffer) < self._shuffle_buffer_size:
+            shuffle_buffer.append(sentence)
+            continue
+          if shuffle_buffer:
+            index = self._random.randrange(len(shuffle_buffer))
+            sentence, shuffle_buffer[index] = shuffle_buffer[index], sentence
+          yield sentence
+      if self._stopped.is_set():
+        return
+      if not num_read:
+        raise ValueError('Corpus does not contain any sentences.')
+      epoch += 1
+      tf.logging.info('Finished streaming epoch %d.', epoch)
+
+    self._random.shuffle(shuffle_buffer)
+    for sentence in shuffle_buffer:
+      yield sentence
+
+  def _produce(self):
+    """Body of the background thread, which batches the sentences."""
+    try:
+      batch = []
+      for sentence in self._sentences():
+        batch.append(sentence)
+        if len(batch) == self._batch_size:
+          if not self._put(batch):
+            return
+          batch = []
+      if batch:
+        self._put(batch)
+    except Exception as e:  # pylint: disable=broad-except
+      # Raised in the consuming thread by next().
+      self._put(e)
+    finally:
+      self._put(None)
+
+  def __iter__(self):
+    return self
+
+  def next(self):
+    """Returns the next batch of sentences."""
+    if self._done:
+      raise StopIteration
+    batch = self._batches.get()
+    if batch is None or isinstance(batch, Exception):
+      self._done = True
+      self._thread.join()
+      if batch is None:
+        raise StopIteration
+      raise batch
+    return batch
+
+  __next__ = next
+
+  def close(self):
+    """Stops reading sentences."""
+    self._stopped.set()
+    self._done = True
+    self._thread.join()
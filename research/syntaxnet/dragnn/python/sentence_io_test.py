@@ -13,6 +13,8 @@
 # limitations under the License.
 # ==============================================================================
 
+import collections
+import functools
 import os
 import tensorflow as tf
 
@@ -80,6 +82,35 @@ class ConllSentenceReaderTest(test_util.TensorFlowTestCase):
     self.assertParseable(reader, 0, True)
     self.assertParseable(reader, 0, True)
 
+  def testStreamShuffledEpochs(self):
+    corpus = sentence_io.ConllSentenceReader(self.filepath).corpus()
+    reader = sentence_io.StreamingSentenceReader(
+        functools.partial(sentence_io.ConllSentenceReader, self.filepath),
+        self.batch_size, shuffle_buffer_size=10, num_epochs=2, seed=1)
+    batches = list(reader)
+    self.assertEqual([20, 20, 20, 20, 20, 8], [len(b) for b in batches])
+    streamed = [s for batch in batches for s in batch]
+    self.assertEqual(collections.Counter(corpus * 2),
+                     collections.Counter(streamed))
+    self.assertNotEqual(corpus, streamed[:len(corpus)])
+
+  def testStreamWithoutShuffling(self):
+    corpus = sentence_io.ConllSentenceReader(self.filepath).corpus()
+    reader = sentence_io.StreamingSentenceReader(
+        functools.partial(sentence_io.ConllSentenceReader, self.filepath),
+        self.batch_size, shuffle_buffer_size=0, num_epochs=1)
+    self.assertEqual(corpus, [s for batch in reader for s in batch])
+
+  def testCloseStream(self):
+    reader = sentence_io.StreamingSentenceReader(
+        functools.partial(sentence_io.ConllSentenceReader, self.filepath),
+        self.batch_size, prefetch_batches=1)
+    for _ in range(10):
+      self.assertEqual(self.batch_size, len(next(reader)))
+    reader.close()
+    with self.assertRaises(StopIteration):
+      next(reader)
+
 
 if __name__ == '__main__':
   googletest.main()
@@ -19,6 +19,8 @@ Provides functions to finish a MasterSpec, building required lexicons for it and
 adding them as resources, as well as setting features sizes.
 """
 
+import collections
+import multiprocessing.pool
 import random
 
 
@@ -28,6 +30,8 @@ from tensorflow.core.framework.summary_pb2 import Summary
 from tensorflow.python.framework import errors
 from tensorflow.python.platform import gfile
 
+from dragnn.python import sentence_io
+
 flags = tf.app.flags
 FLAGS = flags.FLAGS
 
@@ -50,17 +54,97 @@ def write_summary(summary_writer, label, value, step):
   summary_writer.flush()
 
 
-def annotate_dataset(sess, annotator, eval_corpus):
-  """Annotate eval_corpus given a model."""
-  batch_size = min(len(eval_corpus), 1024)
+def _with_is_last(items):
+  """Yields (item, is_last) for each item, reading one item ahead."""
+  iterator = iter(items)
+  try:
+    previous = next(iterator)
+  except StopIteration:
+    return
+  for item in iterator:
+    yield previous, False
+    previous = item
+  yield previous, True
+
+
+def annotate_batches(sess, annotator, batches, num_threads=1,
+                     max_pending_batches=4, feed_dict=None, run_metadata=None):
+  """Annotates batches of sentences, overlapping the runs of the annotator.
+
+  Up to |num_threads| batches are annotated concurrently, so that input
+  preparation and output handling of one batch overlap with the annotation of
+  others. Batches are only read from |batches| as needed, so it can be a stream
+  such as a sentence_io.StreamingSentenceReader.
+
+  Args:
+    sess: TF session to use.
+    annotator: Annotation op, a dict with the 'input_batch' tensor fed with
+      serialized sentences and the 'annotations' tensor to compute.
+    batches: Iterable of lists of serialized sentences.
+    num_threads: Number of concurrent runs of the annotator.
+    max_pending_batches: Maximum number of batches being annotated or waiting
+      to be returned, which bounds the memory used.
+    feed_dict: Optional additional feeds of every run, e.g. inference beam
+      sizes.
+    run_metadata: Optional tf.RunMetadata. If given, the last batch is
+      annotated with full tracing, and its step stats are collected into it.
+
+  Yields:
+    The list of serialized annotations of each batch, in the order of |batches|.
+  """
+  def annotate(batch, is_last):
+    batch_feed_dict = dict(feed_dict or {})
+    batch_feed_dict[annotator['input_batch']] = batch
+    if run_metadata is not None and is_last:
+      serialized_annotations = sess.run(
+          annotator['annotations'], feed_dict=batch_feed_dict,
+          options=tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE),
+          run_metadata=run_metadata)
+    else:
+      serialized_annotations = sess.run(
+          annotator['annotations'], feed_dict=batch_feed_dict)
+    assert len(serialized_annotations) == len(batch)
+    return serialized_annotations
+
+  if run_metadata is not None:
+    batches = _with_is_last(batches)
+  else:
+    batches = ((batch, False) for batch in batches)
+
+  if num_threads <= 1:
+    for batch, is_last in batches:
+      yield annotate(batch, is_last)
+    return
+
+  pool = multiprocessing.pool.ThreadPool(num_threads)
+  try:
+    pending = collections.deque()
+    for batch, is_last in batches:
+      if len(pending) >= max(max_pending_batches, num_threads):
+        yield pending.popleft().get()
+      pending.append(pool.apply_async(annotate, (batch, is_last)))
+    while pending:
+      yield pending.popleft().get()
+  finally:
+    pool.terminate()
+    pool.join()
+
+
+def annotate_dataset(sess, annotator, eval_corpus, num_threads=1,
+                     batch_size=1024, feed_dict=None, run_metadata=None):
+  """Annotate eval_corpus given a model.
+
+  The corpus is annotated in batches of at most |batch_size| sentences by
+  annotate_batches, see there for the other arguments.
+  """
+  batch_size = max(1, min(len(eval_corpus), batch_size))
   processed = []
   tf.logging.info('Annotating datset: %d examples', len(eval_corpus))
-  for start in range(0, len(eval_corpus), batch_size):
-    end = min(start + batch_size, len(eval_corpus))
-    serialized_annotations = sess.run(
-        annotator['annotations'],
-        feed_dict={annotator['input_batch']: eval_corpus[start:end]})
-    assert len(serialized_annotations) == end - start
+  batches = (eval_corpus[start:start + batch_size]
+             for start in range(0, len(eval_corpus), batch_size))
+  for serialized_annotations in annotate_batches(
+      sess, annotator, batches, num_threads=num_threads, feed_dict=feed_dict,
+      run_metadata=run_metadata):
     processed.extend(serialized_annotations)
   tf.logging.info('Done. Produced %d annotations', len(processed))
   return processed
@@ -82,15 +166,25 @@ def get_summary_writer(tensorboard_dir):
 
 
 def run_training_step(sess, trainer, train_corpus, batch_size):
-  """Runs a single iteration of train_op on a randomly sampled batch."""
-  batch = random.sample(train_corpus, batch_size)
+  """Runs a single iteration of train_op on a randomly sampled batch.
+
+  If |train_corpus| is a sentence_io.StreamingSentenceReader, its next batch is
+  used instead.
+  """
+  if isinstance(train_corpus, sentence_io.StreamingSentenceReader):
+    batch = next(train_corpus)
+  else:
+    # Sample indices, since |train_corpus| may be a numpy array of sentences.
+    batch = [train_corpus[i]
+             for i in random.sample(xrange(len(train_corpus)), batch_size)]
   sess.run(trainer['run'], feed_dict={trainer['input_batch']: batch})
 
 
 def run_training(sess, trainers, annotator, evaluator, pretrain_steps,
                  train_steps, train_corpus, eval_corpus, eval_gold,
                  batch_size, summary_writer, report_every, saver,
-                 checkpoint_filename, checkpoint_stats=None):
+                 checkpoint_filename, checkpoint_stats=None,
+                 annotation_threads=1):
   """Runs multi-task DRAGNN training on a single corpus.
 
   Arguments:
@@ -102,7 +196,8 @@ def run_training(sess, trainers, annotator, evaluator, pretrain_steps,
       summary will be used for early stopping.
     pretrain_steps: List of the no. of pre-training steps for each train op.
     train_steps: List of the total no. of steps for each train op.
-    train_corpus: Training corpus to use.
+    train_corpus: Training corpus to use, either a sequence of sentences or a
+      sentence_io.StreamingSentenceReader, see run_training_step.
     eval_corpus: Holdout Corpus for early stoping.
     eval_gold: Reference of eval_corpus for computing accuracy.
       eval_corpus and eval_gold are allowed to be the same if eval_corpus
@@ -116,6 +211,8 @@ def run_training(sess, trainers, annotator, evaluator, pretrain_steps,
     saver: TF saver op to save variables.
     checkpoint_filename: File to save checkpoints to.
     checkpoint_stats: Stats of checkpoint.
+    annotation_threads: Number of concurrent runs of the annotator when
+      annotating eval_corpus, see annotate_batches.
   """
   random.seed(0x31337)
 
@@ -148,7 +245,8 @@ def run_training(sess, trainers, annotator, evaluator, pretrain_steps,
     if step % report_every == 0:
       tf.logging.info('finished step: %d, actual: %d', step, actual_step + step)
 
-      annotated = annotate_dataset(sess, annotator, eval_corpus)
+      annotated = annotate_dataset(sess, annotator, eval_corpus,
+                                   num_threads=annotation_threads)
       summaries = evaluator(eval_gold, annotated)
       for label, metric in summaries.iteritems():
         write_summary(summary_writer, label, metric, actual_step + step)
@@ -0,0 +1,126 @@
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for trainer_lib."""
+
+import random
+import threading
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from tensorflow.python.framework import test_util
+from tensorflow.python.platform import googletest
+
+from dragnn.python import sentence_io
+from dragnn.python import trainer_lib
+
+
+class FakeSession(object):
+  """Session annotating sentences after a random delay."""
+
+  def __init__(self):
+    self.feed_dicts = []
+    self.traced_batches = []
+    self._lock = threading.Lock()
+
+  def run(self, fetches, feed_dict, options=None, run_metadata=None):
+    assert fetches == 'annotations'
+    batch = feed_dict['input_batch']
+    with self._lock:
+      self.feed_dicts.append(feed_dict)
+      if run_metadata is not None:
+        self.traced_batches.append(batch)
+    # Delay runs so that concurrent runs finish out of order.
+    time.sleep(random.uniform(0, 0.01))
+    return ['annotated %s' % sentence for sentence in batch]
+
+
+class FakeTrainingSession(object):
+  """Session recording the batches fed to the training op."""
+
+  def __init__(self):
+    self.batches = []
+
+  def run(self, fetches, feed_dict):
+    assert fetches == 'run'
+    self.batches.append(list(feed_dict['input_batch']))
+
+
+class FakeSentenceReader(object):
+  """FormatSentenceReader returning a fixed list of sentences."""
+
+  def __init__(self, sentences):
+    self._sentences = sentences
+
+  def read(self):
+    return self._sentences, True
+
+
+ANNOTATOR = {'input_batch': 'input_batch', 'annotations': 'annotations'}
+TRAINER = {'input_batch': 'input_batch', 'run': 'run'}
+
+
+class TrainerLibTest(test_util.TensorFlowTestCase):
+
+  def testAnnotateBatchesKeepsOrder(self):
+    batches = [['sentence %d.%d' % (i, j) for j in range(i % 3 + 1)]
+               for i in range(50)]
+    for num_threads in [1, 4]:
+      annotations = list(trainer_lib.annotate_batches(
+          FakeSession(), ANNOTATOR, iter(batches), num_threads=num_threads))
+      self.assertEqual([['annotated %s' % sentence for sentence in batch]
+                        for batch in batches], annotations)
+
+  def testAnnotateDataset(self):
+    corpus = ['sentence %d' % i for i in range(25)]
+    sess = FakeSession()
+    run_metadata = object()
+    annotations = trainer_lib.annotate_dataset(
+        sess, ANNOTATOR, corpus, num_threads=3, batch_size=4,
+        feed_dict={'beam_size': 8}, run_metadata=run_metadata)
+    self.assertEqual(['annotated %s' % sentence for sentence in corpus],
+                     annotations)
+    self.assertEqual(7, len(sess.feed_dicts))
+    for feed_dict in sess.feed_dicts:
+      self.assertEqual(8, feed_dict['beam_size'])
+    # Only the last batch is traced.
+    self.assertEqual([corpus[24:]], sess.traced_batches)
+
+  def testRunTrainingStepSamplesSequences(self):
+    sentences = ['sentence %d' % i for i in range(10)]
+    # Char-based corpora are numpy arrays returned by Session.run().
+    for corpus in [sentences, np.array(sentences, dtype=object)]:
+      sess = FakeTrainingSession()
+      trainer_lib.run_training_step(sess, TRAINER, corpus, 4)
+      self.assertEqual(1, len(sess.batches))
+      self.assertEqual(4, len(set(sess.batches[0])))
+      self.assertTrue(set(sess.batches[0]).issubset(sentences))
+
+  def testRunTrainingStepReadsStreamingBatches(self):
+    sentences = ['sentence %d' % i for i in range(10)]
+    reader = sentence_io.StreamingSentenceReader(
+        lambda: FakeSentenceReader(sentences), 4, shuffle_buffer_size=0,
+        num_epochs=1)
+    sess = FakeTrainingSession()
+    for _ in range(3):
+      trainer_lib.run_training_step(sess, TRAINER, reader, 4)
+    self.assertEqual([sentences[:4], sentences[4:8], sentences[8:]],
+                     sess.batches)
+
+
+if __name__ == '__main__':
+  googletest.main()
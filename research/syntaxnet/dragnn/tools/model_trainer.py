@@ -40,6 +40,7 @@ builders in dragnn/examples.
 
 import ast
 import collections
+import functools
 import os
 import os.path
 import tensorflow as tf
@@ -78,6 +79,12 @@ flags.DEFINE_string(
 flags.DEFINE_integer('batch_size', 4, 'Batch size.')
 flags.DEFINE_integer('report_every', 200,
                      'Report cost and training accuracy every this many steps.')
+flags.DEFINE_integer('annotation_threads', 1,
+                     'Number of concurrent annotation runs when evaluating.')
+flags.DEFINE_integer('shuffle_buffer_size', 0,
+                     'If positive, stream the training corpus instead of '
+                     'loading it into memory, shuffling it through a buffer '
+                     'of this many sentences.')
 
 
 def _read_text_proto(path, proto_type):
@@ -88,11 +95,39 @@ def _read_text_proto(path, proto_type):
   return proto
 
 
-def _convert_to_char_corpus(corpus):
-  """Converts the word-based |corpus| into a char-based corpus."""
-  with tf.Session(graph=tf.Graph()) as tmp_session:
-    conversion_op = gen_parser_ops.segmenter_training_data_constructor(corpus)
-    return tmp_session.run(conversion_op)
+class _CharCorpusConverter(object):
+  """Converts word-based corpora into char-based corpora.
+
+  The conversion op is built once, and all conversions run in the same session,
+  since streamed training batches are converted one at a time.
+  """
+
+  def __init__(self):
+    graph = tf.Graph()
+    with graph.as_default():
+      self._corpus = tf.placeholder(tf.string, [None])
+      self._conversion_op = gen_parser_ops.segmenter_training_data_constructor(
+          self._corpus)
+    self._session = tf.Session(graph=graph)
+
+  def __call__(self, corpus):
+    """Returns the char-based version of the word-based |corpus|."""
+    return self._session.run(self._conversion_op,
+                             feed_dict={self._corpus: corpus})
+
+  def close(self):
+    self._session.close()
+
+
+def _count_sentences(reader_fn):
+  """Returns the number of sentences read by a new reader from |reader_fn|."""
+  reader = reader_fn()
+  num_sentences = 0
+  while True:
+    sentences, is_last = reader.read()
+    num_sentences += len(sentences)
+    if is_last:
+      return num_sentences
 
 
 def _get_steps(steps_flag, epochs_flag, corpus_length):
@@ -142,30 +177,50 @@ def main(unused_argv):
     builder.add_saver()
 
   # Read in serialized protos from training data.
-  train_corpus = sentence_io.ConllSentenceReader(
-      train_corpus_path, projectivize=projectivize_train_corpus).corpus()
+  train_reader_fn = functools.partial(
+      sentence_io.ConllSentenceReader, train_corpus_path,
+      projectivize=projectivize_train_corpus)
+  if FLAGS.shuffle_buffer_size > 0:
+    # Only the number of sentences is needed up front; the sentences themselves
+    # are streamed during training.
+    num_train_sentences = _count_sentences(train_reader_fn)
+    train_corpus = None
+  else:
+    train_corpus = train_reader_fn().corpus()
+    num_train_sentences = len(train_corpus)
   tune_corpus = sentence_io.ConllSentenceReader(
       tune_corpus_path, projectivize=False).corpus()
   gold_tune_corpus = tune_corpus
 
   # Convert to char-based corpora, if requested.
+  char_corpus_converter = None
   if config['convert_to_char_corpora']:
+    char_corpus_converter = _CharCorpusConverter()
     # NB: Do not convert the |gold_tune_corpus|, which should remain word-based
     # for segmentation evaluation purposes.
-    train_corpus = _convert_to_char_corpus(train_corpus)
-    tune_corpus = _convert_to_char_corpus(tune_corpus)
+    if train_corpus is not None:
+      train_corpus = char_corpus_converter(train_corpus)
+    tune_corpus = char_corpus_converter(tune_corpus)
+
+  if train_corpus is None:
+    train_corpus = sentence_io.StreamingSentenceReader(
+        train_reader_fn,
+        FLAGS.batch_size,
+        shuffle_buffer_size=FLAGS.shuffle_buffer_size,
+        seed=hyperparameters.seed,
+        transform_fn=char_corpus_converter)
 
   pretrain_steps = _get_steps(FLAGS.pretrain_steps, FLAGS.pretrain_epochs,
-                              len(train_corpus))
+                              num_train_sentences)
   train_steps = _get_steps(FLAGS.train_steps, FLAGS.train_epochs,
-                           len(train_corpus))
+                           num_train_sentences)
   check.Eq(len(targets), len(pretrain_steps),
            'Length mismatch between training targets and --pretrain_steps')
   check.Eq(len(targets), len(train_steps),
            'Length mismatch between training targets and --train_steps')
 
   # Ready to train!
-  tf.logging.info('Training on %d sentences.', len(train_corpus))
+  tf.logging.info('Training on %d sentences.', num_train_sentences)
   tf.logging.info('Tuning on %d sentences.', len(tune_corpus))
 
   tf.logging.info('Creating TensorFlow checkpoint dir...')
@@ -185,7 +240,13 @@ def main(unused_argv):
                              evaluation.parser_summaries, pretrain_steps,
                              train_steps, train_corpus, tune_corpus,
                              gold_tune_corpus, FLAGS.batch_size, summary_writer,
-                             FLAGS.report_every, builder.saver, checkpoint_path)
+                             FLAGS.report_every, builder.saver, checkpoint_path,
+                             annotation_threads=FLAGS.annotation_threads)
+
+  if FLAGS.shuffle_buffer_size > 0:
+    train_corpus.close()
+  if char_corpus_converter is not None:
+    char_corpus_converter.close()
 
   tf.logging.info('Best checkpoint written to:\n%s', checkpoint_path)
 
@@ -29,6 +29,7 @@ from dragnn.protos import spec_pb2
 from dragnn.python import graph_builder
 from dragnn.python import sentence_io
 from dragnn.python import spec_builder
+from dragnn.python import trainer_lib
 from syntaxnet import sentence_pb2
 from syntaxnet.ops import gen_parser_ops
 from syntaxnet.util import check
@@ -56,6 +57,8 @@ flags.DEFINE_string('input_file', '',
 flags.DEFINE_string('output_file', '',
                     'File path to write annotated sentences to.')
 flags.DEFINE_integer('max_batch_size', 2048, 'Maximum batch size to support.')
+flags.DEFINE_integer('annotation_threads', 1,
+                     'Number of concurrent runs of the annotator.')
 flags.DEFINE_string('inference_beam_size', '', 'Comma separated list of '
                     'component_name=beam_size pairs.')
 flags.DEFINE_string('locally_normalize', '', 'Comma separated list of '
@@ -124,24 +127,16 @@ def main(unused_argv):
 
       tf.logging.info('Processing sentences...')
 
-      processed = []
       start_time = time.time()
-      run_metadata = tf.RunMetadata()
-      for start in range(0, len(char_corpus), FLAGS.max_batch_size):
-        end = min(start + FLAGS.max_batch_size, len(char_corpus))
-        feed_dict = {annotator['input_batch']: char_corpus[start:end]}
-        if FLAGS.timeline_output_file and end == len(char_corpus):
-          serialized_annotations = sess.run(
-              annotator['annotations'], feed_dict=feed_dict,
-              options=tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE),
-              run_metadata=run_metadata)
-          trace = timeline.Timeline(step_stats=run_metadata.step_stats)
-          with open(FLAGS.timeline_output_file, 'w') as trace_file:
-            trace_file.write(trace.generate_chrome_trace_format())
-        else:
-          serialized_annotations = sess.run(
-              annotator['annotations'], feed_dict=feed_dict)
-        processed.extend(serialized_annotations)
+      run_metadata = tf.RunMetadata() if FLAGS.timeline_output_file else None
+      processed = trainer_lib.annotate_dataset(
+          sess, annotator, char_corpus, num_threads=FLAGS.annotation_threads,
+          batch_size=FLAGS.max_batch_size,
+          run_metadata=run_metadata)
+      if FLAGS.timeline_output_file:
+        trace = timeline.Timeline(step_stats=run_metadata.step_stats)
+        with open(FLAGS.timeline_output_file, 'w') as trace_file:
+          trace_file.write(trace.generate_chrome_trace_format())
 
       tf.logging.info('Processed %d documents in %.2f seconds.',
                       len(char_corpus), time.time() - start_time)
@@ -187,28 +182,21 @@ def main(unused_argv):
 
     tf.logging.info('Processing sentences...')
 
-    processed = []
+    feed_dict = {}
+    for comp, beam_size in component_beam_sizes:
+      feed_dict['%s/InferenceBeamSize:0' % comp] = beam_size
+    for comp in components_to_locally_normalize:
+      feed_dict['%s/LocallyNormalize:0' % comp] = True
     start_time = time.time()
-    run_metadata = tf.RunMetadata()
-    for start in range(0, len(input_corpus), FLAGS.max_batch_size):
-      end = min(start + FLAGS.max_batch_size, len(input_corpus))
-      feed_dict = {annotator['input_batch']: input_corpus[start:end]}
-      for comp, beam_size in component_beam_sizes:
-        feed_dict['%s/InferenceBeamSize:0' % comp] = beam_size
-      for comp in components_to_locally_normalize:
-        feed_dict['%s/LocallyNormalize:0' % comp] = True
-      if FLAGS.timeline_output_file and end == len(input_corpus):
-        serialized_annotations = sess.run(
-            annotator['annotations'], feed_dict=feed_dict,
-            options=tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE),
-            run_metadata=run_metadata)
-        trace = timeline.Timeline(step_stats=run_metadata.step_stats)
-        with open(FLAGS.timeline_output_file, 'w') as trace_file:
-          trace_file.write(trace.generate_chrome_trace_format())
-      else:
-        serialized_annotations = sess.run(
-            annotator['annotations'], feed_dict=feed_dict)
-      processed.extend(serialized_annotations)
+    run_metadata = tf.RunMetadata() if FLAGS.timeline_output_file else None
+    processed = trainer_lib.annotate_dataset(
+        sess, annotator, input_corpus, num_threads=FLAGS.annotation_threads,
+        batch_size=FLAGS.max_batch_size, feed_dict=feed_dict,
+        run_metadata=run_metadata)
+    if FLAGS.timeline_output_file:
+      trace = timeline.Timeline(step_stats=run_metadata.step_stats)
+      with open(FLAGS.timeline_output_file, 'w') as trace_file:
+        trace_file.write(trace.generate_chrome_trace_format())
 
     tf.logging.info('Processed %d documents in %.2f seconds.',
                     len(input_corpus), time.time() - start_time)
@@ -27,6 +27,7 @@ from dragnn.python import dragnn_ops
 
 from dragnn.python import evaluation
 from dragnn.python import sentence_io
+from dragnn.python import trainer_lib
 from syntaxnet import sentence_pb2
 
 # The following line is necessary to load custom ops into the library.
@@ -51,6 +52,8 @@ flags.DEFINE_string('output_file', '',
 flags.DEFINE_bool('text_format', False, '')
 
 flags.DEFINE_integer('max_batch_size', 2048, 'Maximum batch size to support.')
+flags.DEFINE_integer('annotation_threads', 1,
+                     'Number of concurrent runs of the annotator.')
 flags.DEFINE_string('inference_beam_size', '', 'Comma separated list of '
                     'component_name=beam_size pairs.')
 flags.DEFINE_string('locally_normalize', '', 'Comma separated list of '
@@ -62,6 +65,12 @@ flags.DEFINE_string('timeline_output_file', '', 'Path to save timeline to. '
                     'If specified, the final iteration of the evaluation loop '
                     'will capture and save a TensorFlow timeline.')
 
+# Input and output tensors of the annotation graph of a SavedModel.
+_ANNOTATOR = {
+    'input_batch': 'annotation/ComputeSession/InputBatch:0',
+    'annotations': 'annotation/annotations:0',
+}
+
 
 def get_segmenter_corpus(input_data_path, use_text_format):
   """Reads in a character corpus for segmenting."""
@@ -81,7 +90,7 @@ def get_segmenter_corpus(input_data_path, use_text_format):
 
 
 def run_segmenter(input_data, segmenter_model, session_config, max_batch_size,
-                  timeline_output_file=None):
+                  timeline_output_file=None, num_threads=1):
   """Runs the provided segmenter model on the provided character corpus.
 
   Args:
@@ -90,6 +99,7 @@ def run_segmenter(input_data, segmenter_model, session_config, max_batch_size,
     session_config: A session configuration object.
     max_batch_size: The maximum batch size to use.
     timeline_output_file: Filepath for timeline export. Does not export if None.
+    num_threads: Number of concurrent runs of the segmenter.
 
   Returns:
     A list of segmented sentences suitable for parsing.
@@ -103,33 +113,15 @@ def run_segmenter(input_data, segmenter_model, session_config, max_batch_size,
 
     # Use the graph to segment the sentences.
     tf.logging.info('Segmenting sentences...')
-    processed = []
     start_time = time.time()
-    run_metadata = tf.RunMetadata()
-    for start in range(0, len(input_data), max_batch_size):
-      # Prepare the inputs.
-      end = min(start + max_batch_size, len(input_data))
-      feed_dict = {
-          'annotation/ComputeSession/InputBatch:0': input_data[start:end]
-      }
-      output_node = 'annotation/annotations:0'
-
-      # Process.
-      tf.logging.info('Processing examples %d to %d' % (start, end))
-      if timeline_output_file and end == len(input_data):
-        serialized_annotations = sess.run(
-            output_node,
-            feed_dict=feed_dict,
-            options=tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE),
-            run_metadata=run_metadata)
-        trace = timeline.Timeline(step_stats=run_metadata.step_stats)
-        with open(timeline_output_file, 'w') as trace_file:
-          trace_file.write(trace.generate_chrome_trace_format())
-      else:
-        serialized_annotations = sess.run(output_node, feed_dict=feed_dict)
-
-      # Save the outputs.
-      processed.extend(serialized_annotations)
+    run_metadata = tf.RunMetadata() if timeline_output_file else None
+    processed = trainer_lib.annotate_dataset(
+        sess, _ANNOTATOR, input_data, num_threads=num_threads,
+        batch_size=max_batch_size, run_metadata=run_metadata)
+    if timeline_output_file:
+      trace = timeline.Timeline(step_stats=run_metadata.step_stats)
+      with open(timeline_output_file, 'w') as trace_file:
+        trace_file.write(trace.generate_chrome_trace_format())
 
   # Report statistics.
   tf.logging.info('Segmented %d documents in %.2f seconds.',
@@ -142,7 +134,7 @@ def run_segmenter(input_data, segmenter_model, session_config, max_batch_size,
 
 def run_parser(input_data, parser_model, session_config, beam_sizes,
                locally_normalized_components, max_batch_size,
-               timeline_output_file):
+               timeline_output_file, num_threads=1):
   """Runs the provided segmenter model on the provided character corpus.
 
   Args:
@@ -153,6 +145,7 @@ def run_parser(input_data, parser_model, session_config, beam_sizes,
     locally_normalized_components: A list of components to normalize (optional).
     max_batch_size: The maximum batch size to use.
     timeline_output_file: Filepath for timeline export. Does not export if None.
+    num_threads: Number of concurrent runs of the parser.
 
   Returns:
     A list of parsed sentences.
@@ -165,37 +158,22 @@ def run_parser(input_data, parser_model, session_config, beam_sizes,
 
     tf.logging.info('Parsing sentences...')
 
-    processed = []
+    feed_dict = {}
+    for comp, beam_size in beam_sizes:
+      feed_dict['%s/InferenceBeamSize:0' % comp] = beam_size
+    for comp in locally_normalized_components:
+      feed_dict['%s/LocallyNormalize:0' % comp] = True
     start_time = time.time()
-    run_metadata = tf.RunMetadata()
+    run_metadata = tf.RunMetadata() if timeline_output_file else None
     tf.logging.info('Corpus length is %d' % len(input_data))
-    for start in range(0, len(input_data), max_batch_size):
-      # Set up the input and output.
-      end = min(start + max_batch_size, len(input_data))
-      feed_dict = {
-          'annotation/ComputeSession/InputBatch:0': input_data[start:end]
-      }
-      for comp, beam_size in beam_sizes:
-        feed_dict['%s/InferenceBeamSize:0' % comp] = beam_size
-      for comp in locally_normalized_components:
-        feed_dict['%s/LocallyNormalize:0' % comp] = True
-      output_node = 'annotation/annotations:0'
-
-      # Process.
-      tf.logging.info('Processing examples %d to %d' % (start, end))
-      if timeline_output_file and end == len(input_data):
-        serialized_annotations = sess.run(
-            output_node,
-            feed_dict=feed_dict,
-            options=tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE),
-            run_metadata=run_metadata)
-        trace = timeline.Timeline(step_stats=run_metadata.step_stats)
-        with open(timeline_output_file, 'w') as trace_file:
-          trace_file.write(trace.generate_chrome_trace_format())
-      else:
-        serialized_annotations = sess.run(output_node, feed_dict=feed_dict)
-
-      processed.extend(serialized_annotations)
+    processed = trainer_lib.annotate_dataset(
+        sess, _ANNOTATOR, input_data, num_threads=num_threads,
+        batch_size=max_batch_size, feed_dict=feed_dict,
+        run_metadata=run_metadata)
+    if timeline_output_file:
+      trace = timeline.Timeline(step_stats=run_metadata.step_stats)
+      with open(timeline_output_file, 'w') as trace_file:
+        trace_file.write(trace.generate_chrome_trace_format())
 
     tf.logging.info('Processed %d documents in %.2f seconds.',
                     len(input_data), time.time() - start_time)
@@ -266,13 +244,15 @@ def main(unused_argv):
     segmenter_input = get_segmenter_corpus(FLAGS.input_file, FLAGS.text_format)
     parser_input = run_segmenter(segmenter_input, FLAGS.segmenter_saved_model,
                                  session_config, FLAGS.max_batch_size,
-                                 FLAGS.timeline_output_file)
+                                 FLAGS.timeline_output_file,
+                                 FLAGS.annotation_threads)
     use_gold_segmentation = False
 
   # Now that we have parser input data, parse.
   processed = run_parser(parser_input, FLAGS.parser_saved_model, session_config,
                          component_beam_sizes, components_to_locally_normalize,
-                         FLAGS.max_batch_size, FLAGS.timeline_output_file)
+                         FLAGS.max_batch_size, FLAGS.timeline_output_file,
+                         FLAGS.annotation_threads)
 
   if FLAGS.output_file:
     print_output(FLAGS.output_file, FLAGS.text_format, use_gold_segmentation,
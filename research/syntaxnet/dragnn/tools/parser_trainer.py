@@ -60,6 +60,8 @@ flags.DEFINE_bool('projectivize_training_set', True, '')
 flags.DEFINE_integer('batch_size', 4, 'Batch size.')
 flags.DEFINE_integer('report_every', 200,
                      'Report cost and training accuracy every this many steps.')
+flags.DEFINE_integer('annotation_threads', 1,
+                     'Number of concurrent annotation runs when evaluating.')
 
 
 def main(unused_argv):
@@ -185,7 +187,8 @@ def main(unused_argv):
         sess, trainers, annotator, evaluation.parser_summaries, pretrain_steps,
         train_steps, training_set, dev_set, dev_set, FLAGS.batch_size,
         summary_writer, FLAGS.report_every, builder.saver,
-        FLAGS.checkpoint_filename)
+        FLAGS.checkpoint_filename,
+        annotation_threads=FLAGS.annotation_threads)
 
 
 if __name__ == '__main__':
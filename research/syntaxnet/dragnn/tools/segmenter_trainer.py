@@ -63,6 +63,8 @@ flags.DEFINE_integer('num_epochs', 10, 'Number of epochs to train for.')
 flags.DEFINE_integer('batch_size', 4, 'Batch size.')
 flags.DEFINE_integer('report_every', 500,
                      'Report cost and training accuracy every this many steps.')
+flags.DEFINE_integer('annotation_threads', 1,
+                     'Number of concurrent annotation runs when evaluating.')
 flags.DEFINE_string('hyperparams',
                     'decay_steps:32000 dropout_rate:0.8 gradient_clip_norm:1 '
                     'learning_method:"momentum" learning_rate:0.1 seed:1 '
@@ -166,7 +168,8 @@ def main(unused_argv):
         sess, trainers, annotator, evaluation.segmentation_summaries,
         pretrain_steps, train_steps, char_training_set, char_dev_set, dev_set,
         FLAGS.batch_size, summary_writer, FLAGS.report_every, builder.saver,
-        FLAGS.checkpoint_filename)
+        FLAGS.checkpoint_filename,
+        annotation_threads=FLAGS.annotation_threads)
 
 
 if __name__ == '__main__':
@@ -73,6 +73,8 @@ flags.DEFINE_bool('projectivize_training_set', True, '')
 flags.DEFINE_integer('batch_size', 4, 'Batch size.')
 flags.DEFINE_integer('report_every', 200,
                      'Report cost and training accuracy every this many steps.')
+flags.DEFINE_integer('annotation_threads', 1,
+                     'Number of concurrent annotation runs when evaluating.')
 flags.DEFINE_integer('job_id', 0, 'The trainer will clear checkpoints if the '
                      'saved job id is less than the id this flag. If you want '
                      'training to start over, increment this id.')
@@ -194,7 +196,8 @@ def main(unused_argv):
         sess, trainers, annotator, evaluation.parser_summaries, pretrain_steps,
         train_steps, training_set, tune_set, tune_set, FLAGS.batch_size,
         summary_writer, FLAGS.report_every, builder.saver,
-        FLAGS.checkpoint_filename, stats)
+        FLAGS.checkpoint_filename, stats,
+        annotation_threads=FLAGS.annotation_threads)
 
 
 if __name__ == '__main__':
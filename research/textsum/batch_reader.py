@@ -16,6 +16,10 @@
 """Batch reader to seq2seq attention model, with bucketing support."""
 
 from collections import namedtuple
+import ctypes
+import multiprocessing
+import os
+import random
 from random import shuffle
 from threading import Thread
 import time
@@ -35,17 +39,65 @@ ModelInput = namedtuple('ModelInput',
 BUCKET_CACHE_BATCH = 100
 QUEUE_NUM_BATCH = 100
 
+# The arrays of a batch, with their ctypes type and their shape as a function of
+# the model hyperparameters.
+_BATCH_ARRAYS = [
+    ('enc_batch', ctypes.c_int32, lambda hps: (hps.batch_size,
+                                               hps.enc_timesteps)),
+    ('dec_batch', ctypes.c_int32, lambda hps: (hps.batch_size,
+                                               hps.dec_timesteps)),
+    ('target_batch', ctypes.c_int32, lambda hps: (hps.batch_size,
+                                                  hps.dec_timesteps)),
+    ('enc_input_lens', ctypes.c_int32, lambda hps: (hps.batch_size,)),
+    ('dec_output_lens', ctypes.c_int32, lambda hps: (hps.batch_size,)),
+    ('loss_weights', ctypes.c_float, lambda hps: (hps.batch_size,
+                                                  hps.dec_timesteps)),
+]
+
+
+class _SharedBatch(object):
+  """The arrays of a batch, in memory shared with producer processes."""
+
+  def __init__(self, hps):
+    self.arrays = []
+    for _, ctype, shape_fn in _BATCH_ARRAYS:
+      shape = shape_fn(hps)
+      raw_array = multiprocessing.RawArray(ctype, int(np.prod(shape)))
+      self.arrays.append(np.ctypeslib.as_array(raw_array).reshape(shape))
+
+
+def _PadInto(array, sequences, pad_id):
+  """Copies sequences into the rows of array, padding them with pad_id.
+
+  Args:
+    array: 2-D numpy array with a row per sequence, at least as wide as the
+      longest sequence.
+    sequences: list of lists of ints.
+    pad_id: value of the padding.
+
+  Returns:
+    A boolean numpy array of the shape of array, true for the copied elements.
+  """
+  lens = np.array([len(seq) for seq in sequences])
+  mask = np.arange(array.shape[1]) < lens[:, np.newaxis]
+  array.fill(pad_id)
+  if lens.sum():
+    array[mask] = np.concatenate(sequences)
+  return mask
+
 
 class Batcher(object):
   """Batch reader with shuffling and bucketing support."""
 
   def __init__(self, data_path, vocab, hps,
                article_key, abstract_key, max_article_sentences,
-               max_abstract_sentences, bucketing=True, truncate_input=False):
+               max_abstract_sentences, bucketing=True, truncate_input=False,
+               tokenized=False, num_producers=0):
     """Batcher constructor.
 
     Args:
-      data_path: tf.Example filepattern.
+      data_path: tf.Example filepattern, or the path of a data.ExampleStore if
+        tokenized is True.
       vocab: Vocabulary.
       hps: Seq2SeqAttention model hyperparameters.
       article_key: article feature key in tf.Example.
@@ -55,6 +107,11 @@ class Batcher(object):
       bucketing: Whether bucket articles of similar length into the same batch.
       truncate_input: Whether to truncate input that is too long. Alternative is
         to discard such examples.
+      tokenized: Whether data_path is a pre-tokenized data.ExampleStore, which
+        is read without parsing tf.Examples or tokenizing text.
+      num_producers: If > 0, the number of processes that read, tokenize, bucket
+        and pad the examples into batches in shared memory. Otherwise this is
+        done by threads of the calling process.
     """
     self._data_path = data_path
     self._vocab = vocab
@@ -65,6 +122,22 @@ class Batcher(object):
     self._max_abstract_sentences = max_abstract_sentences
     self._bucketing = bucketing
     self._truncate_input = truncate_input
+    self._example_store = None
+    if tokenized:
+      self._example_store = data.ExampleStore(data_path, vocab)
+
+    # Instrumentation, see Stats().
+    self._num_produced = multiprocessing.Value(ctypes.c_long, 0)
+    self._num_consumed = 0
+    self._wait_secs = 0.0
+    self._last_stats = (time.time(), 0, 0, 0.0)
+
+    self._num_producers = num_producers
+    self._producers = []
+    if num_producers > 0:
+      self._StartProducers(num_producers)
+      return
+
     self._input_queue = Queue.Queue(QUEUE_NUM_BATCH * self._hps.batch_size)
     self._bucket_input_queue = Queue.Queue(QUEUE_NUM_BATCH)
     self._input_threads = []
@@ -95,6 +168,22 @@ class Batcher(object):
       origin_articles: original article words.
       origin_abstracts: original abstract words.
     """
+    start_time = time.time()
+    if self._num_producers > 0:
+      slot, origin_articles, origin_abstracts = self._full_slots.get()
+      self._wait_secs += time.time() - start_time
+      self._num_consumed += 1
+      # Copy the batch so that the slot can be reused.
+      (enc_batch, dec_batch, target_batch, enc_input_lens, dec_output_lens,
+       loss_weights) = [array.copy() for array in self._slots[slot].arrays]
+      self._free_slots.put(slot)
+      return (enc_batch, dec_batch, target_batch, enc_input_lens,
+              dec_output_lens, loss_weights, origin_articles, origin_abstracts)
+
+    buckets = self._bucket_input_queue.get()
+    self._wait_secs += time.time() - start_time
+    self._num_consumed += 1
+
     enc_batch = np.zeros(
         (self._hps.batch_size, self._hps.enc_timesteps), dtype=np.int32)
     enc_input_lens = np.zeros(
@@ -110,7 +199,6 @@ class Batcher(object):
     origin_articles = ['None'] * self._hps.batch_size
     origin_abstracts = ['None'] * self._hps.batch_size
 
-    buckets = self._bucket_input_queue.get()
     for i in xrange(self._hps.batch_size):
       (enc_inputs, dec_inputs, targets, enc_input_len, dec_output_len,
        article, abstract) = buckets[i]
@@ -122,16 +210,67 @@ class Batcher(object):
       enc_batch[i, :] = enc_inputs[:]
       dec_batch[i, :] = dec_inputs[:]
       target_batch[i, :] = targets[:]
-      for j in xrange(dec_output_len):
-        loss_weights[i][j] = 1
+      loss_weights[i, :dec_output_len] = 1
     return (enc_batch, dec_batch, target_batch, enc_input_lens, dec_output_lens,
             loss_weights, origin_articles, origin_abstracts)
 
+  def Stats(self):
+    """Returns statistics of the input pipeline since the previous call.
+
+    Returns:
+      A dict with:
+        queue_depth: the number of batches ready to be consumed.
+        producer_batches_per_sec: the rate at which batches were produced.
+        consumer_batches_per_sec: the rate at which batches were consumed.
+        input_wait_fraction: the fraction of the time that NextBatch waited for
+          batches. Training is input-bound if this is not close to 0.
+    """
+    now = time.time()
+    num_produced = self._num_produced.value
+    (last_time, last_num_produced, last_num_consumed,
+     last_wait_secs) = self._last_stats
+    elapsed = max(now - last_time, 1e-6)
+    self._last_stats = (now, num_produced, self._num_consumed, self._wait_secs)
+    return {
+        'queue_depth': num_produced - self._num_consumed,
+        'producer_batches_per_sec':
+            (num_produced - last_num_produced) / elapsed,
+        'consumer_batches_per_sec':
+            (self._num_consumed - last_num_consumed) / elapsed,
+        'input_wait_fraction': (self._wait_secs - last_wait_secs) / elapsed,
+    }
+
   def _FillInputQueue(self):
     """Fill input queue with ModelInput."""
-    start_id = self._vocab.WordToId(data.SENTENCE_START)
     end_id = self._vocab.WordToId(data.SENTENCE_END)
     pad_id = self._vocab.WordToId(data.PAD_TOKEN)
+    for enc_inputs, dec_inputs, targets, article, abstract in self._InputGen():
+      element = ModelInput(
+          data.Pad(enc_inputs, pad_id, self._hps.enc_timesteps),
+          data.Pad(dec_inputs, end_id, self._hps.dec_timesteps),
+          data.Pad(targets, end_id, self._hps.dec_timesteps),
+          len(enc_inputs), len(targets), article, abstract)
+      self._input_queue.put(element)
+
+  def _InputGen(self):
+    """Generates the word ids of the examples, filtered and truncated.
+
+    Yields:
+      Tuples (enc_inputs, dec_inputs, targets, article, abstract) of the
+      unpadded lists of word ids and the original texts.
+    """
+    if self._example_store is not None:
+      examples = self._StoreWordIdsGen()
+    else:
+      examples = self._TextWordIdsGen()
+    for enc_inputs, dec_inputs, article, abstract in examples:
+      inputs = self._PrepareInputs(enc_inputs, dec_inputs)
+      if inputs is not None:
+        yield inputs + (article, abstract)
+
+  def _TextWordIdsGen(self):
+    """Generates the word ids and texts of the tf.Examples in data_path."""
+    start_id = self._vocab.WordToId(data.SENTENCE_START)
     input_gen = self._TextGenerator(data.ExampleGen(self._data_path))
     while True:
       (article, abstract) = six.next(input_gen)
@@ -152,49 +291,62 @@ class Batcher(object):
                           len(abstract_sentences))):
         dec_inputs += data.GetWordIds(abstract_sentences[i], self._vocab)
 
-      # Filter out too-short input
-      if (len(enc_inputs) < self._hps.min_input_len or
-          len(dec_inputs) < self._hps.min_input_len):
-        tf.logging.warning('Drop an example - too short.\nenc:%d\ndec:%d',
-                           len(enc_inputs), len(dec_inputs))
-        continue
+      yield (enc_inputs, dec_inputs, ' '.join(article_sentences),
+             ' '.join(abstract_sentences))
 
-      # If we're not truncating input, throw out too-long input
-      if not self._truncate_input:
-        if (len(enc_inputs) > self._hps.enc_timesteps or
-            len(dec_inputs) > self._hps.dec_timesteps):
-          tf.logging.warning('Drop an example - too long.\nenc:%d\ndec:%d',
-                             len(enc_inputs), len(dec_inputs))
-          continue
-      # If we are truncating input, do so if necessary
-      else:
-        if len(enc_inputs) > self._hps.enc_timesteps:
-          enc_inputs = enc_inputs[:self._hps.enc_timesteps]
-        if len(dec_inputs) > self._hps.dec_timesteps:
-          dec_inputs = dec_inputs[:self._hps.dec_timesteps]
-
-      # targets is dec_inputs without <s> at beginning, plus </s> at end
-      targets = dec_inputs[1:]
-      targets.append(end_id)
-
-      # Now len(enc_inputs) should be <= enc_timesteps, and
-      # len(targets) = len(dec_inputs) should be <= dec_timesteps
-
-      enc_input_len = len(enc_inputs)
-      dec_output_len = len(targets)
-
-      # Pad if necessary
-      while len(enc_inputs) < self._hps.enc_timesteps:
-        enc_inputs.append(pad_id)
-      while len(dec_inputs) < self._hps.dec_timesteps:
-        dec_inputs.append(end_id)
-      while len(targets) < self._hps.dec_timesteps:
-        targets.append(end_id)
-
-      element = ModelInput(enc_inputs, dec_inputs, targets, enc_input_len,
-                           dec_output_len, ' '.join(article_sentences),
-                           ' '.join(abstract_sentences))
-      self._input_queue.put(element)
+  def _StoreWordIdsGen(self):
+    """Generates the word ids and texts of the examples in the store."""
+    start_id = self._vocab.WordToId(data.SENTENCE_START)
+    store = self._example_store
+    for i in data.ExampleStoreGen(store):
+      enc_inputs = store.ArticleIds(i, self._max_article_sentences).tolist()
+      # Use the <s> as the <GO> symbol for decoder inputs.
+      dec_inputs = [start_id] + store.AbstractIds(
+          i, self._max_abstract_sentences).tolist()
+      yield (enc_inputs, dec_inputs, store.ArticleText(i),
+             store.AbstractText(i))
+
+  def _PrepareInputs(self, enc_inputs, dec_inputs):
+    """Filters and truncates the word ids of an example.
+
+    Args:
+      enc_inputs: list of the article word ids.
+      dec_inputs: list of the abstract word ids, starting with <s>.
+
+    Returns:
+      A tuple (enc_inputs, dec_inputs, targets) of unpadded lists of word ids,
+      or None if the example is dropped.
+    """
+    end_id = self._vocab.WordToId(data.SENTENCE_END)
+
+    # Filter out too-short input
+    if (len(enc_inputs) < self._hps.min_input_len or
+        len(dec_inputs) < self._hps.min_input_len):
+      tf.logging.warning('Drop an example - too short.\nenc:%d\ndec:%d',
+                         len(enc_inputs), len(dec_inputs))
+      return None
+
+    # If we're not truncating input, throw out too-long input
+    if not self._truncate_input:
+      if (len(enc_inputs) > self._hps.enc_timesteps or
+          len(dec_inputs) > self._hps.dec_timesteps):
+        tf.logging.warning('Drop an example - too long.\nenc:%d\ndec:%d',
+                           len(enc_inputs), len(dec_inputs))
+        return None
+    # If we are truncating input, do so if necessary
+    else:
+      if len(enc_inputs) > self._hps.enc_timesteps:
+        enc_inputs = enc_inputs[:self._hps.enc_timesteps]
+      if len(dec_inputs) > self._hps.dec_timesteps:
+        dec_inputs = dec_inputs[:self._hps.dec_timesteps]
+
+    # targets is dec_inputs without <s> at beginning, plus </s> at end
+    targets = dec_inputs[1:]
+    targets.append(end_id)
+
+    # Now len(enc_inputs) should be <= enc_timesteps, and
+    # len(targets) = len(dec_inputs) should be <= dec_timesteps
+    return enc_inputs, dec_inputs, targets
 
   def _FillBucketInputQueue(self):
     """Fill bucketed batches into the bucket_input_queue."""
@@ -211,6 +363,102 @@ class Batcher(object):
       shuffle(batches)
       for b in batches:
         self._bucket_input_queue.put(b)
+        with self._num_produced.get_lock():
+          self._num_produced.value += 1
+
+  def _StartProducers(self, num_producers):
+    """Starts the producer processes and the batch slots they fill."""
+    self._slots = [_SharedBatch(self._hps) for _ in xrange(QUEUE_NUM_BATCH)]
+    # The pid of the producer filling each slot, or 0, so that the slots of a
+    # dead producer can be freed.
+    self._slot_owners = multiprocessing.RawArray(ctypes.c_long,
+                                                 len(self._slots))
+    self._free_slots = multiprocessing.Queue()
+    for slot in xrange(len(self._slots)):
+      self._free_slots.put(slot)
+    self._full_slots = multiprocessing.Queue()
+    for _ in xrange(num_producers):
+      self._StartProducer()
+
+    self._watch_thread = Thread(target=self._WatchProducers)
+    self._watch_thread.daemon = True
+    self._watch_thread.start()
+
+  def _StartProducer(self):
+    producer = multiprocessing.Process(target=self._ProduceBatches,
+                                       args=(random.getrandbits(32),))
+    producer.daemon = True
+    producer.start()
+    self._producers.append(producer)
+
+  def _ProduceBatches(self, seed):
+    """Fills free slots with bucketed batches. Runs in a producer process."""
+    # Producers are forked with the random state of the parent.
+    random.seed(seed)
+    np.random.seed(seed)
+    end_id = self._vocab.WordToId(data.SENTENCE_END)
+    pad_id = self._vocab.WordToId(data.PAD_TOKEN)
+    input_gen = self._InputGen()
+    while True:
+      inputs = [six.next(input_gen)
+                for _ in xrange(self._hps.batch_size * BUCKET_CACHE_BATCH)]
+      if self._bucketing:
+        inputs = sorted(inputs, key=lambda inp: len(inp[0]))
+
+      batches = []
+      for i in xrange(0, len(inputs), self._hps.batch_size):
+        batches.append(inputs[i:i+self._hps.batch_size])
+      shuffle(batches)
+      for batch in batches:
+        self._ProduceBatch(batch, end_id, pad_id)
+
+  def _ProduceBatch(self, batch, end_id, pad_id):
+    """Pads a batch into a free slot and queues the slot for NextBatch.
+
+    Args:
+      batch: list of (enc_inputs, dec_inputs, targets, article, abstract)
+        tuples, as generated by _InputGen.
+      end_id: word id of the sentence end, which pads decoder inputs.
+      pad_id: word id of the padding of encoder inputs.
+    """
+    enc_inputs, dec_inputs, targets, articles, abstracts = zip(*batch)
+    slot = self._free_slots.get()
+    self._slot_owners[slot] = os.getpid()
+    (enc_batch, dec_batch, target_batch, enc_input_lens, dec_output_lens,
+     loss_weights) = self._slots[slot].arrays
+    enc_input_lens[:] = _PadInto(enc_batch, enc_inputs, pad_id).sum(axis=1)
+    _PadInto(dec_batch, dec_inputs, end_id)
+    mask = _PadInto(target_batch, targets, end_id)
+    dec_output_lens[:] = mask.sum(axis=1)
+    loss_weights[:] = mask
+    with self._num_produced.get_lock():
+      self._num_produced.value += 1
+    # The slot is owned by the consumer once queued.
+    self._slot_owners[slot] = 0
+    self._full_slots.put((slot, list(articles), list(abstracts)))
+
+  def _WatchProducers(self):
+    """Watch the producer processes and restart if dead."""
+    while True:
+      time.sleep(60)
+      producers = []
+      for producer in self._producers:
+        if producer.is_alive():
+          producers.append(producer)
+        else:
+          tf.logging.error('Found producer process dead.')
+          self._FreeSlotsOf(producer.pid)
+      num_dead = len(self._producers) - len(producers)
+      self._producers = producers
+      for _ in xrange(num_dead):
+        self._StartProducer()
+
+  def _FreeSlotsOf(self, pid):
+    """Returns the slots that a dead producer was filling to the free slots."""
+    for slot in xrange(len(self._slots)):
+      if self._slot_owners[slot] == pid:
+        self._slot_owners[slot] = 0
+        self._free_slots.put(slot)
 
   def _WatchThreads(self):
     """Watch the daemon input threads and restart if dead."""
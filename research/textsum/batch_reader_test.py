@@ -0,0 +1,114 @@
+# Copyright 2016 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for batch_reader."""
+
+from collections import namedtuple
+import ctypes
+import multiprocessing
+import os
+import tempfile
+
+import numpy as np
+from six.moves import queue as Queue
+import tensorflow as tf
+
+import batch_reader
+import data
+
+_HParams = namedtuple('HParams',
+                      'batch_size enc_timesteps dec_timesteps min_input_len')
+
+
+class BatchReaderTest(tf.test.TestCase):
+
+  def setUp(self):
+    vocab_path = os.path.join(tempfile.mkdtemp(dir=tf.test.get_temp_dir()),
+                              'vocab')
+    with open(vocab_path, 'w') as f:
+      for word in [data.PAD_TOKEN, data.SENTENCE_START, data.SENTENCE_END,
+                   data.UNKNOWN_TOKEN, 'a', 'b', 'c']:
+        f.write('%s 1\n' % word)
+    self._vocab = data.Vocab(vocab_path, 10)
+    self._hps = _HParams(batch_size=3, enc_timesteps=5, dec_timesteps=4,
+                         min_input_len=1)
+    self._end_id = self._vocab.WordToId(data.SENTENCE_END)
+    self._pad_id = self._vocab.WordToId(data.PAD_TOKEN)
+    start_id = self._vocab.WordToId(data.SENTENCE_START)
+    # (enc_inputs, dec_inputs, targets, article, abstract), as generated by
+    # Batcher._InputGen.
+    self._examples = [
+        ([4, 5, 6, 4, 5], [start_id, 6, 5, 4], [6, 5, 4, self._end_id],
+         'a b c a b', 'c b a'),
+        ([5], [start_id], [self._end_id], 'b', ''),
+        ([6, 6, 4], [start_id, 4, 4], [4, 4, self._end_id], 'c c a', 'a a'),
+    ]
+
+  def _NewBatcher(self, num_producers):
+    """Returns a Batcher without input threads or producer processes."""
+    batcher = batch_reader.Batcher.__new__(batch_reader.Batcher)
+    batcher._vocab = self._vocab
+    batcher._hps = self._hps
+    batcher._num_producers = num_producers
+    batcher._num_produced = multiprocessing.Value(ctypes.c_long, 0)
+    batcher._num_consumed = 0
+    batcher._wait_secs = 0.0
+    batcher._InputGen = lambda: iter(self._examples)
+    batcher._input_queue = Queue.Queue()
+    batcher._bucket_input_queue = Queue.Queue()
+    batcher._slots = [batch_reader._SharedBatch(self._hps) for _ in range(2)]
+    batcher._slot_owners = multiprocessing.RawArray(ctypes.c_long, 2)
+    batcher._free_slots = Queue.Queue()
+    batcher._free_slots.put(0)
+    batcher._free_slots.put(1)
+    batcher._full_slots = Queue.Queue()
+    return batcher
+
+  def testPadInto(self):
+    array = np.zeros([3, 4], dtype=np.int32)
+    mask = batch_reader._PadInto(array, [[1, 2], [], [3, 4, 5, 6]], 9)
+    self.assertAllEqual([[1, 2, 9, 9], [9, 9, 9, 9], [3, 4, 5, 6]], array)
+    self.assertAllEqual([2, 0, 4], mask.sum(axis=1))
+
+  def testProducerBatchMatchesThreadBatch(self):
+    thread_batcher = self._NewBatcher(num_producers=0)
+    thread_batcher._FillInputQueue()
+    thread_batcher._bucket_input_queue.put(
+        [thread_batcher._input_queue.get() for _ in self._examples])
+    expected = thread_batcher.NextBatch()
+
+    producer_batcher = self._NewBatcher(num_producers=1)
+    producer_batcher._ProduceBatch(self._examples, self._end_id, self._pad_id)
+    batch = producer_batcher.NextBatch()
+
+    self.assertEqual(len(expected), len(batch))
+    for expected_array, array in zip(expected[:6], batch[:6]):
+      self.assertEqual(expected_array.dtype, array.dtype)
+      self.assertAllEqual(expected_array, array)
+    self.assertEqual(expected[6:], batch[6:])
+
+  def testSlotsOfDeadProducerAreFreed(self):
+    batcher = self._NewBatcher(num_producers=1)
+    slot = batcher._free_slots.get()
+    batcher._slot_owners[slot] = 12345
+    batcher._FreeSlotsOf(54321)
+    self.assertEqual(1, batcher._free_slots.qsize())
+    batcher._FreeSlotsOf(12345)
+    self.assertEqual(2, batcher._free_slots.qsize())
+    self.assertEqual(0, batcher._slot_owners[slot])
+
+
+if __name__ == '__main__':
+  tf.test.main()
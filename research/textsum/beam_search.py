@@ -21,6 +21,7 @@ K*K results, and start over again until certain number of results are fully
 decoded.
 """
 
+import numpy as np
 from six.moves import xrange
 import tensorflow as tf
 
@@ -141,6 +142,147 @@ class BeamSearch(object):
 
     return self._BestHyps(results)
 
+  def BatchBeamSearch(self, sess, enc_inputs, enc_seqlen):
+    """Performs beam search for decoding a batch of articles at once.
+
+    Finds the same hypotheses as running BeamSearch on each article, but feeds
+    beam_size rows per article to the model, so that the model batch size must
+    be num_articles * beam_size. The hypotheses of all articles are extended
+    together: tokens are kept in per-step arrays with back-pointers to the
+    parent hypotheses instead of lists, and the candidates are selected with
+    array operations. Decoding stops once every article has beam_size results.
+
+    Args:
+      sess: tf.Session, session
+      enc_inputs: ndarray of shape (num_articles, enc_length), the document ids
+        to encode
+      enc_seqlen: ndarray of shape (num_articles), the lengths of the sequences
+
+    Returns:
+      A list with the hypotheses of each article, as returned by BeamSearch.
+    """
+    beam_size = self._beam_size
+    num_articles = enc_inputs.shape[0]
+    num_candidates = beam_size * 2
+    articles = np.arange(num_articles)[:, np.newaxis]
+
+    # Run the encoder on beam_size copies of each article.
+    enc_top_states, dec_in_states = self._model.encode_top_states(
+        sess, np.repeat(enc_inputs, beam_size, axis=0),
+        np.repeat(enc_seqlen, beam_size, axis=0))
+    states = np.asarray(dec_in_states)
+
+    # Hypothesis k of article a after step t ends in tokens[t][a, k] and extends
+    # hypothesis parents[t][a, k] of step t - 1.
+    tokens = []
+    parents = []
+    latest_tokens = np.full([num_articles, beam_size], self._start_token,
+                            dtype=np.int64)
+    log_probs = np.zeros([num_articles, beam_size])
+
+    # Results are identified by their step, the hypothesis they extend and their
+    # last token. At most beam_size results are found during the search, plus
+    # at most beam_size hypotheses taken at the last step when max_steps is
+    # reached.
+    max_results = 2 * beam_size
+    num_results = np.zeros([num_articles], dtype=np.int64)
+    result_steps = np.zeros([num_articles, max_results], dtype=np.int64)
+    result_parents = np.zeros([num_articles, max_results], dtype=np.int64)
+    result_tokens = np.zeros([num_articles, max_results], dtype=np.int64)
+    result_log_probs = np.zeros([num_articles, max_results])
+    result_states = np.zeros((num_articles, max_results) + states.shape[1:],
+                             dtype=states.dtype)
+
+    steps = 0
+    while steps < self._max_steps and np.any(num_results < beam_size):
+      topk_ids, topk_log_probs, new_states = self._model.decode_topk(
+          sess, latest_tokens.ravel(), enc_top_states, states)
+      new_states = np.asarray(new_states)
+
+      # Candidate c of an article extends its hypothesis c // num_candidates.
+      candidate_ids = topk_ids[:, :num_candidates].reshape([num_articles, -1])
+      candidate_log_probs = (
+          log_probs[:, :, np.newaxis] +
+          topk_log_probs[:, :num_candidates].reshape(
+              [num_articles, beam_size, num_candidates])).reshape(
+                  [num_articles, -1])
+      if steps == 0:
+        # The first step takes the best K results from the first hypothesis.
+        candidate_log_probs[:, num_candidates:] = -np.inf
+
+      # Take the candidates in order of decreasing log prob (all candidates have
+      # the same length) until either beam_size hypotheses or, together with
+      # previous results, beam_size results are collected.
+      order = np.argsort(-candidate_log_probs, axis=1, kind='mergesort')
+      is_end = candidate_ids[articles, order] == self._end_token
+      end_counts = np.cumsum(is_end, axis=1)
+      hyp_counts = np.cumsum(~is_end, axis=1)
+      full = ((hyp_counts == beam_size) |
+              (num_results[:, np.newaxis] + end_counts == beam_size))
+      last = np.argmax(full, axis=1)
+      taken = np.arange(order.shape[1]) <= last[:, np.newaxis]
+      # Finished articles take no candidates.
+      taken &= (num_results < beam_size)[:, np.newaxis]
+
+      # Pull the taken candidates that end in the end token off the beam.
+      for a, c in zip(*np.nonzero(taken & is_end)):
+        candidate = order[a, c]
+        r = num_results[a]
+        result_steps[a, r] = steps
+        result_parents[a, r] = candidate // num_candidates
+        result_tokens[a, r] = candidate_ids[a, candidate]
+        result_log_probs[a, r] = candidate_log_probs[a, candidate]
+        result_states[a, r] = new_states[
+            a * beam_size + candidate // num_candidates]
+        num_results[a] += 1
+
+      # The other taken candidates continue as hypotheses. Candidates are sorted
+      # so that they come first, in order. The remaining hypotheses of articles
+      # with fewer than beam_size taken candidates are only decoded to keep the
+      # batch full.
+      num_hyps = np.sum(taken & ~is_end, axis=1)
+      hyp_order = np.argsort(~(taken & ~is_end), axis=1,
+                             kind='mergesort')[:, :beam_size]
+      next_hyps = order[articles, hyp_order]
+      hyp_parents = next_hyps // num_candidates
+      latest_tokens = candidate_ids[articles, next_hyps]
+      log_probs = candidate_log_probs[articles, next_hyps]
+      states = new_states[(articles * beam_size + hyp_parents).ravel()]
+      tokens.append(latest_tokens)
+      parents.append(hyp_parents)
+
+      steps += 1
+
+    if steps == self._max_steps:
+      # As in BeamSearch, the hypotheses taken at the last step are added to
+      # the results of every article decoded at that step, including articles
+      # which reached beam_size results at that step.
+      for a in xrange(num_articles):
+        r, n = num_results[a], num_hyps[a]
+        result_steps[a, r:r + n] = steps - 1
+        result_parents[a, r:r + n] = parents[-1][a, :n]
+        result_tokens[a, r:r + n] = tokens[-1][a, :n]
+        result_log_probs[a, r:r + n] = log_probs[a, :n]
+        result_states[a, r:r + n] = states[a * beam_size:a * beam_size + n]
+        num_results[a] += n
+
+    all_hyps = []
+    for a in xrange(num_articles):
+      hyps = []
+      for r in xrange(num_results[a]):
+        # Follow the back-pointers to collect the tokens of the result.
+        hyp_tokens = [result_tokens[a, r]]
+        k = result_parents[a, r]
+        for t in xrange(result_steps[a, r] - 1, -1, -1):
+          hyp_tokens.append(tokens[t][a, k])
+          k = parents[t][a, k]
+        hyp_tokens.append(self._start_token)
+        hyps.append(Hypothesis([int(t) for t in reversed(hyp_tokens)],
+                               result_log_probs[a, r], result_states[a, r]))
+      all_hyps.append(self._BestHyps(hyps))
+
+    return all_hyps
+
   def _BestHyps(self, hyps):
     """Sort the hyps based on log probs and length.
 
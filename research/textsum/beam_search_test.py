@@ -0,0 +1,91 @@
+# Copyright 2016 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for beam_search."""
+
+import numpy as np
+from six.moves import xrange
+import tensorflow as tf
+
+import beam_search
+
+_VOCAB_SIZE = 8
+_START_TOKEN = 0
+_END_TOKEN = 1
+
+
+class _FakeModel(object):
+  """Model whose outputs only depend on the article and the decoded tokens.
+
+  The decoder state of a hypothesis is [article id, hash of its tokens], and
+  the log probs of the next token are drawn from a generator seeded with it,
+  so that a hypothesis gets the same outputs whatever batch it is decoded in.
+  """
+
+  def __init__(self, beam_size):
+    self._beam_size = beam_size
+
+  def encode_top_state(self, sess, enc_inputs, enc_len):
+    return enc_inputs, np.array([enc_inputs[0, 0], 0], dtype=np.int64)
+
+  def encode_top_states(self, sess, enc_inputs, enc_len):
+    states = np.zeros([enc_inputs.shape[0], 2], dtype=np.int64)
+    states[:, 0] = enc_inputs[:, 0]
+    return enc_inputs, states
+
+  def decode_topk(self, sess, latest_tokens, enc_top_states, dec_init_states):
+    ids = []
+    log_probs = []
+    new_states = []
+    for token, state in zip(latest_tokens, dec_init_states):
+      new_state = np.array(
+          [state[0], (state[1] * 31 + token + 1) % 1000003], dtype=np.int64)
+      rng = np.random.RandomState(int(new_state[0] * 1000003 + new_state[1]))
+      token_log_probs = np.log(rng.dirichlet(np.ones(_VOCAB_SIZE)))
+      topk = np.argsort(-token_log_probs)[:self._beam_size * 2]
+      ids.append(topk)
+      log_probs.append(token_log_probs[topk])
+      new_states.append(new_state)
+    return np.array(ids), np.array(log_probs), new_states
+
+
+class BeamSearchTest(tf.test.TestCase):
+
+  def testBatchBeamSearchMatchesBeamSearch(self):
+    for beam_size in [1, 2, 4]:
+      for max_steps in [1, 2, 3, 6]:
+        model = _FakeModel(beam_size)
+        bs = beam_search.BeamSearch(model, beam_size, _START_TOKEN, _END_TOKEN,
+                                    max_steps)
+        num_articles = 50
+        enc_inputs = np.arange(num_articles)[:, np.newaxis] * 7 + 3
+        enc_seqlen = np.ones([num_articles], dtype=np.int64)
+
+        all_hyps = bs.BatchBeamSearch(None, enc_inputs, enc_seqlen)
+        self.assertEqual(num_articles, len(all_hyps))
+        for a in xrange(num_articles):
+          expected_hyps = bs.BeamSearch(
+              None, np.repeat(enc_inputs[a:a + 1], beam_size, axis=0),
+              enc_seqlen[a:a + 1])
+          self.assertEqual([h.tokens for h in expected_hyps],
+                           [h.tokens for h in all_hyps[a]])
+          self.assertAllClose([h.log_prob for h in expected_hyps],
+                              [h.log_prob for h in all_hyps[a]])
+          self.assertAllEqual([h.state for h in expected_hyps],
+                              [h.state for h in all_hyps[a]])
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -16,10 +16,13 @@
 """Data batchers for data described in ..//data_prep/README.md."""
 
 import glob
+import hashlib
+import os
 import random
 import struct
 import sys
 
+import numpy as np
 from tensorflow.core.example import example_pb2
 
 
@@ -74,6 +77,13 @@ class Vocab(object):
   def NumIds(self):
     return self._count
 
+  def Fingerprint(self):
+    """Returns a hash of the words and their ids."""
+    words = '\n'.join(self._id_to_word[i] for i in range(self._count))
+    if not isinstance(words, bytes):
+      words = words.encode('utf-8')
+    return hashlib.md5(words).hexdigest()
+
 
 def ExampleGen(data_path, num_epochs=None):
   """Generates tf.Examples from path of data files.
@@ -110,6 +120,147 @@ def ExampleGen(data_path, num_epochs=None):
     epoch += 1
 
 
+# Columns of the example index of an ExampleStore: the ranges of sentences of
+# the article and the abstract, and the byte ranges of their text.
+_ARTICLE_SENTENCES = slice(0, 2)
+_ABSTRACT_SENTENCES = slice(2, 4)
+_ARTICLE_TEXT = slice(4, 6)
+_ABSTRACT_TEXT = slice(6, 8)
+
+
+def _ToBytes(text):
+  return text if isinstance(text, bytes) else text.encode('utf-8')
+
+
+def WriteExampleStore(store_path, texts, vocab):
+  """Tokenizes articles and abstracts and writes them to an ExampleStore.
+
+  The store consists of three files:
+    <store_path>.tokens: the word ids of all sentences, as int32.
+    <store_path>.text: the text of all articles and abstracts.
+    <store_path>.index.npz: the offsets of the sentences in the tokens, the
+      offsets of the sentences and text of each example, and the fingerprint
+      of the vocabulary.
+  Sentences are split and tokenized as done by batch_reader.Batcher.
+
+  Args:
+    store_path: path prefix of the store files.
+    texts: iterable of (article, abstract) text pairs.
+    vocab: Vocab used for the word ids.
+
+  Returns:
+    The number of examples written.
+  """
+  sentences = [0]
+  examples = []
+  text_size = 0
+  with open(store_path + '.tokens', 'wb') as tokens_f, open(
+      store_path + '.text', 'wb') as text_f:
+    for article, abstract in texts:
+      sentence_ranges = []
+      text_ranges = []
+      for paragraph in (article, abstract):
+        begin = len(sentences) - 1
+        paragraph_sentences = [sent.strip() for sent in
+                               ToSentences(paragraph, include_token=False)]
+        for sentence in paragraph_sentences:
+          ids = np.array(GetWordIds(sentence, vocab), dtype=np.int32)
+          tokens_f.write(ids.tobytes())
+          sentences.append(sentences[-1] + len(ids))
+        sentence_ranges.extend([begin, len(sentences) - 1])
+
+        text = _ToBytes(' '.join(paragraph_sentences))
+        text_f.write(text)
+        text_ranges.extend([text_size, text_size + len(text)])
+        text_size += len(text)
+      examples.append(sentence_ranges + text_ranges)
+
+  with open(store_path + '.index.npz', 'wb') as index_f:
+    np.savez(index_f,
+             sentences=np.array(sentences, dtype=np.int64),
+             examples=np.array(examples, dtype=np.int64).reshape([-1, 8]),
+             vocab_fingerprint=np.array(vocab.Fingerprint()))
+  return len(examples)
+
+
+def _Map(path, dtype):
+  """Memory maps a binary file, which may be empty."""
+  if not os.path.getsize(path):
+    return np.zeros([0], dtype=dtype)
+  return np.memmap(path, dtype=dtype, mode='r')
+
+
+class ExampleStore(object):
+  """Random access to the pre-tokenized examples written by WriteExampleStore.
+
+  The word ids and the text are memory mapped, so reading an example neither
+  parses a tf.Example nor tokenizes its text again.
+  """
+
+  def __init__(self, store_path, vocab=None):
+    """ExampleStore constructor.
+
+    Args:
+      store_path: path prefix of the store files.
+      vocab: If given, the Vocab that the store must have been written with.
+
+    Raises:
+      ValueError: if the store was written with a different vocabulary.
+    """
+    with np.load(store_path + '.index.npz') as index:
+      self._sentences = index['sentences']
+      self._examples = index['examples']
+      fingerprint = str(index['vocab_fingerprint'])
+    if vocab is not None and fingerprint != vocab.Fingerprint():
+      raise ValueError('Example store %s was written with a different '
+                       'vocabulary.' % store_path)
+    self._tokens = _Map(store_path + '.tokens', np.int32)
+    self._text = _Map(store_path + '.text', np.uint8)
+
+  def __len__(self):
+    return len(self._examples)
+
+  def _Ids(self, sentence_range, max_sentences):
+    begin, end = sentence_range
+    if max_sentences is not None:
+      end = min(end, begin + max_sentences)
+    return self._tokens[self._sentences[begin]:self._sentences[end]]
+
+  def ArticleIds(self, i, max_sentences=None):
+    """Returns the word ids of the first max_sentences article sentences."""
+    return self._Ids(self._examples[i, _ARTICLE_SENTENCES], max_sentences)
+
+  def AbstractIds(self, i, max_sentences=None):
+    """Returns the word ids of the first max_sentences abstract sentences."""
+    return self._Ids(self._examples[i, _ABSTRACT_SENTENCES], max_sentences)
+
+  def ArticleText(self, i):
+    begin, end = self._examples[i, _ARTICLE_TEXT]
+    return self._text[begin:end].tobytes()
+
+  def AbstractText(self, i):
+    begin, end = self._examples[i, _ABSTRACT_TEXT]
+    return self._text[begin:end].tobytes()
+
+
+def ExampleStoreGen(store, num_epochs=None):
+  """Generates the example indices of an ExampleStore in shuffled epochs.
+
+  Args:
+    store: ExampleStore.
+    num_epochs: Number of times to go through the data. None means infinite.
+
+  Yields:
+    Example indices, in a new random order every epoch.
+  """
+  assert len(store), 'Empty example store.'
+  epoch = 0
+  while num_epochs is None or epoch < num_epochs:
+    for i in np.random.permutation(len(store)):
+      yield i
+    epoch += 1
+
+
 def Pad(ids, pad_id, length):
   """Pad or trim list to len length.
 
@@ -4,6 +4,7 @@ python data_convert_example.py --command binary_to_text --in_file data/data --ou
 python data_convert_example.py --command text_to_binary --in_file data/text_data --out_file data/binary_data
 python data_convert_example.py --command binary_to_text --in_file data/binary_data --out_file data/text_data2
 diff data/text_data2 data/text_data
+python data_convert_example.py --command binary_to_tokenized --in_file 'data/binary_data*' --out_file data/tokenized_data --vocab_path data/vocab
 """
 
 import struct
@@ -12,12 +13,23 @@ import sys
 import tensorflow as tf
 from tensorflow.core.example import example_pb2
 
+import data
+
 FLAGS = tf.app.flags.FLAGS
 tf.app.flags.DEFINE_string('command', 'binary_to_text',
-                           'Either binary_to_text or text_to_binary.'
+                           'Either binary_to_text, text_to_binary or '
+                           'binary_to_tokenized.'
                            'Specify FLAGS.in_file accordingly.')
 tf.app.flags.DEFINE_string('in_file', '', 'path to file')
 tf.app.flags.DEFINE_string('out_file', '', 'path to file')
+tf.app.flags.DEFINE_string('vocab_path', '',
+                           'Vocabulary file, for binary_to_tokenized.')
+tf.app.flags.DEFINE_string('article_key', 'article',
+                           'tf.Example feature key for article, for '
+                           'binary_to_tokenized.')
+tf.app.flags.DEFINE_string('abstract_key', 'headline',
+                           'tf.Example feature key for abstract, for '
+                           'binary_to_tokenized.')
 
 def _binary_to_text():
   reader = open(FLAGS.in_file, 'rb')
@@ -53,12 +65,31 @@ def _text_to_binary():
   writer.close()
 
 
+def _binary_to_tokenized():
+  """Writes the binary data files in_file (a pattern) to an ExampleStore."""
+  vocab = data.Vocab(FLAGS.vocab_path, 1000000)
+
+  def _texts():
+    for tf_example in data.ExampleGen(FLAGS.in_file, num_epochs=1):
+      try:
+        yield (data.GetExFeatureText(tf_example, FLAGS.article_key),
+               data.GetExFeatureText(tf_example, FLAGS.abstract_key))
+      except IndexError:
+        sys.stderr.write('Skipping example without article or abstract\n')
+
+  num_examples = data.WriteExampleStore(FLAGS.out_file, _texts(), vocab)
+  sys.stderr.write('Wrote %d examples\n' % num_examples)
+
+
 def main(unused_argv):
   assert FLAGS.command and FLAGS.in_file and FLAGS.out_file
   if FLAGS.command == 'binary_to_text':
     _binary_to_text()
   elif FLAGS.command == 'text_to_binary':
     _text_to_binary()
+  elif FLAGS.command == 'binary_to_tokenized':
+    assert FLAGS.vocab_path
+    _binary_to_tokenized()
 
 
 if __name__ == '__main__':
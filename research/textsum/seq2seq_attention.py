@@ -58,6 +58,12 @@ tf.app.flags.DEFINE_integer('eval_interval_secs', 60, 'How often to run eval.')
 tf.app.flags.DEFINE_integer('checkpoint_secs', 60, 'How often to checkpoint.')
 tf.app.flags.DEFINE_bool('use_bucketing', False,
                          'Whether bucket articles of similar length.')
+tf.app.flags.DEFINE_bool('tokenized_data', False,
+                         'Whether data_path is a pre-tokenized example store '
+                         'written by data_convert_example.py.')
+tf.app.flags.DEFINE_integer('num_input_processes', 0,
+                            'If > 0, the number of processes producing input '
+                            'batches, instead of input threads.')
 tf.app.flags.DEFINE_bool('truncate_input', False,
                          'Truncate inputs that are too long. If False, '
                          'examples that are too long are discarded.')
@@ -79,6 +85,20 @@ def _RunningAvgLoss(loss, running_avg_loss, summary_writer, step, decay=0.999):
   return running_avg_loss
 
 
+def _AddInputSummaries(data_batcher, summary_writer, step):
+  """Adds summaries of the input pipeline to see if training is input-bound."""
+  stats = data_batcher.Stats()
+  input_sum = tf.Summary()
+  for name, value in sorted(stats.items()):
+    input_sum.value.add(tag='input/%s' % name, simple_value=value)
+  summary_writer.add_summary(input_sum, step)
+  tf.logging.info('input queue depth: %d, batches/sec produced: %.1f, '
+                  'consumed: %.1f, waiting for input: %.1f%%',
+                  stats['queue_depth'], stats['producer_batches_per_sec'],
+                  stats['consumer_batches_per_sec'],
+                  100 * stats['input_wait_fraction'])
+
+
 def _Train(model, data_batcher):
   """Runs model training."""
   with tf.device('/cpu:0'):
@@ -110,6 +130,7 @@ def _Train(model, data_batcher):
           running_avg_loss, loss, summary_writer, train_step)
       step += 1
       if step % 100 == 0:
+        _AddInputSummaries(data_batcher, summary_writer, train_step)
         summary_writer.flush()
     sv.Stop()
     return running_avg_loss
@@ -168,6 +189,8 @@ def main(unused_argv):
   batch_size = 4
   if FLAGS.mode == 'decode':
     batch_size = FLAGS.beam_size
+    if FLAGS.batch_decode_articles > 0:
+      batch_size *= FLAGS.batch_decode_articles
 
   hps = seq2seq_attention_model.HParams(
       mode=FLAGS.mode,  # train, eval, decode
@@ -187,7 +210,8 @@ def main(unused_argv):
       FLAGS.data_path, vocab, hps, FLAGS.article_key,
       FLAGS.abstract_key, FLAGS.max_article_sentences,
       FLAGS.max_abstract_sentences, bucketing=FLAGS.use_bucketing,
-      truncate_input=FLAGS.truncate_input)
+      truncate_input=FLAGS.truncate_input, tokenized=FLAGS.tokenized_data,
+      num_producers=FLAGS.num_input_processes)
   tf.set_random_seed(FLAGS.random_seed)
 
   if hps.mode == 'train':
@@ -29,6 +29,10 @@ tf.app.flags.DEFINE_integer('max_decode_steps', 1000000,
 tf.app.flags.DEFINE_integer('decode_batches_per_ckpt', 8000,
                             'Number of batches to decode before restoring next '
                             'checkpoint')
+tf.app.flags.DEFINE_integer('batch_decode_articles', 0,
+                            'If > 0, the number of articles decoded together '
+                            'by batched beam search. The model batch size is '
+                            'then batch_decode_articles * beam_size.')
 
 DECODE_LOOP_DELAY_SECS = 60
 DECODE_IO_FLUSH_INTERVAL = 100
@@ -127,6 +131,11 @@ class BSDecoder(object):
     for _ in xrange(FLAGS.decode_batches_per_ckpt):
       (article_batch, _, _, article_lens, _, _, origin_articles,
        origin_abstracts) = self._batch_reader.NextBatch()
+      if FLAGS.batch_decode_articles > 0:
+        self._BatchDecode(sess, article_batch, article_lens, origin_articles,
+                          origin_abstracts)
+        continue
+
       for i in xrange(self._hps.batch_size):
         bs = beam_search.BeamSearch(
             self._model, self._hps.batch_size,
@@ -144,6 +153,35 @@ class BSDecoder(object):
             origin_articles[i], origin_abstracts[i], decode_output)
     return True
 
+  def _BatchDecode(self, sess, article_batch, article_lens, origin_articles,
+                   origin_abstracts):
+    """Decodes a batch of articles with batched beam search.
+
+    The batch holds beam_size groups of batch_decode_articles articles, and
+    the articles of each group are decoded together.
+
+    Args:
+      sess: Tensorflow session.
+      article_batch: The articles, [batch_size, enc_timesteps].
+      article_lens: The article lengths, [batch_size].
+      origin_articles: The original article strings.
+      origin_abstracts: The human (correct) abstract strings.
+    """
+    num_articles = FLAGS.batch_decode_articles
+    bs = beam_search.BeamSearch(
+        self._model, FLAGS.beam_size,
+        self._vocab.WordToId(data.SENTENCE_START),
+        self._vocab.WordToId(data.SENTENCE_END),
+        self._hps.dec_timesteps)
+    for start in xrange(0, self._hps.batch_size, num_articles):
+      all_hyps = bs.BatchBeamSearch(
+          sess, article_batch[start:start + num_articles],
+          article_lens[start:start + num_articles])
+      for i, hyps in enumerate(all_hyps):
+        decode_output = [int(t) for t in hyps[0].tokens[1:]]
+        self._DecodeBatch(origin_articles[start + i],
+                          origin_abstracts[start + i], decode_output)
+
   def _DecodeBatch(self, article, abstract, output_ids):
     """Convert id to words and writing results.
 
@@ -273,6 +273,24 @@ class Seq2SeqAttentionModel(object):
                                   self._article_lens: enc_len})
     return results[0], results[1][0]
 
+  def encode_top_states(self, sess, enc_inputs, enc_len):
+    """Return the top states from encoder and the decoder states of each input.
+
+    Unlike encode_top_state, which returns the decoder initial state of the
+    first input only, this is used to decode different inputs in one batch.
+
+    Args:
+      sess: tensorflow session.
+      enc_inputs: encoder inputs of shape [batch_size, enc_timesteps].
+      enc_len: encoder input length of shape [batch_size]
+    Returns:
+      enc_top_states: The top level encoder states.
+      dec_in_states: The decoder layer initial states, [batch_size, state_size].
+    """
+    return sess.run([self._enc_top_states, self._dec_in_state],
+                    feed_dict={self._articles: enc_inputs,
+                               self._article_lens: enc_len})
+
   def decode_topk(self, sess, latest_tokens, enc_top_states, dec_init_states):
     """Return the topK results and new decoder states."""
     feed = {